@@ -0,0 +1,213 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+# --- CONFIGURACIÓN ---
+MODEL_CONCURRENCY = int(os.environ.get("AGENT_MODEL_CONCURRENCY", "2"))
+QUEUE_MAX_SIZE = int(os.environ.get("AGENT_QUEUE_SIZE", "100"))
+QUEUE_MAX_WAIT = float(os.environ.get("AGENT_QUEUE_MAX_WAIT", "120"))
+# Duración supuesta de una petición hasta disponer de mediciones reales.
+INITIAL_SERVICE_TIME = 10.0
+SERVICE_TIME_SMOOTHING = 0.2
+QUEUE_FEEDBACK_INTERVAL = 1.0
+
+
+class AdmissionRejected(Exception):
+    """La petición se descarta porque la cola está llena o no llegaría a tiempo."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """Plaza de una petición en la cola de admisión."""
+
+    def __init__(self, client_id: str, max_wait: float):
+        self.client_id = client_id
+        self.enqueued_at = time.monotonic()
+        self.deadline = self.enqueued_at + max_wait
+        self.admitted_at = None
+        self.finished = False
+        self._admitted = threading.Event()
+
+    @property
+    def admitted(self) -> bool:
+        return self._admitted.is_set()
+
+    def wait(self, timeout: float) -> bool:
+        return self._admitted.wait(timeout)
+
+
+class AdmissionController:
+    """Cola acotada y equitativa por cliente delante del modelo.
+
+    Como mucho `max_concurrent` peticiones ejecutan el bucle del agente a la
+    vez; el resto espera en una cola por cliente que se atiende por turnos
+    (round-robin), de modo que un cliente con muchas peticiones no acapara el
+    modelo. Las peticiones que no cabrían en la cola, o cuya espera estimada
+    supera su plazo, se rechazan de inmediato con un `retry_after`.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = MODEL_CONCURRENCY,
+        max_queue: int = QUEUE_MAX_SIZE,
+        max_wait: float = QUEUE_MAX_WAIT,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._queues = OrderedDict()
+        self._depth = 0
+        self._in_flight = 0
+        self._service_time = INITIAL_SERVICE_TIME
+        self._stats = {
+            "admitted": 0,
+            "rejected": 0,
+            "timed_out": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    # --- API pública ---
+
+    def submit(self, client_id: str, max_wait: float = None) -> Ticket:
+        """Encola una petición; lanza AdmissionRejected si debe descartarse."""
+        max_wait = self.max_wait if max_wait is None else min(max_wait, self.max_wait)
+        with self._lock:
+            estimated = self._estimate_wait(self._depth + 1)
+            if self._in_flight >= self.max_concurrent and (
+                self._depth >= self.max_queue or estimated > max_wait
+            ):
+                self._stats["rejected"] += 1
+                raise AdmissionRejected(
+                    "El servidor está ocupado; inténtalo más tarde.",
+                    retry_after=max(1, math.ceil(estimated)),
+                )
+            ticket = Ticket(client_id, max_wait)
+            self._queues.setdefault(client_id, deque()).append(ticket)
+            self._depth += 1
+            self._dispatch()
+            return ticket
+
+    def position(self, ticket: Ticket) -> int:
+        """Posición (1 = siguiente) en el orden round-robin; 0 si el ticket ya entró."""
+        with self._lock:
+            queue = self._queues.get(ticket.client_id)
+            if ticket.admitted or not queue or ticket not in queue:
+                return 0
+            index = queue.index(ticket)
+            position = index + 1
+            before = True
+            for client_id, other in self._queues.items():
+                if client_id == ticket.client_id:
+                    before = False
+                    continue
+                position += min(len(other), index + 1 if before else index)
+            return position
+
+    def estimated_wait(self, ticket: Ticket) -> float:
+        position = self.position(ticket)
+        with self._lock:
+            return self._estimate_wait(position) if position else 0.0
+
+    def finish(self, ticket: Ticket, timed_out: bool = False):
+        """Libera la plaza del ticket (o lo saca de la cola si aún esperaba)."""
+        with self._lock:
+            if ticket.finished:
+                return
+            ticket.finished = True
+            if ticket.admitted:
+                self._in_flight -= 1
+                elapsed = time.monotonic() - ticket.admitted_at
+                self._service_time += SERVICE_TIME_SMOOTHING * (
+                    elapsed - self._service_time
+                )
+            else:
+                queue = self._queues.get(ticket.client_id)
+                if queue and ticket in queue:
+                    queue.remove(ticket)
+                    self._depth -= 1
+                    if not queue:
+                        del self._queues[ticket.client_id]
+                if timed_out:
+                    self._stats["timed_out"] += 1
+            self._dispatch()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "queue_depth": self._depth,
+                "in_flight": self._in_flight,
+                "max_concurrent": self.max_concurrent,
+                "avg_wait_seconds": (
+                    stats["total_wait_seconds"] / stats["admitted"]
+                    if stats["admitted"]
+                    else 0.0
+                ),
+                "service_time_seconds": self._service_time,
+            })
+            return stats
+
+    # --- Utilidades (requieren self._lock) ---
+
+    def _estimate_wait(self, position: int) -> float:
+        if self._in_flight < self.max_concurrent:
+            return 0.0
+        return math.ceil(position / self.max_concurrent) * self._service_time
+
+    def _dispatch(self):
+        while self._in_flight < self.max_concurrent and self._queues:
+            client_id, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            self._depth -= 1
+            if queue:
+                self._queues.move_to_end(client_id)
+            else:
+                del self._queues[client_id]
+            ticket.admitted_at = time.monotonic()
+            wait = ticket.admitted_at - ticket.enqueued_at
+            self._stats["admitted"] += 1
+            self._stats["total_wait_seconds"] += wait
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], wait)
+            self._in_flight += 1
+            ticket._admitted.set()
+
+
+def admitted_events(
+    controller: AdmissionController,
+    ticket: Ticket,
+    start,
+    interval: float = QUEUE_FEEDBACK_INTERVAL,
+):
+    """Espera el turno del ticket emitiendo eventos "queue" y luego produce `start()`.
+
+    Si vence el plazo del ticket antes de entrar se emite un evento "error"
+    con `reason="queue_timeout"`. La plaza se libera siempre al terminar.
+    """
+    try:
+        while not ticket.wait(
+            min(interval, max(ticket.deadline - time.monotonic(), 0))
+        ):
+            if time.monotonic() >= ticket.deadline:
+                controller.finish(ticket, timed_out=True)
+                yield "error", {
+                    "message": "Tiempo de espera agotado en la cola del servidor.",
+                    "reason": "queue_timeout",
+                    "retry_after": max(
+                        1, math.ceil(controller.stats()["service_time_seconds"])
+                    ),
+                }
+                return
+            yield "queue", {
+                "position": controller.position(ticket),
+                "estimated_wait": controller.estimated_wait(ticket),
+            }
+        yield from start()
+    finally:
+        controller.finish(ticket)
@@ -1,9 +1,10 @@
-import subprocess
 import json
 from rich.console import Console
 
 # Importa las herramientas y sus manifiestos desde tools.py
-from tools import AVAILABLE_TOOLS, TOOL_MANIFEST
+from tools import AVAILABLE_TOOLS, model_manifest
+from ollama_backend import OllamaBackend, OllamaError
+from history_manager import HistoryManager
 
 # --- CONFIGURACIÓN ---
 OLLAMA_MODEL = "granite4:micro-h"
@@ -12,6 +13,13 @@ AGENT_MEMORY_FILE = "/home/epardo/python_agent_cli/config/agent_memory.md"
 # Inicializa una consola para una salida más atractiva
 console = Console()
 
+# Cliente HTTP de Ollama (reutiliza la conexión entre llamadas)
+ollama_backend = OllamaBackend(OLLAMA_MODEL)
+
+# Compactación del historial según el presupuesto de tokens del modelo
+history_manager = HistoryManager()
+compaction_state = {}
+
 # --- FUNCIONES DEL ORQUESTADOR ---
 
 
@@ -28,10 +36,17 @@ def build_system_prompt(long_term_memory: str, conversation_history: list) -> st
     """Construye el prompt completo para el modelo de Ollama."""
 
     # Convierte el manifiesto de herramientas a una cadena JSON bonita
-    tools_json_str = json.dumps(TOOL_MANIFEST, indent=2)
+    tools_json_str = json.dumps(model_manifest(), indent=2)
+
+    # Resume los turnos antiguos para que el prompt no supere el contexto
+    history_lines, new_state = history_manager.compact(
+        conversation_history, compaction_state
+    )
+    compaction_state.update(new_state)
+    long_term_memory = history_manager.fit_memory(long_term_memory)
 
     # Convierte el historial de conversación a un formato legible
-    history_str = "\n".join(conversation_history)
+    history_str = "\n".join(history_lines)
 
     # Plantilla del prompt del sistema
     prompt_template = f"""
@@ -55,21 +70,12 @@ Responde a la siguiente petición del usuario. Si necesitas usar una herramienta
 
 
 def call_ollama(prompt: str) -> str:
-    """Llama al modelo de Ollama a través de la línea de comandos."""
-    # Escapa las comillas dentro del prompt para evitar errores de shell
-    escaped_prompt = prompt.replace('"', '"')
-    command = f'ollama run {OLLAMA_MODEL} "{escaped_prompt}"'
-
-    # En un agente real, manejarías esto de forma más robusta
+    """Llama al modelo de Ollama a través de su API HTTP."""
     console.print("[grey50]Llamando a Ollama...[/grey50]")
-    result = subprocess.run(
-        command, shell=True, capture_output=True, text=True, check=False
-    )
-
-    if result.returncode != 0:
-        return f"Error al llamar a Ollama: {result.stderr}"
-
-    return result.stdout.strip()
+    try:
+        return ollama_backend.generate(prompt).strip()
+    except OllamaError as e:
+        return f"Error al llamar a Ollama: {e}"
 
 
 def execute_tool(tool_call: dict) -> str:
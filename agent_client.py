@@ -1,50 +1,86 @@
 import requests
-import json
 import os
 
 AGENT_URL = "https://agentpy.emanuel-server.com/chat"
 API_KEY = os.environ.get("AGENT_API_KEY")
 
 
-def chat_with_agent(user_message: str, history: list = None) -> str:
+def chat_with_agent(
+    user_message: str, session_id: str = None, on_chunk=None
+) -> tuple:
+    """Envía un mensaje al agente y devuelve (respuesta, session_id).
+
+    Solo se envía el mensaje nuevo: el historial vive en el servidor, en la
+    sesión `session_id`. La primera petición la crea y el servidor devuelve su
+    id en la cabecera X-Session-Id. La respuesta se lee a medida que llega y
+    cada trozo se pasa a `on_chunk`.
+    """
     if not API_KEY:
-        return "Error: La variable de entorno AGENT_API_KEY no está configurada. Por favor, configúrala antes de usar el cliente."
+        return (
+            "Error: La variable de entorno AGENT_API_KEY no está configurada. "
+            "Por favor, configúrala antes de usar el cliente.",
+            session_id,
+        )
 
     payload = {"user_message": user_message}
-    if history:
-        payload["history"] = history
+    if session_id:
+        payload["session_id"] = session_id
 
-    headers = {"X-API-Key": API_KEY}
+    headers = {"X-API-Key": API_KEY, "Accept": "text/plain"}
 
     try:
-        response = requests.post(AGENT_URL, json=payload, headers=headers)
-        response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
-
-        agent_response = response.json()
-        return agent_response.get(
-            "agent_response", "No se recibió una respuesta válida del agente."
-        )
+        with requests.post(
+            AGENT_URL, json=payload, headers=headers, stream=True
+        ) as response:
+            if response.status_code == 404 and session_id:
+                # La sesión caducó en el servidor: la próxima petición abre otra.
+                return f"Error: {_error_message(response)}", None
+            if not response.ok:
+                return (
+                    f"Error del agente ({response.status_code}): "
+                    f"{_error_message(response)}",
+                    session_id,
+                )
+            session_id = response.headers.get("X-Session-Id", session_id)
+            response.encoding = response.encoding or "utf-8"
+            chunks = []
+            for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+                chunks.append(chunk)
+                if on_chunk is not None:
+                    on_chunk(chunk)
     except requests.exceptions.RequestException as e:
-        return f"Error de conexión con el agente: {e}"
-    except json.JSONDecodeError:
-        return f"Error al decodificar la respuesta JSON del agente: {response.text}"
+        return f"Error de conexión con el agente: {e}", session_id
+    return "".join(chunks), session_id
+
+
+def _error_message(response) -> str:
+    try:
+        return response.json().get("error", response.text)
+    except (ValueError, AttributeError):
+        return response.text
 
 
 def main():
     print("Bienvenido al cliente de PyAgent. Escribe 'salir' para terminar.")
-    conversation_history = []
+    session_id = None
 
     while True:
         user_input = input("Tú: ")
         if user_input.lower() == "salir":
             break
 
-        response = chat_with_agent(user_input, conversation_history)
-        print(f"PyAgent: {response}")
+        print("PyAgent: ", end="", flush=True)
+        printed = []
+
+        def show(chunk):
+            printed.append(chunk)
+            print(chunk, end="", flush=True)
 
-        # Actualizar historial para la próxima interacción
-        conversation_history.append(f"Usuario: {user_input}")
-        conversation_history.append(f"Agente: {response}")
+        response, session_id = chat_with_agent(user_input, session_id, on_chunk=show)
+        if response != "".join(printed):
+            # Errores: no llegaron por el stream.
+            print(response, end="")
+        print()
 
 
 if __name__ == "__main__":
@@ -1,47 +1,195 @@
-import sys
 import logging
 from flask import Flask, request, jsonify, render_template, Response
-import subprocess
 import json
 import os
 import re
+import hashlib
+import threading
+import time
 
 # Importa las herramientas y sus manifiestos desde tools.py
-from tools import AVAILABLE_TOOLS, TOOL_MANIFEST, AGENT_MEMORY_FILE
+from tools import (
+    AVAILABLE_TOOLS,
+    TOOL_MANIFEST,
+    AGENT_MEMORY_FILE,
+    READ_ONLY_TOOLS,
+    SESSION_TOOLS,
+    manifest_to_ollama_tools,
+    model_manifest,
+    tool_result_cache,
+    tool_parameters_schema,
+    validate_tool_arguments,
+)
+from ollama_backend import OllamaBackend, OllamaError
+from tool_call_parser import ToolCallParser, TOOL_CALL, tool_call_list
+from tool_executor import ToolExecutor
+from tool_cache import path_fingerprint
+from session_store import SessionStore, format_history
+from prompt_cache import ContextCache, FileDerivedCache
+from history_manager import (
+    HistoryManager,
+    PromptBudget,
+    estimate_tokens,
+    extractive_summarizer,
+    make_model_summarizer,
+)
+from metrics import (
+    AGENT_LIMITS,
+    AGENT_STEPS,
+    GENERATED_TOKENS,
+    MODEL_ERRORS,
+    MODEL_FIRST_TOKEN,
+    MODEL_IN_FLIGHT,
+    PROMPT_TOKENS,
+    QUEUE_DEPTH,
+    REQUEST_SECONDS,
+    REQUESTS,
+    REQUESTS_IN_FLIGHT,
+    TIME_TO_FIRST_TOKEN,
+    TOOL_CALLS,
+    TOOL_SECONDS,
+    TRACE_HEADER,
+    Trace,
+    bind_trace,
+    current_trace,
+    record_span,
+    render_metrics,
+    span,
+    trace_id_from,
+)
+from log_pipeline import body as log_body, bodies_sampled
+from memory_store import (
+    MEMORY_TOP_K, memory_store_for, render as render_memory, store_path
+)
+from observation_store import observation_store
+from response_cache import (
+    RESPONSE_CACHE_ENABLED, normalize_message, response_cache, response_key
+)
+from streaming import SSE_HEADERS, sse_stream
+from admission import AdmissionController, AdmissionRejected, admitted_events
+from cancellation import (
+    CLIENT_DISCONNECT,
+    DEADLINE,
+    MAX_STEPS,
+    STEP_TOKENS,
+    Cancellation,
+    bind_cancellation,
+)
+from shell_runner import shell_jobs
+from web_fetcher import web_fetcher
 
 # --- CONFIGURACIÓN ---
 OLLAMA_MODEL = "granite4:micro-h"
-
-# Configura el logger
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(
-            "/home/epardo/projects/python_agent_cli/agent_server_debug.log"
-        ),
-        logging.StreamHandler(sys.stdout),
-    ],
-)
+# "prompt": herramientas descritas en el prompt y detectadas en el texto.
+# "native": herramientas nativas de Ollama (/api/chat con `tools`).
+TOOL_CALLING_MODE = os.environ.get("AGENT_TOOL_MODE", "prompt")
+# Fragmentos que se siguen leyendo tras una llamada a herramienta para
+# obtener el `context` (KV) de Ollama y reutilizarlo en el siguiente paso.
+CONTEXT_DRAIN_CHUNKS = 32
+# "extractive" (por defecto, sin coste de modelo) o "model" para resumir el historial.
+HISTORY_SUMMARIZER = os.environ.get("AGENT_SUMMARIZER", "extractive")
+# Caracteres del resultado de una herramienta incluidos en el evento `tool_result`.
+TOOL_RESULT_PREVIEW_CHARS = 2000
+# Pasos con herramientas por petición antes de cortarla sin respuesta final.
+MAX_TOOL_STEPS = int(os.environ.get("AGENT_MAX_TOOL_STEPS", "10"))
+# Segundos de reloj por petición desde que entra al modelo (0: sin plazo).
+REQUEST_DEADLINE = float(os.environ.get("AGENT_REQUEST_DEADLINE", "300"))
+# Tokens generados por pasada del modelo (`num_predict` de Ollama; 0: sin límite).
+STEP_MAX_TOKENS = int(os.environ.get("AGENT_STEP_MAX_TOKENS", "2048"))
+STOP_MESSAGES = {
+    CLIENT_DISCONNECT: "El cliente se desconectó.",
+    DEADLINE: f"Se agotó el tiempo máximo de la petición ({REQUEST_DEADLINE:g} s).",
+    MAX_STEPS: (
+        f"Se alcanzó el máximo de {MAX_TOOL_STEPS} pasos con herramientas "
+        "sin una respuesta final."
+    ),
+}
 
 app = Flask(__name__)
 
+# Backend compartido: un único pool de conexiones keep-alive por proceso.
+ollama_backend = OllamaBackend(OLLAMA_MODEL)
+OLLAMA_TOOLS = manifest_to_ollama_tools(TOOL_MANIFEST)
+# Forma parte de la clave de la caché de respuestas (en modo "native" las
+# herramientas no van en el prefijo).
+TOOL_MANIFEST_VERSION = hashlib.sha1(
+    json.dumps(TOOL_MANIFEST, sort_keys=True, ensure_ascii=False).encode("utf-8")
+).hexdigest()[:12]
+
+# Contadores de pasadas del modelo, llamadas inválidas (reintentos) y prefill.
+agent_stats = {
+    "requests": 0,
+    "model_passes": 0,
+    "invalid_tool_calls": 0,
+    "repaired_tool_calls": 0,
+    "prefill_steps": 0,
+    "prefill_tokens": 0,
+    "context_reuses": 0,
+    "tool_calls": 0,
+    "parallel_tool_steps": 0,
+    "tool_wall_seconds": 0.0,
+    "cached_responses": 0,
+    "stopped_requests": 0,
+    "truncated_steps": 0,
+}
+_stats_lock = threading.Lock()
+
+# Conversaciones del lado del servidor: el cliente solo envía el mensaje nuevo.
+session_store = SessionStore()
+
+# Control de admisión: concurrencia acotada frente al modelo y cola equitativa
+# por cliente.
+admission = AdmissionController()
+
+# Estado KV (`context` de /api/generate) por sesión, para enviar solo el delta.
+context_cache = ContextCache()
+
+def _generate_summary(prompt: str) -> str:
+    try:
+        return ollama_backend.generate(prompt)
+    except OllamaError as e:
+        logging.warning(f"No se pudo resumir el historial con el modelo: {e}")
+        return ""
+
+# Presupuesto de tokens por sección del prompt y compactación del historial. Las
+# herramientas reciben lo que ocupa su manifiesto; el resto se reparte.
+history_manager = HistoryManager(
+    budget=PromptBudget(
+        tools_tokens=estimate_tokens(json.dumps(model_manifest(), indent=2))
+    ),
+    summarizer=(
+        make_model_summarizer(_generate_summary)
+        if HISTORY_SUMMARIZER == "model"
+        else extractive_summarizer
+    )
+)
+
 # --- FUNCIONES DEL ORQUESTADOR ---
 
 def load_long_term_memory() -> str:
-    try:
-        with open(AGENT_MEMORY_FILE, "r", encoding="utf-8") as f:
-            return f.read()
-    except FileNotFoundError:
+    """Entradas fijas de la memoria (directivas generales): van siempre en el prompt."""
+    pinned = memory_store_for(AGENT_MEMORY_FILE).pinned()
+    if not pinned and not os.path.exists(store_path(AGENT_MEMORY_FILE)):
         return "Advertencia: No se encontró el archivo de memoria del agente."
+    return render_memory(pinned)
 
-def build_system_prompt(
-    long_term_memory: str,
-    conversation_history: list,
-    user_request: str
-) -> str:
-    tools_json_str = json.dumps(TOOL_MANIFEST, indent=2)
-    history_str = "\n".join(conversation_history)
+def load_relevant_memory(query: str, long_term_memory: str = "") -> str:
+    """Las entradas de memoria más relevantes para `query` (BM25).
+
+    Caben en el presupuesto de memoria que dejan libre las entradas fijas.
+
+    Así el prompt no crece con la memoria: solo entran `MEMORY_TOP_K` entradas.
+    """
+    entries = memory_store_for(AGENT_MEMORY_FILE).search(query, MEMORY_TOP_K)
+    budget = history_manager.budget.memory - history_manager.tokenizer(long_term_memory)
+    # Se descartan las menos relevantes hasta que quepan en el presupuesto.
+    while entries and history_manager.tokenizer(render_memory(entries)) > budget:
+        entries.pop()
+    return render_memory(entries)
+
+def build_static_prefix(long_term_memory: str) -> str:
+    """Parte fija del prompt (persona, memoria y herramientas), idéntica entre pasos."""
+    tools_json_str = json.dumps(model_manifest(), indent=2)
     return f"""
 Eres un asistente experto de línea de comandos. Tu nombre es 'PyAgent'.
 Responde siempre en español. Sé conciso y directo en tus respuestas.
@@ -51,8 +199,22 @@ Responde siempre en español. Sé conciso y directo en tus respuestas.
 
 ### HERRAMIENTAS DISPONIBLES ###
 Tienes acceso a las siguientes herramientas. Para usarlas, responde ÚNICAMENTE con un objeto JSON válido que represente la herramienta a usar. No añadas texto adicional fuera del JSON.
+Si necesitas varias herramientas independientes entre sí (por ejemplo, leer varios \
+archivos), responde con una lista JSON de esos objetos y se ejecutarán en el mismo \
+paso.
 {tools_json_str}
+"""
 
+def _relevant_memory_block(relevant_memory: str) -> str:
+    if not relevant_memory:
+        return ""
+    return f"\n### MEMORIA RELEVANTE ###\n{relevant_memory}\n"
+
+def build_dynamic_suffix(
+    conversation_history: list, user_request: str, relevant_memory: str = ""
+) -> str:
+    history_str = "\n".join(conversation_history)
+    return _relevant_memory_block(relevant_memory) + f"""
 ### HISTORIAL DE LA CONVERSACIÓN ###
 {history_str}
 
@@ -61,95 +223,865 @@ Usuario: {user_request}
 Antes de responder o usar una herramienta, piensa paso a paso para formular un plan de acción. Luego, responde a la petición del usuario. Si necesitas usar una herramienta, genera el JSON correspondiente. Si tienes la respuesta final, proporciónala directamente en texto plano.
 """
 
-def call_ollama_stream(prompt: str):
-    command = ["/usr/local/bin/ollama", "run", OLLAMA_MODEL, prompt]
-    logging.info(f"Llamando a Ollama (stream) con comando: {' '.join(command)}")
-    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8')
-    for line in iter(process.stdout.readline, ''):
-        yield line
-    process.stdout.close()
-    return_code = process.wait()
-    if return_code != 0:
-        error_output = process.stderr.read()
-        logging.error(f"Error en el stream de Ollama: {error_output}")
-        yield json.dumps({"error": error_output})
-
-def execute_tool(tool_name: str, parameters: dict) -> str:
+def build_system_prompt(
+    long_term_memory: str,
+    conversation_history: list,
+    user_request: str,
+    relevant_memory: str = "",
+) -> str:
+    return build_static_prefix(long_term_memory) + build_dynamic_suffix(
+        conversation_history, user_request, relevant_memory
+    )
+
+def _build_static_prefix_entry(path: str) -> dict:
+    long_term_memory = history_manager.fit_memory(load_long_term_memory())
+    prefix = build_static_prefix(long_term_memory)
+    tools_tokens = history_manager.tokenizer(json.dumps(model_manifest(), indent=2))
+    if tools_tokens > history_manager.budget.tools:
+        logging.warning(
+            f"El manifiesto de herramientas ({tools_tokens} tokens) supera su "
+            "presupuesto "
+            f"({history_manager.budget.tools} tokens)."
+        )
+    return {
+        "memory": long_term_memory,
+        "prefix": prefix,
+        "version": hashlib.sha1(prefix.encode("utf-8")).hexdigest()[:12],
+    }
+
+# El prefijo se reconstruye solo cuando cambia el registro de memoria (mtime/tamaño);
+# si las entradas fijas no cambian, su versión (hash) tampoco y el contexto KV
+# sigue valiendo.
+_static_prefix_cache = FileDerivedCache(_build_static_prefix_entry)
+
+def _usable_context(context):
+    """Descarta el contexto KV si ya ocupa casi todo el contexto del modelo.
+
+    Sin esta comprobación los deltas harían crecer el contexto sin límite y la
+    compactación del historial nunca llegaría a aplicarse.
+    """
+    budget = history_manager.budget
+    if context is not None and len(context) > budget.total - budget.task:
+        return None
+    return context
+
+def get_static_prefix() -> dict:
+    """Devuelve {"memory", "prefix", "version"} desde la caché del prefijo estático."""
+    return _static_prefix_cache.get(store_path(AGENT_MEMORY_FILE))
+
+def build_chat_messages(
+    long_term_memory: str,
+    conversation_history: list,
+    user_request: str,
+    relevant_memory: str = "",
+) -> list:
+    """Mensajes para /api/chat: las herramientas viajan aparte, en formato nativo."""
+    history_str = "\n".join(conversation_history)
+    system = f"""
+Eres un asistente experto de línea de comandos. Tu nombre es 'PyAgent'.
+Responde siempre en español. Sé conciso y directo en tus respuestas.
+
+### MEMORIA A LARGO PLAZO Y DIRECTIVAS ###
+{long_term_memory}
+
+Si necesitas usar una herramienta, invócala mediante las herramientas disponibles. \
+Si tienes la respuesta final, proporciónala directamente en texto plano.
+"""
+    user = _relevant_memory_block(relevant_memory) + f"""
+### HISTORIAL DE LA CONVERSACIÓN ###
+{history_str}
+
+### TAREA ACTUAL ###
+Usuario: {user_request}
+"""
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
+
+def _record_stats(**increments):
+    with _stats_lock:
+        for key, value in increments.items():
+            agent_stats[key] += value
+
+def _observed_frames(frames, mode: str):
+    """Mide una llamada al modelo: primer fragmento, duración y tokens finales."""
+    started = time.monotonic()
+    first = True
+    try:
+        for frame in frames:
+            if first:
+                MODEL_FIRST_TOKEN.observe(time.monotonic() - started, mode=mode)
+                first = False
+            if frame.get("done"):
+                PROMPT_TOKENS.inc(frame.get("prompt_eval_count") or 0, mode=mode)
+                GENERATED_TOKENS.inc(frame.get("eval_count") or 0, mode=mode)
+            yield frame
+    except OllamaError:
+        MODEL_ERRORS.inc(mode=mode)
+        raise
+    finally:
+        record_span("model", time.monotonic() - started)
+
+def _generation_options() -> dict:
+    """Opciones de Ollama de cada pasada del bucle: el límite de tokens generados."""
+    return {"options": {"num_predict": STEP_MAX_TOKENS}} if STEP_MAX_TOKENS > 0 else {}
+
+def call_ollama_stream(
+    prompt: str, turn=None, context: list = None, cancellation: Cancellation = None
+):
+    """Produce el texto generado; al terminar guarda `context` y el prefill en `turn`.
+
+    Si `cancellation` corta la conexión, el stream termina sin mensaje de error.
+    """
+    logging.info(f"Llamando a Ollama (stream) vía HTTP: {ollama_backend.host}")
+    options = _generation_options()
+    if context:
+        options["context"] = context
+    try:
+        frames = ollama_backend.generate_frames(
+            prompt, cancellation=cancellation, **options
+        )
+        for frame in _observed_frames(frames, "prompt"):
+            if frame.get("done") and turn is not None:
+                turn.completed = True
+                turn.truncated = frame.get("done_reason") == "length"
+                turn.context = frame.get("context")
+                turn.prompt_eval_count = frame.get("prompt_eval_count")
+            token = frame.get("response")
+            if token:
+                yield token
+    except OllamaError as e:
+        if cancellation is not None and cancellation.cancelled:
+            return
+        logging.error(f"Error en el stream de Ollama: {e}")
+        yield json.dumps({"error": str(e)})
+
+def call_ollama(prompt: str) -> str:
+    try:
+        return ollama_backend.generate(prompt).strip()
+    except OllamaError as e:
+        logging.error(f"Error al llamar a Ollama: {e}")
+        return f"Error al llamar a Ollama: {e}"
+
+class ModelTurn:
+    """Llamadas a herramientas (si las hay) producidas por una pasada del modelo."""
+
+    def __init__(self):
+        self.tool_calls = []
+        self.raw_tool_call = ""
+        self.context = None
+        self.prompt_eval_count = None
+        # Llegó la trama final (la respuesta no se cortó por un error).
+        self.completed = False
+        # La pasada se detuvo por el límite de tokens (`num_predict`).
+        self.truncated = False
+
+def stream_prompt_turn(
+    prompt: str,
+    turn: ModelTurn,
+    context: list = None,
+    cancellation: Cancellation = None,
+):
+    """Modo "prompt": reenvía el texto y detecta el JSON de herramienta en el stream."""
+    parser = ToolCallParser()
+    stream = call_ollama_stream(
+        prompt, turn=turn, context=context, cancellation=cancellation
+    )
+    for chunk in stream:
+        status = parser.feed(chunk)
+        # El texto que no puede formar parte de una llamada a herramienta se
+        # reenvía al cliente en cuanto llega, también la prosa que precede al
+        # JSON en el mismo fragmento.
+        text = parser.pop_text()
+        if text:
+            yield text
+        if status == TOOL_CALL:
+            break
+    if parser.status == TOOL_CALL:
+        # Unos pocos fragmentos más suelen bastar para recibir la trama final
+        # con `context`; si el modelo sigue generando, se corta sin él.
+        for _ in zip(range(CONTEXT_DRAIN_CHUNKS), stream):
+            pass
+        stream.close()
+        turn.tool_calls = tool_call_list(parser.tool_call)
+        turn.raw_tool_call = parser.raw_tool_call
+    else:
+        tail = parser.finish()
+        if tail:
+            yield tail
+
+def stream_native_turn(
+    messages: list, turn: ModelTurn, cancellation: Cancellation = None
+):
+    """Modo "native": el modelo devuelve las llamadas en `message.tool_calls`."""
+    logging.info(
+        f"Llamando a Ollama (chat con herramientas) vía HTTP: {ollama_backend.host}"
+    )
+    try:
+        frames = ollama_backend.chat_frames(
+            messages,
+            cancellation=cancellation,
+            tools=OLLAMA_TOOLS,
+            **_generation_options(),
+        )
+        for frame in _observed_frames(frames, "native"):
+            if frame.get("done"):
+                turn.completed = True
+                turn.truncated = frame.get("done_reason") == "length"
+            message = frame.get("message") or {}
+            if message.get("content"):
+                yield message["content"]
+            for call in message.get("tool_calls") or []:
+                function = call.get("function") or {}
+                arguments = function.get("arguments") or {}
+                if isinstance(arguments, str):
+                    try:
+                        arguments = json.loads(arguments)
+                    except json.JSONDecodeError:
+                        pass
+                turn.tool_calls.append((function.get("name"), arguments))
+                turn.raw_tool_call += json.dumps(call, ensure_ascii=False)
+    except OllamaError as e:
+        if cancellation is not None and cancellation.cancelled:
+            return
+        logging.error(f"Error en el stream de Ollama: {e}")
+        yield f"Error al llamar a Ollama: {e}"
+
+def repair_tool_arguments(context: str, tool_name: str, parameters, errors: list):
+    """Regenera los argumentos de una llamada inválida con decodificación restringida.
+
+    Usa `format` con el JSON Schema de la herramienta, de modo que una sola
+    pasada corta sustituye a una iteración completa del bucle con un error.
+    """
+    error_lines = "\n".join(f"- {error}" for error in errors)
+    arguments = json.dumps(parameters, ensure_ascii=False)
+    prompt = f"""{context}
+La llamada a la herramienta '{tool_name}' con los argumentos {arguments} no es válida:
+{error_lines}
+Devuelve únicamente los argumentos corregidos como un objeto JSON.
+"""
+    try:
+        with span("repair"):
+            schema = tool_parameters_schema(tool_name)
+            repaired = json.loads(ollama_backend.generate(prompt, format=schema))
+    except (OllamaError, json.JSONDecodeError) as e:
+        logging.warning(
+            f"No se pudieron reparar los argumentos de '{tool_name}': {e}"
+        )
+        return None
+    if validate_tool_arguments(tool_name, repaired):
+        return None
+    return repaired
+
+def execute_tool(tool_name: str, parameters: dict, session_id: str = None) -> str:
+    """Ejecuta una herramienta y registra su latencia y su resultado (ok, cached...)."""
+    started = time.monotonic()
+    result, outcome = _run_tool(tool_name, parameters, session_id)
+    elapsed = time.monotonic() - started
+    label = tool_name if tool_name in AVAILABLE_TOOLS else "desconocida"
+    TOOL_CALLS.inc(tool=label, outcome=outcome)
+    TOOL_SECONDS.observe(elapsed, tool=label)
+    record_span("tool", elapsed)
+    return result
+
+def _run_tool(tool_name: str, parameters: dict, session_id: str = None):
     if tool_name not in AVAILABLE_TOOLS:
-        return json.dumps({"error": f"La herramienta '{tool_name}' no existe."})
-    logging.info(f"Ejecutando herramienta: {tool_name} con parámetros {parameters}")
+        message = f"La herramienta '{tool_name}' no existe."
+        return json.dumps({"error": message}), "invalid"
+    errors = validate_tool_arguments(tool_name, parameters)
+    if errors:
+        message = f"Argumentos inválidos para '{tool_name}': {' '.join(errors)}"
+        return json.dumps({"error": message}), "invalid"
+    # Las herramientas puras repetidas en la sesión se sirven de la caché
+    # mientras no cambie la ruta que leyeron.
+    cached, token = tool_result_cache.lookup(session_id, tool_name, parameters)
+    if cached is not None:
+        logging.info(
+            f"Resultado de '{tool_name}' servido desde la caché con parámetros "
+            f"{log_body(parameters)}"
+        )
+        return cached, "cached"
+    logging.info(
+        f"Ejecutando herramienta: {tool_name} con parámetros {log_body(parameters)}"
+    )
     try:
         tool_function = AVAILABLE_TOOLS[tool_name]
-        result = tool_function(**parameters)
-        return json.dumps(result) if isinstance(result, dict) else str(result)
+        if tool_name in SESSION_TOOLS:
+            result = tool_function(**parameters, session_id=session_id)
+        else:
+            result = tool_function(**parameters)
+        result = json.dumps(result) if isinstance(result, dict) else str(result)
     except Exception as e:
         logging.error(f"Error al ejecutar la herramienta '{tool_name}': {e}")
-        return json.dumps({"error": f"Error al ejecutar la herramienta '{tool_name}': {e}"})
+        message = f"Error al ejecutar la herramienta '{tool_name}': {e}"
+        return json.dumps({"error": message}), "exception"
+    if result.startswith(("Error", '{"error"')):
+        return result, "error"
+    tool_result_cache.store(token, result)
+    return result, "ok"
+
+# Pool compartido para las herramientas de solo lectura de un mismo paso.
+tool_executor = ToolExecutor(
+    lambda name, params: execute_tool(name, params), READ_ONLY_TOOLS
+)
+
+def _response_cache_key(
+    static_prefix: dict, formatted_history: list, relevant_memory: str, message: str
+) -> str:
+    return response_key(
+        prefix=static_prefix["version"],
+        model=OLLAMA_MODEL,
+        mode=TOOL_CALLING_MODE,
+        tools=TOOL_MANIFEST_VERSION,
+        history=formatted_history,
+        memory=relevant_memory,
+        message=normalize_message(message),
+    )
+
+def _is_deterministic(tool_name: str) -> bool:
+    """Herramientas cuyo resultado depende de una sola ruta (read_file, ...)."""
+    spec = TOOL_MANIFEST.get(tool_name, {})
+    return bool(spec.get("pure")) and not spec.get("recursive", False)
+
+def replay_cached_response(session_id: str, entry: dict):
+    """Reproduce una respuesta guardada sin llamar al modelo ni a las herramientas."""
+    for kind, data in entry["events"]:
+        yield kind, data
+    for role, text in entry["turns"]:
+        session_store.append(session_id, role, text)
+    _record_stats(requests=1, cached_responses=1)
+    yield "done", {
+        "session_id": session_id, "model_passes": 0, "retries": 0, "cached": True
+    }
+
+def stop_agent(session_id: str, cancellation: Cancellation, answer: list):
+    """Corta la petición: cierra el turno del agente en la sesión y emite el motivo."""
+    message = STOP_MESSAGES.get(cancellation.reason, "Petición cancelada.")
+    logging.warning(f"Petición detenida ({cancellation.reason}): {message}")
+    _record_stats(stopped_requests=1)
+    session_store.append(session_id, "agent", "".join(answer) or f"[{message}]")
+    yield "error", {"message": message, "reason": cancellation.reason}
+
+def run_agent(
+    session_id: str,
+    current_user_message: str,
+    static_prefix: dict,
+    formatted_history: list,
+    cancellation: Cancellation = None,
+):
+    """Bucle del agente para un mensaje: produce eventos (tipo, datos).
+
+    Tipos: "token" (texto para el usuario), "tool_start", "tool_progress",
+    "tool_result", "done" y "error" (con `reason`) si la petición se corta por
+    `cancellation` (desconexión o plazo) o por el máximo de pasos con
+    herramientas. Los transportes (texto plano o SSE) deciden cómo enviarlos.
+    """
+    if cancellation is None:
+        cancellation = Cancellation(
+            time.monotonic() + REQUEST_DEADLINE if REQUEST_DEADLINE > 0 else None
+        )
+    long_term_memory = static_prefix["memory"]
+    with span("memory"):
+        relevant_memory = load_relevant_memory(current_user_message, long_term_memory)
+    current_turn_history = list(formatted_history)
+    current_turn_history.append(f"Usuario: {current_user_message}")
+    session_store.append(session_id, "user", current_user_message)
+    answer = []
+
+    # Caché de respuestas: solo mientras la sesión no haya ejecutado herramientas
+    # que escriben.
+    cache_key = None
+    if RESPONSE_CACHE_ENABLED:
+        if session_store.get_meta(session_id, "mutated", False):
+            response_cache.bypass()
+        else:
+            cache_key = _response_cache_key(
+                static_prefix, formatted_history, relevant_memory, current_user_message
+            )
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                logging.info("Respuesta servida desde la caché de respuestas.")
+                yield from replay_cached_response(session_id, cached)
+                return
+    # Lo necesario para guardar la respuesta: eventos, turnos de herramienta y
+    # huellas.
+    recorded, tool_turns, fingerprints = [], [], []
+    generation_started = time.monotonic()
+
+    # Si el contexto KV de la sesión sigue siendo válido, solo se envía el delta.
+    context = _usable_context(
+        context_cache.get(
+            session_id, (static_prefix["version"], len(formatted_history))
+        )
+    )
+    compaction = session_store.get_meta(session_id, "compaction", {})
+    delta_prompt = (
+        _relevant_memory_block(relevant_memory)
+        + f"Usuario: {current_user_message}\n"
+    )
+
+    model_passes = 0
+    tool_steps = 0
+    retries = 0
+    while True:
+        if cancellation.cancelled:
+            yield from stop_agent(session_id, cancellation, answer)
+            return
+        model_passes += 1
+        step_started = time.monotonic()
+        turn = ModelTurn()
+        with span("prompt"):
+            history_lines, compaction = history_manager.compact(
+                current_turn_history, compaction
+            )
+            task = history_manager.fit_task(current_user_message)
+            if TOOL_CALLING_MODE == "native":
+                messages = build_chat_messages(
+                    long_term_memory, history_lines, task, relevant_memory
+                )
+            elif context is None:
+                prompt = static_prefix["prefix"] + build_dynamic_suffix(
+                    history_lines, task, relevant_memory
+                )
+        if TOOL_CALLING_MODE == "native":
+            chunks = stream_native_turn(messages, turn, cancellation)
+        elif context is not None:
+            chunks = stream_prompt_turn(delta_prompt, turn, context, cancellation)
+        else:
+            chunks = stream_prompt_turn(prompt, turn, cancellation=cancellation)
+        for text in chunks:
+            answer.append(text)
+            recorded.append(("token", {"text": text}))
+            yield "token", {"text": text}
+            if cancellation.cancelled:
+                # Cerrar el generador cierra la conexión con Ollama, que deja de
+                # generar.
+                chunks.close()
+                break
+        if cancellation.cancelled:
+            yield from stop_agent(session_id, cancellation, answer)
+            return
+        if turn.truncated:
+            logging.warning(
+                f"Paso {model_passes}: la generación alcanzó el límite de "
+                f"{STEP_MAX_TOKENS} tokens."
+            )
+            AGENT_LIMITS.inc(reason=STEP_TOKENS)
+            _record_stats(truncated_steps=1)
+
+        if TOOL_CALLING_MODE == "native":
+            sent = messages
+        elif context is not None:
+            sent = delta_prompt
+        else:
+            sent = prompt
+        if context is not None:
+            scope = "delta sobre contexto reutilizado"
+        else:
+            scope = "prompt completo"
+        logging.info(
+            f"Paso {model_passes}: {turn.prompt_eval_count} tokens de prefill "
+            f"({scope}).",
+            # El prompt completo solo en las peticiones muestreadas.
+            extra={"step": model_passes, "prefill_tokens": turn.prompt_eval_count,
+                   "prompt": log_body(sent) if bodies_sampled() else None},
+        )
+        _record_stats(
+            prefill_steps=1,
+            prefill_tokens=turn.prompt_eval_count or 0,
+            context_reuses=1 if context is not None else 0,
+        )
+        context = _usable_context(turn.context)
+
+        if turn.tool_calls:
+            logging.info(
+                f"Llamada a herramienta detectada: {log_body(turn.raw_tool_call)}"
+            )
+            tool_steps += 1
+            if tool_steps > MAX_TOOL_STEPS:
+                cancellation.cancel(MAX_STEPS)
+                yield from stop_agent(session_id, cancellation, answer)
+                return
+            calls = []
+            for tool_name, parameters in turn.tool_calls:
+                errors = validate_tool_arguments(tool_name, parameters)
+                if errors:
+                    retries += 1
+                    if tool_name in TOOL_MANIFEST:
+                        model_passes += 1
+                        repair_context = build_system_prompt(
+                            long_term_memory, history_lines, task, relevant_memory
+                        )
+                        repaired = repair_tool_arguments(
+                            repair_context, tool_name, parameters, errors
+                        )
+                        if repaired is not None:
+                            logging.info(
+                                f"Argumentos reparados para '{tool_name}': "
+                                f"{log_body(repaired)}"
+                            )
+                            _record_stats(repaired_tool_calls=1)
+                            parameters = repaired
+                calls.append((tool_name, parameters))
+
+            for index, (tool_name, parameters) in enumerate(calls):
+                if RESPONSE_CACHE_ENABLED and tool_name not in READ_ONLY_TOOLS:
+                    session_store.set_meta(session_id, "mutated", True)
+                if cache_key is not None:
+                    if _is_deterministic(tool_name) and not validate_tool_arguments(
+                        tool_name, parameters
+                    ):
+                        # Huella tomada antes de ejecutar, como en la caché de
+                        # herramientas.
+                        _, path = tool_result_cache.key(None, tool_name, parameters)
+                        fingerprints.append((path, path_fingerprint(path)))
+                    else:
+                        cache_key = None
+                recorded.append((
+                    "tool_start",
+                    {"tool": tool_name, "parameters": parameters, "index": index},
+                ))
+                yield recorded[-1]
+            started = time.monotonic()
+            results = [None] * len(calls)
+            trace = current_trace()
+
+            def execute(name, params):
+                # Las herramientas corren en otros hilos: se les pasan la traza y la
+                # cancelación de la petición.
+                with bind_trace(trace), bind_cancellation(cancellation):
+                    return execute_tool(name, params, session_id)
+
+            results_stream = tool_executor.stream(
+                calls, execute, cancellation=cancellation, scope=session_id
+            )
+            for kind, index, tool_result in results_stream:
+                if kind == "progress":
+                    # Salida parcial (p. ej. de run_shell_command) mientras se ejecuta.
+                    yield "tool_progress", {
+                        "tool": calls[index][0], "index": index, **tool_result
+                    }
+                    continue
+                # Un resultado largo se queda en el servidor: al historial (que se
+                # reenvía en cada paso) solo llega una vista previa con su handle.
+                results[index], handle = observation_store.bound(
+                    session_id, calls[index][0], tool_result
+                )
+                if handle is not None:
+                    # Los handles pertenecen a la sesión: no se reproducen en otra.
+                    cache_key = None
+                logging.info(
+                    f"Resultado de la herramienta ({len(tool_result)} caracteres): "
+                    f"{log_body(results[index])}",
+                    extra={
+                        "tool": calls[index][0],
+                        "result_chars": len(tool_result),
+                        "handle": handle,
+                    },
+                )
+                recorded.append(("tool_result", {
+                    "tool": calls[index][0],
+                    "index": index,
+                    "result": tool_result[:TOOL_RESULT_PREVIEW_CHARS],
+                    "length": len(tool_result),
+                    "handle": handle,
+                }))
+                yield recorded[-1]
+            elapsed = time.monotonic() - started
+            logging.info(
+                f"Paso {model_passes}: {len(calls)} herramientas en {elapsed:.3f} s."
+            )
+            _record_stats(
+                tool_calls=len(calls),
+                parallel_tool_steps=1 if len(calls) > 1 else 0,
+                tool_wall_seconds=elapsed,
+            )
+            if cancellation.cancelled:
+                yield from stop_agent(session_id, cancellation, answer)
+                return
+
+            # Todas las observaciones vuelven al modelo en un único turno.
+            observations = []
+            for (tool_name, parameters), tool_result in zip(calls, results):
+                if len(calls) > 1:
+                    arguments = json.dumps(parameters, ensure_ascii=False)
+                    tool_result = f"{tool_name} {arguments} -> {tool_result}"
+                observations.append(f"Observación de Herramienta: {tool_result}")
+                current_turn_history.append(observations[-1])
+                session_store.append(session_id, "tool", tool_result)
+                tool_turns.append(("tool", tool_result))
+            current_user_message = (
+                "Las herramientas han sido ejecutadas." if len(calls) > 1
+                else "La herramienta ha sido ejecutada."
+            ) + " Proporciona la respuesta final al usuario."
+            delta_prompt = "".join(f"{line}\n" for line in observations)
+            delta_prompt += f"Usuario: {current_user_message}\n"
+            record_span("step", time.monotonic() - step_started)
+            continue
+        else:
+            logging.info(
+                f"Respuesta de texto completada: {model_passes} pasadas del modelo, "
+                f"{retries} reintentos."
+            )
+            _record_stats(
+                requests=1, model_passes=model_passes, invalid_tool_calls=retries
+            )
+            record_span("step", time.monotonic() - step_started)
+            AGENT_STEPS.observe(model_passes)
+            session_store.append(session_id, "agent", "".join(answer))
+            session_store.set_meta(session_id, "compaction", compaction)
+            if context is not None:
+                context_cache.put(
+                    session_id,
+                    (static_prefix["version"], session_store.count(session_id)),
+                    context,
+                )
+            if cache_key is not None and turn.completed:
+                response_cache.put(
+                    cache_key,
+                    recorded,
+                    tool_turns + [("agent", "".join(answer))],
+                    fingerprints,
+                    time.monotonic() - generation_started,
+                )
+            yield "done", {
+                "session_id": session_id,
+                "model_passes": model_passes,
+                "retries": retries,
+                "cached": False,
+                "truncated": turn.truncated,
+            }
+            break
+
+def text_stream(events):
+    """Transporte de texto plano: solo se envían los tokens de la respuesta."""
+    try:
+        for kind, data in events:
+            if kind == "token":
+                yield data["text"]
+            elif kind == "error":
+                yield data["message"]
+    finally:
+        # Si el servidor cierra la respuesta (el cliente se fue), se cierra el
+        # bucle.
+        events.close()
+
+def observed_request(
+    trace: Trace, received: float, events, cancellation: Cancellation = None
+):
+    """Asocia la traza al hilo de los eventos y registra las métricas de la petición.
+
+    Si el transporte cierra el stream antes del final (el cliente se fue), se
+    cancela `cancellation` para que paren el modelo y las herramientas.
+    """
+    REQUESTS_IN_FLIGHT.inc()
+    outcome = "cancelled"
+    first_token = True
+    with bind_trace(trace):
+        try:
+            for kind, data in events:
+                if kind == "token" and first_token:
+                    TIME_TO_FIRST_TOKEN.observe(time.monotonic() - received)
+                    first_token = False
+                elif kind == "done":
+                    outcome = "ok"
+                elif kind == "error":
+                    outcome = data.get("reason") or "error"
+                yield kind, data
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            if cancellation is not None:
+                if outcome == "cancelled":
+                    cancellation.cancel(CLIENT_DISCONNECT)
+                if cancellation.reason is not None:
+                    AGENT_LIMITS.inc(reason=cancellation.reason)
+            close = getattr(events, "close", None)
+            if close is not None:
+                close()
+            REQUESTS_IN_FLIGHT.dec()
+            REQUESTS.inc(outcome=outcome)
+            REQUEST_SECONDS.observe(time.monotonic() - received)
+            logging.info(
+                f"Traza de la petición ({outcome}): {trace.summary()}",
+                extra={
+                    "outcome": outcome,
+                    "spans": {
+                        name: round(seconds, 4)
+                        for name, (_, seconds) in trace.spans.items()
+                    },
+                },
+            )
+
+def parse_history(raw_history) -> list:
+    """Convierte el historial enviado por el cliente en turnos (rol, texto).
+
+    Lanza ValueError si no es una lista de objetos {"sender", "text"}.
+    """
+    if not isinstance(raw_history, list):
+        raise ValueError("history debe ser una lista")
+    turns = []
+    for msg in raw_history:
+        if not isinstance(msg, dict) or not isinstance(msg.get("text", ""), str):
+            raise ValueError('cada elemento de history debe ser {"sender", "text"}')
+        role = "user" if msg.get('sender') == 'user' else "agent"
+        # Strip HTML tags from agent responses for the prompt
+        turns.append((role, re.sub('<[^<]+?>', '', msg.get('text', ''))))
+    return turns
+
+def client_key() -> str:
+    """Identifica al cliente para el reparto equitativo de la cola."""
+    if request.headers.get("X-Client-Id"):
+        return request.headers["X-Client-Id"]
+    # access_route respeta X-Forwarded-For (p. ej. detrás de Cloudflare/nginx).
+    return request.access_route[0] if request.access_route else "anónimo"
 
 # --- RUTAS DEL SERVIDOR ---
 
 
 @app.route("/chat", methods=["POST"])
 def chat():
+    received = time.monotonic()
+    trace = Trace(trace_id_from(request.headers.get(TRACE_HEADER)))
     data = request.json
     user_message = data.get("user_message")
+    session_id = data.get("session_id")
     raw_history = data.get("history", [])
 
     if not user_message:
         return jsonify({"error": "user_message es requerido"}), 400
+    if session_id and not session_store.exists(session_id):
+        return jsonify({"error": f"La sesión '{session_id}' no existe."}), 404
+
+    try:
+        max_wait = float(data["max_wait"]) if data.get("max_wait") is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "max_wait debe ser un número de segundos"}), 400
+    try:
+        history = parse_history(raw_history) if not session_id else []
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        ticket = admission.submit(client_key(), max_wait=max_wait)
+    except AdmissionRejected as e:
+        with bind_trace(trace):
+            logging.warning(f"Petición rechazada por el control de admisión: {e}")
+        REQUESTS.inc(outcome="rejected")
+        return (
+            jsonify({"error": str(e), "retry_after": e.retry_after}),
+            429,
+            {"Retry-After": str(e.retry_after), TRACE_HEADER: trace.trace_id},
+        )
+
+    # La plaza solo se libera en `admitted_events`: si algo falla antes de
+    # devolver la respuesta, se libera aquí para no dejarla ocupada.
+    try:
+        return _admitted_chat(
+            trace, received, ticket, session_id, user_message, history
+        )
+    except BaseException:
+        admission.finish(ticket)
+        raise
 
-    logging.info(f"Mensaje de usuario recibido: {user_message}")
-    long_term_memory = load_long_term_memory()
+def _admitted_chat(trace, received, ticket, session_id, user_message, history):
+    with bind_trace(trace):
+        logging.info(f"Mensaje de usuario recibido: {log_body(user_message)}")
 
-    # Convert history of dicts to a list of strings for the prompt
-    formatted_history = []
-    for msg in raw_history:
-        sender = "Usuario" if msg.get('sender') == 'user' else "Agente"
-        # Strip HTML tags from agent responses for the prompt
-        text = re.sub('<[^<]+?>', '', msg.get('text', ''))
-        formatted_history.append(f"{sender}: {text}")
-
-    def event_stream(current_user_message):
-        current_turn_history = list(formatted_history)
-        current_turn_history.append(f"Usuario: {current_user_message}")
-
-        while True:
-            prompt = build_system_prompt(long_term_memory, current_turn_history, current_user_message)
-            
-            response_buffer = ""
-            is_tool_call = False
-            
-            stream_generator = call_ollama_stream(prompt)
-            for chunk in stream_generator:
-                response_buffer += chunk
-                try:
-                    parsed_json = json.loads(response_buffer)
-                    if isinstance(parsed_json, dict) and len(parsed_json) == 1:
-                        is_tool_call = True
-                        break
-                except json.JSONDecodeError:
-                    pass
-            
-            if is_tool_call:
-                logging.info(f"Llamada a herramienta detectada: {response_buffer}")
-                tool_call = json.loads(response_buffer)
-                tool_name = next(iter(tool_call))
-                parameters = tool_call[tool_name]
-                
-                tool_result = execute_tool(tool_name, parameters)
-                logging.info(f"Resultado de la herramienta: {tool_result}")
-                
-                current_turn_history.append(f"Observación de Herramienta: {tool_result}")
-                current_user_message = "La herramienta ha sido ejecutada. Proporciona la respuesta final al usuario."
-                continue
-            else:
-                logging.info("Respuesta de texto detectada, iniciando streaming.")
-                yield response_buffer
-                for chunk in stream_generator:
-                    yield chunk
-                break
+    if not session_id:
+        # Clientes sin sesión: se crea una y se siembra con el historial enviado.
+        session_id = session_store.create()
+        for role, text in history:
+            session_store.append(session_id, role, text)
+
+    cancellation = Cancellation()
+
+    def start():
+        record_span("queue", time.monotonic() - received)
+        # El plazo cuenta desde que la petición entra al modelo, no desde la cola.
+        if REQUEST_DEADLINE > 0:
+            cancellation.deadline = time.monotonic() + REQUEST_DEADLINE
+        # El historial se lee al entrar al modelo, no al encolar: así incluye
+        # las respuestas de peticiones anteriores de la misma sesión.
+        formatted_history = format_history(session_store.get_turns(session_id))
+        return run_agent(
+            session_id,
+            user_message,
+            get_static_prefix(),
+            formatted_history,
+            cancellation,
+        )
+
+    events = observed_request(
+        trace, received, admitted_events(admission, ticket, start), cancellation
+    )
+    headers = {"X-Session-Id": session_id, TRACE_HEADER: trace.trace_id}
+    if "text/event-stream" in request.headers.get("Accept", ""):
+        return Response(
+            sse_stream(events, on_stop=lambda: cancellation.cancel(CLIENT_DISCONNECT)),
+            mimetype="text/event-stream",
+            headers={**headers, **SSE_HEADERS},
+        )
+    return Response(
+        text_stream(events),
+        mimetype='text/plain',
+        headers=headers,
+    )
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    with _stats_lock:
+        snapshot = dict(agent_stats)
+    snapshot["sessions"] = session_store.stats()
+    snapshot["admission"] = admission.stats()
+    snapshot["shell_jobs"] = shell_jobs.stats()
+    snapshot["web_fetch"] = dict(web_fetcher.stats)
+    snapshot["tool_cache"] = tool_result_cache.stats()
+    snapshot["memory"] = memory_store_for(AGENT_MEMORY_FILE).stats()
+    snapshot["observations"] = observation_store.stats()
+    snapshot["response_cache"] = response_cache.stats()
+    return jsonify(snapshot)
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Métricas en formato de texto de Prometheus."""
+    admission_stats = admission.stats()
+    QUEUE_DEPTH.set(admission_stats["queue_depth"])
+    MODEL_IN_FLIGHT.set(admission_stats["in_flight"])
+    return Response(
+        render_metrics(), mimetype="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+@app.route("/sessions", methods=["POST"])
+def create_session():
+    return jsonify({"session_id": session_store.create()}), 201
+
+@app.route("/sessions/<session_id>", methods=["GET"])
+def get_session(session_id):
+    """Transcripción paginada de una sesión: ?offset=0&limit=50."""
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 200)
+    page = session_store.page(session_id, offset, limit)
+    if page is None:
+        return jsonify({"error": f"La sesión '{session_id}' no existe."}), 404
+    total, turns = page
+    return jsonify({
+        "session_id": session_id,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": offset + len(turns) if offset + len(turns) < total else None,
+        "turns": turns,
+    })
 
-    return Response(event_stream(user_message), mimetype='text/plain')
+@app.route("/sessions/<session_id>", methods=["DELETE"])
+def delete_session(session_id):
+    if not session_store.delete(session_id):
+        return jsonify({"error": f"La sesión '{session_id}' no existe."}), 404
+    tool_result_cache.clear(session_id)
+    observation_store.clear(session_id)
+    return "", 204
 
 @app.route("/")
 @app.route("/web_chat")
@@ -0,0 +1,348 @@
+"""Benchmark de extremo a extremo de /chat contra un Ollama falso.
+
+Arranca `agent_server.app` en un servidor HTTP local apuntando a
+`fake_ollama.FakeOllama` (streams con guion, TTFT y tokens/s
+configurables), lanza N clientes concurrentes por SSE y mide, por escenario:
+tiempo hasta el primer byte y hasta el primer token, latencia total,
+tokens/s por stream y agregados, latencia del bucle de herramientas (desde
+`tool_start` hasta la siguiente salida del modelo), percentiles p50/p95/p99
+y memoria residente del proceso. Todo se ejecuta en un único proceso, así
+que la RSS incluye a los clientes y al Ollama falso.
+
+Escenarios:
+  plain  respuesta en texto, sin herramientas.
+  tools  bucle de varios pasos: fecha, listado, dos lecturas en paralelo y respuesta.
+  large  lectura de un archivo grande (observación recortada), una página con
+         fetch_observation y respuesta.
+
+El resultado se puede guardar en JSON (--json) y comparar con otro (--compare).
+
+Uso: python benchmarks/bench_chat.py [--scenarios plain,tools,large] [--clients 8]
+     [--requests 5] [--ttft 0.05] [--tps 200] [--messages 0]
+     [--json salida.json] [--compare base.json]
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+from fake_ollama import (  # noqa: E402
+    FakeOllama,
+    fetch_first_observation,
+    plain_answer,
+    tool_call,
+)
+
+SCENARIOS = ("plain", "tools", "large")
+# Métricas comparadas con --compare (percentiles de latencia, menor es mejor).
+COMPARED = ("ttfb", "first_token", "latency", "tool_loop")
+
+
+def build_scripts(root: str, answer_tokens: int) -> dict:
+    small = []
+    for i in range(2):
+        small.append(os.path.join(root, f"modulo{i}.py"))
+        with open(small[-1], "w") as f:
+            f.write(f"def funcion_{i}():\n    return {i}\n" * 50)
+    big = os.path.join(root, "grande.log")
+    with open(big, "w") as f:
+        line = "2026-01-01 12:00:00 INFO petición atendida en 12 ms por el worker 3\n"
+        f.write(line * 30000)
+    return {
+        "plain": plain_answer(answer_tokens),
+        "tools": [
+            tool_call("get_current_date"),
+            tool_call("list_directory", path=root),
+            json.dumps([{"read_file": {"path": path}} for path in small]),
+        ] + plain_answer(answer_tokens),
+        "large": [
+            tool_call("read_file", path=big, limit=4000),
+            fetch_first_observation,
+        ] + plain_answer(answer_tokens),
+    }
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"n": 0}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+    return {
+        "n": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "p50": round(rank(50), 4),
+        "p95": round(rank(95), 4),
+        "p99": round(rank(99), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+def rss_mib() -> dict:
+    status = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key, value = line.split(":", 1)
+                    status[key] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return {
+        "rss_mib": status.get("VmRSS"),
+        "peak_rss_mib": status.get(
+            "VmHWM", round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        ),
+    }
+
+
+def one_request(http: requests.Session, base_url: str, message: str) -> dict:
+    """Envía una petición SSE y devuelve sus tiempos (en segundos desde el envío)."""
+    started = time.perf_counter()
+    sample = {"status": None, "tokens": 0, "tool_loop": [], "error": None}
+    response = http.post(
+        f"{base_url}/chat",
+        json={"user_message": message},
+        headers={"Accept": "text/event-stream"},
+        stream=True,
+        timeout=300,
+    )
+    sample["status"] = response.status_code
+    if response.status_code != 200:
+        response.close()
+        sample["latency"] = time.perf_counter() - started
+        return sample
+    buffer = ""
+    # Inicio del paso de herramientas en curso y si ya llegó algún resultado.
+    pending_tool, tool_done = None, False
+    for data in response.iter_content(chunk_size=None, decode_unicode=True):
+        now = time.perf_counter() - started
+        sample.setdefault("ttfb", now)
+        buffer += data
+        while "\n\n" in buffer:
+            frame, buffer = buffer.split("\n\n", 1)
+            event = next(
+                (line[7:] for line in frame.splitlines() if line.startswith("event: ")),
+                None,
+            )
+            if event in ("token", "tool_start") and tool_done:
+                sample["tool_loop"].append(now - pending_tool)
+                pending_tool, tool_done = None, False
+            if event == "token":
+                sample.setdefault("first_token", now)
+                sample["tokens"] += 1
+            elif event == "tool_start" and pending_tool is None:
+                pending_tool = now
+            elif event == "tool_result":
+                tool_done = True
+            elif event == "error":
+                sample["error"] = frame
+            elif event == "done":
+                sample["done"] = now
+    sample["latency"] = time.perf_counter() - started
+    return sample
+
+
+def run_scenario(
+    base_url: str, clients: int, per_client: int, messages: int = 0, name: str = ""
+) -> dict:
+    samples = []
+    lock = threading.Lock()
+
+    def client(number: int):
+        with requests.Session() as http:
+            for i in range(per_client):
+                if messages:
+                    # Preguntas repetidas entre clientes (p. ej. para la caché
+                    # de respuestas).
+                    question = (number * per_client + i) % messages
+                    message = f"Pregunta {question} ({name})"
+                else:
+                    message = f"Petición {i} del cliente {number}"
+                sample = one_request(http, base_url, message)
+                with lock:
+                    samples.append(sample)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    ok = [
+        s for s in samples
+        if s["status"] == 200 and s.get("done") is not None and not s["error"]
+    ]
+    rejected = sum(1 for s in samples if s["status"] == 429)
+    tokens = sum(s["tokens"] for s in ok)
+    return {
+        "requests": len(samples),
+        "ok": len(ok),
+        "rejected": rejected,
+        "errors": len(samples) - len(ok) - rejected,
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(len(ok) / wall, 2),
+        "tokens_per_second": round(tokens / wall, 1),
+        "ttfb": percentiles([s["ttfb"] for s in ok]),
+        "first_token": percentiles(
+            [s["first_token"] for s in ok if "first_token" in s]
+        ),
+        "latency": percentiles([s["latency"] for s in ok]),
+        "stream_tokens_per_second": percentiles([
+            s["tokens"] / (s["done"] - s["first_token"])
+            for s in ok if "first_token" in s and s["done"] > s["first_token"]
+        ]),
+        "tool_loop": percentiles([value for s in ok for value in s["tool_loop"]]),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def print_report(report: dict):
+    print(f"commit {report['commit'] or '?'}  clientes {report['config']['clients']}  "
+          f"peticiones/cliente {report['config']['requests']}")
+    for name, result in report["scenarios"].items():
+        print(f"\n[{name}] {result['ok']}/{result['requests']} ok, "
+              f"{result['rejected']} rechazadas, "
+              f"{result['errors']} errores, {result['wall_seconds']} s, "
+              f"{result['requests_per_second']} pet/s, "
+              f"{result['tokens_per_second']} tokens/s, "
+              f"RSS {result['rss_mib']} MiB (pico {result['peak_rss_mib']} MiB), "
+              f"{result['model_requests']} llamadas al modelo, "
+              f"{result['prompt_chars']} car. de prompt")
+        for metric in (
+            "ttfb", "first_token", "latency", "tool_loop", "stream_tokens_per_second"
+        ):
+            stats = result[metric]
+            if stats["n"]:
+                print(f"  {metric:<25} p50 {stats['p50']:9.4f}  "
+                      f"p95 {stats['p95']:9.4f}  "
+                      f"p99 {stats['p99']:9.4f}  (n={stats['n']})")
+
+
+def print_comparison(report: dict, baseline: dict):
+    reference = baseline.get("commit") or "la referencia"
+    print(f"\nComparación con {reference} (p50 / p95, variación):")
+    for name, result in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        print(f"[{name}]")
+        for metric in COMPARED:
+            now, before = result.get(metric, {}), base.get(metric, {})
+            if not now.get("n") or not before.get("n"):
+                continue
+            deltas = []
+            for p in ("p50", "p95"):
+                change = (now[p] - before[p]) / before[p] * 100 if before[p] else 0.0
+                deltas.append(f"{p} {before[p]:.4f} -> {now[p]:.4f} ({change:+.1f}%)")
+            print(f"  {metric:<12} " + "  ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument(
+        "--requests", type=int, default=5, help="peticiones por cliente"
+    )
+    parser.add_argument(
+        "--ttft", type=float, default=0.05,
+        help="segundos hasta el primer token del modelo",
+    )
+    parser.add_argument(
+        "--tps", type=float, default=200.0, help="tokens por segundo del modelo"
+    )
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    parser.add_argument(
+        "--messages", type=int, default=0,
+        help="preguntas distintas (0: todas distintas)",
+    )
+    parser.add_argument("--json", help="guarda el informe en este archivo")
+    parser.add_argument("--compare", help="informe JSON de referencia")
+    args = parser.parse_args()
+
+    fake = FakeOllama(ttft=args.ttft, tokens_per_second=args.tps).start()
+    os.environ["OLLAMA_HOST"] = fake.url
+    import agent_server  # noqa: E402  (lee OLLAMA_HOST al importarse)
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    server = make_server("127.0.0.1", 0, agent_server.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "clients": args.clients,
+            "requests": args.requests,
+            "ttft": args.ttft,
+            "tokens_per_second": args.tps,
+            "answer_tokens": args.answer_tokens,
+            "messages": args.messages,
+            "response_cache": agent_server.RESPONSE_CACHE_ENABLED,
+            "model_concurrency": agent_server.admission.max_concurrent,
+            "tool_mode": agent_server.TOOL_CALLING_MODE,
+        },
+        "scenarios": {},
+    }
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            scripts = build_scripts(root, args.answer_tokens)
+            for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+                if name not in scripts:
+                    parser.error(
+                        f"escenario desconocido: {name} "
+                        f"(disponibles: {', '.join(SCENARIOS)})"
+                    )
+                fake.script = scripts[name]
+                requests_before, prompt_before = fake.requests, fake.prompt_chars
+                result = run_scenario(
+                    base_url, args.clients, args.requests, args.messages, name
+                )
+                result["model_requests"] = fake.requests - requests_before
+                result["prompt_chars"] = fake.prompt_chars - prompt_before
+                result.update(rss_mib())
+                report["scenarios"][name] = result
+    finally:
+        server.shutdown()
+        fake.stop()
+
+    print_report(report)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(report, json.load(f))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nInforme guardado en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark: glob.glob recursivo frente a file_glob en un monorepo sintético.
+
+El árbol tiene paquetes de código, un `node_modules` y un `venv` grandes.
+Se comparan patrones típicos del agente con el glob original de tools.py
+(glob.glob + abspath de cada resultado) y con glob_paths (scandir perezoso,
+poda de subárboles, límite de resultados y caché de listados).
+
+Uso: python benchmarks/bench_glob.py [número_de_archivos]
+"""
+import glob
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_glob import glob_paths  # noqa: E402
+
+PATTERNS = ["**/*.md", "packages/pkg_7/**/*.py", "packages/*/README.md", "**/*.py"]
+FILES_PER_DIR = 50
+
+
+def build_tree(root: str, total: int):
+    """40 % paquetes de código, 40 % node_modules, 20 % venv."""
+    layout = [("packages", 0.4), ("node_modules", 0.4), ("venv/lib/site-packages", 0.2)]
+    for prefix, share in layout:
+        count = int(total * share)
+        for i in range(count):
+            if prefix == "packages":
+                directory = os.path.join(
+                    root, prefix, f"pkg_{i % 20}", f"mod_{i // (20 * FILES_PER_DIR)}"
+                )
+            else:
+                directory = os.path.join(root, prefix, f"dep_{i // FILES_PER_DIR}")
+            os.makedirs(directory, exist_ok=True)
+            suffix = ".md" if i % 97 == 0 else ".py"
+            open(os.path.join(directory, f"f{i}{suffix}"), "w").close()
+    for i in range(20):
+        open(os.path.join(root, "packages", f"pkg_{i}", "README.md"), "w").close()
+
+
+def legacy_glob(pattern: str, path: str) -> list:
+    """Implementación original de tools.glob_files."""
+    matches = glob.glob(os.path.join(path, pattern), recursive=True)
+    return [os.path.abspath(f) for f in matches]
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    with tempfile.TemporaryDirectory() as root:
+        build_tree(root, total)
+        print(f"Árbol de {total} archivos")
+        print(
+            f"{'patrón':<26} {'original (s)':>12} {'n':>6} {'nuevo (s)':>10} "
+            f"{'n':>6} {'repetido (s)':>13}"
+        )
+        for pattern in PATTERNS:
+            legacy_time, legacy = timed(legacy_glob, pattern, root)
+            new_time, (paths, _) = timed(glob_paths, pattern, root)
+            repeat_time, _ = timed(glob_paths, pattern, root)
+            print(
+                f"{pattern:<26} {legacy_time:>12.3f} {len(legacy):>6} "
+                f"{new_time:>10.3f} {len(paths):>6} {repeat_time:>13.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Benchmark: coste del logging en el hilo que atiende la petición.
+
+Registra N resultados de herramienta (como hace el bucle del agente) con la
+configuración anterior (FileHandler síncrono con el texto completo) y con
+`log_pipeline` (cola, hilo escritor y texto sustituido por longitud y hash),
+sobre un archivo que se bloquea `--stall` ms cada `--every` escrituras para
+simular un disco lento o una rotación. Informa de la latencia de cada llamada
+en el hilo que registra (p50/p99/máx), los bytes escritos y los descartes.
+
+Uso: python benchmarks/bench_logging.py [--records 20000] [--chars 4000]
+     [--stall 20] [--every 500]
+"""
+import argparse
+import logging
+import logging.handlers
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_pipeline  # noqa: E402
+from log_pipeline import (  # noqa: E402
+    LOG_RECORDS_DROPPED,
+    DroppingQueueHandler,
+    JsonFormatter,
+    body,
+)
+
+
+class StallingFileHandler(logging.FileHandler):
+    """FileHandler que se detiene periódicamente, como un disco ocupado."""
+
+    def __init__(self, path: str, stall: float, every: int):
+        super().__init__(path, encoding="utf-8")
+        self.stall, self.every, self.writes = stall, every, 0
+
+    def emit(self, record):
+        self.writes += 1
+        if self.every and self.writes % self.every == 0:
+            time.sleep(self.stall)
+        super().emit(record)
+
+
+def measure(records: int, text: str, redact) -> list:
+    latencies = []
+    for i in range(records):
+        started = time.perf_counter()
+        logging.info(
+            f"Resultado de la herramienta ({len(text)} caracteres): {redact(text)}"
+        )
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def report(name: str, latencies: list, path: str, dropped: float = 0):
+    ordered = sorted(latencies)
+
+    def p(q):
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1e6
+
+    size = os.path.getsize(path) / 1024 / 1024
+    print(f"{name:<10} p50 {p(0.5):8.1f} µs  p99 {p(0.99):9.1f} µs  "
+          f"máx {ordered[-1] * 1e3:7.1f} ms  total {sum(ordered):6.2f} s  "
+          f"{size:7.1f} MiB  descartados {dropped:.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument(
+        "--chars", type=int, default=4000, help="caracteres de cada resultado"
+    )
+    parser.add_argument(
+        "--stall", type=float, default=20, help="ms de cada bloqueo del disco"
+    )
+    parser.add_argument(
+        "--every", type=int, default=500, help="escrituras entre bloqueos"
+    )
+    args = parser.parse_args()
+    text = "2026-01-01 12:00:00 INFO petición atendida\n" * (args.chars // 43 + 1)
+    text = text[:args.chars]
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.setLevel(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sincrono.log")
+        handler = StallingFileHandler(path, args.stall / 1000, args.every)
+        handler.setFormatter(
+            logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+        )
+        root.addHandler(handler)
+        report("síncrono", measure(args.records, text, lambda t: t), path)
+        root.removeHandler(handler)
+        handler.close()
+
+        path = os.path.join(tmp, "cola.log")
+        handler = StallingFileHandler(path, args.stall / 1000, args.every)
+        handler.setFormatter(JsonFormatter())
+        log_queue = log_pipeline.queue.Queue(log_pipeline.LOG_QUEUE_SIZE)
+        root.addHandler(DroppingQueueHandler(log_queue))
+        listener = log_pipeline._Listener(log_queue, handler)
+        listener.start()
+        dropped = LOG_RECORDS_DROPPED.value(level="INFO")
+        latencies = measure(args.records, text, body)
+        listener.stop()
+        handler.close()
+        dropped = LOG_RECORDS_DROPPED.value(level="INFO") - dropped
+        report("cola", latencies, path, dropped)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark: tamaño de la memoria en el prompt a medida que crece.
+
+Llena la memoria con N entradas sintéticas y compara, para una misma
+petición, los tokens de memoria del prompt con el archivo completo (como
+antes) y con las entradas fijas más las `MEMORY_TOP_K` relevantes (BM25).
+Mide también el coste de anexar una entrada y de la búsqueda.
+
+Uso: python benchmarks/bench_memory.py [entradas máximas]
+"""
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import agent_server  # noqa: E402
+from history_manager import estimate_tokens  # noqa: E402
+from memory_store import MemoryStore, render, store_path  # noqa: E402
+
+TOPICS = [
+    "docker", "postgres", "nginx", "pytest", "gunicorn",
+    "systemd", "git", "redis", "celery", "django",
+]
+QUERY = "¿Cómo reinicio gunicorn después de cambiar la configuración de nginx?"
+
+
+def fill(store: MemoryStore, start: int, end: int) -> float:
+    started = time.perf_counter()
+    for i in range(start, end):
+        topic = TOPICS[i % len(TOPICS)]
+        store.append(
+            f"Lección {i}: con {topic} conviene revisar los registros y la "
+            f"configuración del servicio {i % 97}.",
+            "Lecciones Aprendidas",
+        )
+    return (time.perf_counter() - started) / max(end - start, 1)
+
+
+def main():
+    maximum = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = os.path.join(tmp, "agent_memory.md")
+        with open(legacy, "w", encoding="utf-8") as f:
+            f.write(
+                "## Directivas Generales\n"
+                "- Responde siempre en español.\n"
+                "- Sé conciso.\n"
+            )
+        store = MemoryStore(store_path(legacy), legacy_path=legacy)
+        with patch.object(agent_server, "AGENT_MEMORY_FILE", legacy), patch.object(
+            agent_server, "memory_store_for", lambda _: store
+        ):
+            print(
+                f"{'entradas':>8} {'archivo completo':>17} "
+                f"{'fijas + top-k':>14} {'anexar':>9} {'buscar':>9}"
+            )
+            size = 0
+            for target in (10, 100, 1000, maximum):
+                if target > maximum or target <= size:
+                    continue
+                append_seconds = fill(store, size, target)
+                size = target
+                full = render(store.entries())
+                pinned = agent_server.load_long_term_memory()
+                started = time.perf_counter()
+                relevant = agent_server.load_relevant_memory(QUERY, pinned)
+                search_seconds = time.perf_counter() - started
+                print(
+                    f"{size:8d} {estimate_tokens(full):12d} tok "
+                    f"{estimate_tokens(pinned + relevant):10d} tok "
+                    f"{append_seconds * 1000:6.2f} ms {search_seconds * 1000:6.2f} ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
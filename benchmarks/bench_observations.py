@@ -0,0 +1,68 @@
+"""Benchmark: bytes de prompt por paso con resultados de herramientas grandes.
+
+Simula una petición en la que el modelo lee un archivo grande y después
+hace varias llamadas pequeñas, reutilizando el contexto KV (cada paso envía
+solo el delta): compara los caracteres de prompt enviados en cada paso
+pasando el resultado completo al modelo (como antes) y con el almacén de
+observaciones (vista previa + handle).
+
+Uso: python benchmarks/bench_observations.py [KiB del archivo] [pasos]
+"""
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import agent_server  # noqa: E402
+import tools  # noqa: E402
+from observation_store import ObservationStore  # noqa: E402
+
+
+def run(store: ObservationStore, content: str, steps: int) -> list:
+    prompts = []
+    scripts = iter(
+        [['{"read_file": {"path": "/grande.log"}}']]
+        + [['{"get_current_date": {}}']] * (steps - 2)
+        + [["Listo."]]
+    )
+
+    def fake_generate_frames(prompt, **options):
+        prompts.append(len(prompt))
+        for token in next(scripts):
+            yield {"response": token, "done": False}
+        # Un contexto KV pequeño: los pasos siguientes envían solo el delta.
+        yield {
+            "response": "", "done": True,
+            "context": [len(prompts)], "prompt_eval_count": 0,
+        }
+
+    with patch.object(
+        agent_server.ollama_backend, "generate_frames", fake_generate_frames
+    ), patch.object(
+        agent_server, "observation_store", store
+    ), patch.dict(
+        tools.AVAILABLE_TOOLS, {"read_file": lambda **kwargs: content}
+    ), patch.object(
+        agent_server, "load_long_term_memory", return_value=""
+    ):
+        client = agent_server.app.test_client()
+        client.post("/chat", json={"user_message": "Analiza /grande.log"}).get_data()
+    return prompts
+
+
+def main():
+    kib = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    steps = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    line = "2026-01-01 12:00:00 INFO petición atendida en 12 ms\n"
+    content = line * (kib * 1024 // len(line))
+    before = run(ObservationStore(preview_chars=len(content) + 1), content, steps)
+    after = run(ObservationStore(), content, steps)
+    print(f"{'paso':>4} {'historial completo':>19} {'con observaciones':>18}")
+    for step, (a, b) in enumerate(zip(before, after), 1):
+        print(f"{step:4d} {a:13d} car. {b:12d} car.")
+    print(f"total {sum(before):12d} car. {sum(after):12d} car.")
+
+
+if __name__ == "__main__":
+    main()
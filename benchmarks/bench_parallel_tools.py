@@ -0,0 +1,73 @@
+"""Benchmark: tarea multiarchivo con una llamada por paso frente a un paso con varias.
+
+Simula una pasada del modelo con una latencia fija y lee archivos reales con
+una latencia de E/S añadida (disco de red, web_fetch...). "Antes" es el bucle
+original: una herramienta por pasada del modelo. "Después" es una sola pasada
+que pide todas las lecturas, ejecutadas en paralelo por ToolExecutor.
+
+Uso: python benchmarks/bench_parallel_tools.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tool_executor import ToolExecutor  # noqa: E402
+from tools import READ_ONLY_TOOLS, read_file  # noqa: E402
+
+FILE_COUNTS = [2, 5, 10]
+MODEL_PASS_SECONDS = 0.3
+IO_LATENCY_SECONDS = 0.05
+
+
+def execute(tool_name: str, parameters: dict) -> str:
+    time.sleep(IO_LATENCY_SECONDS)
+    return read_file(**parameters)
+
+
+def model_pass():
+    time.sleep(MODEL_PASS_SECONDS)
+
+
+def sequential(calls):
+    for call in calls:
+        model_pass()
+        execute(*call)
+    model_pass()  # respuesta final
+
+
+def batched(executor, calls):
+    model_pass()
+    list(executor.run(calls))
+    model_pass()  # respuesta final
+
+
+def timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    executor = ToolExecutor(execute, READ_ONLY_TOOLS)
+    with tempfile.TemporaryDirectory() as root:
+        paths = []
+        for i in range(max(FILE_COUNTS)):
+            path = os.path.join(root, f"modulo_{i}.py")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("print('hola')\n" * 2000)
+            paths.append(path)
+
+        print(f"{'archivos':>8} {'antes (s)':>10} {'después (s)':>12} {'mejora':>7}")
+        for count in FILE_COUNTS:
+            calls = [("read_file", {"path": p}) for p in paths[:count]]
+            before = timed(sequential, calls)
+            after = timed(batched, executor, calls)
+            print(f"{count:>8} {before:>10.3f} {after:>12.3f} {before / after:>6.1f}x")
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
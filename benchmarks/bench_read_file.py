@@ -0,0 +1,63 @@
+"""Benchmark: acceso aleatorio a líneas de un registro grande con read_file.
+
+Genera un archivo de registro (por defecto ~1 GB) y mide la lectura original
+(archivo completo a memoria) frente a read_file paginado: la primera consulta
+construye el índice de líneas y las siguientes saltan directamente a la línea.
+
+Uso: python benchmarks/bench_read_file.py [megabytes]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import read_file  # noqa: E402
+
+LINE = "2026-10-17 12:00:00,000 - INFO - Mensaje de registro número %d\n"
+
+
+def build_log(path: str, megabytes: int) -> int:
+    lines = 0
+    target = megabytes * 1024 * 1024
+    with open(path, "w", encoding="utf-8") as f:
+        written = 0
+        while written < target:
+            block = "".join(LINE % (lines + i) for i in range(10_000))
+            f.write(block)
+            written += len(block)
+            lines += 10_000
+    return lines
+
+
+def legacy_read(path: str) -> str:
+    """Implementación original de tools.read_file."""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "agent_server.log")
+        lines = build_log(path, megabytes)
+        print(f"Registro de {megabytes} MB y {lines} líneas")
+        print(f"{'original (archivo completo)':<34} {timed(legacy_read, path):>8.3f} s")
+        first = timed(read_file, path, offset=lines // 2, limit=50)
+        print(f"{'paginado, 1ª consulta (índice)':<34} {first:>8.3f} s")
+        samples = [random.randint(1, lines) for _ in range(100)]
+        total = sum(timed(read_file, path, offset=n, limit=50) for n in samples)
+        average = total / len(samples) * 1000
+        print(f"{'paginado, consulta aleatoria':<34} {average:>8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark: cambiar dos líneas de un archivo grande.
+
+Compara reescribirlo entero con write_file (lo único posible antes: el modelo
+debía reenviar el archivo completo) con un replace de dos cambios: bytes que
+el modelo tiene que generar, tiempo de la herramienta y pico de memoria de
+Python (tracemalloc).
+
+Uso: python benchmarks/bench_replace.py [megabytes]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import replace, write_file  # noqa: E402
+
+
+def measure(label: str, arguments_bytes: int, run):
+    tracemalloc.start()
+    started = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{label:<22} argumentos {arguments_bytes / 1024:10.1f} KiB  "
+        f"{elapsed:7.3f} s  pico {peak / 1024 / 1024:7.1f} MiB"
+    )
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "modulo.py")
+        count = megabytes * 1024 * 1024 // 32
+        lines = [f"def funcion_{i}():\n    return {i}\n\n" for i in range(count)]
+        content = "".join(lines)
+        with open(path, "w") as f:
+            f.write(content)
+        print(f"Archivo de {len(content) / 1024 / 1024:.0f} MB")
+
+        middle = len(lines) // 2
+        edited = content.replace("return 7\n", "return 70\n", 1).replace(
+            f"return {middle}\n", f"return -{middle}\n", 1
+        )
+        del lines
+        measure(
+            "write_file (completo)",
+            len(edited.encode()),
+            lambda text=edited: write_file(path, text),
+        )
+        del edited, content
+
+        edits = [
+            {
+                "old_string": "def funcion_7():\n    return 70\n",
+                "new_string": "def funcion_7():\n    return 7\n",
+            },
+            {
+                "old_string": f"def funcion_{middle}():\n    return -{middle}\n",
+                "new_string": f"def funcion_{middle}():\n    return {middle}\n",
+            },
+        ]
+        arguments = len(path) + sum(
+            len(e["old_string"]) + len(e["new_string"]) for e in edits
+        )
+        measure(
+            "replace (2 cambios)",
+            arguments,
+            lambda: replace(file_path=path, edits=edits),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Benchmark: search_file_content original frente al motor de file_search.
+
+Genera un árbol sintético (por defecto 100 000 archivos) con código fuente,
+un `.git`, un `venv`, un directorio ignorado por `.gitignore` y binarios, y
+mide una búsqueda con el bucle original (os.walk + regex línea a línea) y con
+iter_search (poda, descarte de binarios, prefiltro literal e hilos).
+
+También mide una consulta repetida con el índice de trigramas de search_index.
+
+Uso: python benchmarks/bench_search.py [número_de_archivos]
+"""
+import fnmatch
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_search import iter_search  # noqa: E402
+from search_index import TrigramIndex  # noqa: E402
+
+FILES_PER_DIR = 100
+PATTERN = r"def handle_request\("
+SOURCE = "import os\n\n" + "".join(
+    f"def funcion_{i}(x):\n    return x * {i}\n\n" for i in range(40)
+)
+
+
+def build_tree(root: str, total: int):
+    """Reparte `total` archivos entre los tipos del árbol.
+
+    70 % código, 10 % .git, 10 % venv, 5 % ignorado y 5 % binario.
+    """
+    layout = [
+        ("src", 0.70, ".py"),
+        (".git/objects", 0.10, ""),
+        ("venv/lib/site-packages", 0.10, ".py"),
+        ("generado", 0.05, ".py"),
+        ("assets", 0.05, ".bin"),
+    ]
+    with open(os.path.join(root, ".gitignore"), "w") as f:
+        f.write("generado/\n")
+    for prefix, share, suffix in layout:
+        count = int(total * share)
+        for i in range(count):
+            directory = os.path.join(root, prefix, f"d{i // FILES_PER_DIR}")
+            if i % FILES_PER_DIR == 0:
+                os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"f{i}{suffix}")
+            if suffix == ".bin":
+                with open(path, "wb") as f:
+                    f.write(b"\0\1\2" * 1000)
+                continue
+            with open(path, "w") as f:
+                f.write(SOURCE)
+                if i % 1000 == 0:
+                    f.write("def handle_request(req):\n    pass\n")
+
+
+def legacy_search(pattern: str, path: str, include: str = "*") -> list:
+    """Implementación original de tools.search_file_content."""
+    results = []
+    compiled_pattern = re.compile(pattern)
+    for root, _, files in os.walk(path):
+        for file_name in files:
+            if fnmatch.fnmatch(file_name, include):
+                file_path = os.path.join(root, file_name)
+                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+                    for line_num, line in enumerate(f, 1):
+                        if compiled_pattern.search(line):
+                            results.append(f"{file_path}:{line_num}: {line.strip()}")
+    return results
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as root:
+        start = time.perf_counter()
+        build_tree(root, total)
+        elapsed = time.perf_counter() - start
+        print(f"Árbol de {total} archivos generado en {elapsed:.1f} s")
+
+        legacy_time, legacy = timed(legacy_search, PATTERN, root)
+        new_time, new = timed(
+            lambda: list(iter_search(PATTERN, root, max_results=10_000))
+        )
+        first_time, _ = timed(lambda: next(iter_search(PATTERN, root)))
+        capped_time, capped = timed(
+            lambda: list(iter_search(PATTERN, root, max_results=20))
+        )
+
+        print(f"{'variante':<28} {'tiempo (s)':>10} {'resultados':>11}")
+        print(f"{'original':<28} {legacy_time:>10.2f} {len(legacy):>11}")
+        print(f"{'file_search':<28} {new_time:>10.2f} {len(new):>11}")
+        print(f"{'file_search (1er resultado)':<28} {first_time:>10.2f} {1:>11}")
+        print(f"{'file_search (max 20)':<28} {capped_time:>10.2f} {len(capped):>11}")
+
+        # Búsquedas repetidas con el índice de trigramas (la construcción
+        # inicial se hace en segundo plano en el servidor).
+        index_dir = tempfile.mkdtemp()
+        index = TrigramIndex(root, index_dir)
+        build_time, _ = timed(index.refresh)
+        index.ready = True
+        index.mark_stale()
+
+        def indexed_search():
+            candidates = index.candidates(PATTERN)
+            return list(
+                iter_search(PATTERN, root, max_results=10_000, candidates=candidates)
+            )
+
+        indexed_time, indexed = timed(indexed_search)
+        print(f"{'índice (construcción)':<28} {build_time:>10.2f} {'-':>11}")
+        repeat_time, _ = timed(indexed_search)
+        print(f"{'índice (consulta)':<28} {indexed_time:>10.2f} {len(indexed):>11}")
+        print(
+            f"{'índice (consulta repetida)':<28} {repeat_time:>10.2f} "
+            f"{len(indexed):>11}"
+        )
+        shutil.rmtree(index_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark: comando de shell con mucha salida.
+
+Compara la implementación original de run_shell_command (subprocess.run con
+capture_output, toda la salida en memoria) con el ejecutor nuevo: tiempo
+total, tiempo hasta el primer aviso de progreso, bytes devueltos y pico de
+memoria de Python (tracemalloc).
+
+Uso: python benchmarks/bench_shell.py [megabytes]
+"""
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shell_runner import run_command  # noqa: E402
+
+
+def legacy_run(command: str) -> dict:
+    """Implementación original de tools.run_shell_command."""
+    result = subprocess.run(
+        command, shell=True, capture_output=True, text=True, check=False
+    )
+    return {
+        "stdout": result.stdout,
+        "stderr": result.stderr,
+        "exit_code": result.returncode,
+    }
+
+
+def measure(label: str, run):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result, first_output = run(started)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    first = "       —   "
+    if first_output is not None:
+        first = f"{first_output * 1000:8.1f} ms"
+    print(
+        f"{label:<12} {elapsed:7.3f} s  primer aviso {first}  "
+        f"devuelto {len(result['stdout']) / 1024:10.1f} KiB  "
+        f"pico {peak / 1024 / 1024:8.1f} MiB"
+    )
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    command = (
+        "yes 'línea de salida de un comando muy hablador' "
+        f"| head -c {megabytes * 1024 * 1024}"
+    )
+    print(f"Comando con {megabytes} MB de salida")
+
+    measure("original", lambda started: (legacy_run(command), None))
+
+    def streamed(started):
+        first = []
+
+        def on_output(stream, text):
+            if not first:
+                first.append(time.perf_counter() - started)
+
+        result = run_command(command, timeout=300, on_output=on_output)
+        return result, first[0] if first else None
+
+    measure("nuevo", streamed)
+
+
+if __name__ == "__main__":
+    main()
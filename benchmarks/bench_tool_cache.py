@@ -0,0 +1,70 @@
+"""Benchmark: llamadas repetidas a herramientas puras dentro de una sesión.
+
+Reproduce un patrón habitual del modelo (volver a leer los mismos archivos y
+repetir la misma búsqueda y el mismo glob) sobre un árbol sintético, con y
+sin la caché de resultados de execute_tool.
+
+Uso: python benchmarks/bench_tool_cache.py [archivos] [repeticiones]
+"""
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import agent_server  # noqa: E402
+import search_index  # noqa: E402
+from tool_cache import ToolResultCache  # noqa: E402
+from tools import TOOL_MANIFEST  # noqa: E402
+
+
+def build_tree(root: str, files: int):
+    for i in range(files):
+        directory = os.path.join(root, f"pkg{i % 50}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"mod{i}.py"), "w") as f:
+            f.write(f"def funcion_{i}():\n    return {i}\n" * 40)
+
+
+def session(root: str, repetitions: int):
+    calls = [
+        ("read_file", {"path": os.path.join(root, "pkg1", "mod1.py")}),
+        ("list_directory", {"path": os.path.join(root, "pkg2")}),
+        ("glob", {"pattern": "**/*.py", "path": root}),
+        ("search_file_content", {"pattern": r"funcion_1\d\d\(", "path": root}),
+    ]
+    for _ in range(repetitions):
+        for tool_name, parameters in calls:
+            agent_server.execute_tool(tool_name, parameters, "bench")
+
+
+def measure(label: str, root: str, repetitions: int, cache: ToolResultCache):
+    with patch.object(agent_server, "tool_result_cache", cache):
+        started = time.perf_counter()
+        session(root, repetitions)
+        elapsed = time.perf_counter() - started
+    stats = cache.stats()
+    print(
+        f"{label:<10} {elapsed:7.3f} s  "
+        f"aciertos {stats['hits']:4d}  fallos {stats['misses']:4d}"
+    )
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    # Sin índice de trigramas: se mide el coste de repetir la herramienta.
+    search_index.SEARCH_INDEX_ENABLED = False
+    with tempfile.TemporaryDirectory() as root:
+        build_tree(root, files)
+        print(f"{files} archivos, {repetitions} repeticiones de 4 llamadas")
+        measure(
+            "sin caché", root, repetitions, ToolResultCache(TOOL_MANIFEST, budget=0)
+        )
+        measure("con caché", root, repetitions, ToolResultCache(TOOL_MANIFEST))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Micro-benchmark: ToolCallParser frente al bucle original de json.loads.
+
+Uso: python benchmarks/bench_tool_call_parser.py
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tool_call_parser import ToolCallParser, TOOL_CALL  # noqa: E402
+
+SIZES = [10_000, 50_000, 100_000]
+CHUNK_SIZE = 4  # Ollama emite fragmentos de unos pocos caracteres
+
+
+def chunked(text: str):
+    return [text[i:i + CHUNK_SIZE] for i in range(0, len(text), CHUNK_SIZE)]
+
+
+def make_tool_call(size: int) -> str:
+    content = ("linea de código con \"comillas\" y {llaves}\n" * size)[:size]
+    return json.dumps({"write_file": {"path": "/tmp/x.py", "content": content}})
+
+
+def make_text(size: int) -> str:
+    return ("Respuesta en texto plano con algo de markdown.\n" * size)[:size]
+
+
+def legacy_loop(chunks):
+    """Bucle previo de event_stream: json.loads del búfer entero en cada fragmento."""
+    response_buffer = ""
+    for chunk in chunks:
+        response_buffer += chunk
+        try:
+            parsed_json = json.loads(response_buffer)
+            if isinstance(parsed_json, dict) and len(parsed_json) == 1:
+                return True
+        except json.JSONDecodeError:
+            pass
+    return False
+
+
+def incremental_loop(chunks):
+    parser = ToolCallParser()
+    for chunk in chunks:
+        if parser.feed(chunk) == TOOL_CALL:
+            return True
+        parser.pop_text()
+    parser.finish()
+    return False
+
+
+def timed(func, chunks) -> float:
+    start = time.perf_counter()
+    func(chunks)
+    return time.perf_counter() - start
+
+
+def main():
+    print(
+        f"{'escenario':<12}{'caracteres':>12}{'json.loads (s)':>16}"
+        f"{'incremental (s)':>18}{'x':>8}"
+    )
+    for name, factory in (("tool_call", make_tool_call), ("texto", make_text)):
+        for size in SIZES:
+            chunks = chunked(factory(size))
+            legacy = timed(legacy_loop, chunks)
+            incremental = timed(incremental_loop, chunks)
+            print(
+                f"{name:<12}{size:>12}{legacy:>16.4f}{incremental:>18.4f}"
+                f"{legacy / incremental:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark: web_fetch con 20 URLs frente a un servidor local con latencia.
+
+Cada respuesta tarda `latencia` segundos y contiene una página HTML de unos
+100 KB (scripts, estilos y texto). Compara la implementación original
+(requests.get secuencial, HTML sin procesar) con la nueva en frío, con
+revalidación (ETag, 304) y con respuestas frescas en caché.
+
+Uso: python benchmarks/bench_web_fetch.py [latencia_en_segundos]
+"""
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web_fetcher import FetchCache, WebFetcher  # noqa: E402
+
+LATENCY = float(sys.argv[1]) if len(sys.argv) > 1 else 0.2
+PAGE = (
+    "<html><head><title>Documento</title><style>" + "p{margin:0}" * 2000 + "</style>"
+    "<script>" + "var x = 1;" * 3000 + "</script></head><body><nav>menú</nav>"
+    + "".join(
+        f"<p>Párrafo {i} con <a href='/enlace{i}'>un enlace</a> y algo de texto.</p>"
+        for i in range(800)
+    )
+    + "</body></html>"
+).encode("utf-8")
+
+
+class Handler(BaseHTTPRequestHandler):
+    cache_control = "no-cache"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(LATENCY)
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Cache-Control", Handler.cache_control)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.send_header("ETag", '"v1"')
+        self.send_header("Cache-Control", Handler.cache_control)
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+
+def legacy_fetch(prompt: str) -> str:
+    """Implementación original de tools.web_fetch."""
+    results = []
+    for url in re.findall(r'https?://[^\s]+', prompt):
+        response = requests.get(url)
+        response.raise_for_status()
+        results.append(f"--- Contenido de {url} ---\n{response.text}")
+    return "\n\n".join(results)
+
+
+def new_fetch(fetcher: WebFetcher, urls: list) -> str:
+    return "\n\n".join(page["text"] for _, page in fetcher.fetch_many(urls))
+
+
+def measure(label: str, run):
+    started = time.perf_counter()
+    output = run()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:7.3f} s  {len(output) / 1024:9.1f} KiB al modelo")
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base}/doc{i}" for i in range(20)]
+    print(
+        f"20 URLs, {LATENCY * 1000:.0f} ms de latencia, "
+        f"página de {len(PAGE) / 1024:.0f} KiB"
+    )
+
+    measure("original (secuencial)", lambda: legacy_fetch(" ".join(urls)))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        fetcher = WebFetcher(cache=FetchCache(cache_dir))
+        measure("nuevo, en frío", lambda: new_fetch(fetcher, urls))
+        measure("nuevo, revalidación (304)", lambda: new_fetch(fetcher, urls))
+        Handler.cache_control = "max-age=600"
+        fetcher = WebFetcher(cache=FetchCache(cache_dir))
+        new_fetch(fetcher, urls)
+        measure("nuevo, caché fresca", lambda: new_fetch(fetcher, urls))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
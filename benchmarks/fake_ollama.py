@@ -0,0 +1,196 @@
+"""Servidor falso de Ollama para medir /chat sin un modelo real.
+
+Implementa `/api/generate` (y `/api/tags`) con streaming NDJSON: cada
+respuesta se genera a partir de un guion por pasos, con un tiempo hasta el
+primer token (`ttft`) y un ritmo de tokens por segundo configurables. Un
+paso es un texto (respuesta final o llamada a herramienta en JSON) o una
+función `prompt -> texto`.
+
+El paso de cada petición se deduce del `context` KV que devuelve el propio
+servidor (`[conversación, paso]`) cuando el delta trae observaciones; sin
+contexto, del número de observaciones de herramienta del turno actual. Así
+sirve tanto para prompts completos como para deltas.
+
+Uso (independiente): python benchmarks/fake_ollama.py [puerto]
+"""
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+OBSERVATION_MARK = "Observación de Herramienta:"
+USER_MARK = "Usuario: "
+# Caracteres por token al trocear el texto del guion.
+CHARS_PER_TOKEN = 4
+
+
+def plain_answer(tokens: int = 64) -> list:
+    """Guion de una respuesta en texto de `tokens` tokens, sin herramientas."""
+    return [_filler(tokens)]
+
+
+def tool_call(tool_name: str, **parameters) -> str:
+    return json.dumps({tool_name: parameters}, ensure_ascii=False)
+
+
+def _filler(tokens: int) -> str:
+    words = (
+        "el agente responde con un texto de prueba para medir el rendimiento"
+    ).split()
+    text = " ".join(words[i % len(words)] for i in range(tokens))
+    return text[:tokens * CHARS_PER_TOKEN]
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # El agente cierra la conexión en cuanto detecta una llamada a herramienta.
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class FakeOllama:
+    """Servidor HTTP en un hilo que sirve un guion con latencias configurables."""
+
+    def __init__(
+        self,
+        script: list = None,
+        ttft: float = 0.05,
+        tokens_per_second: float = 200.0,
+        port: int = 0,
+    ):
+        self.script = script or plain_answer()
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.requests = 0
+        self.prompt_chars = 0
+        self._conversations = 0
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def step_for(self, prompt: str, context):
+        """(conversación, paso) de una petición."""
+        if context:
+            # Un delta con observaciones continúa la conversación; uno con un
+            # mensaje nuevo del usuario empieza el guion de nuevo.
+            return context[0], context[1] + 1 if OBSERVATION_MARK in prompt else 0
+        with self._lock:
+            self._conversations += 1
+            conversation = self._conversations
+        last_user = prompt.rfind(USER_MARK)
+        before = prompt[:last_user] if last_user != -1 else prompt
+        # Observaciones posteriores al último turno del agente (el de esta petición).
+        if "Agente: " in before:
+            current = before[before.rfind("Agente: ") + 1:]
+        else:
+            current = before
+        return conversation, current.count(OBSERVATION_MARK)
+
+    def chunks(self, prompt: str, step: int) -> list:
+        item = self.script[min(step, len(self.script) - 1)]
+        text = item(prompt) if callable(item) else item
+        step = CHARS_PER_TOKEN
+        return [text[i:i + step] for i in range(0, len(text), step)] or [""]
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                body = json.dumps({"models": [{"name": "fake"}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path != "/api/generate":
+                    self.send_error(404, "Solo se simula /api/generate")
+                    return
+                prompt = payload.get("prompt", "")
+                with fake._lock:
+                    fake.requests += 1
+                    fake.prompt_chars += len(prompt)
+                conversation, step = fake.step_for(prompt, payload.get("context"))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    if not payload.get("stream", True):
+                        text = "".join(fake.chunks(prompt, step))
+                        self._frame({"response": text, "done": True})
+                    else:
+                        time.sleep(fake.ttft)
+                        tps = fake.tokens_per_second
+                        interval = 1 / tps if tps else 0
+                        for chunk in fake.chunks(prompt, step):
+                            self._frame({"response": chunk, "done": False})
+                            time.sleep(interval)
+                        self._frame({
+                            "response": "",
+                            "done": True,
+                            "context": [conversation, step],
+                            "prompt_eval_count": len(prompt) // CHARS_PER_TOKEN,
+                        })
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # El agente corta el stream en cuanto detecta una llamada a
+                    # herramienta.
+                    self.close_connection = True
+
+            def _frame(self, frame: dict):
+                data = (json.dumps(frame, ensure_ascii=False) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def fetch_first_observation(prompt: str) -> str:
+    """Paso de guion: pide la página 2 de la primera observación recortada."""
+    match = re.search(r'handle "(obs-[0-9a-f]+)"', prompt)
+    if not match:
+        return _filler(32)
+    return tool_call("fetch_observation", handle=match.group(1), page=2)
+
+
+if __name__ == "__main__":
+    server = FakeOllama(port=int(sys.argv[1]) if len(sys.argv) > 1 else 11434).start()
+    print(f"Ollama falso en {server.url} (Ctrl+C para salir)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
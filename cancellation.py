@@ -0,0 +1,100 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Motivos de parada de una petición (etiqueta `reason` de las métricas).
+CLIENT_DISCONNECT = "client_disconnect"
+DEADLINE = "deadline"
+MAX_STEPS = "max_steps"
+STEP_TOKENS = "step_tokens"
+
+
+class Cancellation:
+    """Cancelación cooperativa de una petición, con un plazo opcional.
+
+    El transporte la activa cuando el cliente se desconecta; el bucle del
+    agente la consulta entre tokens y pasos, y las herramientas largas (p. ej.
+    `run_shell_command`) la sondean para terminar su proceso. Al vencer
+    `deadline` (reloj monotónico) cuenta como cancelada con el motivo
+    "deadline".
+    """
+
+    def __init__(self, deadline: float = None):
+        self.deadline = deadline
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def cancel(self, reason: str):
+        """Marca la petición como cancelada; el primer motivo es el que cuenta."""
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            callbacks, self._callbacks = self._callbacks, []
+        self._event.set()
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback):
+        """Llama a `callback` al cancelarse (ya mismo si lo estaba).
+
+        Sirve para desbloquear a quien espera en E/S (p. ej. cerrar la conexión
+        con Ollama). Devuelve una función que anula el registro.
+        """
+        with self._lock:
+            if self.reason is None:
+                self._callbacks.append(callback)
+                return lambda: self._unregister(callback)
+        callback()
+        return lambda: None
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(DEADLINE)
+            return True
+        return False
+
+    def remaining(self):
+        """Segundos hasta el plazo (None si no hay)."""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0)
+
+    def wait(self, timeout: float) -> bool:
+        """Espera hasta `timeout` segundos a la cancelación (o al plazo).
+
+        Devuelve True si se canceló.
+        """
+        remaining = self.remaining()
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+        self._event.wait(timeout)
+        return self.cancelled
+
+    def _unregister(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+_local = threading.local()
+
+
+def current_cancellation():
+    """La cancelación de la petición a la que sirve este hilo (None fuera de una)."""
+    return getattr(_local, "cancellation", None)
+
+
+@contextmanager
+def bind_cancellation(cancellation):
+    previous = current_cancellation()
+    _local.cancellation = cancellation
+    try:
+        yield cancellation
+    finally:
+        _local.cancellation = previous
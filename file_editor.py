@@ -0,0 +1,219 @@
+import difflib
+import mmap
+import os
+import tempfile
+from collections import OrderedDict
+
+# --- CONFIGURACIÓN ---
+# Tamaño de los tramos copiados del original al temporal: la memoria usada no
+# depende del tamaño del archivo.
+EDIT_CHUNK_BYTES = 1024 * 1024
+# Líneas de diff mostradas por cambio en el resumen.
+EDIT_DIFF_MAX_LINES = 12
+
+
+class EditError(Exception):
+    """Un lote de cambios no puede aplicarse; no se ha modificado ningún archivo."""
+
+
+class _FileEdit:
+    """Cambios localizados en un archivo, listos para escribirse."""
+
+    def __init__(self, path: str, hunks: list):
+        self.path = path
+        self.hunks = hunks
+        self.handle = open(path, "rb")
+        st = os.fstat(self.handle.fileno())
+        self.mode = st.st_mode
+        self.fingerprint = (st.st_mtime_ns, st.st_size)
+        self.buffer = (
+            mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+            if st.st_size
+            else b""
+        )
+        self.spans = []
+        self.tmp_path = None
+        self.backup_path = None
+
+    def locate(self):
+        """Busca cada `old` exactamente una vez; produce self.spans ordenados."""
+        crlf = self.buffer.find(b"\r\n") != -1
+        for number, (old, new) in enumerate(self.hunks, 1):
+            old_bytes, new_bytes = old.encode("utf-8"), new.encode("utf-8")
+            start = self.buffer.find(old_bytes)
+            if start == -1 and crlf and b"\n" in old_bytes:
+                # El modelo suele enviar '\n' aunque el archivo use CRLF.
+                old_bytes = old_bytes.replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+                new_bytes = new_bytes.replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+                start = self.buffer.find(old_bytes)
+            if start == -1:
+                raise EditError(
+                    f"{self.path}: el cambio {number} no encuentra 'old_string' en el "
+                    "archivo."
+                )
+            if self.buffer.find(old_bytes, start + 1) != -1:
+                raise EditError(
+                    f"{self.path}: 'old_string' del cambio {number} aparece más de una "
+                    "vez; añade contexto para que sea único."
+                )
+            self.spans.append((start, start + len(old_bytes), new_bytes, old, new))
+        self.spans.sort(key=lambda span: span[0])
+        for previous, current in zip(self.spans, self.spans[1:]):
+            if current[0] < previous[1]:
+                raise EditError(f"{self.path}: dos cambios se solapan.")
+
+    def write_temp(self) -> list:
+        """Escribe el resultado en un temporal del mismo directorio.
+
+        Devuelve las líneas afectadas por cada cambio.
+        """
+        directory, name = os.path.split(self.path)
+        fd, self.tmp_path = tempfile.mkstemp(
+            prefix=f".{name}.", suffix=".tmp", dir=directory
+        )
+        lines = []
+        line_no, position = 1, 0
+        with os.fdopen(fd, "wb") as out:
+            for start, end, new_bytes, _, _ in self.spans:
+                line_no += self._copy(out, position, start)
+                lines.append(line_no)
+                out.write(new_bytes)
+                line_no += new_bytes.count(b"\n")
+                position = end
+            self._copy(out, position, len(self.buffer))
+            out.flush()
+            os.fsync(out.fileno())
+        os.chmod(self.tmp_path, self.mode & 0o7777)
+        return lines
+
+    def _copy(self, out, start: int, end: int) -> int:
+        newlines = 0
+        for offset in range(start, end, EDIT_CHUNK_BYTES):
+            chunk = self.buffer[offset:min(offset + EDIT_CHUNK_BYTES, end)]
+            newlines += chunk.count(b"\n")
+            out.write(chunk)
+        return newlines
+
+    def unchanged_on_disk(self) -> bool:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        return (st.st_mtime_ns, st.st_size) == self.fingerprint
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self.handle.close()
+        for path in (self.tmp_path, self.backup_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+
+def _fsync_directory(directory: str):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _hunk_diff(old: str, new: str) -> list:
+    diff = [
+        line
+        for line in difflib.unified_diff(
+            old.splitlines(), new.splitlines(), lineterm="", n=0
+        )
+        if not line.startswith(("---", "+++", "@@"))
+    ]
+    if len(diff) > EDIT_DIFF_MAX_LINES:
+        hidden = len(diff) - EDIT_DIFF_MAX_LINES
+        diff = diff[:EDIT_DIFF_MAX_LINES] + [f"  … ({hidden} líneas más)"]
+    return diff
+
+
+def apply_edits(edits: list) -> str:
+    """Aplica un lote de cambios [(ruta, old, new)] como una transacción.
+
+    Cada `old` debe aparecer exactamente una vez en su archivo. Si algún
+    cambio falla no se toca ningún archivo (EditError). Cada archivo se
+    reescribe en un temporal del mismo directorio (copiando por tramos desde
+    un mmap del original), se sincroniza con fsync y se sustituye con un
+    rename atómico; si un rename falla, los archivos ya sustituidos se
+    restauran. Devuelve un resumen compacto con el diff de cada cambio.
+    """
+    by_file = OrderedDict()
+    for path, old, new in edits:
+        if not os.path.isabs(path):
+            raise EditError(f"La ruta debe ser absoluta: {path}")
+        if not old:
+            raise EditError(f"{path}: 'old_string' no puede estar vacío.")
+        if old == new:
+            raise EditError(f"{path}: 'old_string' y 'new_string' son idénticos.")
+        by_file.setdefault(os.path.normpath(path), []).append((old, new))
+
+    files = []
+    try:
+        for path, hunks in by_file.items():
+            try:
+                files.append(_FileEdit(path, hunks))
+            except OSError as e:
+                raise EditError(f"{path}: no se puede abrir ({e.strerror}).") from e
+            files[-1].locate()
+        summaries = []
+        for file_edit in files:
+            summaries.append((file_edit, file_edit.write_temp()))
+        if not all(file_edit.unchanged_on_disk() for file_edit in files):
+            raise EditError(
+                "Un archivo cambió mientras se editaba; vuelve a leerlo e inténtalo "
+                "de nuevo."
+            )
+        _commit(files)
+    except OSError as e:
+        raise EditError(f"No se pudieron escribir los cambios: {e}") from e
+    finally:
+        for file_edit in files:
+            file_edit.close()
+
+    report = []
+    for file_edit, lines in summaries:
+        added = sum(len(new.splitlines()) for _, _, _, _, new in file_edit.spans)
+        removed = sum(len(old.splitlines()) for _, _, _, old, _ in file_edit.spans)
+        report.append(
+            f"Editado {file_edit.path} ({len(file_edit.spans)} cambios, "
+            f"+{added} -{removed} líneas):"
+        )
+        for line_no, (_, _, _, old, new) in zip(lines, file_edit.spans):
+            report.append(f"@@ línea {line_no} @@")
+            report.extend(_hunk_diff(old, new))
+    return "\n".join(report)
+
+
+def _commit(files: list):
+    """Sustituye cada archivo por su temporal; si algo falla, deshace los anteriores."""
+    committed = []
+    try:
+        for file_edit in files:
+            # Un enlace duro conserva el original sin copiarlo, por si hay que deshacer.
+            backup = f"{file_edit.tmp_path}.orig"
+            try:
+                os.link(file_edit.path, backup)
+                file_edit.backup_path = backup
+            except OSError:
+                file_edit.backup_path = None
+            os.replace(file_edit.tmp_path, file_edit.path)
+            file_edit.tmp_path = None
+            committed.append(file_edit)
+    except OSError:
+        for file_edit in committed:
+            if file_edit.backup_path:
+                os.replace(file_edit.backup_path, file_edit.path)
+                file_edit.backup_path = None
+        raise
+    for directory in {os.path.dirname(file_edit.path) for file_edit in files}:
+        _fsync_directory(directory)
@@ -0,0 +1,102 @@
+import heapq
+import os
+import re
+from itertools import islice
+
+from fs_walk import DirectoryCache, expand_braces, translate_glob, walk_files
+
+# --- CONFIGURACIÓN ---
+GLOB_MAX_RESULTS = 500
+
+# Listados compartidos entre llamadas: validados por el mtime de cada directorio.
+directory_cache = DirectoryCache()
+
+
+class GlobPattern:
+    """Patrón glob compilado una vez, con poda de subárboles.
+
+    Los segmentos anteriores al primer `**` fijan qué directorios pueden
+    contener coincidencias a cada profundidad; sin `**`, tampoco se baja más
+    allá del número de segmentos del patrón.
+    """
+
+    def __init__(self, pattern: str):
+        self.segments = [s for s in pattern.split("/") if s not in ("", ".")]
+        self.regex = re.compile(translate_glob("/".join(self.segments)) + r"\Z")
+        self._segment_regexes = [
+            re.compile(translate_glob(s) + r"\Z") for s in self.segments
+        ]
+        self._recursive_from = next(
+            (i for i, s in enumerate(self.segments) if "**" in s), None
+        )
+
+    def may_contain(self, parts: list) -> bool:
+        """Indica si un directorio (lista de segmentos) puede contener coincidencias."""
+        limit = self._recursive_from
+        if limit is None:
+            limit = len(self.segments) - 1
+        for depth, part in enumerate(parts):
+            if depth >= limit:
+                return self._recursive_from is not None
+            if not self._segment_regexes[depth].match(part):
+                return False
+        return True
+
+
+def iter_glob(pattern: str, root: str, cache: DirectoryCache = None):
+    """Produce los `os.DirEntry` (archivos y directorios) que coinciden con `pattern`.
+
+    Es perezoso: recorre solo los subárboles que pueden coincidir, respeta los
+    `.gitignore` y omite los nombres ocultos salvo que el patrón los pida
+    explícitamente (como `glob.glob`).
+    """
+    if os.path.isabs(pattern):
+        root, pattern = os.sep, pattern.lstrip(os.sep)
+    root = os.path.normpath(root)
+    prefix = root if root.endswith(os.sep) else root + os.sep
+    patterns = [GlobPattern(p) for p in expand_braces(pattern)]
+    include_hidden = any(s.startswith(".") for p in patterns for s in p.segments)
+
+    def relative_parts(path: str) -> list:
+        return path[len(prefix):].split(os.sep)
+
+    def dir_filter(path: str) -> bool:
+        parts = relative_parts(path)
+        return any(p.may_contain(parts) for p in patterns)
+
+    for entry in walk_files(
+        root,
+        dir_filter=dir_filter,
+        include_dirs=True,
+        include_hidden=include_hidden,
+        cache=cache,
+    ):
+        relative = entry.path[len(prefix):].replace(os.sep, "/")
+        if any(p.regex.match(relative) for p in patterns):
+            yield entry
+
+
+def glob_paths(
+    pattern: str, root: str, limit: int = GLOB_MAX_RESULTS, sort_by_mtime: bool = False
+):
+    """Devuelve (rutas, truncado). Con `sort_by_mtime`, las más recientes primero."""
+    matches = iter_glob(pattern, root, cache=directory_cache)
+    if sort_by_mtime:
+        # Ordenar exige ver todas las coincidencias, pero solo se guardan `limit`.
+        stamped = []
+        total = 0
+        for entry in matches:
+            total += 1
+            try:
+                mtime = os.stat(entry.path).st_mtime_ns
+            except OSError:
+                continue
+            item = (mtime, entry.path)
+            if len(stamped) < limit:
+                heapq.heappush(stamped, item)
+            else:
+                heapq.heappushpop(stamped, item)
+        paths = [path for _, path in sorted(stamped, reverse=True)]
+        return paths, total > limit
+    paths = [entry.path for entry in islice(matches, limit + 1)]
+    return paths[:limit], len(paths) > limit
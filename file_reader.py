@@ -0,0 +1,164 @@
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from itertools import accumulate, count, islice
+from operator import add
+
+from prompt_cache import file_fingerprint
+
+# --- CONFIGURACIÓN ---
+READ_MAX_BYTES = int(os.environ.get("AGENT_READ_MAX_BYTES", str(256 * 1024)))
+READ_DEFAULT_LINES = 2000
+LINE_INDEX_CACHE_ENTRIES = 64
+# Se guarda el desplazamiento de una de cada LINE_INDEX_STEP líneas: llegar a
+# la línea N cuesta, como mucho, LINE_INDEX_STEP búsquedas de '\n'.
+LINE_INDEX_STEP = 256
+INDEX_CHUNK_BYTES = 8 * 1024 * 1024
+BINARY_SNIFF_BYTES = 8192
+
+
+class LineIndex:
+    """Índice disperso de inicios de línea de un archivo.
+
+    `checkpoints[k]` es el desplazamiento en bytes de la línea k·STEP (base 0).
+    Se construye una vez por versión del archivo recorriéndolo por bloques con
+    operaciones en C (split/accumulate), sin un bucle de Python por línea.
+    """
+
+    def __init__(self, buffer, size: int, step: int = LINE_INDEX_STEP):
+        self.step = step
+        self.size = size
+        self.checkpoints = array("Q", [0])
+        newlines = 0
+        position = 0
+        while position < size:
+            chunk = buffer[position:position + INDEX_CHUNK_BYTES]
+            parts = chunk.split(b"\n")
+            chunk_newlines = len(parts) - 1
+            next_line = len(self.checkpoints) * step
+            if newlines + chunk_newlines >= next_line:
+                # Inicio de cada línea del bloque: fin de la anterior + 1.
+                starts = map(add, accumulate(map(len, parts[:-1])), count(position + 1))
+                first = next_line - newlines - 1
+                self.checkpoints.extend(islice(starts, first, None, step))
+            newlines += chunk_newlines
+            position += len(chunk)
+        ends_with_newline = size > 0 and buffer[size - 1:size] == b"\n"
+        self.total_lines = newlines + (0 if ends_with_newline or size == 0 else 1)
+
+    def line_start(self, buffer, line: int) -> int:
+        """Byte en que empieza la línea `line` (base 0); `size` si no existe."""
+        if line >= self.total_lines:
+            return self.size
+        checkpoint = min(line // self.step, len(self.checkpoints) - 1)
+        position = self.checkpoints[checkpoint]
+        for _ in range(line - checkpoint * self.step):
+            position = buffer.find(b"\n", position) + 1
+        return position
+
+
+class LineIndexCache:
+    """Índices de línea por archivo, válidos mientras no cambie su (mtime, tamaño)."""
+
+    def __init__(self, max_entries: int = LINE_INDEX_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, fingerprint, buffer, size: int) -> LineIndex:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == fingerprint:
+                self._entries.move_to_end(path)
+                return entry[1]
+        index = LineIndex(buffer, size)
+        with self._lock:
+            self._entries[path] = (fingerprint, index)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+
+line_index_cache = LineIndexCache()
+
+
+def read_lines(
+    path: str,
+    offset: int = 1,
+    limit: int = READ_DEFAULT_LINES,
+    max_bytes: int = READ_MAX_BYTES,
+) -> dict:
+    """Lee `limit` líneas desde la línea `offset` (base 1) sin cargar el archivo entero.
+
+    Devuelve {"content", "start_line", "end_line", "total_lines", "next_offset",
+    "end_byte", "partial_line"}; `next_offset` es None si no quedan más líneas.
+    Si el tramo supera `max_bytes` se corta en el último salto de línea dentro
+    del límite; si ni una línea cabe, se devuelve su principio con
+    `partial_line` y el resto puede leerse por bytes desde `end_byte`.
+    Lanza OSError si no se puede abrir y ValueError si el archivo es binario.
+    """
+    offset = max(offset, 1)
+    limit = max(limit, 1)
+    fingerprint = file_fingerprint(path)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return {
+                "content": "", "start_line": 1, "end_line": 0, "total_lines": 0,
+                "next_offset": None, "end_byte": 0, "partial_line": False,
+            }
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if b"\0" in buffer[:BINARY_SNIFF_BYTES]:
+                raise ValueError(f"el archivo parece binario ({size} bytes)")
+            index = line_index_cache.get(path, fingerprint, buffer, size)
+            start = index.line_start(buffer, offset - 1)
+            end_line = min(offset - 1 + limit, index.total_lines)
+            end = start if end_line < offset else index.line_start(buffer, end_line)
+            partial_line = False
+            if end - start > max_bytes:
+                cut = buffer.rfind(b"\n", start, start + max_bytes)
+                if cut == -1:
+                    # Una sola línea más larga que el límite: se devuelve un trozo.
+                    end = start + max_bytes
+                    end_line = offset
+                    partial_line = True
+                else:
+                    end = cut + 1
+                    end_line = offset - 1 + buffer[start:end].count(b"\n")
+            content = buffer[start:end].decode("utf-8", errors="replace")
+    return {
+        "content": content,
+        "start_line": offset,
+        "end_line": end_line,
+        "total_lines": index.total_lines,
+        "next_offset": end_line + 1 if end_line < index.total_lines else None,
+        "end_byte": end,
+        "partial_line": partial_line,
+    }
+
+
+def read_bytes(
+    path: str, byte_offset: int = 0, byte_limit: int = READ_MAX_BYTES
+) -> dict:
+    """Lee un rango de bytes (al menos uno y como mucho READ_MAX_BYTES).
+
+    Devuelve {"content", "start", "end", "size", "next_byte_offset"}.
+    """
+    byte_offset = max(byte_offset, 0)
+    # Un límite negativo haría que f.read() leyera el archivo entero.
+    byte_limit = max(min(byte_limit, READ_MAX_BYTES), 1)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        f.seek(byte_offset)
+        data = f.read(byte_limit)
+    end = byte_offset + len(data)
+    return {
+        "content": data.decode("utf-8", errors="replace"),
+        "start": byte_offset,
+        "end": end,
+        "size": size,
+        "next_byte_offset": end if end < size else None,
+    }
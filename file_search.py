@@ -0,0 +1,322 @@
+import fnmatch
+import mmap
+import os
+import re
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+try:  # Python 3.11+
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+    from re._constants import LITERAL, SUBPATTERN, MAX_REPEAT, MIN_REPEAT
+except ImportError:  # pragma: no cover - Python < 3.11
+    import sre_parse
+    import sre_constants
+    from sre_constants import LITERAL, SUBPATTERN, MAX_REPEAT, MIN_REPEAT
+
+from fs_walk import expand_braces, walk_files
+
+# --- CONFIGURACIÓN ---
+SEARCH_WORKERS = int(os.environ.get("AGENT_SEARCH_WORKERS", "8"))
+SEARCH_MAX_RESULTS = 200
+SEARCH_MAX_MATCHES_PER_FILE = 20
+SEARCH_MAX_LINE_CHARS = 300
+SEARCH_BATCH_SIZE = 64
+# Como git: un byte NUL al principio del archivo indica que es binario.
+BINARY_SNIFF_BYTES = 8192
+# Por encima de este tamaño el archivo se mapea en memoria en lugar de leerse.
+MMAP_THRESHOLD = 1024 * 1024
+
+
+def required_literals(pattern: str, flags: int = 0) -> list:
+    """Literales que toda coincidencia de `pattern` debe contener.
+
+    Solo se consideran los literales consecutivos del nivel superior de la
+    expresión (sin alternativas); devuelve [] si no hay ninguno utilizable o
+    la búsqueda no distingue mayúsculas. Los grupos `(?i:...)` cortan la
+    secuencia.
+    """
+    if flags & re.IGNORECASE:
+        return []
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return []
+    if parsed.state.flags & re.IGNORECASE:
+        return []
+    runs, current = [], []
+
+    def close_run():
+        if current:
+            runs.append("".join(current).encode("utf-8"))
+            current.clear()
+
+    def visit(items):
+        for op, arg in items:
+            if op is LITERAL:
+                current.append(chr(arg))
+            elif op is SUBPATTERN and arg[1] & re.IGNORECASE:
+                # `(?i:...)`: el grupo admite otras mayúsculas, no aporta literales.
+                close_run()
+            elif op is SUBPATTERN:
+                # Grupo sin alternativas: sus literales siguen la secuencia.
+                visit(arg[-1])
+            elif op in (MAX_REPEAT, MIN_REPEAT) and arg[0] >= 1:
+                # `x+` o `x{2,}`: al menos una repetición es obligatoria.
+                close_run()
+                visit(arg[2])
+                close_run()
+            else:
+                close_run()
+
+    visit(parsed)
+    close_run()
+    return runs
+
+
+# Categorías de clase (`\w`, `\d`, `\S`) que nunca incluyen el salto de línea.
+_LINE_CATEGORIES = {
+    sre_constants.CATEGORY_WORD,
+    sre_constants.CATEGORY_DIGIT,
+    sre_constants.CATEGORY_NOT_SPACE,
+    sre_constants.CATEGORY_NOT_LINEBREAK,
+}
+
+
+def line_bounded(pattern: str, flags: int = 0) -> bool:
+    r"""True si ninguna coincidencia de `pattern` puede cruzar un salto de línea.
+
+    Entonces basta con evaluar la expresión línea a línea. El análisis es
+    conservador: ante `\n`, `\s`, clases negadas, `.` con DOTALL, `\A`/`\Z`
+    o cualquier construcción desconocida devuelve False.
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return False
+    c = sre_constants
+
+    def bounded_set(items) -> bool:
+        for op, arg in items:
+            if op is c.LITERAL and arg == 10:
+                return False
+            if op is c.RANGE and arg[0] <= 10 <= arg[1]:
+                return False
+            if op is c.NEGATE or (op is c.CATEGORY and arg not in _LINE_CATEGORIES):
+                return False
+        return True
+
+    def bounded(items, dotall: bool) -> bool:
+        for op, arg in items:
+            if op is c.LITERAL:
+                ok = arg != 10
+            elif op is c.NOT_LITERAL:
+                ok = arg == 10
+            elif op is c.ANY:
+                ok = not dotall
+            elif op is c.IN:
+                ok = bounded_set(arg)
+            elif op is c.AT:
+                ok = arg not in (c.AT_BEGINNING_STRING, c.AT_END_STRING)
+            elif op is c.SUBPATTERN:
+                ok = bounded(
+                    arg[-1], (dotall or arg[1] & re.DOTALL) and not arg[2] & re.DOTALL
+                )
+            elif op is c.BRANCH:
+                ok = all(bounded(branch, dotall) for branch in arg[1])
+            elif op in (c.MAX_REPEAT, c.MIN_REPEAT) or op.name == "POSSESSIVE_REPEAT":
+                ok = bounded(arg[2], dotall)
+            elif op in (c.ASSERT, c.ASSERT_NOT):
+                ok = bounded(arg[1], dotall)
+            elif op.name == "ATOMIC_GROUP":
+                ok = bounded(arg, dotall)
+            elif op is c.GROUPREF:
+                # Repite el texto de un grupo, que ya se comprueba aparte.
+                ok = True
+            else:
+                ok = False
+            if not ok:
+                return False
+        return True
+
+    return bounded(parsed, bool(parsed.state.flags & re.DOTALL))
+
+
+def required_literal(pattern: str, flags: int = 0) -> bytes:
+    """El más largo de `required_literals` (b"" si no hay ninguno)."""
+    return max(required_literals(pattern, flags), key=len, default=b"")
+
+
+def include_matcher(include: str):
+    """Función nombre -> bool para el glob `include` (admite `*.{ts,tsx}`)."""
+    if not include or include == "*":
+        return lambda name: True
+    regex = re.compile("|".join(fnmatch.translate(p) for p in expand_braces(include)))
+    return lambda name: regex.match(name) is not None
+
+
+def _read_buffer(path: str):
+    """Contenido del archivo como buffer: bytes o mmap para archivos grandes."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return f.read()
+
+
+def search_file(
+    path: str,
+    regex,
+    literal: bytes = b"",
+    max_matches: int = SEARCH_MAX_MATCHES_PER_FILE,
+    per_line: bool = False,
+) -> list:
+    """Busca `regex` (de texto, MULTILINE) en todo el archivo de una vez.
+
+    Devuelve [(número de línea, línea)] con como mucho `max_matches`
+    coincidencias (una por línea). Los binarios y los archivos que no contienen
+    el literal obligatorio (en UTF-8) se descartan sin decodificarlos ni
+    ejecutar la expresión regular. Con `per_line` (ver `line_bounded`) solo se
+    decodifican las líneas que contienen el literal.
+    """
+    try:
+        buffer = _read_buffer(path)
+    except (OSError, ValueError):
+        return []
+    try:
+        if b"\0" in buffer[:BINARY_SNIFF_BYTES]:
+            return []
+        if literal and buffer.find(literal) == -1:
+            return []
+        if literal and per_line:
+            return _search_lines(buffer, regex, literal, max_matches)
+        # La expresión se evalúa sobre el texto decodificado para que las
+        # clases, rangos y mayúsculas funcionen con caracteres no ASCII.
+        text = str(buffer, "utf-8", errors="replace")
+    finally:
+        if isinstance(buffer, mmap.mmap):
+            buffer.close()
+    return _search_text(text, regex, max_matches)
+
+
+def _search_lines(buffer, regex, literal: bytes, max_matches: int) -> list:
+    """Evalúa `regex` solo en las líneas del buffer que contienen `literal`."""
+    matches = []
+    line_no, counted_upto = 1, 0
+    found = buffer.find(literal)
+    while found != -1 and len(matches) < max_matches:
+        line_start = buffer.rfind(b"\n", 0, found) + 1
+        line_end = buffer.find(b"\n", found)
+        if line_end == -1:
+            line_end = len(buffer)
+        line = str(buffer[line_start:line_end], "utf-8", errors="replace")
+        match = regex.search(line)
+        if match is not None:
+            # mmap no tiene count(): se cuenta sobre una copia sin decodificar.
+            line_no += buffer[counted_upto:line_start].count(b"\n")
+            counted_upto = line_start
+            matches.append((line_no, _excerpt(line, match.start(), 0, len(line))))
+        found = buffer.find(literal, line_end + 1)
+    return matches
+
+
+def _excerpt(text: str, start: int, line_start: int, line_end: int) -> str:
+    # En líneas muy largas (código minificado) se muestra un extracto
+    # alrededor de la coincidencia.
+    excerpt_start = max(line_start, start - SEARCH_MAX_LINE_CHARS // 2)
+    excerpt_end = min(line_end, excerpt_start + SEARCH_MAX_LINE_CHARS)
+    return text[excerpt_start:excerpt_end].strip()
+
+
+def _search_text(text: str, regex, max_matches: int) -> list:
+    matches = []
+    line_no, counted_upto = 1, 0
+    position = 0
+    end = len(text)
+    while position <= end and len(matches) < max_matches:
+        match = regex.search(text, position)
+        if match is None:
+            break
+        start = match.start()
+        line_no += text.count("\n", counted_upto, start)
+        counted_upto = start
+        line_start = text.rfind("\n", 0, start) + 1
+        line_end = text.find("\n", start)
+        if line_end == -1:
+            line_end = end
+        matches.append((line_no, _excerpt(text, start, line_start, line_end)))
+        # Una coincidencia por línea: se continúa en la línea siguiente.
+        position = line_end + 1
+    return matches
+
+
+def _search_batch(
+    paths: list, regex, literal: bytes, max_matches: int, per_line: bool
+) -> list:
+    return [
+        search_file(path, regex, literal, max_matches, per_line) for path in paths
+    ]
+
+
+def iter_search(
+    pattern: str,
+    root: str,
+    include: str = "*",
+    max_results: int = SEARCH_MAX_RESULTS,
+    max_matches_per_file: int = SEARCH_MAX_MATCHES_PER_FILE,
+    workers: int = SEARCH_WORKERS,
+    candidates=None,
+):
+    """Produce (ruta, línea, texto) a medida que se encuentran coincidencias.
+
+    Los archivos se reparten entre `workers` hilos con una ventana acotada, y
+    los resultados se emiten en el orden del recorrido (determinista). La
+    búsqueda se detiene en cuanto se alcanzan `max_results` coincidencias.
+    `candidates` permite sustituir el recorrido por una lista de rutas.
+    Lanza re.error si el patrón no es válido.
+    """
+    regex = re.compile(pattern, re.MULTILINE)
+    literal = required_literal(pattern)
+    per_line = bool(literal) and line_bounded(pattern, re.MULTILINE)
+    if candidates is None:
+        matches_name = include_matcher(include)
+        candidates = (
+            entry.path for entry in walk_files(root) if matches_name(entry.name)
+        )
+
+    emitted = 0
+    window = deque()
+    pending = iter(candidates)
+    exhausted = False
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            while True:
+                while not exhausted and len(window) < workers * 2:
+                    # Los archivos se envían por lotes para amortizar el coste
+                    # de cada tarea del pool frente a archivos pequeños.
+                    batch = list(islice(pending, SEARCH_BATCH_SIZE))
+                    if len(batch) < SEARCH_BATCH_SIZE:
+                        exhausted = True
+                    if batch:
+                        future = pool.submit(
+                            _search_batch,
+                            batch,
+                            regex,
+                            literal,
+                            max_matches_per_file,
+                            per_line,
+                        )
+                        window.append((batch, future))
+                if not window:
+                    return
+                batch, future = window.popleft()
+                for path, matches in zip(batch, future.result()):
+                    for line_no, text in matches:
+                        yield path, line_no, text
+                        emitted += 1
+                        if emitted >= max_results:
+                            return
+        finally:
+            for _, future in window:
+                future.cancel()
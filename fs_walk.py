@@ -0,0 +1,225 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# Directorios que nunca se recorren: control de versiones, entornos virtuales y cachés.
+PRUNED_DIRS = frozenset({
+    ".git",
+    ".hg",
+    ".svn",
+    "node_modules",
+    "__pycache__",
+    "venv",
+    ".venv",
+    ".tox",
+    ".nox",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".ruff_cache",
+})
+IGNORE_FILE = ".gitignore"
+DIR_CACHE_ENTRIES = int(os.environ.get("AGENT_DIR_CACHE_ENTRIES", "4096"))
+
+
+def expand_braces(pattern: str) -> list:
+    """Expande `*.{ts,tsx}` en ['*.ts', '*.tsx'] (fnmatch no lo soporta)."""
+    match = re.search(r"\{([^{}]*)\}", pattern)
+    if match is None:
+        return [pattern]
+    head, tail = pattern[:match.start()], pattern[match.end():]
+    expanded = []
+    for option in match.group(1).split(","):
+        expanded.extend(expand_braces(head + option + tail))
+    return expanded
+
+
+def translate_glob(pattern: str) -> str:
+    """Traduce un glob con `**` a una expresión regular sobre rutas con '/'."""
+    i, n = 0, len(pattern)
+    parts = []
+    while i < n:
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif char == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif char == "?":
+            parts.append("[^/]")
+            i += 1
+        elif char == "[":
+            start = i + 2 if pattern[i + 1:i + 2] in ("!", "]") else i + 1
+            end = pattern.find("]", start)
+            if end == -1:
+                parts.append(re.escape(char))
+                i += 1
+                continue
+            body = pattern[i + 1:end].replace("\\", "\\\\")
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append(f"[{body}]")
+            i = end + 1
+        else:
+            parts.append(re.escape(char))
+            i += 1
+    return "".join(parts)
+
+
+class IgnoreRules:
+    """Reglas de un `.gitignore`, relativas al directorio que lo contiene.
+
+    Soporta comentarios, negaciones (`!`), patrones solo para directorios
+    (`/` final), patrones anclados (con `/`) y `**`. Gana la última regla que
+    coincide, como en git.
+    """
+
+    def __init__(self, base: str, lines):
+        self.base = base
+        self._prefix = base if base.endswith(os.sep) else base + os.sep
+        self._rules = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate or line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            if anchored:
+                regex = re.compile(translate_glob(line.lstrip("/")) + r"(?:/.*)?\Z")
+            else:
+                regex = re.compile(translate_glob(line) + r"\Z")
+            self._rules.append((regex, negate, dir_only, anchored))
+
+    @classmethod
+    def load(cls, directory: str):
+        """Reglas del `.gitignore` de `directory`, o None si no existe."""
+        try:
+            path = os.path.join(directory, IGNORE_FILE)
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                rules = cls(directory, f)
+        except OSError:
+            return None
+        return rules if rules._rules else None
+
+    def match(self, path: str, is_dir: bool):
+        """True (ignorado), False (re-incluido con `!`) o None si no aplica ninguna."""
+        relative = path[len(self._prefix):].replace(os.sep, "/")
+        name = relative.rsplit("/", 1)[-1]
+        result = None
+        for regex, negate, dir_only, anchored in self._rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative if anchored else name):
+                result = not negate
+        return result
+
+
+def is_ignored(path: str, is_dir: bool, rule_stack: list) -> bool:
+    ignored = False
+    for rules in rule_stack:
+        decision = rules.match(path, is_dir)
+        if decision is not None:
+            ignored = decision
+    return ignored
+
+
+class DirectoryCache:
+    """Caché LRU de listados de directorio validada por el mtime del directorio.
+
+    Crear, borrar o renombrar una entrada cambia el mtime del directorio, así
+    que un `stat` basta para saber si el listado guardado sigue siendo válido
+    y ahorra el `scandir` completo en recorridos repetidos. Los `DirEntry`
+    guardados no deben usarse para consultar mtime o tamaño actualizados.
+    """
+
+    def __init__(self, max_entries: int = DIR_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def list(self, directory: str) -> list:
+        mtime = os.stat(directory).st_mtime_ns
+        with self._lock:
+            cached = self._entries.get(directory)
+            if cached is not None and cached[0] == mtime:
+                self._entries.move_to_end(directory)
+                return cached[1]
+        entries = _scan(directory)
+        with self._lock:
+            self._entries[directory] = (mtime, entries)
+            self._entries.move_to_end(directory)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entries
+
+
+def _scan(directory: str) -> list:
+    with os.scandir(directory) as it:
+        return sorted(it, key=lambda e: e.name)
+
+
+def walk_files(
+    root: str,
+    use_ignore_files: bool = True,
+    pruned_dirs=PRUNED_DIRS,
+    dir_filter=None,
+    include_dirs: bool = False,
+    include_hidden: bool = True,
+    cache: DirectoryCache = None,
+):
+    """Recorre `root` con `os.scandir` y produce un `os.DirEntry` por archivo.
+
+    Poda los directorios de `pruned_dirs`, los entornos virtuales (con
+    `pyvenv.cfg`) y, si `use_ignore_files`, lo que excluyan los `.gitignore`
+    encontrados por el camino. `dir_filter(ruta)` permite podar más
+    subárboles. Con `include_dirs` también se producen los directorios; sin
+    `include_hidden` se omiten las entradas que empiezan por '.'. No sigue
+    enlaces simbólicos a directorios.
+    """
+    root = os.path.normpath(root)
+    root_rules = IgnoreRules.load(root) if use_ignore_files else None
+    stack = [(root, [root_rules] if root_rules else [])]
+    while stack:
+        directory, rule_stack = stack.pop()
+        try:
+            entries = cache.list(directory) if cache is not None else _scan(directory)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            if not include_hidden and entry.name.startswith("."):
+                continue
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name in pruned_dirs:
+                    continue
+                if rule_stack and is_ignored(entry.path, True, rule_stack):
+                    continue
+                if include_dirs:
+                    yield entry
+                if dir_filter is not None and not dir_filter(entry.path):
+                    continue
+                if os.path.exists(os.path.join(entry.path, "pyvenv.cfg")):
+                    continue
+                subdirs.append(entry.path)
+            elif entry.is_file():
+                if rule_stack and is_ignored(entry.path, False, rule_stack):
+                    continue
+                yield entry
+        # Orden estable: los subdirectorios se visitan alfabéticamente.
+        for subdir in reversed(subdirs):
+            rules = IgnoreRules.load(subdir) if use_ignore_files else None
+            stack.append((subdir, rule_stack + [rules] if rules else rule_stack))
@@ -0,0 +1,24 @@
+# Configuración de Gunicorn para servir PyAgent en modo streaming.
+#
+# Con el worker `gevent` cada conexión es un greenlet: un stream de varios
+# minutos esperando al modelo no ocupa un worker entero, de modo que un solo
+# proceso atiende cientos de streams concurrentes.
+#
+# Uso: gunicorn -c gunicorn.conf.py agent_server:app
+import os
+
+bind = os.environ.get("AGENT_BIND", "127.0.0.1:5000")
+worker_class = os.environ.get("AGENT_WORKER_CLASS", "gevent")
+workers = int(os.environ.get("AGENT_WORKERS", "1"))
+worker_connections = int(os.environ.get("AGENT_WORKER_CONNECTIONS", "1000"))
+# Los streams largos no deben confundirse con un worker colgado.
+timeout = int(os.environ.get("AGENT_WORKER_TIMEOUT", "300"))
+keepalive = 75
+
+
+def post_worker_init(worker):
+    # Logs en una cola con un hilo escritor (el stream nunca espera al disco). Se
+    # configura en cada worker: el hilo escritor no sobrevive al fork.
+    from log_pipeline import setup_logging
+
+    setup_logging()
@@ -0,0 +1,168 @@
+import os
+
+# --- CONFIGURACIÓN ---
+CONTEXT_TOKENS = int(os.environ.get("AGENT_CONTEXT_TOKENS", "8192"))
+MIN_RECENT_LINES = 2
+SUMMARY_LINE_CHARS = 200
+SUMMARY_OBSERVATION_CHARS = 120
+OBSERVATION_PREFIX = "Observación de Herramienta:"
+SUMMARY_HEADER = "Resumen de la conversación anterior:"
+TRUNCATION_MARK = "\n[…contenido recortado…]\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata de tokens (~4 caracteres por token)."""
+    return len(text) // 4 + 1
+
+
+def fit_text(text: str, budget: int, tokenizer=estimate_tokens) -> str:
+    """Recorta `text` por el centro hasta que quepa en `budget` tokens."""
+    if budget <= 0:
+        return ""
+    if tokenizer(text) <= budget:
+        return text
+    # Aproximación proporcional a partir de la estimación inicial.
+    max_chars = max(int(len(text) * budget / tokenizer(text)) - len(TRUNCATION_MARK), 0)
+    while True:
+        head = max_chars // 2
+        tail = max_chars - head
+        fitted = text[:head] + TRUNCATION_MARK + (text[-tail:] if tail else "")
+        if tokenizer(fitted) <= budget or max_chars == 0:
+            return fitted
+        max_chars = int(max_chars * 0.9)
+
+
+def extractive_summarizer(previous_summary: str, lines: list) -> str:
+    """Resumen sin modelo: conserva el inicio de cada turno y abrevia observaciones."""
+    parts = [previous_summary] if previous_summary else []
+    for line in lines:
+        if line.startswith(OBSERVATION_PREFIX):
+            body = line[len(OBSERVATION_PREFIX):].strip()
+            snippet = body[:SUMMARY_OBSERVATION_CHARS]
+            ellipsis = "…" if len(body) > len(snippet) else ""
+            parts.append(f"- Herramienta ({len(body)} caracteres): {snippet}{ellipsis}")
+        else:
+            snippet = line[:SUMMARY_LINE_CHARS]
+            ellipsis = "…" if len(line) > len(snippet) else ""
+            parts.append(f"- {snippet}{ellipsis}")
+    return "\n".join(parts)
+
+
+def make_model_summarizer(generate):
+    """Crea un resumidor que delega en el modelo (`generate(prompt) -> str`)."""
+
+    def summarize(previous_summary: str, lines: list) -> str:
+        new_turns = "\n".join(lines)
+        prompt = f"""Actualiza el resumen de una conversación entre un usuario y el \
+asistente PyAgent.
+Conserva decisiones, rutas de archivos, resultados de herramientas y tareas \
+pendientes. Responde solo con el resumen actualizado, en español.
+
+### RESUMEN ACTUAL ###
+{previous_summary or "(vacío)"}
+
+### TURNOS NUEVOS ###
+{new_turns}
+"""
+        summary = generate(prompt).strip()
+        return summary or extractive_summarizer(previous_summary, lines)
+
+    return summarize
+
+
+class PromptBudget:
+    """Reparto del contexto del modelo entre las secciones del prompt (en tokens).
+
+    Con `tools_tokens` (el tamaño real del manifiesto) las herramientas reciben
+    exactamente eso y el resto del contexto se reparte entre las demás
+    secciones en la proporción de sus cuotas; `tools` se ignora.
+    """
+
+    def __init__(
+        self,
+        total: int = CONTEXT_TOKENS,
+        memory: float = 0.15,
+        tools: float = 0.25,
+        history: float = 0.45,
+        task: float = 0.15,
+        summary: float = 0.25,
+        tools_tokens: int = None,
+    ):
+        self.total = total
+        if tools_tokens is not None:
+            self.tools = min(tools_tokens, total)
+            scale = (total - self.tools) / (total * (memory + history + task))
+            memory, history, task = memory * scale, history * scale, task * scale
+        else:
+            self.tools = int(total * tools)
+        self.memory = int(total * memory)
+        self.history = int(total * history)
+        self.task = int(total * task)
+        # Parte del presupuesto del historial reservada para el resumen.
+        self.summary = int(self.history * summary)
+
+
+class HistoryManager:
+    """Compacta el historial para que quepa en el presupuesto de tokens.
+
+    Los turnos recientes se conservan literalmente; los antiguos se pliegan en
+    un resumen que se actualiza de forma incremental. El estado de compactación
+    (`summary`, `compacted_upto`) se guarda por conversación, de modo que cada
+    tramo del historial se resume una sola vez.
+    """
+
+    def __init__(
+        self,
+        budget: PromptBudget = None,
+        tokenizer=estimate_tokens,
+        summarizer=extractive_summarizer,
+    ):
+        self.budget = budget or PromptBudget()
+        self.tokenizer = tokenizer
+        self.summarizer = summarizer
+
+    def fit_memory(self, long_term_memory: str) -> str:
+        return fit_text(long_term_memory, self.budget.memory, self.tokenizer)
+
+    def fit_task(self, user_request: str) -> str:
+        return fit_text(user_request, self.budget.task, self.tokenizer)
+
+    def compact(self, lines: list, state: dict = None):
+        """Devuelve (líneas para el prompt, nuevo estado de compactación)."""
+        state = dict(state or {})
+        summary = state.get("summary", "")
+        compacted_upto = state.get("compacted_upto", 0)
+        if compacted_upto > len(lines):
+            # El historial ya no es el que se resumió: se empieza de cero.
+            summary, compacted_upto = "", 0
+
+        total = sum(self.tokenizer(line) for line in lines)
+        if not summary and total <= self.budget.history:
+            return list(lines), {"summary": "", "compacted_upto": 0}
+
+        # Turnos recientes desde el final, sin bajar nunca de lo ya resumido.
+        recent_budget = self.budget.history - self.budget.summary
+        keep_from = len(lines)
+        used = 0
+        while keep_from > compacted_upto:
+            cost = self.tokenizer(lines[keep_from - 1])
+            if (
+                used + cost > recent_budget
+                and len(lines) - keep_from >= MIN_RECENT_LINES
+            ):
+                break
+            used += cost
+            keep_from -= 1
+
+        if keep_from > compacted_upto:
+            summary = self.summarizer(summary, lines[compacted_upto:keep_from])
+            summary = fit_text(summary, self.budget.summary, self.tokenizer)
+            compacted_upto = keep_from
+
+        per_line = max(recent_budget // MIN_RECENT_LINES, 1)
+        recent = [
+            line if used <= recent_budget else fit_text(line, per_line, self.tokenizer)
+            for line in lines[keep_from:]
+        ]
+        rendered = ([f"{SUMMARY_HEADER}\n{summary}"] if summary else []) + recent
+        return rendered, {"summary": summary, "compacted_upto": compacted_upto}
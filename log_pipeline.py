@@ -0,0 +1,149 @@
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+from metrics import Counter, TraceIdFilter, current_trace
+
+# --- CONFIGURACIÓN ---
+LOG_FILE = os.environ.get(
+    "AGENT_LOG_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent_server_debug.log"),
+)
+LOG_LEVEL = os.environ.get("AGENT_LOG_LEVEL", "INFO").upper()
+# Rotación del archivo de log: tamaño máximo y número de copias.
+LOG_MAX_BYTES = int(os.environ.get("AGENT_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.environ.get("AGENT_LOG_BACKUPS", "5"))
+# Registros pendientes de escribir; con la cola llena se descartan (nunca se espera).
+LOG_QUEUE_SIZE = int(os.environ.get("AGENT_LOG_QUEUE_SIZE", "10000"))
+# Fracción de peticiones cuyos textos (mensajes, prompts, resultados) se
+# registran completos; en el resto solo su longitud y un hash.
+LOG_BODY_SAMPLE_RATE = float(os.environ.get("AGENT_LOG_BODY_SAMPLE_RATE", "0"))
+CONSOLE_FORMAT = "%(asctime)s - %(levelname)s - [%(trace_id)s] %(message)s"
+
+LOG_RECORDS_DROPPED = Counter(
+    "pyagent_log_records_dropped_total",
+    "Registros de log descartados por la cola llena.",
+    ("level",),
+)
+
+# Atributos propios de LogRecord; el resto son campos pasados con `extra`.
+_RECORD_ATTRIBUTES = frozenset(
+    vars(logging.LogRecord("", 0, "", 0, "", None, None))
+) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro, con el id de traza y los campos de `extra`."""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+            + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Encola el registro sin bloquear; si la cola está llena lo descarta y lo cuenta.
+
+    El formateo y la escritura ocurren en el hilo de `QueueListener`; aquí
+    solo se añade el id de traza, que depende del hilo que registra.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.addFilter(TraceIdFilter())
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(level=record.levelname)
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Al detenerse con la cola llena se espera a que el escritor haga sitio.
+        self.queue.put(self._sentinel)
+
+
+def bodies_sampled() -> bool:
+    """Si los textos de la petición en curso se registran completos.
+
+    Se decide una vez por traza.
+    """
+    if LOG_BODY_SAMPLE_RATE <= 0:
+        return False
+    trace = current_trace()
+    if trace is None:
+        return random.random() < LOG_BODY_SAMPLE_RATE
+    if trace.log_bodies is None:
+        trace.log_bodies = random.random() < LOG_BODY_SAMPLE_RATE
+    return trace.log_bodies
+
+
+def body(text) -> str:
+    """`text` completo si la petición está muestreada; si no, longitud y hash corto."""
+    if not isinstance(text, str):
+        text = json.dumps(text, ensure_ascii=False, default=str)
+    if bodies_sampled():
+        return text
+    digest = hashlib.sha256(text.encode("utf-8", "replace")).hexdigest()[:12]
+    return f"<{len(text)} car., sha256 {digest}>"
+
+
+def setup_logging(log_file: str = LOG_FILE, level: str = LOG_LEVEL):
+    """Sustituye los manejadores del logger raíz por una cola con un hilo escritor.
+
+    El archivo recibe líneas JSON y rota por tamaño; la consola, texto legible.
+    Devuelve el `QueueListener`, que se detiene (vaciando la cola) al salir.
+    No se llama al importar: lo hace el punto de entrada del servidor (el
+    hook `post_worker_init` de gunicorn.conf.py).
+    """
+    handlers = [logging.StreamHandler(sys.stdout)]
+    handlers[0].setFormatter(logging.Formatter(CONSOLE_FORMAT))
+    file_error = None
+    try:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8"
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    except OSError as e:
+        file_error = e
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener = _Listener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    if file_error is not None:
+        logging.getLogger(__name__).warning(
+            f"No se pudo abrir el archivo de log {log_file}: {file_error}; "
+            "solo se registra en la consola."
+        )
+    return listener
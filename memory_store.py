@@ -0,0 +1,447 @@
+import fcntl
+import heapq
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+import uuid
+from collections import Counter
+
+# --- CONFIGURACIÓN ---
+# Entradas relevantes (además de las fijas) que se inyectan en cada petición.
+MEMORY_TOP_K = int(os.environ.get("AGENT_MEMORY_TOP_K", "6"))
+# Secciones que se incluyen siempre, en la parte fija del prompt.
+MEMORY_PINNED_SECTIONS = tuple(
+    s.strip()
+    for s in os.environ.get("AGENT_MEMORY_PINNED", "Directivas Generales").split(",")
+    if s.strip()
+)
+MEMORY_DEFAULT_SECTION = "Notas Adicionales"
+# Longitud máxima del texto de una entrada.
+MEMORY_ENTRY_MAX_CHARS = 2000
+# El registro se compacta cuando las líneas obsoletas (olvidadas o duplicadas)
+# superan este número y a las vivas; se comprueba tras cada escritura y al leer
+# el registro.
+MEMORY_COMPACT_MIN_GARBAGE = 64
+# Parámetros de BM25.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_STOPWORDS = frozenset(
+    "a al algo ante como con cual cuando de del desde donde el ella en entre era es "
+    "esa ese eso esta este esto fue ha hay la las le les lo los mas me mi muy ni no "
+    "nos o para pero por que se ser si sin sobre su sus tambien te tu un una uno "
+    "unos y ya the and or of to in is it for on with".split()
+)
+
+
+def tokenize(text: str) -> list:
+    """Términos normalizados (minúsculas, sin acentos ni plural simple) de `text`."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    terms = []
+    for word in re.findall(r"\w+", text):
+        if len(word) < 2 or word in _STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith("es"):
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith("s"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+class BM25Index:
+    """Índice invertido en memoria con puntuación BM25 y altas/bajas incrementales."""
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}
+        self._lengths = {}
+        # Términos de cada documento: una baja solo toca sus propias listas.
+        self._doc_terms = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def add(self, doc_id: str, terms: list):
+        self.remove(doc_id)
+        counts = Counter(terms)
+        for term, count in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = count
+        self._doc_terms[doc_id] = tuple(counts)
+        self._lengths[doc_id] = len(terms)
+        self._total_length += len(terms)
+
+    def remove(self, doc_id: str):
+        length = self._lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in self._doc_terms.pop(doc_id):
+            del self._postings[term][doc_id]
+            if not self._postings[term]:
+                del self._postings[term]
+
+    def search(self, terms: list, k: int, exclude=()) -> list:
+        """[(-puntuación, doc_id)] de los `k` documentos con puntuación > 0.
+
+        Ordenados de mayor a menor puntuación.
+        """
+        n = len(self._lengths)
+        if not n or k <= 0:
+            return []
+        average = self._total_length / n or 1
+        scores = {}
+        for term in set(terms):
+            docs = self._postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                if doc_id in exclude:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average)
+                score = idf * tf * (self.k1 + 1) / (tf + norm)
+                scores[doc_id] = scores.get(doc_id, 0.0) + score
+        return heapq.nsmallest(
+            k, ((-score, doc_id) for doc_id, score in scores.items())
+        )
+
+
+def parse_markdown(text: str) -> list:
+    """[(sección, texto)] de un archivo de memoria en Markdown.
+
+    Cada entrada es una viñeta bajo un encabezado `## Sección`.
+
+    Se omiten los marcadores de ejemplo entre corchetes de la plantilla.
+    """
+    entries = []
+    section = MEMORY_DEFAULT_SECTION
+    current = None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("## "):
+            section, current = stripped[3:].strip(), None
+        elif not stripped or stripped.startswith("# "):
+            current = None
+        elif stripped.startswith(("- ", "* ")):
+            current = [section, stripped[2:].strip()]
+            entries.append(current)
+        elif current is not None and line[:1].isspace():
+            current[1] += " " + stripped
+        else:
+            current = [section, stripped]
+            entries.append(current)
+    return [
+        (section, text) for section, text in entries
+        if text and not (text.startswith("[") and text.endswith("]"))
+    ]
+
+
+class MemoryStore:
+    """Memoria a largo plazo como registro JSONL de solo anexado.
+
+    Cada línea es una operación: `{"op": "add", "id", "section", "text", "ts"}`
+    o `{"op": "forget", "id", "ts"}`. Las escrituras toman un cerrojo de
+    archivo (`<registro>.lock`), de modo que varios procesos del servidor
+    pueden anexar a la vez; cada proceso lee solo los bytes nuevos desde su
+    última lectura y actualiza su índice BM25 de forma incremental. La
+    compactación reescribe el registro con las entradas vivas (temporal +
+    rename atómico); los lectores la detectan por el cambio de inodo.
+
+    Si el registro no existe se siembra con el archivo Markdown heredado.
+    """
+
+    def __init__(self, path: str, legacy_path: str = None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._index = BM25Index()
+        self._identity = None
+        self._offset = 0
+        self._lines = 0
+        self.stats_counters = {
+            "appends": 0, "searches": 0, "compactions": 0, "reloads": 0
+        }
+
+    # --- Lectura ---
+
+    def entries(self) -> list:
+        """Entradas vivas en orden de creación."""
+        with self._lock:
+            self._seed()
+            self._sync()
+            self._maybe_compact()
+            return sorted(self._entries.values(), key=lambda e: (e["ts"], e["id"]))
+
+    def pinned(self) -> list:
+        return [e for e in self.entries() if e["section"] in MEMORY_PINNED_SECTIONS]
+
+    def search(self, query: str, k: int = MEMORY_TOP_K) -> list:
+        """Las `k` entradas no fijas más relevantes para `query`, de mayor a menor."""
+        with self._lock:
+            self._seed()
+            self._sync()
+            self._maybe_compact()
+            self.stats_counters["searches"] += 1
+            pinned = {
+                i
+                for i, e in self._entries.items()
+                if e["section"] in MEMORY_PINNED_SECTIONS
+            }
+            ranked = self._index.search(tokenize(query), k, pinned)
+            return [self._entries[doc_id] for _, doc_id in ranked]
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._seed()
+            self._sync()
+            return {
+                "entries": len(self._entries),
+                "log_lines": self._lines,
+                "log_bytes": self._offset,
+                **self.stats_counters,
+            }
+
+    # --- Escritura ---
+
+    def append(self, text: str, section: str = MEMORY_DEFAULT_SECTION) -> dict:
+        """Añade una entrada; si la sección ya tiene el mismo texto, devuelve esa."""
+        text = " ".join(text.split())[:MEMORY_ENTRY_MAX_CHARS]
+        section = " ".join(section.split()) or MEMORY_DEFAULT_SECTION
+        if not text:
+            raise ValueError("El contenido de la memoria no puede estar vacío.")
+        with self._lock:
+            self._seed()
+            with self._file_lock():
+                self._sync()
+                for entry in self._entries.values():
+                    if entry["section"] == section and entry["text"] == text:
+                        return entry
+                record = {
+                    "op": "add",
+                    "id": uuid.uuid4().hex[:8],
+                    "section": section,
+                    "text": text,
+                    "ts": time.time(),
+                }
+                self._write([record])
+                self.stats_counters["appends"] += 1
+                self._sync()
+                self._maybe_compact_locked()
+                return self._entries[record["id"]]
+
+    def forget(self, entry_id: str) -> bool:
+        """Marca una entrada como olvidada; False si no existe."""
+        with self._lock:
+            self._seed()
+            with self._file_lock():
+                self._sync()
+                if entry_id not in self._entries:
+                    return False
+                self._write([{"op": "forget", "id": entry_id, "ts": time.time()}])
+                self._sync()
+                self._maybe_compact_locked()
+                return True
+
+    def compact(self):
+        """Reescribe el registro solo con las entradas vivas."""
+        with self._lock:
+            self._seed()
+            with self._file_lock():
+                self._sync()
+                self._compact_locked()
+
+    # --- Utilidades ---
+
+    def _file_lock(self):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        return _FileLock(f"{self.path}.lock")
+
+    def _write(self, records: list):
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        data = data.encode("utf-8")
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _needs_compaction(self) -> bool:
+        garbage = self._lines - len(self._entries)
+        return garbage > max(MEMORY_COMPACT_MIN_GARBAGE, len(self._entries))
+
+    def _maybe_compact(self):
+        """Compacta al leer si el registro cargado tiene demasiadas líneas obsoletas.
+
+        Requiere self._lock pero no el cerrojo de archivo, que se toma aquí.
+        """
+        if not self._needs_compaction():
+            return
+        with self._file_lock():
+            self._sync()
+            self._maybe_compact_locked()
+
+    def _maybe_compact_locked(self):
+        if self._needs_compaction():
+            self._compact_locked()
+
+    def _compact_locked(self):
+        entries = sorted(self._entries.values(), key=lambda e: (e["ts"], e["id"]))
+        records = [{"op": "add", **e} for e in entries]
+        self._replace_log(records)
+        self.stats_counters["compactions"] += 1
+        self._sync()
+
+    def _replace_log(self, records: list):
+        directory, name = os.path.split(self.path)
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f".{name}.", suffix=".tmp", dir=directory or "."
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as out:
+                for record in records:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _seed(self):
+        """Crea el registro a partir del Markdown heredado si aún no existe."""
+        if (
+            os.path.exists(self.path)
+            or not self.legacy_path
+            or not os.path.exists(self.legacy_path)
+        ):
+            return
+        with self._file_lock():
+            if not os.path.exists(self.path):
+                self._seed_locked()
+
+    def _seed_locked(self):
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                parsed = parse_markdown(f.read())
+        except OSError:
+            return
+        now = time.time()
+        self._replace_log([
+            {
+                "op": "add",
+                "id": uuid.uuid4().hex[:8],
+                "section": section,
+                "text": text,
+                "ts": now + i * 1e-6,
+            }
+            for i, (section, text) in enumerate(parsed)
+        ])
+
+    def _sync(self):
+        """Aplica las líneas nuevas del registro (requiere self._lock)."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self._identity is not None:
+                self._entries, self._index = {}, BM25Index()
+                self._identity, self._offset, self._lines = None, 0, 0
+            return
+        identity = (st.st_dev, st.st_ino)
+        if identity != self._identity or st.st_size < self._offset:
+            # Registro nuevo o compactado por otro proceso: se relee entero.
+            self._entries, self._index = {}, BM25Index()
+            self._identity, self._offset, self._lines = identity, 0, 0
+            self.stats_counters["reloads"] += 1
+        if st.st_size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(st.st_size - self._offset)
+        # Una línea a medio escribir se deja para la próxima lectura.
+        complete = data[:data.rfind(b"\n") + 1]
+        self._offset += len(complete)
+        for line in complete.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            self._lines += 1
+            self._apply(record)
+
+    def _apply(self, record: dict):
+        if record.get("op") == "add" and record.get("id") and record.get("text"):
+            entry = {
+                "id": record["id"],
+                "section": record.get("section") or MEMORY_DEFAULT_SECTION,
+                "text": record["text"],
+                "ts": record.get("ts", 0),
+            }
+            self._entries[entry["id"]] = entry
+            self._index.add(
+                entry["id"], tokenize(f"{entry['section']} {entry['text']}")
+            )
+        elif record.get("op") == "forget":
+            self._entries.pop(record.get("id"), None)
+            self._index.remove(record.get("id"))
+
+
+class _FileLock:
+    """Cerrojo exclusivo entre procesos (flock) sobre un archivo auxiliar."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+
+def render(entries: list) -> str:
+    """Entradas agrupadas por sección en Markdown, con su id para poder olvidarlas."""
+    sections = {}
+    for entry in entries:
+        sections.setdefault(entry["section"], []).append(entry)
+    return "\n\n".join(
+        f"## {section}\n" + "\n".join(f"- {e['text']} (#{e['id']})" for e in items)
+        for section, items in sections.items()
+    )
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def store_path(markdown_path: str) -> str:
+    """Ruta del registro JSONL asociado al archivo de memoria en Markdown."""
+    return os.path.splitext(markdown_path)[0] + ".jsonl"
+
+
+def memory_store_for(markdown_path: str) -> MemoryStore:
+    """Almacén (compartido por proceso) del archivo de memoria `markdown_path`."""
+    with _stores_lock:
+        store = _stores.get(markdown_path)
+        if store is None:
+            store = _stores[markdown_path] = MemoryStore(
+                store_path(markdown_path), legacy_path=markdown_path
+            )
+        return store
@@ -0,0 +1,297 @@
+import logging
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# --- CONFIGURACIÓN ---
+# Límites (segundos) de los histogramas de latencia.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300
+)
+# Límites de los histogramas de recuento (pasos del agente por petición).
+COUNT_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+# Cabecera con la que el cliente puede fijar el id de traza y en la que se devuelve.
+TRACE_HEADER = "X-Trace-Id"
+_TRACE_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+class _Metric:
+    """Métrica con etiquetas; los valores se guardan por tupla de etiquetas."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: tuple, extra: tuple = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        body = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+        return "{" + body + "}"
+
+    def samples(self) -> list:
+        with self._lock:
+            return [
+                (f"{self.name}{self._labels(key)}", value)
+                for key, value in sorted(self._values.items())
+            ]
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(f"{name} {_number(value)}" for name, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {
+                    "counts": [0] * len(self.buckets), "sum": 0.0, "count": 0
+                }
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["counts"][i] += 1
+                    break
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry["count"] if entry else 0
+
+    def samples(self) -> list:
+        samples = []
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, entry["counts"]):
+                    cumulative += count
+                    labels = self._labels(key, (("le", _number(bound)),))
+                    samples.append((f"{self.name}_bucket{labels}", cumulative))
+                labels = self._labels(key, (("le", "+Inf"),))
+                samples.append((f"{self.name}_bucket{labels}", entry["count"]))
+                samples.append((f"{self.name}_sum{self._labels(key)}", entry["sum"]))
+                samples.append(
+                    (f"{self.name}_count{self._labels(key)}", entry["count"])
+                )
+        return samples
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value) -> str:
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render_metrics() -> str:
+    """Todas las métricas en el formato de texto de Prometheus (0.0.4)."""
+    with _registry_lock:
+        metrics = list(_registry)
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# --- Métricas del agente ---
+
+REQUESTS = Counter(
+    "pyagent_requests_total", "Peticiones a /chat por resultado.", ("outcome",)
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "pyagent_requests_in_flight", "Peticiones a /chat en cola o en curso."
+)
+REQUEST_SECONDS = Histogram(
+    "pyagent_request_seconds", "Duración total de las peticiones a /chat."
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "pyagent_time_to_first_token_seconds",
+    "Desde que llega la petición hasta el primer token enviado al cliente.",
+)
+AGENT_STEPS = Histogram(
+    "pyagent_agent_loop_iterations",
+    "Pasadas del modelo por petición.",
+    buckets=COUNT_BUCKETS,
+)
+AGENT_LIMITS = Counter(
+    "pyagent_agent_limits_total",
+    "Peticiones cortadas (client_disconnect, deadline, max_steps) "
+    "y pasadas truncadas (step_tokens).",
+    ("reason",),
+)
+SPAN_SECONDS = Histogram(
+    "pyagent_span_seconds",
+    "Duración de cada fase de una petición (queue, prompt, model, step, tool...).",
+    ("span",),
+)
+MODEL_FIRST_TOKEN = Histogram(
+    "pyagent_model_first_token_seconds",
+    "Desde la llamada al modelo hasta su primer fragmento.",
+    ("mode",),
+)
+PROMPT_TOKENS = Counter(
+    "pyagent_prompt_tokens_total",
+    "Tokens de prompt evaluados (prefill) según Ollama.",
+    ("mode",),
+)
+GENERATED_TOKENS = Counter(
+    "pyagent_generated_tokens_total",
+    "Tokens generados por el modelo según Ollama.",
+    ("mode",),
+)
+MODEL_ERRORS = Counter(
+    "pyagent_model_errors_total", "Llamadas al modelo fallidas.", ("mode",)
+)
+TOOL_CALLS = Counter(
+    "pyagent_tool_calls_total",
+    "Llamadas a herramientas por resultado.",
+    ("tool", "outcome"),
+)
+TOOL_SECONDS = Histogram(
+    "pyagent_tool_seconds", "Duración de cada llamada a herramienta.", ("tool",)
+)
+# Se actualizan al servir /metrics a partir del control de admisión.
+QUEUE_DEPTH = Gauge(
+    "pyagent_queue_depth", "Peticiones esperando turno para el modelo."
+)
+MODEL_IN_FLIGHT = Gauge(
+    "pyagent_model_in_flight", "Peticiones ejecutando el bucle del agente."
+)
+
+
+# --- Trazas por petición ---
+
+class Trace:
+    """Fases de una petición: nombre → [veces, segundos acumulados]."""
+
+    def __init__(self, trace_id: str = None):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.started = time.monotonic()
+        self.spans = {}
+        # Si los textos de la petición se registran completos (lo decide log_pipeline).
+        self.log_bodies = None
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            entry = self.spans.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def summary(self) -> str:
+        with self._lock:
+            parts = [
+                f"{name} {seconds:.3f} s" + (f" ({count}x)" if count > 1 else "")
+                for name, (count, seconds) in self.spans.items()
+            ]
+        return f"total {time.monotonic() - self.started:.3f} s; " + ", ".join(parts)
+
+
+def trace_id_from(value) -> str:
+    """El id de traza enviado por el cliente si es válido; si no, uno nuevo."""
+    if value and _TRACE_ID.match(value):
+        return value
+    return uuid.uuid4().hex[:16]
+
+
+_local = threading.local()
+
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def bind_trace(trace):
+    """Asocia `trace` al hilo actual (para los spans y los registros)."""
+    previous = current_trace()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+def record_span(name: str, seconds: float):
+    SPAN_SECONDS.observe(seconds, span=name)
+    trace = current_trace()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    """Mide un bloque: histograma `pyagent_span_seconds` y traza del hilo."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        record_span(name, time.monotonic() - started)
+
+
+class TraceIdFilter(logging.Filter):
+    """Añade `trace_id` a cada registro (o "-" fuera de una petición)."""
+
+    def filter(self, record):
+        trace = current_trace()
+        record.trace_id = trace.trace_id if trace is not None else "-"
+        return True
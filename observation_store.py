@@ -0,0 +1,148 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+# --- CONFIGURACIÓN ---
+# Un resultado de herramienta más largo que esto se guarda en el servidor y al
+# prompt solo llega su principio y su final, con un identificador para paginarlo.
+OBSERVATION_PREVIEW_CHARS = int(
+    os.environ.get("AGENT_OBSERVATION_PREVIEW_CHARS", "4000")
+)
+# Caracteres de cada página de `fetch_observation`.
+OBSERVATION_PAGE_CHARS = int(os.environ.get("AGENT_OBSERVATION_PAGE_CHARS", "8000"))
+# Presupuesto en bytes de las observaciones guardadas (LRU).
+OBSERVATION_STORE_BYTES = int(
+    os.environ.get("AGENT_OBSERVATION_STORE_BYTES", str(64 * 1024 * 1024))
+)
+# Herramientas cuyo resultado ya está acotado y no se vuelve a guardar.
+OBSERVATION_EXEMPT_TOOLS = frozenset({"fetch_observation"})
+
+
+class ObservationStore:
+    """Resultados largos de herramientas guardados fuera del prompt.
+
+    `bound` sustituye un resultado largo por una vista previa (principio y
+    final, cortados en saltos de línea) y un identificador; el modelo lee el
+    resto por páginas con `fetch_observation`. Así el historial, que se
+    reenvía en cada paso, no crece con el tamaño de la salida.
+    """
+
+    def __init__(
+        self,
+        preview_chars: int = OBSERVATION_PREVIEW_CHARS,
+        page_chars: int = OBSERVATION_PAGE_CHARS,
+        budget: int = OBSERVATION_STORE_BYTES,
+    ):
+        self.preview_chars = preview_chars
+        self.page_chars = page_chars
+        self.budget = budget
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.pages_served = 0
+        self.evicted = 0
+
+    def bound(self, session_id, tool_name: str, text: str):
+        """Devuelve (texto para el prompt, identificador o None)."""
+        if len(text) <= self.preview_chars or tool_name in OBSERVATION_EXEMPT_TOOLS:
+            return text, None
+        handle = f"obs-{uuid.uuid4().hex[:10]}"
+        size = len(text.encode("utf-8"))
+        with self._lock:
+            self._entries[handle] = {
+                "session": session_id, "tool": tool_name, "text": text, "size": size
+            }
+            self._total_bytes += size
+            self.stored += 1
+            while self._total_bytes > self.budget and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+                self.evicted += 1
+        return self._preview(handle, text), handle
+
+    def page(self, session_id, handle: str, page: int = 1) -> str:
+        """Página `page` (desde 1) de una observación de la sesión `session_id`.
+
+        KeyError si no existe o pertenece a otra sesión; ValueError si la
+        página no es válida.
+        """
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is None or entry["session"] != session_id:
+                raise KeyError(handle)
+            self._entries.move_to_end(handle)
+            self.pages_served += 1
+        text = entry["text"]
+        pages = self.page_count(text)
+        if not 1 <= page <= pages:
+            raise ValueError(
+                f"la observación {handle} tiene {pages} páginas (pediste la {page})."
+            )
+        start = (page - 1) * self.page_chars
+        end = min(start + self.page_chars, len(text))
+        footer = ""
+        if page < pages:
+            footer = (
+                f"\n[Siguiente: fetch_observation con handle \"{handle}\" y page "
+                f"{page + 1}.]"
+            )
+        return (
+            f"[Observación {handle} ({entry['tool']}): página {page} de {pages}, "
+            f"caracteres {start + 1}-{end} de {len(text)}]\n{text[start:end]}{footer}"
+        )
+
+    def page_count(self, text: str) -> int:
+        return max((len(text) + self.page_chars - 1) // self.page_chars, 1)
+
+    def clear(self, session_id=None):
+        """Descarta las observaciones de una sesión (o todas)."""
+        with self._lock:
+            for handle in [
+                h
+                for h, e in self._entries.items()
+                if session_id is None or e["session"] == session_id
+            ]:
+                self._drop(handle)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "budget": self.budget,
+                "stored": self.stored,
+                "pages_served": self.pages_served,
+                "evicted": self.evicted,
+            }
+
+    # --- Utilidades ---
+
+    def _preview(self, handle: str, text: str) -> str:
+        half = self.preview_chars // 2
+        head = text[:half]
+        cut = head.rfind("\n")
+        if cut > half // 2:
+            head = head[:cut + 1]
+        tail = text[-half:]
+        cut = tail.find("\n")
+        if 0 <= cut < half // 2:
+            tail = tail[cut + 1:]
+        omitted = len(text) - len(head) - len(tail)
+        return (
+            f"{head.rstrip(chr(10))}\n"
+            f"[... {omitted} caracteres omitidos de {len(text)}. El resultado completo "
+            f"está guardado: usa fetch_observation con handle \"{handle}\" y page "
+            f"1-{self.page_count(text)} "
+            f"({self.page_chars} caracteres por página) ...]\n"
+            f"{tail}"
+        )
+
+    def _drop(self, handle: str):
+        entry = self._entries.pop(handle, None)
+        if entry is not None:
+            self._total_bytes -= entry["size"]
+
+
+# Almacén compartido por el servidor.
+observation_store = ObservationStore()
@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import socket
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- CONFIGURACIÓN ---
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "10m")
+OLLAMA_POOL_SIZE = int(os.environ.get("OLLAMA_POOL_SIZE", "8"))
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.environ.get("OLLAMA_READ_TIMEOUT", "300"))
+
+
+class OllamaError(Exception):
+    """Error devuelto por la API HTTP de Ollama."""
+
+
+class OllamaBackend:
+    """Cliente HTTP de Ollama con un pool de conexiones keep-alive.
+
+    Sustituye a lanzar `ollama run` en cada iteración: las peticiones reutilizan
+    conexiones TCP del pool y las respuestas NDJSON se procesan trama a trama.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        host: str = OLLAMA_HOST,
+        keep_alive: str = OLLAMA_KEEP_ALIVE,
+        pool_size: int = OLLAMA_POOL_SIZE,
+        timeout: tuple = (OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT),
+    ):
+        self.model = model
+        self.host = host.rstrip("/")
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _stream_frames(self, endpoint: str, payload: dict, cancellation=None):
+        """Envía `payload` a `endpoint` y produce cada trama NDJSON decodificada.
+
+        Con `cancellation`, el tiempo de lectura no pasa del plazo que le queda
+        (cubre el prefill y las lecturas atascadas) y al cancelarse se corta la
+        conexión, aunque este hilo esté bloqueado leyendo.
+        """
+        url = f"{self.host}{endpoint}"
+        payload = {"model": self.model, "keep_alive": self.keep_alive, **payload}
+        timeout = self.timeout
+        remaining = cancellation.remaining() if cancellation is not None else None
+        if remaining is not None:
+            timeout = (timeout[0], max(min(timeout[1], remaining), 0.01))
+        try:
+            response = self.session.post(
+                url, json=payload, stream=True, timeout=timeout
+            )
+        except requests.exceptions.RequestException as e:
+            raise OllamaError(f"No se pudo conectar con Ollama en {url}: {e}") from e
+        unregister = (
+            cancellation.on_cancel(lambda: _abort(response))
+            if cancellation is not None
+            else None
+        )
+        try:
+            with response:
+                if response.status_code != 200:
+                    raise OllamaError(
+                        f"Ollama respondió {response.status_code}: "
+                        f"{response.text.strip()}"
+                    )
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    try:
+                        frame = json.loads(line)
+                    except json.JSONDecodeError:
+                        logging.warning(f"Trama NDJSON inválida de Ollama: {line!r}")
+                        continue
+                    if "error" in frame:
+                        raise OllamaError(frame["error"])
+                    yield frame
+                    if frame.get("done"):
+                        return
+        except requests.exceptions.RequestException as e:
+            raise OllamaError(f"Se interrumpió el stream de Ollama: {e}") from e
+        finally:
+            if unregister is not None:
+                unregister()
+
+    def generate_frames(self, prompt: str, cancellation=None, **options):
+        """Produce las tramas de `/api/generate` en modo streaming."""
+        return self._stream_frames(
+            "/api/generate", {"prompt": prompt, "stream": True, **options}, cancellation
+        )
+
+    def chat_frames(self, messages: list, cancellation=None, **options):
+        """Produce las tramas de `/api/chat` en modo streaming."""
+        return self._stream_frames(
+            "/api/chat", {"messages": messages, "stream": True, **options}, cancellation
+        )
+
+    def generate_stream(self, prompt: str, **options):
+        """Produce únicamente los fragmentos de texto generados por el modelo."""
+        for frame in self.generate_frames(prompt, **options):
+            token = frame.get("response")
+            if token:
+                yield token
+
+    def generate(self, prompt: str, **options) -> str:
+        """Devuelve la respuesta completa del modelo como una sola cadena."""
+        return "".join(self.generate_stream(prompt, **options))
+
+    def close(self):
+        self.session.close()
+
+
+def _abort(response):
+    """Corta la conexión de un stream en curso desde otro hilo.
+
+    `close()` no despierta a un hilo bloqueado en `recv`; `shutdown()` sí: la
+    lectura termina y Ollama ve la desconexión y deja de generar.
+    """
+    connection = getattr(response.raw, "connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
@@ -0,0 +1,78 @@
+import os
+import threading
+from collections import OrderedDict
+
+# --- CONFIGURACIÓN ---
+CONTEXT_CACHE_MAX_ENTRIES = int(os.environ.get("AGENT_CONTEXT_CACHE_ENTRIES", "256"))
+
+
+def file_fingerprint(path: str) -> tuple:
+    """Huella (ruta, mtime_ns, tamaño) de un archivo; (ruta, None, None) si no hay."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (path, None, None)
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+class FileDerivedCache:
+    """Valor calculado a partir de un archivo, recalculado solo cuando cambia.
+
+    `build(path)` se invoca de nuevo únicamente si cambia la huella
+    (mtime/tamaño) del archivo, de modo que las peticiones sucesivas reutilizan
+    el mismo objeto sin volver a leer el disco.
+    """
+
+    def __init__(self, build):
+        self._build = build
+        self._fingerprint = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self, path: str):
+        fingerprint = file_fingerprint(path)
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                self._value = self._build(path)
+                self._fingerprint = fingerprint
+            return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._fingerprint = None
+
+
+class ContextCache:
+    """Caché LRU del estado `context` (KV) que devuelve Ollama por sesión.
+
+    Cada entrada guarda una huella del estado de la conversación al que
+    corresponde el contexto; si al recuperarla la huella no coincide (la
+    memoria cambió o el historial se modificó por otra vía) se descarta.
+    """
+
+    def __init__(self, max_entries: int = CONTEXT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, fingerprint):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != fingerprint:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, fingerprint, context: list):
+        with self._lock:
+            self._entries[key] = (fingerprint, context)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
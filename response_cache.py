@@ -0,0 +1,228 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import Counter
+from tool_cache import path_fingerprint
+
+# --- CONFIGURACIÓN ---
+# Desactivada por defecto: una respuesta repetida no vuelve a consultar al modelo.
+RESPONSE_CACHE_ENABLED = os.environ.get("AGENT_RESPONSE_CACHE", "0") != "0"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("AGENT_RESPONSE_CACHE_ENTRIES", "1000"))
+# Segundos de validez de una respuesta guardada.
+RESPONSE_CACHE_TTL = float(os.environ.get("AGENT_RESPONSE_CACHE_TTL", "3600"))
+# Directorio de la copia en disco (vacío: solo en memoria).
+RESPONSE_CACHE_DIR = os.environ.get(
+    "AGENT_RESPONSE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "pyagent", "response_cache"),
+)
+
+RESPONSE_CACHE_LOOKUPS = Counter(
+    "pyagent_response_cache_lookups_total",
+    "Consultas a la caché de respuestas (hit, miss, bypass).",
+    ("result",),
+)
+RESPONSE_CACHE_SAVED_SECONDS = Counter(
+    "pyagent_response_cache_saved_seconds_total",
+    "Segundos de generación ahorrados por la caché de respuestas.",
+)
+
+
+def normalize_message(text: str) -> str:
+    """Mensaje sin diferencias de espacios, para la clave.
+
+    Las mayúsculas se conservan: "/tmp/Foo.txt" y "/tmp/foo.txt" son rutas
+    distintas en un sistema de archivos que las distingue.
+    """
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def response_key(**parts) -> str:
+    """Hash de lo que fija la respuesta (prefijo, historial, mensaje, modelo...)."""
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Respuestas completas del agente por coincidencia exacta del prompt (LRU + TTL).
+
+    Una entrada guarda los eventos de la respuesta (tokens y, si las hubo,
+    llamadas a herramientas deterministas), los turnos que se añadieron a la
+    sesión y la huella de cada ruta que leyeron esas herramientas: si alguna
+    cambia, la entrada se descarta. Las entradas se copian en disco (un JSON
+    por clave) para sobrevivir a los reinicios.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        ttl: float = RESPONSE_CACHE_TTL,
+        directory: str = RESPONSE_CACHE_DIR,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory or None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stored = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+        self._writes = 0
+
+    def get(self, key: str):
+        """La entrada de `key` si sigue vigente; None (y cuenta un fallo) si no."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            entry = self._read(key)
+        if entry is not None and not self._valid(entry):
+            self._discard(key)
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                RESPONSE_CACHE_LOOKUPS.inc(result="miss")
+                return None
+            self._insert(key, entry)
+            self.hits += 1
+            self.saved_seconds += entry["generation_seconds"]
+        RESPONSE_CACHE_LOOKUPS.inc(result="hit")
+        RESPONSE_CACHE_SAVED_SECONDS.inc(entry["generation_seconds"])
+        return entry
+
+    def put(
+        self,
+        key: str,
+        events: list,
+        turns: list,
+        fingerprints: list,
+        generation_seconds: float,
+    ):
+        """Guarda una respuesta: eventos, turnos de la sesión y huellas de rutas."""
+        entry = {
+            "key": key,
+            "created": time.time(),
+            "events": events,
+            "turns": turns,
+            "fingerprints": fingerprints,
+            "generation_seconds": generation_seconds,
+        }
+        with self._lock:
+            self._insert(key, entry)
+            self.stored += 1
+        self._write(key, entry)
+
+    def bypass(self):
+        """Cuenta una petición que no podía usar la caché (p. ej. tras escrituras)."""
+        with self._lock:
+            self.bypassed += 1
+        RESPONSE_CACHE_LOOKUPS.inc(result="bypass")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "stored": self.stored,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "saved_generation_seconds": round(self.saved_seconds, 3),
+            }
+
+    # --- Utilidades ---
+
+    def _valid(self, entry: dict) -> bool:
+        if time.time() - entry["created"] > self.ttl:
+            return False
+        return all(
+            path_fingerprint(path)
+            == (tuple(fingerprint) if fingerprint is not None else None)
+            for path, fingerprint in entry["fingerprints"]
+        )
+
+    def _insert(self, key: str, entry: dict):
+        # Requiere self._lock.
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            self._remove_file(old_key)
+
+    def _discard(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+        self._remove_file(key)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read(self, key: str):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("key") == key else None
+
+    def _write(self, key: str, entry: dict):
+        if not self.directory:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"No se pudo guardar la respuesta en la caché: {e}")
+            return
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % 100 == 0
+        if prune:
+            self._prune()
+
+    def _prune(self):
+        """Borra las copias en disco más antiguas por encima de `max_entries`.
+
+        Cubre también las que escribieron otros procesos.
+        """
+        try:
+            with os.scandir(self.directory) as it:
+                files = [
+                    (e.stat().st_mtime, e.path) for e in it if e.name.endswith(".json")
+                ]
+        except OSError:
+            return
+        files.sort()
+        for _, path in files[:max(len(files) - self.max_entries, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _remove_file(self, key: str):
+        if not self.directory:
+            return
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,378 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from file_search import BINARY_SNIFF_BYTES, include_matcher, required_literals
+from fs_walk import walk_files
+
+# --- CONFIGURACIÓN ---
+# Desactivado por defecto: construir un índice lee todo el árbol buscado.
+SEARCH_INDEX_ENABLED = os.environ.get("AGENT_SEARCH_INDEX", "0") != "0"
+SEARCH_INDEX_DIR = os.environ.get(
+    "AGENT_SEARCH_INDEX_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "pyagent", "search_index"),
+)
+# Los archivos mayores no se indexan: siempre son candidatos y se verifican.
+INDEX_MAX_FILE_BYTES = 1024 * 1024
+# Un árbol con más archivos, o cuya lectura supere este volumen en una misma
+# construcción, no se indexa (p. ej. buscar en / o en $HOME).
+INDEX_MAX_FILES = int(os.environ.get("AGENT_SEARCH_INDEX_MAX_FILES", "50000"))
+INDEX_MAX_BYTES = int(
+    os.environ.get("AGENT_SEARCH_INDEX_MAX_BYTES", str(256 * 1024 * 1024))
+)
+# Fracción de identificadores obsoletos a partir de la cual se compactan las listas.
+INDEX_COMPACT_RATIO = 0.5
+INDEX_FORMAT_VERSION = 1
+# Consultas seguidas dentro de este intervalo no vuelven a recorrer el árbol;
+# los cambios hechos por las herramientas se notifican aparte.
+INDEX_REFRESH_SECONDS = float(os.environ.get("AGENT_SEARCH_INDEX_REFRESH", "2"))
+# Índices (directorios raíz) que se mantienen a la vez; el menos usado se
+# descarta, también su copia en disco. Un subdirectorio de un raíz ya indexado
+# usa el índice de ese raíz.
+SEARCH_INDEX_MAX_ROOTS = int(os.environ.get("AGENT_SEARCH_INDEX_MAX_ROOTS", "8"))
+
+
+def trigrams(data: bytes) -> set:
+    """Conjunto de trigramas (tuplas de 3 bytes) de `data`."""
+    return set(zip(data, data[1:], data[2:]))
+
+
+class TrigramIndex:
+    """Índice de trigramas de los archivos de un directorio raíz.
+
+    Cada archivo recibe un identificador y cada trigrama una lista de
+    identificadores (`array('I')`). Una consulta toma los trigramas de los
+    literales obligatorios del patrón e intersecta sus listas para acotar los
+    archivos candidatos, que después se verifican con la expresión regular.
+
+    La actualización es incremental: al consultar se recorre el árbol (como
+    mucho una vez cada `INDEX_REFRESH_SECONDS`) y solo se vuelven a leer los
+    archivos cuya huella (mtime, tamaño) cambió.
+    Un archivo modificado recibe un identificador nuevo; los antiguos se
+    descartan al consultar y se eliminan al compactar. El índice se guarda en
+    disco con pickle para sobrevivir a reinicios.
+
+    Si el árbol supera `INDEX_MAX_FILES` archivos o una actualización tendría
+    que leer más de `INDEX_MAX_BYTES`, el índice se abandona (`too_large`) y
+    las búsquedas en ese directorio recorren el árbol como sin índice.
+    """
+
+    def __init__(self, root: str, index_dir: str = None):
+        self.root = os.path.normpath(root)
+        self.path = None
+        if index_dir:
+            digest = hashlib.sha1(self.root.encode("utf-8")).hexdigest()[:16]
+            self.path = os.path.join(index_dir, f"{digest}.idx")
+        self.ready = False
+        self.too_large = False
+        self._lock = threading.RLock()
+        self._building = False
+        self._files = {}
+        self._paths = {}
+        self._postings = {}
+        self._unindexed = set()
+        self._order = []
+        self._next_id = 0
+        self._dead = 0
+        self._dirty = False
+        self._refreshed_at = None
+        self._load()
+
+    # --- API pública ---
+
+    def candidates(self, pattern: str, include: str = "*", root: str = None):
+        """Rutas que pueden contener `pattern`, en orden de recorrido.
+
+        Con `root` (un subdirectorio del raíz del índice) se recorre ese
+        subárbol igual que sin índice y el índice solo descarta los archivos
+        que conoce y no contienen los literales; los que no conoce (p. ej.
+        ignorados por un `.gitignore` superior) siguen siendo candidatos.
+
+        Devuelve None si el índice aún no está listo o el patrón no tiene
+        literales de al menos tres bytes; en ese caso hay que recorrerlo todo.
+        """
+        literals = [lit for lit in required_literals(pattern) if len(lit) >= 3]
+        if not literals or not self.ready:
+            return None
+        with self._lock:
+            if (
+                self._refreshed_at is None
+                or time.monotonic() - self._refreshed_at >= INDEX_REFRESH_SECONDS
+            ):
+                self.refresh()
+                if not self.ready:
+                    return None
+            lists = sorted(
+                (self._postings.get(t, ()) for lit in literals for t in trigrams(lit)),
+                key=len,
+            )
+            ids = set(lists[0])
+            for ids_list in lists[1:]:
+                if not ids:
+                    break
+                ids.intersection_update(ids_list)
+            matches_name = include_matcher(include)
+            if root is not None and os.path.normpath(root) != self.root:
+                paths = (entry.path for entry in walk_files(root))
+            else:
+                paths = self._order
+            candidates = []
+            for path in paths:
+                if not matches_name(os.path.basename(path)):
+                    continue
+                known = self._files.get(path)
+                if known is None or known[2] in ids or path in self._unindexed:
+                    candidates.append(path)
+            return candidates
+
+    def refresh(self):
+        """Sincroniza el índice con el disco (solo relee los archivos cambiados)."""
+        with self._lock:
+            seen = []
+            read_bytes = 0
+            for entry in walk_files(self.root):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                seen.append(entry.path)
+                if len(seen) > INDEX_MAX_FILES:
+                    self._abandon(f"más de {INDEX_MAX_FILES} archivos")
+                    return
+                current = self._files.get(entry.path)
+                if current is None or current[:2] != (st.st_mtime_ns, st.st_size):
+                    if st.st_size <= INDEX_MAX_FILE_BYTES:
+                        read_bytes += st.st_size
+                    if read_bytes > INDEX_MAX_BYTES:
+                        self._abandon(f"más de {INDEX_MAX_BYTES} bytes por leer")
+                        return
+                    self._index_file(entry.path, st)
+            for path in set(self._files) - set(seen):
+                self._forget(path)
+            self._order = seen
+            self._maybe_compact()
+            self._save()
+            self._refreshed_at = time.monotonic()
+
+    def covers(self, path: str) -> bool:
+        """True si `path` es el raíz del índice o está dentro de él."""
+        return _within(os.path.normpath(path), self.root)
+
+    def discard(self):
+        """Deja de guardar el índice en disco y borra su copia (al expulsarlo)."""
+        path, self.path = self.path, None
+        if path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def mark_stale(self):
+        """Fuerza un recorrido completo en la próxima consulta."""
+        self._refreshed_at = None
+
+    def update_file(self, path: str):
+        """Reindexa un archivo concreto (p. ej. tras write_file o replace)."""
+        path = os.path.normpath(path)
+        with self._lock:
+            if not self.ready:
+                return
+            try:
+                st = os.stat(path)
+            except OSError:
+                self._forget(path)
+                return
+            if path not in self._files:
+                self._order.append(path)
+            self._index_file(path, st)
+
+    def build_in_background(self):
+        """Construye el índice completo en un hilo; `ready` pasa a True al terminar."""
+        with self._lock:
+            if self.ready or self._building or self.too_large:
+                return
+            self._building = True
+
+        def build():
+            try:
+                self.refresh()
+                if self.too_large:
+                    return
+                self.ready = True
+                logging.info(
+                    f"Índice de búsqueda listo para {self.root}: "
+                    f"{len(self._files)} archivos."
+                )
+            except Exception:
+                logging.exception(
+                    f"No se pudo construir el índice de búsqueda de {self.root}"
+                )
+            finally:
+                self._building = False
+
+        threading.Thread(target=build, daemon=True).start()
+
+    # --- Utilidades (requieren self._lock) ---
+
+    def _abandon(self, reason: str):
+        logging.warning(
+            f"No se indexa {self.root} ({reason}); se buscará recorriendo el árbol."
+        )
+        self.ready = False
+        self.too_large = True
+        self._files, self._paths, self._postings = {}, {}, {}
+        self._unindexed, self._order = set(), []
+        self._dead = 0
+        self._dirty = False
+        self.discard()
+
+    def _index_file(self, path: str, st):
+        self._forget(path)
+        file_id = self._next_id
+        self._next_id += 1
+        self._files[path] = (st.st_mtime_ns, st.st_size, file_id)
+        self._paths[file_id] = path
+        self._dirty = True
+        if st.st_size > INDEX_MAX_FILE_BYTES:
+            self._unindexed.add(path)
+            return
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+        if b"\0" in data[:BINARY_SNIFF_BYTES]:
+            return
+        for trigram in trigrams(data):
+            ids = self._postings.get(trigram)
+            if ids is None:
+                ids = self._postings[trigram] = array("I")
+            ids.append(file_id)
+
+    def _forget(self, path: str):
+        entry = self._files.pop(path, None)
+        if entry is None:
+            return
+        del self._paths[entry[2]]
+        self._unindexed.discard(path)
+        self._dead += 1
+        self._dirty = True
+
+    def _maybe_compact(self):
+        if self._dead <= INDEX_COMPACT_RATIO * max(self._next_id, 1):
+            return
+        live = self._paths
+        for trigram, ids in list(self._postings.items()):
+            kept = array("I", (i for i in ids if i in live))
+            if kept:
+                self._postings[trigram] = kept
+            else:
+                del self._postings[trigram]
+        self._dead = 0
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return
+        if (
+            state.get("version") != INDEX_FORMAT_VERSION
+            or state.get("root") != self.root
+        ):
+            return
+        self._files = state["files"]
+        self._postings = state["postings"]
+        self._unindexed = state["unindexed"]
+        self._next_id = state["next_id"]
+        self._dead = state["dead"]
+        self._paths = {entry[2]: path for path, entry in self._files.items()}
+        self._order = list(self._files)
+        self.ready = True
+
+    def _save(self):
+        path = self.path
+        if not path or not self._dirty:
+            return
+        state = {
+            "version": INDEX_FORMAT_VERSION,
+            "root": self.root,
+            "files": self._files,
+            "postings": self._postings,
+            "unindexed": self._unindexed,
+            "next_id": self._next_id,
+            "dead": self._dead,
+        }
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self._dirty = False
+            if self.path is None:
+                # Se descartó mientras se guardaba (p. ej. en la construcción).
+                os.remove(path)
+        except OSError as e:
+            logging.warning(f"No se pudo guardar el índice de búsqueda: {e}")
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def index_for(root: str, index_dir: str = SEARCH_INDEX_DIR):
+    """Índice que cubre `root` (creado y construido en segundo plano la primera vez).
+
+    Si ya hay un índice de un directorio que contiene a `root`, se usa ese
+    (ver `candidates(root=...)`). Un índice nuevo sustituye a los de sus
+    subdirectorios, y por encima de `SEARCH_INDEX_MAX_ROOTS` se descarta el
+    menos usado.
+    """
+    if not SEARCH_INDEX_ENABLED:
+        return None
+    root = os.path.normpath(root)
+    dropped = []
+    with _indexes_lock:
+        index = next((i for i in _indexes.values() if i.covers(root)), None)
+        if index is None:
+            dropped = [i for i in _indexes.values() if _within(i.root, root)]
+            for old in dropped:
+                del _indexes[old.root]
+            index = _indexes[root] = TrigramIndex(root, index_dir)
+            while len(_indexes) > max(SEARCH_INDEX_MAX_ROOTS, 1):
+                dropped.append(_indexes.popitem(last=False)[1])
+        _indexes.move_to_end(index.root)
+    for old in dropped:
+        old.discard()
+    index.build_in_background()
+    return index
+
+
+def invalidate_all():
+    """Marca todos los índices como desactualizados (p. ej. tras un comando shell)."""
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        index.mark_stale()
+
+
+def file_changed(path: str):
+    """Notifica a los índices cuyo directorio raíz contiene `path`."""
+    path = os.path.normpath(path)
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        if index.covers(path):
+            index.update_file(path)
+
+
+def _within(path: str, root: str) -> bool:
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
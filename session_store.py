@@ -0,0 +1,231 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# --- CONFIGURACIÓN ---
+SESSION_MEMORY_BUDGET = int(
+    os.environ.get("AGENT_SESSION_BUDGET_BYTES", str(64 * 1024 * 1024))
+)
+SESSION_DB_PATH = os.environ.get("AGENT_SESSION_DB")
+
+# Etiquetas con las que cada rol aparece en el historial del prompt.
+ROLE_LABELS = {
+    "user": "Usuario",
+    "agent": "Agente",
+    "tool": "Observación de Herramienta",
+}
+
+
+def _turn_size(turn: dict) -> int:
+    return len(turn["text"].encode("utf-8")) + len(turn["role"])
+
+
+def format_history(turns: list) -> list:
+    """Convierte los turnos de una sesión en las líneas de historial del prompt."""
+    return [f"{ROLE_LABELS.get(t['role'], t['role'])}: {t['text']}" for t in turns]
+
+
+class SessionStore:
+    """Almacén de conversaciones indexado por identificador de sesión.
+
+    Los turnos se guardan en markdown crudo (nunca HTML renderizado) en una
+    caché LRU con presupuesto de bytes. Si se indica `db_path`, cada turno se
+    persiste además en SQLite (modo WAL) y las sesiones desalojadas de memoria
+    se recargan desde disco al volver a usarse.
+    """
+
+    def __init__(
+        self, memory_budget: int = SESSION_MEMORY_BUDGET, db_path: str = SESSION_DB_PATH
+    ):
+        self.memory_budget = memory_budget
+        self._sessions = OrderedDict()
+        self._sizes = {}
+        self._meta = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " id TEXT PRIMARY KEY, created_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                " session_id TEXT NOT NULL, seq INTEGER NOT NULL,"
+                " role TEXT NOT NULL, text TEXT NOT NULL, created_at REAL NOT NULL,"
+                " PRIMARY KEY (session_id, seq))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS session_meta ("
+                " session_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " PRIMARY KEY (session_id, key))"
+            )
+            self._db.commit()
+
+    # --- API pública ---
+
+    def create(self) -> str:
+        """Crea una sesión vacía y devuelve su identificador."""
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._sessions[session_id] = []
+            self._sizes[session_id] = 0
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT INTO sessions (id, created_at) VALUES (?, ?)",
+                    (session_id, time.time()),
+                )
+                self._db.commit()
+        return session_id
+
+    def exists(self, session_id: str) -> bool:
+        with self._lock:
+            return self._load(session_id) is not None
+
+    def get_turns(self, session_id: str) -> list:
+        """Devuelve una copia de los turnos de la sesión (lista vacía si no existe)."""
+        with self._lock:
+            turns = self._load(session_id)
+            return list(turns) if turns is not None else []
+
+    def count(self, session_id: str) -> int:
+        """Número de turnos de la sesión (0 si no existe)."""
+        with self._lock:
+            turns = self._load(session_id)
+            return len(turns) if turns is not None else 0
+
+    def append(self, session_id: str, role: str, text: str):
+        """Añade un turno ("user", "agent" o "tool") al final de la sesión."""
+        turn = {"role": role, "text": text, "created_at": time.time()}
+        with self._lock:
+            turns = self._load(session_id)
+            if turns is None:
+                raise KeyError(session_id)
+            turns.append(turn)
+            size = _turn_size(turn)
+            self._sizes[session_id] += size
+            self._total_bytes += size
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT INTO turns (session_id, seq, role, text, created_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (session_id, len(turns) - 1, role, text, turn["created_at"]),
+                )
+                self._db.commit()
+            self._evict(keep=session_id)
+
+    def get_meta(self, session_id: str, key: str, default=None):
+        """Metadatos auxiliares de la sesión (p. ej. el estado de compactación)."""
+        with self._lock:
+            if self._load(session_id) is None:
+                return default
+            return self._meta.get(session_id, {}).get(key, default)
+
+    def set_meta(self, session_id: str, key: str, value):
+        with self._lock:
+            if self._load(session_id) is None:
+                raise KeyError(session_id)
+            self._meta.setdefault(session_id, {})[key] = value
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO session_meta (session_id, key, value) "
+                    "VALUES (?, ?, ?)",
+                    (session_id, key, json.dumps(value)),
+                )
+                self._db.commit()
+
+    def page(self, session_id: str, offset: int = 0, limit: int = 50):
+        """Devuelve (total, turnos[offset:offset + limit]) o None si no hay sesión."""
+        with self._lock:
+            turns = self._load(session_id)
+            if turns is None:
+                return None
+            return len(turns), turns[offset:offset + limit]
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            found = self._drop(session_id)
+            if self._db is not None:
+                cursor = self._db.execute(
+                    "DELETE FROM sessions WHERE id = ?", (session_id,)
+                )
+                self._db.execute(
+                    "DELETE FROM turns WHERE session_id = ?", (session_id,)
+                )
+                self._db.execute(
+                    "DELETE FROM session_meta WHERE session_id = ?", (session_id,)
+                )
+                self._db.commit()
+                found = found or cursor.rowcount > 0
+            return found
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions_in_memory": len(self._sessions),
+                "bytes_in_memory": self._total_bytes,
+                "memory_budget": self.memory_budget,
+            }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+
+    # --- Utilidades (requieren self._lock) ---
+
+    def _load(self, session_id: str):
+        turns = self._sessions.get(session_id)
+        if turns is not None:
+            self._sessions.move_to_end(session_id)
+            return turns
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT 1 FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        turns = [
+            {"role": role, "text": text, "created_at": created_at}
+            for role, text, created_at in self._db.execute(
+                "SELECT role, text, created_at FROM turns "
+                "WHERE session_id = ? ORDER BY seq",
+                (session_id,),
+            )
+        ]
+        self._meta[session_id] = {
+            key: json.loads(value)
+            for key, value in self._db.execute(
+                "SELECT key, value FROM session_meta WHERE session_id = ?",
+                (session_id,),
+            )
+        }
+        size = sum(_turn_size(t) for t in turns)
+        self._sessions[session_id] = turns
+        self._sizes[session_id] = size
+        self._total_bytes += size
+        self._evict(keep=session_id)
+        return turns
+
+    def _drop(self, session_id: str) -> bool:
+        if session_id not in self._sessions:
+            return False
+        del self._sessions[session_id]
+        self._meta.pop(session_id, None)
+        self._total_bytes -= self._sizes.pop(session_id)
+        return True
+
+    def _evict(self, keep: str):
+        while self._total_bytes > self.memory_budget and len(self._sessions) > 1:
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                self._sessions.move_to_end(oldest)
+                oldest = next(iter(self._sessions))
+            self._drop(oldest)
@@ -0,0 +1,329 @@
+import codecs
+import os
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# --- CONFIGURACIÓN ---
+SHELL_TIMEOUT = float(os.environ.get("AGENT_SHELL_TIMEOUT", "120"))
+SHELL_MAX_TIMEOUT = 600
+SHELL_BACKGROUND_TIMEOUT = float(
+    os.environ.get("AGENT_SHELL_BACKGROUND_TIMEOUT", "3600")
+)
+# Bytes conservados por flujo (stdout/stderr): la mitad del principio y la
+# mitad del final; lo intermedio solo se cuenta.
+SHELL_OUTPUT_BYTES = int(os.environ.get("AGENT_SHELL_OUTPUT_BYTES", str(32 * 1024)))
+SHELL_MAX_JOBS = int(os.environ.get("AGENT_SHELL_MAX_JOBS", "8"))
+# Trabajos terminados que se conservan para poder consultarlos.
+SHELL_FINISHED_JOBS = 32
+SHELL_READ_CHUNK = 64 * 1024
+# Espera entre SIGTERM y SIGKILL al grupo de procesos.
+SHELL_KILL_GRACE_SECONDS = 2
+# Tras salir el proceso, tiempo máximo para vaciar las tuberías (un proceso
+# hijo en segundo plano puede mantenerlas abiertas indefinidamente).
+SHELL_DRAIN_SECONDS = 1
+# Cada cuánto comprueba un comando en primer plano si su petición se canceló.
+SHELL_CANCEL_POLL_SECONDS = 0.2
+
+
+class ShellJobError(Exception):
+    """No se puede lanzar o localizar un trabajo de shell."""
+
+
+class OutputBuffer:
+    """Salida acotada de un flujo: principio y final, con el total de bytes vistos.
+
+    La memoria usada no depende del tamaño de la salida: tras llenar la
+    cabeza, los bytes nuevos entran en una cola circular que descarta los
+    más antiguos.
+    """
+
+    def __init__(self, max_bytes: int = SHELL_OUTPUT_BYTES):
+        self.head_bytes = max_bytes // 2
+        self.tail_bytes = max_bytes - self.head_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def write(self, data: bytes):
+        with self._lock:
+            self.total += len(data)
+            room = self.head_bytes - len(self.head)
+            if room > 0:
+                self.head += data[:room]
+                data = data[room:]
+            if data:
+                self.tail += data
+                excess = len(self.tail) - self.tail_bytes
+                if excess > 0:
+                    del self.tail[:excess]
+
+    @property
+    def omitted(self) -> int:
+        return self.total - len(self.head) - len(self.tail)
+
+    def text(self) -> str:
+        """Salida decodificada; si se recortó, marca cuántos bytes se omitieron."""
+        with self._lock:
+            head, tail, omitted = bytes(self.head), bytes(self.tail), self.omitted
+        if not omitted:
+            return (head + tail).decode("utf-8", errors="replace")
+        # La cola puede empezar a mitad de un carácter UTF-8.
+        skip = 0
+        while skip < min(len(tail), 3) and 0x80 <= tail[skip] <= 0xBF:
+            skip += 1
+        return (
+            head.decode("utf-8", errors="replace")
+            + f"\n[... {omitted + skip} bytes omitidos ...]\n"
+            + tail[skip:].decode("utf-8", errors="replace")
+        )
+
+
+class ShellProcess:
+    """Un comando de shell en su propio grupo de procesos.
+
+    Dos hilos leen stdout y stderr a medida que llegan, los guardan en
+    `OutputBuffer` acotados y, si se indica, los reenvían a
+    `on_output(flujo, texto)`. Al vencer `timeout` se termina todo el grupo
+    (SIGTERM y, tras una espera, SIGKILL), incluidos los procesos hijos.
+    """
+
+    def __init__(
+        self,
+        command: str,
+        timeout: float = SHELL_TIMEOUT,
+        on_output=None,
+        output_bytes: int = SHELL_OUTPUT_BYTES,
+    ):
+        self.command = command
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout
+        self.finished = None
+        self.timed_out = False
+        self.killed = False
+        self.stdout = OutputBuffer(output_bytes)
+        self.stderr = OutputBuffer(output_bytes)
+        self._on_output = on_output
+        self._lock = threading.RLock()
+        self.process = subprocess.Popen(
+            command,
+            shell=True,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+        self._readers = [
+            threading.Thread(
+                target=self._pump,
+                args=("stdout", self.process.stdout, self.stdout),
+                daemon=True,
+            ),
+            threading.Thread(
+                target=self._pump,
+                args=("stderr", self.process.stderr, self.stderr),
+                daemon=True,
+            ),
+        ]
+        for reader in self._readers:
+            reader.start()
+
+    def _pump(self, name: str, pipe, buffer: OutputBuffer):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with pipe:
+            while True:
+                try:
+                    data = os.read(pipe.fileno(), SHELL_READ_CHUNK)
+                except OSError:
+                    break
+                if not data:
+                    break
+                buffer.write(data)
+                if self._on_output is not None:
+                    text = decoder.decode(data)
+                    if text:
+                        self._on_output(name, text)
+
+    @property
+    def running(self) -> bool:
+        return self.finished is None
+
+    def wait(self, timeout: float = None) -> bool:
+        """Espera a que termine (como mucho `timeout` segundos); True si terminó.
+
+        Si se alcanza el plazo del comando, se termina su grupo de procesos.
+        """
+        if self.finished is not None:
+            return True
+        remaining = self.deadline - time.monotonic()
+        limit = remaining if timeout is None else min(timeout, remaining)
+        try:
+            self.process.wait(timeout=max(limit, 0))
+        except subprocess.TimeoutExpired:
+            if time.monotonic() < self.deadline:
+                return False
+            self.timed_out = True
+            self.kill()
+        self._finish()
+        return True
+
+    def kill(self):
+        """Termina el grupo de procesos: SIGTERM y, si no basta, SIGKILL."""
+        with self._lock:
+            if self.process.poll() is None:
+                self.killed = True
+            # SIGKILL se envía igualmente tras la espera: los hijos que ignoren
+            # SIGTERM no deben seguir reteniendo las tuberías.
+            for sig in (signal.SIGTERM, signal.SIGKILL):
+                try:
+                    os.killpg(self.process.pid, sig)
+                except (ProcessLookupError, PermissionError):
+                    break
+                try:
+                    self.process.wait(timeout=SHELL_KILL_GRACE_SECONDS)
+                except subprocess.TimeoutExpired:
+                    pass
+        self._finish()
+
+    def _finish(self):
+        with self._lock:
+            if self.finished is not None:
+                return
+            deadline = time.monotonic() + SHELL_DRAIN_SECONDS
+            for reader in self._readers:
+                reader.join(max(deadline - time.monotonic(), 0))
+            self.finished = time.monotonic()
+
+    def result(self) -> dict:
+        """Salida acotada y estado: {"stdout", "stderr", "exit_code"} y "timed_out"."""
+        result = {
+            "stdout": self.stdout.text(),
+            "stderr": self.stderr.text(),
+            "exit_code": self.process.returncode,
+        }
+        if self.timed_out:
+            result["timed_out"] = True
+            result["stderr"] += (
+                f"\n[Comando terminado: superó el límite de {self.timeout:g} s.]"
+            )
+        return result
+
+
+def run_command(
+    command: str, timeout: float = SHELL_TIMEOUT, on_output=None, cancellation=None
+) -> dict:
+    """Ejecuta `command` hasta que termine o venza `timeout` y devuelve su resultado.
+
+    Si se pasa `cancellation` (ver cancellation.py) y la petición se cancela
+    antes, se termina el grupo de procesos.
+    """
+    process = ShellProcess(command, timeout, on_output)
+    if cancellation is None:
+        process.wait()
+        return process.result()
+    while not process.wait(SHELL_CANCEL_POLL_SECONDS):
+        if cancellation.cancelled:
+            process.kill()
+            result = process.result()
+            result["cancelled"] = True
+            result["stderr"] += (
+                f"\n[Comando terminado: petición cancelada ({cancellation.reason}).]"
+            )
+            return result
+    return process.result()
+
+
+class ShellJobs:
+    """Registro de comandos lanzados en segundo plano.
+
+    Cada trabajo tiene un identificador opaco que las llamadas posteriores
+    usan para consultar su estado o terminarlo. Como mucho `max_jobs` se
+    ejecutan a la vez; de los terminados se conservan los más recientes.
+    """
+
+    def __init__(
+        self, max_jobs: int = SHELL_MAX_JOBS, max_finished: int = SHELL_FINISHED_JOBS
+    ):
+        self.max_jobs = max_jobs
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(
+        self, command: str, timeout: float = SHELL_BACKGROUND_TIMEOUT, on_exit=None
+    ) -> str:
+        """Lanza `command` y devuelve su identificador.
+
+        `on_exit(proceso)` se llama cuando el comando termina.
+        """
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.running)
+            if running >= self.max_jobs:
+                raise ShellJobError(
+                    f"Ya hay {running} comandos en segundo plano; espera a que "
+                    "terminen o termina alguno."
+                )
+            job_id = uuid.uuid4().hex[:12]
+            process = self._jobs[job_id] = ShellProcess(command, timeout)
+            self._evict()
+
+        def watch():
+            process.wait()
+            if on_exit is not None:
+                on_exit(process)
+
+        threading.Thread(target=watch, daemon=True).start()
+        return job_id
+
+    def get(self, job_id: str) -> ShellProcess:
+        with self._lock:
+            process = self._jobs.get(job_id)
+        if process is None:
+            raise ShellJobError(f"No existe el trabajo '{job_id}'.")
+        return process
+
+    def status(self, job_id: str, wait: float = 0, kill: bool = False) -> dict:
+        """Estado del trabajo y su salida acotada; opcionalmente espera o lo termina."""
+        process = self.get(job_id)
+        if kill and process.running:
+            process.kill()
+        elif wait > 0:
+            process.wait(wait)
+        if process.running:
+            state = "running"
+        elif process.timed_out:
+            state = "timed_out"
+        elif process.killed:
+            state = "killed"
+        else:
+            state = "finished"
+        end = process.finished if process.finished is not None else time.monotonic()
+        status = {
+            "job_id": job_id,
+            "status": state,
+            "elapsed_seconds": round(end - process.started, 3),
+        }
+        status.update(process.result())
+        if process.running:
+            status["exit_code"] = None
+        return status
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "jobs": len(self._jobs),
+                "running": sum(1 for job in self._jobs.values() if job.running),
+            }
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if not job.running]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job_id]
+
+
+shell_jobs = ShellJobs()
@@ -6,11 +6,58 @@ document.addEventListener('DOMContentLoaded', () => {
     const typingIndicator = document.getElementById('typing-indicator-container');
 
     let conversation = [];
+    // La conversación vive en el servidor; aquí solo guardamos su identificador
+    let sessionId = sessionStorage.getItem('sessionId');
 
     const saveHistory = () => {
         sessionStorage.setItem('chatHistory', JSON.stringify(conversation));
     };
 
+    const setSessionId = (id) => {
+        sessionId = id;
+        if (id) {
+            sessionStorage.setItem('sessionId', id);
+        } else {
+            sessionStorage.removeItem('sessionId');
+        }
+    };
+
+    const postMessage = async (message) => {
+        const payload = { user_message: message };
+        if (sessionId) {
+            payload.session_id = sessionId;
+        }
+        const response = await fetch('/chat', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+            body: JSON.stringify(payload)
+        });
+        if (response.status === 404 && sessionId) {
+            // La sesión expiró en el servidor: se empieza una nueva
+            setSessionId(null);
+            return postMessage(message);
+        }
+        setSessionId(response.headers.get('X-Session-Id'));
+        return response;
+    };
+
+    // Convierte un frame SSE ("event: ...\ndata: ...") en { type, data }
+    const parseSseFrame = (frame) => {
+        let type = 'message';
+        const dataLines = [];
+        frame.split('\n').forEach(line => {
+            if (line.startsWith('event:')) {
+                type = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                dataLines.push(line.slice(5).trim());
+            }
+        });
+        if (dataLines.length === 0) {
+            return null; // comentarios de keepalive
+        }
+        return { type, data: JSON.parse(dataLines.join('\n')) };
+    };
+
     const addCopyButtons = (messageEl) => {
         const codeBlocks = messageEl.querySelectorAll('pre');
         codeBlocks.forEach(block => {
@@ -53,8 +100,8 @@ document.addEventListener('DOMContentLoaded', () => {
         if (savedHistory) {
             conversation = JSON.parse(savedHistory);
             conversation.forEach(msg => {
-                const isHtml = msg.sender === 'agent';
-                appendMessage(msg.sender, msg.text, isHtml);
+                const isAgent = msg.sender === 'agent';
+                appendMessage(msg.sender, isAgent ? marked.parse(msg.text) : msg.text, isAgent);
             });
         }
     };
@@ -71,27 +118,66 @@ document.addEventListener('DOMContentLoaded', () => {
             chatHistory.scrollTop = chatHistory.scrollHeight;
 
             try {
-                const response = await fetch('/chat', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ user_message: message, history: conversation.slice(0, -1) })
-                });
+                const response = await postMessage(message);
 
                 typingIndicator.style.display = 'none';
 
+                if (response.status === 429) {
+                    // Servidor saturado: el mensaje no se ha encolado
+                    const retryAfter = response.headers.get('Retry-After') || '?';
+                    appendMessage('agent', `El servidor está ocupado. Inténtalo de nuevo en ${retryAfter} s.`);
+                    return;
+                }
+
                 const reader = response.body.getReader();
                 const decoder = new TextDecoder();
                 let agentResponseText = '';
                 
                 const agentMessageDiv = appendMessage('agent', '');
 
+                let buffer = '';
+                let pendingTools = 0;
+                let toolOutput = '';
+
                 while (true) {
                     const { value, done } = await reader.read();
                     if (done) break;
-                    
-                    agentResponseText += decoder.decode(value, { stream: true });
+
+                    buffer += decoder.decode(value, { stream: true });
+                    let boundary;
+                    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                        const event = parseSseFrame(buffer.slice(0, boundary));
+                        buffer = buffer.slice(boundary + 2);
+                        if (!event) continue;
+
+                        if (event.type === 'queue') {
+                            agentMessageDiv.textContent = `En cola (posición ${event.data.position})…`;
+                            continue;
+                        } else if (event.type === 'token') {
+                            agentResponseText += event.data.text;
+                        } else if (event.type === 'tool_start') {
+                            pendingTools += 1;
+                            typingIndicator.style.display = 'block';
+                        } else if (event.type === 'tool_progress') {
+                            // Salida en vivo de la herramienta (solo las últimas líneas)
+                            toolOutput = (toolOutput + event.data.text).slice(-2000);
+                            if (!agentResponseText) {
+                                agentMessageDiv.textContent = toolOutput;
+                            }
+                        } else if (event.type === 'tool_result') {
+                            // Varias herramientas pueden ejecutarse en paralelo
+                            pendingTools = Math.max(pendingTools - 1, 0);
+                            if (pendingTools === 0) {
+                                typingIndicator.style.display = 'none';
+                            }
+                        } else if (event.type === 'error') {
+                            agentResponseText += `\n\n**Error:** ${event.data.message}`;
+                        }
+                    }
                     // Just update the text content for live streaming effect
-                    agentMessageDiv.textContent = agentResponseText;
+                    if (agentResponseText) {
+                        agentMessageDiv.textContent = agentResponseText;
+                    }
                     chatHistory.scrollTop = chatHistory.scrollHeight;
                 }
                 
@@ -100,8 +186,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 agentMessageDiv.innerHTML = finalHtml;
                 addCopyButtons(agentMessageDiv);
 
-                // Update history with the final rendered HTML
-                conversation.push({ sender: 'agent', text: finalHtml });
+                // Keep the raw markdown; it is rendered again when loading
+                conversation.push({ sender: 'agent', text: agentResponseText });
                 saveHistory();
 
             } catch (error) {
@@ -113,6 +199,10 @@ document.addEventListener('DOMContentLoaded', () => {
     };
 
     const startNewChat = () => {
+        if (sessionId) {
+            fetch(`/sessions/${sessionId}`, { method: 'DELETE' });
+            setSessionId(null);
+        }
         conversation = [];
         sessionStorage.removeItem('chatHistory');
         chatHistory.innerHTML = '';
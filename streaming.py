@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import queue
+import threading
+
+# --- CONFIGURACIÓN ---
+SSE_QUEUE_SIZE = int(os.environ.get("AGENT_SSE_QUEUE_SIZE", "64"))
+SSE_KEEPALIVE_SECONDS = float(os.environ.get("AGENT_SSE_KEEPALIVE", "15"))
+SSE_SLOW_READER_TIMEOUT = float(os.environ.get("AGENT_SSE_SLOW_READER_TIMEOUT", "60"))
+
+# Cabeceras para que ni Gunicorn/nginx ni Cloudflare almacenen el stream en búfer.
+SSE_HEADERS = {
+    "Cache-Control": "no-cache, no-transform",
+    "X-Accel-Buffering": "no",
+}
+
+_END = object()
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Serializa un evento en el formato de Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class EventPump:
+    """Desacopla el bucle del agente del cliente mediante una cola acotada.
+
+    Un hilo productor (greenlet con el worker gevent) recorre `events` y deja
+    cada elemento en la cola. Si el cliente lee despacio, la cola se llena y
+    el productor se bloquea, lo que a su vez frena la lectura del stream del
+    modelo (backpressure). Si la cola sigue llena durante `slow_reader_timeout`
+    segundos, o el cliente se desconecta, el productor se detiene y cierra
+    `events`. `on_stop` se llama si el stream se detiene antes de terminar,
+    para avisar al productor aunque esté bloqueado (p. ej. esperando a una
+    herramienta).
+    """
+
+    def __init__(
+        self,
+        events,
+        queue_size: int = SSE_QUEUE_SIZE,
+        slow_reader_timeout: float = SSE_SLOW_READER_TIMEOUT,
+        on_stop=None,
+    ):
+        self._events = events
+        self._on_stop = on_stop
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._slow_reader_timeout = slow_reader_timeout
+        self.stopped = threading.Event()
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def _produce(self):
+        try:
+            for item in self._events:
+                if self.stopped.is_set():
+                    break
+                try:
+                    self._queue.put(item, timeout=self._slow_reader_timeout)
+                except queue.Full:
+                    logging.warning("Cliente demasiado lento: se detiene el stream.")
+                    self.stop()
+                    break
+        except Exception as e:
+            logging.exception("Error en el bucle del agente")
+            self._put_final(("error", {"message": f"Error interno del agente: {e}"}))
+        finally:
+            close = getattr(self._events, "close", None)
+            if close is not None:
+                close()
+            self._put_final(_END)
+
+    def _put_final(self, item):
+        # El cierre no debe bloquear si el lector ya se fue.
+        try:
+            timeout = 1 if self.stopped.is_set() else self._slow_reader_timeout
+            self._queue.put(item, timeout=timeout)
+        except queue.Full:
+            pass
+
+    def get(self, timeout: float):
+        """Devuelve el siguiente elemento, None si vence `timeout` o _END al final."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def get_nowait(self):
+        try:
+            return self._queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def stop(self):
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        if self._on_stop is not None and self._thread.is_alive():
+            self._on_stop()
+
+
+def sse_stream(events, keepalive: float = SSE_KEEPALIVE_SECONDS, **pump_options):
+    """Transporte SSE: eventos tipados, latidos y tokens agrupados bajo presión."""
+    pump = EventPump(events, **pump_options)
+    try:
+        while True:
+            item = pump.get(keepalive)
+            if item is None:
+                # Comentario SSE: mantiene viva la conexión a través de proxies.
+                yield ": keepalive\n\n"
+                continue
+            if item is _END:
+                return
+            kind, data = item
+            if kind == "token":
+                # Si el cliente va por detrás, se agrupan los tokens pendientes
+                # en un único frame en lugar de enviar uno por token.
+                texts = [data["text"]]
+                pending = pump.get_nowait()
+                while (
+                    pending is not None
+                    and pending is not _END
+                    and pending[0] == "token"
+                ):
+                    texts.append(pending[1]["text"])
+                    pending = pump.get_nowait()
+                yield format_sse("token", {"text": "".join(texts)})
+                if pending is _END:
+                    return
+                if pending is not None:
+                    yield format_sse(*pending)
+                continue
+            yield format_sse(kind, data)
+    finally:
+        pump.stop()
@@ -0,0 +1,128 @@
+import unittest
+import threading
+import time
+
+from admission import AdmissionController, AdmissionRejected, admitted_events
+
+
+class TestAdmissionController(unittest.TestCase):
+
+    def test_admits_up_to_the_concurrency_limit(self):
+        controller = AdmissionController(max_concurrent=2, max_queue=10, max_wait=60)
+        first = controller.submit("a")
+        second = controller.submit("b")
+        third = controller.submit("c")
+        self.assertTrue(first.admitted and second.admitted)
+        self.assertFalse(third.admitted)
+        self.assertEqual(controller.position(third), 1)
+
+        controller.finish(first)
+        self.assertTrue(third.admitted)
+        stats = controller.stats()
+        self.assertEqual(stats["in_flight"], 2)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertEqual(stats["admitted"], 3)
+
+    def test_clients_are_served_round_robin(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=10, max_wait=600)
+        running = controller.submit("a")
+        greedy = [controller.submit("a") for _ in range(3)]
+        polite = controller.submit("b")
+        # El único ticket de "b" adelanta a los pendientes de "a".
+        self.assertEqual(controller.position(greedy[0]), 1)
+        self.assertEqual(controller.position(polite), 2)
+        self.assertEqual(controller.position(greedy[1]), 3)
+
+        order = []
+        controller.finish(running)
+        for _ in range(4):
+            current = next(
+                t for t in greedy + [polite] if t.admitted and not t.finished
+            )
+            order.append(current)
+            controller.finish(current)
+        self.assertEqual(order, [greedy[0], polite, greedy[1], greedy[2]])
+
+    def test_full_queue_is_rejected_with_retry_after(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=1, max_wait=600)
+        controller.submit("a")
+        controller.submit("b")
+        with self.assertRaises(AdmissionRejected) as ctx:
+            controller.submit("c")
+        self.assertGreaterEqual(ctx.exception.retry_after, 1)
+        self.assertEqual(controller.stats()["rejected"], 1)
+
+    def test_requests_that_cannot_meet_their_deadline_are_shed(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=10, max_wait=600)
+        controller.submit("a")
+        # Sin mediciones se asume el tiempo de servicio inicial (10 s).
+        with self.assertRaises(AdmissionRejected):
+            controller.submit("b", max_wait=1)
+        self.assertFalse(controller.submit("b", max_wait=30).admitted)
+
+    def test_cancelled_ticket_leaves_the_queue(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=10, max_wait=60)
+        running = controller.submit("a")
+        waiting = controller.submit("b")
+        controller.finish(waiting)
+        controller.finish(waiting)
+        self.assertEqual(controller.stats()["queue_depth"], 0)
+        controller.finish(running)
+        self.assertEqual(controller.stats()["in_flight"], 0)
+
+
+class TestAdmittedEvents(unittest.TestCase):
+
+    def test_reports_queue_position_until_admitted(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=10, max_wait=60)
+        running = controller.submit("a")
+        ticket = controller.submit("b")
+        events = admitted_events(
+            controller,
+            ticket,
+            lambda: iter([("token", {"text": "hola"})]),
+            interval=0.01,
+        )
+        self.assertEqual(
+            next(events), ("queue", {"position": 1, "estimated_wait": 10.0})
+        )
+        threading.Timer(0.05, controller.finish, args=(running,)).start()
+        rest = list(events)
+        self.assertEqual(rest[-1], ("token", {"text": "hola"}))
+        self.assertTrue(all(kind == "queue" for kind, _ in rest[:-1]))
+        self.assertEqual(controller.stats()["in_flight"], 0)
+
+    def test_queue_timeout_emits_error(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=10, max_wait=60)
+        controller.submit("a")
+        ticket = controller.submit("b")
+        ticket.deadline = time.monotonic() + 0.05
+        started = []
+        events = list(admitted_events(
+            controller,
+            ticket,
+            lambda: started.append(1) or iter([]),
+            interval=0.01,
+        ))
+        self.assertEqual(events[-1][0], "error")
+        self.assertEqual(events[-1][1]["reason"], "queue_timeout")
+        self.assertEqual(started, [])
+        stats = controller.stats()
+        self.assertEqual(stats["timed_out"], 1)
+        self.assertEqual(stats["queue_depth"], 0)
+
+    def test_slot_is_released_when_client_disconnects(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=10, max_wait=60)
+        ticket = controller.submit("a")
+        events = admitted_events(
+            controller,
+            ticket,
+            lambda: iter([("token", {"text": "a"}), ("token", {"text": "b"})]),
+        )
+        next(events)
+        events.close()
+        self.assertEqual(controller.stats()["in_flight"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,19 @@
 import unittest
 import os
 import json
-from unittest.mock import patch, mock_open, MagicMock
+import tempfile
+from unittest.mock import ANY, patch, MagicMock
 
 import tools  # Import the module, not individual functions
 from tools import (
     run_shell_command,
+    shell_job_status,
     read_file,
     write_file,
     list_directory,
     update_long_term_memory,
+    manifest_to_ollama_tools,
+    validate_tool_arguments,
 )
 
 # Import agent_server functions for testing
@@ -49,31 +53,32 @@ class TestTools(unittest.TestCase):
         # Stop the patcher
         self._patcher.stop()
 
-    @patch("subprocess.run")
-    def test_run_shell_command_success(self, mock_subprocess_run):
-        mock_subprocess_run.return_value.returncode = 0
-        mock_subprocess_run.return_value.stdout = "hello world\n"
-        mock_subprocess_run.return_value.stderr = ""
-
+    def test_run_shell_command_success(self):
         result = run_shell_command("echo hello world")
         self.assertEqual(
             result, {"stdout": "hello world\n", "stderr": "", "exit_code": 0}
         )
-        mock_subprocess_run.assert_called_once_with(
-            "echo hello world", shell=True, capture_output=True, text=True, check=False
-        )
-
-    @patch("subprocess.run")
-    def test_run_shell_command_failure(self, mock_subprocess_run):
-        mock_subprocess_run.return_value.returncode = 1
-        mock_subprocess_run.return_value.stdout = ""
-        mock_subprocess_run.return_value.stderr = "command not found\n"
 
-        result = run_shell_command("nonexistent_command")
+    def test_run_shell_command_failure(self):
+        result = run_shell_command("echo command not found >&2; exit 1")
         self.assertEqual(
             result, {"stdout": "", "stderr": "command not found\n", "exit_code": 1}
         )
 
+    def test_run_shell_command_timeout(self):
+        result = run_shell_command("echo inicio; sleep 30", timeout=1)
+        self.assertTrue(result["timed_out"])
+        self.assertEqual(result["stdout"], "inicio\n")
+        self.assertIn("superó el límite", result["stderr"])
+
+    def test_run_shell_command_background(self):
+        started = run_shell_command("echo en segundo plano", background=True)
+        self.assertEqual(started["status"], "running")
+        status = shell_job_status(started["job_id"], wait=5)
+        self.assertEqual(status["status"], "finished")
+        self.assertEqual(status["stdout"], "en segundo plano\n")
+        self.assertIn("error", shell_job_status("inexistente"))
+
     def test_read_file_success(self):
         with open(self.test_file_path, "w") as f:
             f.write("test content")
@@ -121,26 +126,64 @@ class TestTools(unittest.TestCase):
     def test_update_long_term_memory_success(self):
         new_content = "Nueva directiva: Siempre sé amable."
         result = update_long_term_memory(new_content)
-        self.assertEqual(
+        store_file = os.path.join(self.test_dir, "agent_memory.jsonl")
+        self.assertTrue(
+            result.startswith(
+                f"Memoria a largo plazo actualizada en {store_file}: Entrada #"
+            ),
             result,
-            f"Memoria a largo plazo actualizada exitosamente en {self.test_memory_file}.",
         )
-        with open(self.test_memory_file, "r") as f:
-            self.assertEqual(f.read(), new_content)
+        with open(store_file, "r") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["text"], new_content)
+        self.assertEqual(records[0]["section"], "Notas Adicionales")
+
+        # Las actualizaciones se anexan; 'forget' retira una entrada por su id.
+        update_long_term_memory("Otra nota.", section="Lecciones Aprendidas")
+        result = update_long_term_memory(forget=f"#{records[0]['id']}")
+        self.assertIn(f"Entrada #{records[0]['id']} olvidada.", result)
+        with open(store_file, "r") as f:
+            self.assertEqual(
+                [json.loads(line)["op"] for line in f], ["add", "add", "forget"]
+            )
 
     def test_update_long_term_memory_failure(self):
-        with patch.object(tools, "AGENT_MEMORY_FILE", "/root/unwritable_memory.md"):
+        # Un archivo normal no puede contener el registro de memoria.
+        with open(self.test_file_path, "w") as f:
+            f.write("no soy un directorio")
+        memory_file = os.path.join(self.test_file_path, "memoria.md")
+        with patch.object(tools, "AGENT_MEMORY_FILE", memory_file):
             result = update_long_term_memory("content")
             self.assertIn("Error al actualizar la memoria a largo plazo:", result)
 
+    def test_manifest_to_ollama_tools(self):
+        ollama_tools = {t["function"]["name"]: t for t in manifest_to_ollama_tools()}
+        self.assertEqual(set(ollama_tools), set(tools.TOOL_MANIFEST))
+        search = ollama_tools["search_file_content"]["function"]["parameters"]
+        self.assertEqual(search["type"], "object")
+        self.assertEqual(search["required"], ["pattern"])
+        self.assertEqual(search["properties"]["include"]["default"], "*")
+
+    def test_validate_tool_arguments(self):
+        self.assertEqual(validate_tool_arguments("read_file", {"path": "/tmp/a"}), [])
+        self.assertEqual(validate_tool_arguments("get_current_date", {}), [])
+        self.assertEqual(len(validate_tool_arguments("read_file", {})), 1)
+        self.assertEqual(len(validate_tool_arguments("read_file", {"path": 3})), 1)
+        self.assertEqual(
+            len(validate_tool_arguments("read_file", {"path": "/a", "modo": "r"})), 1
+        )
+        self.assertIn("no existe", validate_tool_arguments("borrar_todo", {})[0])
+
 
 # Import agent_server functions for testing
 class TestAgentServer(unittest.TestCase):
 
     def setUp(self):
         # Create a dummy directory and files for testing file operations
-        self.test_dir = "/tmp/test_agent_cli_dir_server"
-        os.makedirs(self.test_dir, exist_ok=True)
+        # A fresh directory per test: memory stores are shared per path
+        # within the process.
+        self.test_dir = tempfile.mkdtemp(prefix="test_agent_cli_dir_server")
         self.test_memory_file = os.path.join(self.test_dir, "agent_memory.md")
 
         # Patch agent_server.AGENT_MEMORY_FILE for isolated testing
@@ -153,12 +196,6 @@ class TestAgentServer(unittest.TestCase):
         self.app = app.test_client()
         self.app.testing = True
 
-        # Set a dummy API key for testing
-        os.environ["AGENT_API_KEY"] = "test_api_key"
-        # Ensure the app's API_KEY is updated for the test client
-        self._api_key_patcher = patch.object(agent_server, "API_KEY", "test_api_key")
-        self._api_key_patcher.start()
-
     def tearDown(self):
         # Clean up dummy directory and files
         if os.path.exists(self.test_dir):
@@ -171,26 +208,27 @@ class TestAgentServer(unittest.TestCase):
 
         # Stop the patchers
         self._agent_memory_file_patcher_server.stop()
-        self._api_key_patcher.stop()
 
-        # Clean up environment variable
-        del os.environ["AGENT_API_KEY"]
-
-    @patch("builtins.open", new_callable=mock_open, read_data="Test memory content.")
-    def test_load_long_term_memory_success(self, mock_open_func):
-        expected_content = "Test memory content."
+    def test_load_long_term_memory_success(self):
+        with open(self.test_memory_file, "w", encoding="utf-8") as f:
+            f.write(
+                "# Memoria\n\n## Directivas Generales\n- Responde en español.\n\n"
+                "## Preferencias del Usuario\n- Usa pytest.\n- [Plantilla]\n"
+            )
         content = load_long_term_memory()
-        self.assertEqual(content, expected_content)
-        mock_open_func.assert_called_once_with(
-            self.test_memory_file, "r", encoding="utf-8"
-        )
-
-    @patch("builtins.open", side_effect=FileNotFoundError)
-    def test_load_long_term_memory_not_found(self, mock_open_func):
+        # Solo las directivas fijas; el resto se recupera por relevancia.
+        self.assertIn("## Directivas Generales\n- Responde en español. (#", content)
+        self.assertNotIn("pytest", content)
+        load_relevant_memory = agent_server.load_relevant_memory
+        self.assertIn("Usa pytest.", load_relevant_memory("ejecuta pytest", content))
+        self.assertEqual(load_relevant_memory("algo sin relación", content), "")
+
+    def test_load_long_term_memory_not_found(self):
         content = load_long_term_memory()
         self.assertIn(
             "Advertencia: No se encontró el archivo de memoria del agente.", content
         )
+        self.assertEqual(agent_server.load_relevant_memory("pytest", content), "")
 
     def test_build_system_prompt(self):
         long_term_memory = "Soy un asistente de prueba."
@@ -216,27 +254,18 @@ class TestAgentServer(unittest.TestCase):
         self.assertIn("list_directory", prompt)
         self.assertIn("update_long_term_memory", prompt)
 
-    @patch("subprocess.run")
-    def test_call_ollama_success(self, mock_subprocess_run):
-        mock_subprocess_run.return_value.returncode = 0
-        mock_subprocess_run.return_value.stdout = "Ollama response content."
-        mock_subprocess_run.return_value.stderr = ""
+    @patch.object(agent_server.ollama_backend, "generate")
+    def test_call_ollama_success(self, mock_generate):
+        mock_generate.return_value = "Ollama response content.\n"
 
         prompt = "Test prompt"
         result = call_ollama(prompt)
         self.assertEqual(result, "Ollama response content.")
-        mock_subprocess_run.assert_called_once_with(
-            ["/usr/local/bin/ollama", "run", agent_server.OLLAMA_MODEL, prompt],
-            capture_output=True,
-            text=True,
-            check=False,
-        )
+        mock_generate.assert_called_once_with(prompt)
 
-    @patch("subprocess.run")
-    def test_call_ollama_failure(self, mock_subprocess_run):
-        mock_subprocess_run.return_value.returncode = 1
-        mock_subprocess_run.return_value.stdout = ""
-        mock_subprocess_run.return_value.stderr = "Ollama error message."
+    @patch.object(agent_server.ollama_backend, "generate")
+    def test_call_ollama_failure(self, mock_generate):
+        mock_generate.side_effect = agent_server.OllamaError("Ollama error message.")
 
         prompt = "Test prompt"
         result = call_ollama(prompt)
@@ -305,3 +334,265 @@ class TestAgentServer(unittest.TestCase):
         )
         mock_update_memory.assert_called_once_with(content="new memory")
         mock_update_memory.reset_mock()
+
+
+class TestChatStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        self._memory_patcher = patch.object(
+            agent_server, "load_long_term_memory", return_value="memoria"
+        )
+        self._memory_patcher.start()
+
+    def tearDown(self):
+        self._memory_patcher.stop()
+
+    def _fake_stream(self, responses, consumed):
+        streams = iter(responses)
+
+        def fake_call_ollama_stream(prompt, **kwargs):
+            for chunk in next(streams):
+                consumed.append(chunk)
+                yield chunk
+
+        return fake_call_ollama_stream
+
+    def test_text_answer_is_streamed_before_generation_ends(self):
+        consumed = []
+        fake = self._fake_stream([["Hola", ", ", "mundo", "."]], consumed)
+        with patch.object(agent_server, "call_ollama_stream", fake):
+            response = self.app.post(
+                "/chat", json={"user_message": "Hola"}, buffered=False
+            )
+            body = iter(response.response)
+            first = next(body)
+            self.assertEqual(first, b"Hola")
+            self.assertEqual(consumed, ["Hola"])
+            rest = b"".join(body)
+        self.assertEqual(first + rest, b"Hola, mundo.")
+
+    def test_tool_call_is_executed_before_answer(self):
+        consumed = []
+        fake = self._fake_stream(
+            [['{"get_current_date"', ": {}}"], ["Hoy es ", "lunes."]], consumed
+        )
+        with patch.object(agent_server, "call_ollama_stream", fake), patch.object(
+            agent_server, "execute_tool", return_value="2024-01-01"
+        ) as mock_execute:
+            response = self.app.post("/chat", json={"user_message": "¿Qué día es?"})
+            body = response.get_data(as_text=True)
+        self.assertEqual(body, "Hoy es lunes.")
+        mock_execute.assert_called_once_with("get_current_date", {}, ANY)
+
+    def test_multiple_tool_calls_in_one_step(self):
+        consumed = []
+        fake = self._fake_stream(
+            [
+                ['[{"read_file": {"path": "/a"}},', ' {"read_file": {"path": "/b"}}]'],
+                ["Listo."],
+            ],
+            consumed,
+        )
+        prompts = []
+
+        def recording(prompt, **kwargs):
+            prompts.append(prompt)
+            return fake(prompt, **kwargs)
+
+        def fake_execute(name, params, session_id):
+            return f"contenido de {params['path']}"
+
+        with patch.object(agent_server, "call_ollama_stream", recording), patch.object(
+            agent_server, "execute_tool", side_effect=fake_execute
+        ) as mock_execute:
+            response = self.app.post(
+                "/chat",
+                json={"user_message": "Lee /a y /b"},
+                headers={"Accept": "text/event-stream"},
+            )
+            body = response.get_data(as_text=True)
+        self.assertEqual(mock_execute.call_count, 2)
+        # Una sola pasada extra del modelo con ambas observaciones.
+        self.assertEqual(len(prompts), 2)
+        self.assertIn("contenido de /a", prompts[1])
+        self.assertIn("contenido de /b", prompts[1])
+        self.assertEqual(body.count("event: tool_result"), 2)
+        self.assertIn('"model_passes": 2', body)
+
+    def test_tool_call_after_prose(self):
+        consumed = []
+        fake = self._fake_stream(
+            [
+                [
+                    "Voy a consultarlo.\n",
+                    "```json\n",
+                    '{"get_current_date": {}}',
+                    "\n```",
+                ],
+                ["Hoy es lunes."],
+            ],
+            consumed,
+        )
+        with patch.object(agent_server, "call_ollama_stream", fake), patch.object(
+            agent_server, "execute_tool", return_value="2024-01-01"
+        ) as mock_execute:
+            response = self.app.post("/chat", json={"user_message": "¿Qué día es?"})
+            body = response.get_data(as_text=True)
+        self.assertEqual(body, "Voy a consultarlo.\nHoy es lunes.")
+        mock_execute.assert_called_once_with("get_current_date", {}, ANY)
+
+    def test_prose_in_the_same_chunk_as_the_tool_call(self):
+        consumed = []
+        fake = self._fake_stream(
+            [['Voy a mirar.\n{"get_current_date": {}}'], ["Hoy es lunes."]], consumed
+        )
+        with patch.object(agent_server, "call_ollama_stream", fake), patch.object(
+            agent_server, "execute_tool", return_value="2024-01-01"
+        ) as mock_execute:
+            response = self.app.post("/chat", json={"user_message": "¿Qué día es?"})
+            body = response.get_data(as_text=True)
+        self.assertEqual(body, "Voy a mirar.\nHoy es lunes.")
+        mock_execute.assert_called_once_with("get_current_date", {}, ANY)
+
+    def test_native_mode_repairs_invalid_arguments(self):
+        frames = [
+            [
+                {
+                    "message": {
+                        "role": "assistant",
+                        "content": "",
+                        "tool_calls": [
+                            {
+                                "function": {
+                                    "name": "read_file",
+                                    "arguments": {"file": "/a"},
+                                }
+                            }
+                        ],
+                    },
+                    "done": True,
+                }
+            ],
+            [
+                {"message": {"role": "assistant", "content": "Listo."}, "done": False},
+                {"message": {"role": "assistant", "content": ""}, "done": True},
+            ],
+        ]
+        streams = iter(frames)
+        with patch.object(agent_server, "TOOL_CALLING_MODE", "native"), patch.object(
+            agent_server.ollama_backend,
+            "chat_frames",
+            side_effect=lambda *a, **k: iter(next(streams)),
+        ) as mock_chat, patch.object(
+            agent_server.ollama_backend, "generate", return_value='{"path": "/a"}'
+        ) as mock_generate, patch.object(
+            agent_server, "execute_tool", return_value="contenido"
+        ) as mock_execute:
+            response = self.app.post("/chat", json={"user_message": "Lee /a"})
+            body = response.get_data(as_text=True)
+
+        self.assertEqual(body, "Listo.")
+        self.assertEqual(mock_chat.call_args.kwargs["tools"], agent_server.OLLAMA_TOOLS)
+        self.assertEqual(
+            mock_generate.call_args.kwargs["format"]["required"], ["path"]
+        )
+        mock_execute.assert_called_once_with("read_file", {"path": "/a"}, ANY)
+
+    def test_session_keeps_history_on_the_server(self):
+        prompts = []
+
+        def fake_call_ollama_stream(prompt, **kwargs):
+            prompts.append(prompt)
+            yield f"Respuesta {len(prompts)}"
+
+        with patch.object(agent_server, "call_ollama_stream", fake_call_ollama_stream):
+            response = self.app.post("/chat", json={"user_message": "Primero"})
+            response.get_data()
+            session_id = response.headers["X-Session-Id"]
+            response = self.app.post(
+                "/chat", json={"user_message": "Segundo", "session_id": session_id}
+            )
+            response.get_data()
+
+        self.assertIn("Usuario: Primero\nAgente: Respuesta 1", prompts[1])
+        transcript = self.app.get(f"/sessions/{session_id}?offset=1&limit=2").get_json()
+        self.assertEqual(transcript["total"], 4)
+        self.assertEqual(
+            [t["text"] for t in transcript["turns"]], ["Respuesta 1", "Segundo"]
+        )
+        self.assertEqual(transcript["next_offset"], 3)
+
+    def test_unknown_session_is_rejected(self):
+        response = self.app.post(
+            "/chat", json={"user_message": "Hola", "session_id": "desconocida"}
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.app.get("/sessions/desconocida").status_code, 404)
+
+    def test_saturated_queue_returns_429(self):
+        from admission import AdmissionController
+        busy = AdmissionController(max_concurrent=1, max_queue=0)
+        busy.submit("otro-cliente")
+        with patch.object(agent_server, "admission", busy):
+            response = self.app.post("/chat", json={"user_message": "Hola"})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response.headers)
+        self.assertEqual(busy.stats()["rejected"], 1)
+
+    def test_failed_requests_release_their_admission_slot(self):
+        from admission import AdmissionController
+        controller = AdmissionController(max_concurrent=2, max_queue=10)
+        with patch.object(agent_server, "admission", controller):
+            for _ in range(3):
+                response = self.app.post(
+                    "/chat", json={"user_message": "Hola", "history": ["oops"]}
+                )
+                self.assertEqual(response.status_code, 400)
+            # Un fallo entre la admisión y la respuesta también libera la plaza.
+            with patch.object(
+                agent_server.session_store, "create", side_effect=RuntimeError("disco")
+            ):
+                response = self.app.post("/chat", json={"user_message": "Hola"})
+                self.assertEqual(response.status_code, 500)
+        stats = controller.stats()
+        self.assertEqual((stats["in_flight"], stats["queue_depth"]), (0, 0))
+
+    def test_kv_context_is_reused_across_steps_and_requests(self):
+        calls = []
+        scripts = iter([
+            ['{"get_current_date": {}}'],
+            ["Hoy es lunes."],
+            ["De nada."],
+        ])
+
+        def fake_generate_frames(prompt, **options):
+            calls.append((prompt, options.get("context")))
+            step = len(calls)
+            for token in next(scripts):
+                yield {"response": token, "done": False}
+            yield {
+                "response": "", "done": True,
+                "context": [step], "prompt_eval_count": 10,
+            }
+
+        with patch.object(
+            agent_server.ollama_backend, "generate_frames", fake_generate_frames
+        ), patch.object(agent_server, "execute_tool", return_value="2024-01-01"):
+            response = self.app.post("/chat", json={"user_message": "¿Qué día es?"})
+            response.get_data()
+            session_id = response.headers["X-Session-Id"]
+            self.app.post(
+                "/chat", json={"user_message": "Gracias", "session_id": session_id}
+            ).get_data()
+
+        self.assertIn("### HERRAMIENTAS DISPONIBLES ###", calls[0][0])
+        self.assertIsNone(calls[0][1])
+        # Tras la herramienta solo se envía la observación sobre el contexto previo.
+        self.assertTrue(
+            calls[1][0].startswith("Observación de Herramienta: 2024-01-01")
+        )
+        self.assertEqual(calls[1][1], [1])
+        # La siguiente petición de la sesión reutiliza el contexto final.
+        self.assertEqual(calls[2], ("Usuario: Gracias\n", [2]))
@@ -0,0 +1,52 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import agent_client
+
+
+def fake_response(status_code=200, chunks=(), headers=None, error=None):
+    response = MagicMock()
+    response.__enter__.return_value = response
+    response.status_code = status_code
+    response.ok = status_code < 400
+    response.headers = headers or {}
+    response.encoding = "utf-8"
+    response.iter_content.return_value = iter(chunks)
+    response.json.return_value = {"error": error}
+    return response
+
+
+@patch.object(agent_client, "API_KEY", "clave")
+class TestChatWithAgent(unittest.TestCase):
+
+    def test_session_is_kept_and_only_the_new_message_is_sent(self):
+        first = fake_response(chunks=["Ho", "la"], headers={"X-Session-Id": "s1"})
+        second = fake_response(chunks=["Adiós"], headers={"X-Session-Id": "s1"})
+        with patch.object(
+            agent_client.requests, "post", side_effect=[first, second]
+        ) as post:
+            received = []
+            reply, session_id = agent_client.chat_with_agent(
+                "Hola", on_chunk=received.append
+            )
+            self.assertEqual((reply, session_id), ("Hola", "s1"))
+            self.assertEqual(received, ["Ho", "la"])
+            reply, session_id = agent_client.chat_with_agent("Chao", session_id)
+        self.assertEqual((reply, session_id), ("Adiós", "s1"))
+        payloads = [call.kwargs["json"] for call in post.call_args_list]
+        self.assertEqual(
+            payloads,
+            [{"user_message": "Hola"}, {"user_message": "Chao", "session_id": "s1"}],
+        )
+        self.assertTrue(all(call.kwargs["stream"] for call in post.call_args_list))
+
+    def test_expired_session_is_dropped(self):
+        expired = fake_response(404, error="La sesión 's1' no existe.")
+        with patch.object(agent_client.requests, "post", return_value=expired):
+            reply, session_id = agent_client.chat_with_agent("Hola", "s1")
+        self.assertIsNone(session_id)
+        self.assertIn("no existe", reply)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+import json
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import agent_server
+from cancellation import CLIENT_DISCONNECT, DEADLINE, Cancellation
+from metrics import AGENT_LIMITS
+from shell_runner import run_command
+from streaming import EventPump
+from tool_executor import ToolExecutor
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+class TestCancellation(unittest.TestCase):
+
+    def test_deadline_counts_as_cancelled_and_first_reason_wins(self):
+        cancellation = Cancellation(deadline=time.monotonic() - 1)
+        self.assertTrue(cancellation.cancelled)
+        cancellation.cancel(CLIENT_DISCONNECT)
+        self.assertEqual(cancellation.reason, DEADLINE)
+        self.assertFalse(Cancellation().cancelled)
+
+    def test_cancelled_shell_command_is_killed(self):
+        cancellation = Cancellation()
+        threading.Timer(0.2, cancellation.cancel, args=(CLIENT_DISCONNECT,)).start()
+        started = time.monotonic()
+        result = run_command("sleep 30", timeout=60, cancellation=cancellation)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertTrue(result["cancelled"])
+        self.assertIn("petición cancelada", result["stderr"])
+
+    def test_executor_stops_waiting_and_skips_later_batches(self):
+        release = threading.Event()
+        executed = []
+
+        def execute(name, params):
+            executed.append(name)
+            release.wait(5)
+            return "ok"
+
+        executor = ToolExecutor(execute, read_only={"leer"})
+        cancellation = Cancellation()
+        threading.Timer(0.2, cancellation.cancel, args=(CLIENT_DISCONNECT,)).start()
+        started = time.monotonic()
+        results = list(executor.stream(
+            [("leer", {}), ("escribir", {})], cancellation=cancellation
+        ))
+        release.set()
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual([index for _, index, _ in results], [0, 1])
+        self.assertIn("cancelada", json.loads(results[1][2])["error"])
+        self.assertEqual(executed, ["leer"])
+        executor.shutdown()
+
+    def test_event_pump_calls_on_stop_only_if_the_producer_is_running(self):
+        stops = []
+        release = threading.Event()
+
+        def events():
+            yield "token", {"text": "a"}
+            release.wait(5)
+            yield "token", {"text": "b"}
+
+        pump = EventPump(events(), on_stop=lambda: stops.append(True))
+        self.assertEqual(pump.get(1), ("token", {"text": "a"}))
+        pump.stop()
+        release.set()
+        self.assertEqual(stops, [True])
+
+        finished = EventPump(
+            iter([("token", {"text": "a"})]), on_stop=lambda: stops.append(False)
+        )
+        finished._thread.join(1)
+        finished.stop()
+        self.assertEqual(stops, [True])
+
+
+class TestAgentLimits(unittest.TestCase):
+
+    def setUp(self):
+        self.app = agent_server.app.test_client()
+        self.calls = []
+        patcher = patch.object(
+            agent_server, "load_long_term_memory", return_value="memoria"
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_agent(self, frames, cancellation=None):
+        def fake_generate_frames(prompt, **options):
+            self.calls.append(options)
+            yield from frames()
+
+        session_id = agent_server.session_store.create()
+        with patch.object(
+            agent_server.ollama_backend, "generate_frames", fake_generate_frames
+        ):
+            events = list(agent_server.run_agent(
+                session_id, "Hola", agent_server.get_static_prefix(), [], cancellation
+            ))
+        return session_id, events
+
+    def test_tool_steps_are_capped(self):
+        before = AGENT_LIMITS.value(reason="max_steps")
+
+        def frames():
+            yield {"response": '{"get_current_date": {}}', "done": False}
+            yield {"response": "", "done": True}
+
+        with patch.object(agent_server, "MAX_TOOL_STEPS", 2):
+            session_id, events = self.run_agent(frames)
+        self.assertEqual(len(self.calls), 3)
+        self.assertEqual(events[-1], ("error", {
+            "message": agent_server.STOP_MESSAGES["max_steps"], "reason": "max_steps"
+        }))
+        turns = agent_server.session_store.get_turns(session_id)
+        self.assertEqual(turns[-1]["role"], "agent")
+        # La métrica se cuenta al cerrar la petición (observed_request).
+        self.assertEqual(AGENT_LIMITS.value(reason="max_steps"), before)
+
+    def test_deadline_stops_the_model_stream(self):
+        closed = []
+
+        def frames():
+            try:
+                for i in range(100):
+                    time.sleep(0.02)
+                    yield {"response": f"t{i} ", "done": False}
+                yield {"response": "", "done": True}
+            finally:
+                closed.append(True)
+
+        session_id, events = self.run_agent(
+            frames, Cancellation(time.monotonic() + 0.2)
+        )
+        tokens = [data for kind, data in events if kind == "token"]
+        self.assertLess(len(tokens), 50)
+        self.assertEqual(events[-1][1]["reason"], "deadline")
+        self.assertEqual(closed, [True])
+        turns = agent_server.session_store.get_turns(session_id)
+        self.assertTrue(turns[-1]["text"].startswith("t0"))
+
+    def test_step_token_limit_is_sent_and_reported(self):
+        before = AGENT_LIMITS.value(reason="step_tokens")
+
+        def frames():
+            yield {"response": "Respuesta cortada", "done": False}
+            yield {"response": "", "done": True, "done_reason": "length"}
+
+        with patch.object(agent_server, "STEP_MAX_TOKENS", 16):
+            _, events = self.run_agent(frames)
+        self.assertEqual(self.calls[0]["options"], {"num_predict": 16})
+        self.assertTrue(events[-1][1]["truncated"])
+        self.assertEqual(AGENT_LIMITS.value(reason="step_tokens"), before + 1)
+
+    def test_client_disconnect_kills_the_running_tool(self):
+        before = AGENT_LIMITS.value(reason=CLIENT_DISCONNECT)
+        call = '{"run_shell_command": {"command": "sleep 30"}}'
+        scripts = iter([[{"response": call, "done": False}]])
+
+        def fake_generate_frames(prompt, **options):
+            yield from next(scripts, [{"response": "Fin.", "done": False}])
+            yield {"response": "", "done": True}
+
+        started = time.monotonic()
+        with patch.object(
+            agent_server.ollama_backend, "generate_frames", fake_generate_frames
+        ):
+            response = self.app.post(
+                "/chat",
+                json={"user_message": "Espera"},
+                headers={"Accept": "text/event-stream"},
+                buffered=False,
+            )
+            stream = response.response
+            for chunk in stream:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                if b"tool_start" in chunk:
+                    break
+            response.close()
+            self.assertTrue(wait_until(
+                lambda: AGENT_LIMITS.value(reason=CLIENT_DISCONNECT) == before + 1
+            ))
+        self.assertLess(time.monotonic() - started, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
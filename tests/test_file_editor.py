@@ -0,0 +1,144 @@
+import os
+import stat
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import file_editor
+import tools
+from file_editor import EditError, apply_edits
+
+
+class TestApplyEdits(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.a = self._write(
+            "a.py", "def uno():\n    return 1\n\n\ndef dos():\n    return 2\n"
+        )
+        self.b = self._write("b.py", "VALOR = 10\n")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _write(self, name, content, newline=None):
+        path = os.path.join(self._tmp.name, name)
+        with open(path, "w", newline=newline) as f:
+            f.write(content)
+        return path
+
+    def _read(self, path):
+        with open(path, newline="") as f:
+            return f.read()
+
+    def test_multiple_hunks_in_several_files(self):
+        summary = apply_edits([
+            (self.a, "return 2", "return 22"),
+            (self.a, "def uno():", "def uno(x):"),
+            (self.b, "VALOR = 10", "VALOR = 11\nOTRO = 1"),
+        ])
+        self.assertEqual(
+            self._read(self.a),
+            "def uno(x):\n    return 1\n\n\ndef dos():\n    return 22\n",
+        )
+        self.assertEqual(self._read(self.b), "VALOR = 11\nOTRO = 1\n")
+        self.assertIn(f"Editado {self.a} (2 cambios, +2 -2 líneas):", summary)
+        self.assertIn("@@ línea 1 @@\n-def uno():\n+def uno(x):", summary)
+        self.assertIn("@@ línea 6 @@", summary)
+        self.assertIn(f"Editado {self.b} (1 cambios, +2 -1 líneas):", summary)
+
+    def test_failed_hunk_leaves_every_file_untouched(self):
+        before = (self._read(self.a), self._read(self.b))
+        with self.assertRaises(EditError):
+            apply_edits(
+                [(self.b, "VALOR = 10", "VALOR = 11"), (self.a, "no existe", "x")]
+            )
+        self.assertEqual((self._read(self.a), self._read(self.b)), before)
+        self.assertEqual(sorted(os.listdir(self._tmp.name)), ["a.py", "b.py"])
+
+    def test_ambiguous_and_overlapping_hunks_are_rejected(self):
+        with self.assertRaisesRegex(EditError, "más de una vez"):
+            apply_edits([(self.a, "    return", "    yield")])
+        with self.assertRaisesRegex(EditError, "solapan"):
+            apply_edits([
+                (self.a, "def uno():\n    return 1", "x"),
+                (self.a, "return 1\n\n", "y"),
+            ])
+
+    def test_crlf_files_accept_lf_hunks(self):
+        path = self._write("win.txt", "uno\ndos\ntres\n", newline="\r\n")
+        apply_edits([(path, "uno\ndos", "UNO\nDOS")])
+        self.assertEqual(self._read(path), "UNO\r\nDOS\r\ntres\r\n")
+
+    def test_permissions_are_preserved(self):
+        os.chmod(self.a, 0o750)
+        apply_edits([(self.a, "return 1", "return 0")])
+        self.assertEqual(stat.S_IMODE(os.stat(self.a).st_mode), 0o750)
+
+    def test_large_files_are_copied_in_chunks(self):
+        path = self._write("grande.txt", "".join(f"línea {i}\n" for i in range(50_000)))
+        with patch.object(file_editor, "EDIT_CHUNK_BYTES", 4096):
+            summary = apply_edits([
+                (path, "línea 40000\n", "cambiada\n"),
+                (path, "línea 7\n", "siete\n"),
+            ])
+        content = self._read(path)
+        self.assertIn("línea 39999\ncambiada\nlínea 40001\n", content)
+        self.assertTrue(content.startswith("línea 0\n"))
+        self.assertIn("@@ línea 8 @@", summary)
+        self.assertIn("@@ línea 40001 @@", summary)
+
+    def test_rename_failure_rolls_back_committed_files(self):
+        original_replace = os.replace
+        calls = []
+
+        def flaky_replace(src, dst):
+            calls.append(dst)
+            if dst == self.b and len(calls) == 2:
+                raise OSError("disco lleno")
+            return original_replace(src, dst)
+
+        before = (self._read(self.a), self._read(self.b))
+        with patch("file_editor.os.replace", flaky_replace):
+            with self.assertRaises(EditError):
+                apply_edits([(self.a, "return 1", "return 0"), (self.b, "10", "20")])
+        self.assertEqual((self._read(self.a), self._read(self.b)), before)
+        self.assertEqual(sorted(os.listdir(self._tmp.name)), ["a.py", "b.py"])
+
+
+class TestReplaceTool(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "c.py")
+        with open(self.path, "w") as f:
+            f.write("a = 1\nb = 2\n")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_single_replacement_keeps_the_original_interface(self):
+        result = tools.replace(self.path, "a = 1", "a = 3", "Cambia a")
+        self.assertTrue(result.startswith(f"Editado {self.path}"))
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "a = 3\nb = 2\n")
+
+    def test_edits_list_uses_file_path_as_default(self):
+        with patch.object(tools, "_path_changed") as changed:
+            tools.replace(file_path=self.path, edits=[
+                {"old_string": "a = 1", "new_string": "a = 5"},
+                {"old_string": "b = 2", "new_string": "b = 6"},
+            ])
+        changed.assert_called_once_with(self.path)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "a = 5\nb = 6\n")
+
+    def test_errors_are_reported_without_writing(self):
+        result = tools.replace(self.path, "z = 0", "z = 1")
+        self.assertTrue(result.startswith("Error:"))
+        self.assertIn("No se ha modificado ningún archivo.", result)
+        self.assertIn("debe tener", tools.replace(edits=[{"old_string": "a"}]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import fs_walk
+from file_glob import GlobPattern, glob_paths, iter_glob
+from fs_walk import DirectoryCache
+
+
+class TestFileGlob(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = self._tmp.name
+        for relative in [
+            "a.py",
+            ".oculto.py",
+            "src/b.py",
+            "src/c.ts",
+            "src/d.tsx",
+            "src/sub/e.py",
+            "node_modules/x/f.py",
+            "docs/g.md",
+        ]:
+            path = os.path.join(self.root, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "w").close()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def relative(self, pattern: str, **kwargs) -> list:
+        paths, _ = glob_paths(pattern, self.root, **kwargs)
+        return sorted(os.path.relpath(p, self.root) for p in paths)
+
+    def test_recursive_and_single_level_patterns(self):
+        self.assertEqual(self.relative("**/*.py"), ["a.py", "src/b.py", "src/sub/e.py"])
+        self.assertEqual(self.relative("src/*.py"), ["src/b.py"])
+        self.assertEqual(
+            self.relative("src/*"), ["src/b.py", "src/c.ts", "src/d.tsx", "src/sub"]
+        )
+        self.assertEqual(self.relative("src/**/*.{ts,tsx}"), ["src/c.ts", "src/d.tsx"])
+        self.assertEqual(self.relative(".*.py"), [".oculto.py"])
+
+    def test_subtrees_that_cannot_match_are_not_listed(self):
+        listed = []
+        real_scan = fs_walk._scan
+
+        def recording_scan(directory):
+            listed.append(os.path.relpath(directory, self.root))
+            return real_scan(directory)
+
+        with patch.object(fs_walk, "_scan", recording_scan):
+            list(iter_glob("src/*.py", self.root))
+        self.assertEqual(sorted(listed), [".", "src"])
+
+    def test_may_contain(self):
+        pattern = GlobPattern("src/**/test_*.py")
+        self.assertTrue(pattern.may_contain(["src"]))
+        self.assertTrue(pattern.may_contain(["src", "a", "b"]))
+        self.assertFalse(pattern.may_contain(["docs"]))
+        self.assertFalse(GlobPattern("src/*.py").may_contain(["src", "sub"]))
+
+    def test_limit_and_mtime_order(self):
+        now = time.time()
+        for i, name in enumerate(["a.py", "src/b.py", "src/sub/e.py"]):
+            os.utime(os.path.join(self.root, name), (now, now - 100 + i * 10))
+        paths, truncated = glob_paths("**/*.py", self.root, limit=2, sort_by_mtime=True)
+        self.assertTrue(truncated)
+        self.assertEqual(
+            [os.path.relpath(p, self.root) for p in paths], ["src/sub/e.py", "src/b.py"]
+        )
+        paths, truncated = glob_paths("**/*.py", self.root, limit=3)
+        self.assertFalse(truncated)
+
+    def test_directory_cache_is_invalidated_by_changes(self):
+        cache = DirectoryCache()
+        first = [e.name for e in cache.list(self.root)]
+        self.assertIs(cache.list(self.root), cache.list(self.root))
+        time.sleep(0.01)
+        open(os.path.join(self.root, "nuevo.py"), "w").close()
+        names = sorted([e.name for e in cache.list(self.root)])
+        self.assertEqual(names, sorted(first + ["nuevo.py"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
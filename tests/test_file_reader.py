@@ -0,0 +1,122 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import file_reader
+from file_reader import LineIndex, read_bytes, read_lines
+from tools import read_file
+
+
+class TestFileReader(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "registro.log")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, content: bytes):
+        with open(self.path, "wb") as f:
+            f.write(content)
+
+    def test_line_index_matches_naive_offsets(self):
+        samples = [b"a\nbb\n\nccc\nd", b"a\nb\n", b"\n\n\n", b"sin salto", b"x\n" * 50]
+        for content in samples:
+            lines = content.split(b"\n")
+            naive = [0]
+            for line in lines[:-1]:
+                naive.append(naive[-1] + len(line) + 1)
+            expected_total = len(lines) - (1 if content.endswith(b"\n") else 0)
+            for chunk in (3, 1024):
+                with patch.object(file_reader, "INDEX_CHUNK_BYTES", chunk):
+                    index = LineIndex(content, len(content), step=4)
+                self.assertEqual(index.total_lines, expected_total, content)
+                for line in range(expected_total):
+                    self.assertEqual(
+                        index.line_start(content, line), naive[line], (content, line)
+                    )
+
+    def test_pages_report_totals_and_cursor(self):
+        self.write("".join(f"línea {i}\n" for i in range(1, 11)).encode("utf-8"))
+        page = read_lines(self.path, offset=4, limit=3)
+        self.assertEqual(page["content"], "línea 4\nlínea 5\nlínea 6\n")
+        self.assertEqual((page["start_line"], page["end_line"]), (4, 6))
+        self.assertEqual(page["total_lines"], 10)
+        self.assertEqual(page["next_offset"], 7)
+        last = read_lines(self.path, offset=9, limit=5)
+        self.assertEqual(last["content"], "línea 9\nlínea 10\n")
+        self.assertIsNone(last["next_offset"])
+        self.assertEqual(read_lines(self.path, offset=50)["content"], "")
+
+    def test_byte_cap_cuts_at_line_boundary(self):
+        self.write(b"12345\n" * 10)
+        page = read_lines(self.path, limit=10, max_bytes=15)
+        self.assertEqual(page["content"], "12345\n12345\n")
+        self.assertEqual(page["next_offset"], 3)
+
+        self.write(b"x" * 100)
+        page = read_lines(self.path, max_bytes=10)
+        self.assertTrue(page["partial_line"])
+        self.assertEqual(page["end_byte"], 10)
+
+    def test_index_is_rebuilt_when_file_changes(self):
+        self.write(b"a\nb\n")
+        self.assertEqual(read_lines(self.path)["total_lines"], 2)
+        time.sleep(0.01)
+        self.write(b"a\nb\nc\n")
+        self.assertEqual(read_lines(self.path)["total_lines"], 3)
+
+    def test_binary_files_are_rejected(self):
+        self.write(b"\x00\x01\x02")
+        with self.assertRaises(ValueError):
+            read_lines(self.path)
+
+    def test_read_bytes(self):
+        self.write(b"0123456789")
+        page = read_bytes(self.path, 3, 4)
+        self.assertEqual((page["content"], page["next_byte_offset"]), ("3456", 7))
+
+    def test_non_positive_limits_are_clamped(self):
+        self.write(b"0123456789")
+        page = read_bytes(self.path, 0, -1)
+        self.assertEqual((page["content"], page["end"]), ("0", 1))
+        page = read_lines(self.path, offset=-3, limit=0)
+        self.assertEqual((page["start_line"], page["end_line"]), (1, 1))
+
+    def test_tool_rejects_non_positive_parameters(self):
+        self.write(b"linea 1\nlinea 2\n")
+        for params in (
+            {"byte_limit": -1}, {"byte_limit": 0}, {"byte_offset": -5},
+            {"offset": 0}, {"offset": -2}, {"limit": 0}, {"limit": -1},
+        ):
+            with self.subTest(params=params):
+                self.assertTrue(read_file(self.path, **params).startswith("Error:"))
+        self.assertEqual(
+            read_file(self.path, byte_limit=1),
+            "l\n[Bytes 0-1 de 16. Continúa con byte_offset=1.]",
+        )
+
+    def test_tool_pages_large_files(self):
+        self.write(b"".join(b"linea %d\n" % i for i in range(1, 6)))
+        self.assertEqual(
+            read_file(self.path), "linea 1\nlinea 2\nlinea 3\nlinea 4\nlinea 5\n"
+        )
+        result = read_file(self.path, offset=2, limit=2)
+        self.assertEqual(
+            result, "linea 2\nlinea 3\n[Líneas 2-3 de 5. Continúa con offset=4.]"
+        )
+        with patch.object(file_reader, "READ_DEFAULT_LINES", 2), patch(
+            "tools.READ_DEFAULT_LINES", 2
+        ):
+            self.assertIn("Continúa con offset=3.", read_file(self.path))
+        self.assertEqual(
+            read_file(self.path, byte_offset=0, byte_limit=5),
+            "linea\n[Bytes 0-5 de 40. Continúa con byte_offset=5.]",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
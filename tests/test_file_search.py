@@ -0,0 +1,128 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import file_search
+import search_index
+from file_search import iter_search, line_bounded, required_literal, search_file
+from tools import search_file_content
+
+
+class TestFileSearch(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, relative: str, content, mode: str = "w"):
+        path = os.path.join(self.root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, mode) as f:
+            f.write(content)
+        return path
+
+    def test_required_literal(self):
+        self.assertEqual(required_literal(r"def foo\("), b"def foo(")
+        self.assertEqual(required_literal(r"error: (\w+) failed"), b"error: ")
+        self.assertEqual(required_literal(r"(?:foo|bar)baz"), b"baz")
+        self.assertEqual(required_literal(r"(?i)hola"), b"")
+        self.assertEqual(required_literal(r"[abc]+"), b"")
+        self.assertEqual(required_literal(r"(?i:abc)defg"), b"defg")
+
+    def test_scoped_ignorecase_groups_are_not_prefiltered(self):
+        path = self.write("a.txt", "ABCdef\n")
+        self.assertEqual(
+            list(iter_search(r"(?i:abc)def", self.root)), [(path, 1, "ABCdef")]
+        )
+
+    def test_matches_report_line_numbers(self):
+        path = self.write("a.py", "uno\ndos TODO\ntres\ncuatro TODO\n")
+        self.assertEqual(
+            list(iter_search("TODO", self.root)),
+            [(path, 2, "dos TODO"), (path, 4, "cuatro TODO")],
+        )
+
+    def test_binaries_and_pruned_dirs_are_skipped(self):
+        self.write("bin.dat", b"TODO\0\1\2", mode="wb")
+        self.write(".git/objects/x", "TODO\n")
+        self.write("venv/lib/x.py", "TODO\n")
+        self.write(".gitignore", "generado/\n")
+        self.write("generado/x.py", "TODO\n")
+        path = self.write("src/x.py", "TODO\n")
+        self.assertEqual([m[0] for m in iter_search("TODO", self.root)], [path])
+
+    def test_result_and_per_file_limits(self):
+        for i in range(5):
+            self.write(f"f{i}.txt", "x\n" * 50)
+        results = list(
+            iter_search("x", self.root, max_results=7, max_matches_per_file=3)
+        )
+        self.assertEqual(len(results), 7)
+        self.assertEqual([line for _, line, _ in results[:4]], [1, 2, 3, 1])
+
+    def test_include_with_braces(self):
+        self.write("a.ts", "hola\n")
+        self.write("b.tsx", "hola\n")
+        self.write("c.js", "hola\n")
+        matches = iter_search("hola", self.root, "*.{ts,tsx}")
+        names = sorted(os.path.basename(p) for p, _, _ in matches)
+        self.assertEqual(names, ["a.ts", "b.tsx"])
+
+    def test_large_files_are_memory_mapped(self):
+        path = self.write("grande.txt", "relleno\n" * 10 + "aguja\n")
+        with patch.object(file_search, "MMAP_THRESHOLD", 16):
+            self.assertEqual(
+                search_file(path, file_search.re.compile("aguja")), [(11, "aguja")]
+            )
+
+    def test_line_bounded(self):
+        for pattern in (r"def foo\(", r"^foo.*$", r"(\w+) = foo\d", r"[a-z]+foo"):
+            self.assertTrue(line_bounded(pattern), pattern)
+        for pattern in (
+            r"foo\s+bar", r"foo[^x]", r"(?s)foo.*", r"\Afoo", r"foo\n", r"(?s:foo.)"
+        ):
+            self.assertFalse(line_bounded(pattern), pattern)
+
+    def test_line_bounded_patterns_only_decode_matching_lines(self):
+        path = self.write(
+            "a.py", "x = 1\ndef foo(a):\n    foo = 2  # foo\nfoo\n" * 3 + "fin"
+        )
+        for pattern in (r"def foo\(", r"^foo$", r"foo = \d", r"\bfoo\b"):
+            regex = file_search.re.compile(pattern, file_search.re.MULTILINE)
+            literal = required_literal(pattern)
+            expected = search_file(path, regex, literal)
+            with patch.object(
+                file_search, "_search_text", side_effect=AssertionError
+            ), patch.object(file_search, "MMAP_THRESHOLD", 16):
+                self.assertEqual(
+                    search_file(path, regex, literal, per_line=True), expected
+                )
+            self.assertTrue(expected, pattern)
+
+    def test_non_ascii_patterns_match_characters(self):
+        path = self.write("a.txt", "el niño\nÁrbol alto\ncafé\nsin acentos\n")
+
+        def search(pattern):
+            return [line for _, line, _ in iter_search(pattern, self.root)]
+
+        self.assertEqual(search("ni[ñn]o"), [1])
+        self.assertEqual(search("(?i)árbol"), [2])
+        self.assertEqual(search("^caf.$"), [3])
+        self.assertEqual(search("[á-ú]"), [1, 3])
+        self.assertEqual(list(iter_search("café", self.root)), [(path, 3, "café")])
+
+    @patch.object(search_index, "SEARCH_INDEX_ENABLED", False)
+    def test_tool_reports_truncation(self):
+        self.write("a.txt", "x\n" * 10)
+        result = search_file_content("x", self.root, max_results=2)
+        self.assertEqual(result.count("a.txt:"), 2)
+        self.assertIn("Resultados truncados", result)
+        self.assertIn("Error durante la búsqueda", search_file_content("(", self.root))
+
+
+if __name__ == "__main__":
+    unittest.main()
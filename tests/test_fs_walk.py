@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+from fs_walk import IgnoreRules, expand_braces, walk_files
+
+
+def make_tree(root: str, files: dict):
+    for relative, content in files.items():
+        path = os.path.join(root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+class TestFsWalk(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def walked(self, **kwargs):
+        return sorted(
+            os.path.relpath(entry.path, self.root).replace(os.sep, "/")
+            for entry in walk_files(self.root, **kwargs)
+        )
+
+    def test_prunes_vcs_virtualenvs_and_gitignore(self):
+        make_tree(self.root, {
+            ".gitignore": "*.log\nbuild/\n/solo_raiz.txt\n!importante.log\n",
+            "src/app.py": "",
+            "src/debug.log": "",
+            "src/importante.log": "",
+            "src/solo_raiz.txt": "",
+            "solo_raiz.txt": "",
+            "build/out.py": "",
+            ".git/config": "",
+            "node_modules/x/index.js": "",
+            "entorno/pyvenv.cfg": "",
+            "entorno/lib/mod.py": "",
+            "src/sub/.gitignore": "*.tmp\n",
+            "src/sub/a.tmp": "",
+            "src/b.tmp": "",
+        })
+        self.assertEqual(
+            self.walked(),
+            [
+                ".gitignore",
+                "src/app.py",
+                "src/b.tmp",
+                "src/importante.log",
+                "src/solo_raiz.txt",
+                "src/sub/.gitignore",
+            ],
+        )
+
+    def test_ignore_files_can_be_disabled(self):
+        make_tree(self.root, {".gitignore": "*.log\n", "a.log": ""})
+        self.assertEqual(self.walked(use_ignore_files=False), [".gitignore", "a.log"])
+
+    def test_double_star_patterns(self):
+        rules = IgnoreRules("/r", ["docs/**/*.md", "**/tmp"])
+        self.assertTrue(rules.match("/r/docs/a/b/c.md", False))
+        self.assertTrue(rules.match("/r/docs/c.md", False))
+        self.assertIsNone(rules.match("/r/src/c.md", False))
+        self.assertTrue(rules.match("/r/x/y/tmp", True))
+
+    def test_expand_braces(self):
+        self.assertEqual(expand_braces("*.{ts,tsx}"), ["*.ts", "*.tsx"])
+        self.assertEqual(expand_braces("*.py"), ["*.py"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+from history_manager import (
+    HistoryManager,
+    PromptBudget,
+    SUMMARY_HEADER,
+    extractive_summarizer,
+    fit_text,
+)
+
+
+def word_tokenizer(text):
+    return len(text.split())
+
+
+class TestHistoryManager(unittest.TestCase):
+
+    def setUp(self):
+        self.summarized = []
+
+        def recording_summarizer(previous, lines):
+            self.summarized.append(list(lines))
+            return extractive_summarizer(previous, lines)
+
+        # 100 tokens de historial, 25 reservados para el resumen.
+        budget = PromptBudget(total=1000, history=0.1)
+        self.manager = HistoryManager(
+            budget=budget, tokenizer=word_tokenizer, summarizer=recording_summarizer
+        )
+
+    def _turns(self, start, count):
+        return [
+            f"Usuario: mensaje {i} " + "palabra " * 10
+            for i in range(start, start + count)
+        ]
+
+    def test_budget_can_be_sized_from_the_tools_manifest(self):
+        budget = PromptBudget(total=1000, tools_tokens=400)
+        self.assertEqual(
+            (budget.tools, budget.memory, budget.history, budget.task),
+            (400, 120, 360, 120),
+        )
+        self.assertEqual(PromptBudget(total=1000).tools, 250)
+
+    def test_short_history_is_untouched(self):
+        lines = self._turns(0, 3)
+        rendered, state = self.manager.compact(lines)
+        self.assertEqual(rendered, lines)
+        self.assertEqual(state, {"summary": "", "compacted_upto": 0})
+        self.assertEqual(self.summarized, [])
+
+    def test_old_turns_are_summarized_and_recent_kept(self):
+        lines = self._turns(0, 20)
+        rendered, state = self.manager.compact(lines)
+        self.assertTrue(rendered[0].startswith(SUMMARY_HEADER))
+        self.assertEqual(rendered[-1], lines[-1])
+        self.assertEqual(lines[state["compacted_upto"]:], rendered[1:])
+        self.assertLessEqual(sum(word_tokenizer(line) for line in rendered), 100)
+
+    def test_compacted_spans_are_never_resummarized(self):
+        lines = self._turns(0, 20)
+        _, state = self.manager.compact(lines)
+        first_upto = state["compacted_upto"]
+
+        lines += self._turns(20, 5)
+        _, state = self.manager.compact(lines, state)
+        self.assertEqual(len(self.summarized), 2)
+        self.assertEqual(self.summarized[1], lines[first_upto:state["compacted_upto"]])
+
+        # Sin turnos nuevos que plegar no se vuelve a resumir.
+        self.manager.compact(lines, state)
+        self.assertEqual(len(self.summarized), 2)
+
+    def test_fit_text_keeps_head_and_tail(self):
+        text = "inicio " + "x " * 500 + "final"
+        fitted = fit_text(text, 50)
+        self.assertTrue(fitted.startswith("inicio"))
+        self.assertTrue(fitted.endswith("final"))
+        self.assertLess(len(fitted), len(text))
+        self.assertEqual(fit_text("corto", 50), "corto")
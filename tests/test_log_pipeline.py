@@ -0,0 +1,113 @@
+import atexit
+import importlib
+import json
+import logging
+import os
+import queue
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import log_pipeline
+from log_pipeline import (
+    LOG_RECORDS_DROPPED, DroppingQueueHandler, JsonFormatter, body, setup_logging
+)
+from metrics import Trace, bind_trace
+
+
+class TestLogPipeline(unittest.TestCase):
+
+    def test_json_lines_carry_trace_id_and_extra_fields(self):
+        record = logging.LogRecord(
+            "agente", logging.INFO, __file__, 1, "Paso %d", (2,), None
+        )
+        record.trace_id = "t-1"
+        record.prefill_tokens = 120
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry["msg"], "Paso 2")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["trace_id"], "t-1")
+        self.assertEqual(entry["prefill_tokens"], 120)
+        self.assertNotIn("args", entry)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = DroppingQueueHandler(queue.Queue(1))
+        before = LOG_RECORDS_DROPPED.value(level="INFO")
+        for i in range(3):
+            handler.handle(logging.LogRecord(
+                "agente", logging.INFO, __file__, 1, f"registro {i}", None, None
+            ))
+        self.assertEqual(handler.queue.qsize(), 1)
+        self.assertEqual(LOG_RECORDS_DROPPED.value(level="INFO"), before + 2)
+
+    def test_bodies_are_hashed_unless_the_request_is_sampled(self):
+        text = "contenido privado " * 100
+        summary = body(text)
+        self.assertNotIn("contenido", summary)
+        self.assertIn(f"{len(text)} car.", summary)
+        self.assertEqual(body(text), summary)
+        with patch.object(log_pipeline, "LOG_BODY_SAMPLE_RATE", 0.5):
+            trace = Trace("t-2")
+            with bind_trace(trace):
+                first = body(text)
+                # La decisión se toma una vez por petición.
+                self.assertTrue(all(body(text) == first for _ in range(20)))
+            self.assertEqual(first == text, trace.log_bodies)
+        with patch.object(log_pipeline, "LOG_BODY_SAMPLE_RATE", 1.0), \
+                bind_trace(Trace("t-3")):
+            self.assertEqual(body({"path": "/a"}), '{"path": "/a"}')
+
+    def test_setup_writes_json_lines_from_a_background_thread(self):
+        root = logging.getLogger()
+        saved_handlers, saved_level = list(root.handlers), root.level
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "agente.log")
+            listener = setup_logging(path, "INFO")
+            try:
+                with bind_trace(Trace("t-4")), patch("sys.stdout"):
+                    logging.info("Mensaje de prueba", extra={"tool": "read_file"})
+                    logging.debug("No se registra")
+            finally:
+                listener.stop()
+                atexit.unregister(listener.stop)
+                for handler in listener.handlers:
+                    handler.close()
+                for handler in list(root.handlers):
+                    root.removeHandler(handler)
+                for handler in saved_handlers:
+                    root.addHandler(handler)
+                root.setLevel(saved_level)
+            with open(path, encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]["msg"], "Mensaje de prueba")
+        self.assertEqual(lines[0]["trace_id"], "t-4")
+        self.assertEqual(lines[0]["tool"], "read_file")
+
+    def test_unwritable_log_file_is_reported_through_logging(self):
+        root = logging.getLogger()
+        saved_handlers, saved_level = list(root.handlers), root.level
+        with tempfile.TemporaryDirectory() as tmp, patch("sys.stdout") as stdout, \
+                patch("sys.stderr") as stderr:
+            listener = setup_logging(os.path.join(tmp, "no", "existe.log"), "INFO")
+            listener.stop()
+            atexit.unregister(listener.stop)
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            for handler in saved_handlers:
+                root.addHandler(handler)
+            root.setLevel(saved_level)
+        console = "".join(call.args[0] for call in stdout.write.call_args_list)
+        self.assertIn("No se pudo abrir el archivo de log", console)
+        stderr.write.assert_not_called()
+
+    def test_importing_the_server_does_not_configure_logging(self):
+        importlib.import_module("agent_server")
+        self.assertFalse(any(
+            isinstance(handler, DroppingQueueHandler)
+            for handler in logging.getLogger().handlers
+        ))
+
+
+if __name__ == "__main__":
+    unittest.main()
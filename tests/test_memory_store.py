@@ -0,0 +1,193 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import memory_store
+from memory_store import BM25Index, MemoryStore, parse_markdown, render, tokenize
+
+LEGACY = """# Memoria a Largo Plazo de PyAgent
+
+## Directivas Generales
+- Responde siempre en español.
+- Sé conciso.
+
+## Preferencias del Usuario
+- El usuario trabaja con Django y PostgreSQL.
+- [Aquí se podrían añadir preferencias]
+
+## Lecciones Aprendidas
+- Para reiniciar el servidor usa systemctl restart pyagent,
+  no mates el proceso de gunicorn.
+"""
+
+
+def _append_many(path, worker, count):
+    store = MemoryStore(path)
+    for i in range(count):
+        store.append(f"nota {worker}-{i}")
+
+
+class _UnscannableDict(dict):
+    """Falla si se recorren todas las listas de términos."""
+
+    def items(self):
+        raise AssertionError("se recorrieron todas las listas")
+
+    def __iter__(self):
+        raise AssertionError("se recorrieron todas las listas")
+
+
+class TestTokenizeAndIndex(unittest.TestCase):
+
+    def test_tokenize_folds_case_accents_and_plurals(self):
+        self.assertEqual(
+            tokenize("Las Configuraciónes de los Servidores"),
+            ["configuracion", "servidor"],
+        )
+
+    def test_bm25_ranks_rare_terms_higher(self):
+        index = BM25Index()
+        index.add("a", tokenize("python python servidor"))
+        index.add("b", tokenize("servidor web"))
+        index.add("c", tokenize("servidor base de datos"))
+        ranked = index.search(tokenize("python servidor"), 2)
+        self.assertEqual([doc for _, doc in ranked], ["a", "b"])
+        index.remove("a")
+        self.assertEqual(index.search(tokenize("python"), 2), [])
+        ranked = index.search(tokenize("servidor"), 5, exclude={"b"})
+        self.assertEqual([doc for _, doc in ranked], ["c"])
+
+    def test_bm25_remove_only_touches_the_document_terms(self):
+        index = BM25Index()
+        index.add("a", tokenize("python servidor"))
+        index.add("b", tokenize("servidor web"))
+        untouched = index._postings["web"]
+        index._postings = _UnscannableDict(index._postings)
+        index.remove("a")
+        self.assertNotIn("python", index._postings)
+        self.assertEqual(index._postings["servidor"], {"b": 1})
+        self.assertIs(index._postings["web"], untouched)
+
+
+class TestMemoryStore(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.legacy = os.path.join(self._tmp.name, "agent_memory.md")
+        with open(self.legacy, "w", encoding="utf-8") as f:
+            f.write(LEGACY)
+        self.path = memory_store.store_path(self.legacy)
+        self.store = MemoryStore(self.path, legacy_path=self.legacy)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _records(self):
+        with open(self.path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_legacy_markdown_is_imported_once(self):
+        self.assertEqual(
+            parse_markdown(LEGACY)[-1],
+            (
+                "Lecciones Aprendidas",
+                "Para reiniciar el servidor usa systemctl restart pyagent, no mates el "
+                "proceso de gunicorn.",
+            ),
+        )
+        self.assertEqual(
+            [e["text"] for e in self.store.pinned()],
+            ["Responde siempre en español.", "Sé conciso."],
+        )
+        self.assertEqual(len(self._records()), 4)
+        with open(self.legacy, "w") as f:
+            f.write("## Directivas Generales\n- Otra cosa.\n")
+        store = MemoryStore(self.path, legacy_path=self.legacy)
+        self.assertEqual(len(store.entries()), 4)
+
+    def test_search_returns_relevant_unpinned_entries(self):
+        results = self.store.search("¿Cómo reinicio el servidor?", k=3)
+        self.assertEqual([e["section"] for e in results], ["Lecciones Aprendidas"])
+        self.assertEqual(self.store.search("español", k=3), [])
+        self.assertIn(
+            "- El usuario trabaja con Django",
+            render(self.store.search("base de datos postgresql")),
+        )
+
+    def test_append_is_incremental_and_deduplicated(self):
+        entry = self.store.append(
+            "Prefiere  tabuladores\nen Makefiles", "Preferencias del Usuario"
+        )
+        self.assertEqual(entry["text"], "Prefiere tabuladores en Makefiles")
+        again = self.store.append(
+            "Prefiere tabuladores en Makefiles", "Preferencias del Usuario"
+        )
+        self.assertEqual(again, entry)
+        self.assertEqual(len(self._records()), 5)
+        # Solo se leen los bytes nuevos: el registro no se ha releído entero.
+        self.assertEqual(self.store.stats()["reloads"], 1)
+        self.assertEqual(self.store.stats()["log_bytes"], os.path.getsize(self.path))
+
+    def test_other_writers_and_compaction_are_picked_up(self):
+        other = MemoryStore(self.path, legacy_path=self.legacy)
+        entry = other.append("Usa pnpm en el frontend", "Preferencias del Usuario")
+        self.assertEqual(self.store.search("pnpm")[0]["id"], entry["id"])
+        other.forget(entry["id"])
+        other.compact()
+        self.assertEqual(self.store.search("pnpm"), [])
+        self.assertEqual(len(self.store.entries()), 4)
+        self.assertEqual(self.store.stats()["log_lines"], 4)
+
+    def test_forget_compacts_once_garbage_dominates(self):
+        with patch.object(memory_store, "MEMORY_COMPACT_MIN_GARBAGE", 2):
+            ids = [self.store.append(f"temporal {i}")["id"] for i in range(3)]
+            for entry_id in ids:
+                self.assertTrue(self.store.forget(entry_id))
+        self.assertFalse(self.store.forget("no-existe"))
+        self.assertGreaterEqual(self.store.stats()["compactions"], 1)
+        self.assertTrue(all(r["op"] == "add" for r in self._records()[:4]))
+        self.assertEqual(len(self.store.entries()), 4)
+
+    def test_garbage_is_compacted_at_load_and_after_appends(self):
+        self.store.entries()
+        records = []
+        for i in range(5):
+            records.append({"op": "add", "id": f"t{i}", "text": f"temporal {i}"})
+            records.append({"op": "forget", "id": f"t{i}"})
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(r) + "\n" for r in records)
+        with patch.object(memory_store, "MEMORY_COMPACT_MIN_GARBAGE", 2):
+            # Otro proceso carga el registro con 10 líneas obsoletas y 4 vivas.
+            loaded = MemoryStore(self.path, legacy_path=self.legacy)
+            self.assertEqual(len(loaded.entries()), 4)
+            self.assertEqual(loaded.stats()["compactions"], 1)
+            self.assertEqual(len(self._records()), 4)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(r) + "\n" for r in records)
+            self.store.append("Una nota más")
+        self.assertEqual(self.store.stats()["compactions"], 1)
+        self.assertEqual(len(self._records()), 5)
+
+    def test_concurrent_processes_append_without_losing_lines(self):
+        self.store.entries()
+        workers = [
+            multiprocessing.Process(target=_append_many, args=(self.path, worker, 25))
+            for worker in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(len(self._records()), 4 + 100)
+        self.assertEqual(len(self.store.entries()), 4 + 100)
+
+    def test_empty_content_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.store.append("   ")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import logging
+import threading
+import unittest
+from unittest.mock import patch
+
+import agent_server
+import metrics
+from metrics import (
+    Counter, Histogram, Trace, TraceIdFilter, bind_trace, span, trace_id_from
+)
+
+
+class TestExposition(unittest.TestCase):
+
+    def test_counter_and_histogram_text_format(self):
+        counter = Counter("test_llamadas_total", "Llamadas.", ("tool",))
+        counter.inc(tool='di "hola"\n')
+        counter.inc(2, tool="b")
+        histogram = Histogram("test_segundos", "Segundos.", ("tool",), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 3):
+            histogram.observe(value, tool="a")
+        text = metrics.render_metrics()
+        self.assertIn("# TYPE test_llamadas_total counter", text)
+        self.assertIn('test_llamadas_total{tool="di \\"hola\\"\\n"} 1', text)
+        self.assertIn('test_llamadas_total{tool="b"} 2', text)
+        self.assertIn('test_segundos_bucket{tool="a",le="0.1"} 1', text)
+        self.assertIn('test_segundos_bucket{tool="a",le="1"} 2', text)
+        self.assertIn('test_segundos_bucket{tool="a",le="+Inf"} 3', text)
+        self.assertIn('test_segundos_sum{tool="a"} 3.55', text)
+        self.assertIn('test_segundos_count{tool="a"} 3', text)
+
+
+class TestTracing(unittest.TestCase):
+
+    def test_client_trace_ids_are_validated(self):
+        self.assertEqual(trace_id_from("abc-123"), "abc-123")
+        self.assertEqual(len(trace_id_from("con espacios\n")), 16)
+        self.assertEqual(len(trace_id_from(None)), 16)
+
+    def test_spans_are_added_to_the_bound_trace_only(self):
+        trace = Trace("t1")
+        before = metrics.SPAN_SECONDS.count(span="prueba")
+        with bind_trace(trace):
+            with span("prueba"):
+                pass
+            with span("prueba"):
+                pass
+        with span("prueba"):
+            pass
+        self.assertEqual(trace.spans["prueba"][0], 2)
+        self.assertEqual(metrics.SPAN_SECONDS.count(span="prueba"), before + 3)
+        self.assertIn("prueba", trace.summary())
+
+    def test_log_records_carry_the_trace_id(self):
+        record = logging.LogRecord(
+            "x", logging.INFO, __file__, 1, "mensaje", None, None
+        )
+        with bind_trace(Trace("t-log")):
+            TraceIdFilter().filter(record)
+        self.assertEqual(record.trace_id, "t-log")
+        # Otros hilos no ven la traza.
+        other = []
+        thread = threading.Thread(target=lambda: other.append(metrics.current_trace()))
+        thread.start()
+        thread.join()
+        self.assertEqual(other, [None])
+
+
+class TestChatInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.app = agent_server.app.test_client()
+        self._memory_patcher = patch.object(
+            agent_server, "load_long_term_memory", return_value="memoria"
+        )
+        self._memory_patcher.start()
+
+    def tearDown(self):
+        self._memory_patcher.stop()
+
+    def test_chat_reports_trace_header_and_metrics(self):
+        scripts = iter([[{"response": '{"get_current_date": {}}', "done": False}],
+                        [{"response": "Hoy.", "done": False}]])
+
+        def fake_generate_frames(prompt, **options):
+            yield from next(scripts)
+            yield {
+                "response": "", "done": True,
+                "prompt_eval_count": 100, "eval_count": 7,
+            }
+
+        ok_before = metrics.REQUESTS.value(outcome="ok")
+        tool_before = metrics.TOOL_CALLS.value(tool="get_current_date", outcome="ok")
+        generated_before = metrics.GENERATED_TOKENS.value(mode="prompt")
+        ttft_before = metrics.TIME_TO_FIRST_TOKEN.count()
+        with patch.object(
+            agent_server.ollama_backend, "generate_frames", fake_generate_frames
+        ), self.assertLogs(level="INFO") as logs:
+            response = self.app.post(
+                "/chat",
+                json={"user_message": "¿Qué día es?"},
+                headers={"X-Trace-Id": "mi-traza"},
+            )
+            self.assertEqual(response.get_data(as_text=True), "Hoy.")
+        self.assertEqual(response.headers["X-Trace-Id"], "mi-traza")
+        self.assertEqual(metrics.REQUESTS.value(outcome="ok"), ok_before + 1)
+        self.assertEqual(
+            metrics.TOOL_CALLS.value(tool="get_current_date", outcome="ok"),
+            tool_before + 1,
+        )
+        self.assertEqual(
+            metrics.GENERATED_TOKENS.value(mode="prompt"), generated_before + 14
+        )
+        self.assertEqual(metrics.TIME_TO_FIRST_TOKEN.count(), ttft_before + 1)
+        summary = [line for line in logs.output if "Traza de la petición (ok)" in line]
+        self.assertEqual(len(summary), 1)
+        for phase in ("queue", "memory", "prompt", "model", "tool", "step"):
+            self.assertIn(phase, summary[0])
+
+        body = self.app.get("/metrics")
+        self.assertTrue(body.content_type.startswith("text/plain; version=0.0.4"))
+        text = body.get_data(as_text=True)
+        self.assertIn('pyagent_tool_seconds_count{tool="get_current_date"}', text)
+        self.assertIn("pyagent_requests_in_flight 0", text)
+        self.assertIn('pyagent_agent_loop_iterations_bucket{le="2"}', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
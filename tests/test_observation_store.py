@@ -0,0 +1,133 @@
+import json
+import unittest
+from unittest.mock import patch
+
+import agent_server
+import tools
+from observation_store import ObservationStore
+
+
+def _long_text(lines: int) -> str:
+    return "".join(f"línea {i:05d}\n" for i in range(lines))
+
+
+class TestObservationStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = ObservationStore(
+            preview_chars=200, page_chars=1000, budget=100_000
+        )
+
+    def test_short_results_pass_through(self):
+        self.assertEqual(self.store.bound("s1", "read_file", "corto"), ("corto", None))
+        self.assertEqual(self.store.stats()["entries"], 0)
+
+    def test_long_results_keep_head_tail_and_handle(self):
+        text = _long_text(500)
+        preview, handle = self.store.bound("s1", "read_file", text)
+        self.assertTrue(handle.startswith("obs-"))
+        self.assertLess(len(preview), 200 + 250)
+        self.assertTrue(preview.startswith("línea 00000\n"))
+        self.assertTrue(preview.endswith("línea 00499\n"))
+        self.assertIn(f'handle "{handle}" y page 1-6', preview)
+        # Los cortes caen en saltos de línea.
+        self.assertNotIn("lín\n", preview)
+
+    def test_pages_cover_the_whole_result(self):
+        text = _long_text(500)
+        _, handle = self.store.bound("s1", "read_file", text)
+        pages = [self.store.page("s1", handle, n) for n in range(1, 7)]
+        self.assertIn("página 1 de 6, caracteres 1-1000 de 6000]", pages[0])
+        self.assertIn('page 2.]', pages[0])
+        body = "".join(p.split("]\n", 1)[1].split("\n[Siguiente")[0] for p in pages)
+        self.assertEqual(body, text)
+        with self.assertRaisesRegex(ValueError, "tiene 6 páginas"):
+            self.store.page("s1", handle, 7)
+        with self.assertRaises(KeyError):
+            self.store.page("s1", "obs-desconocida")
+
+    def test_budget_evicts_oldest_and_sessions_are_cleared(self):
+        store = ObservationStore(preview_chars=10, page_chars=100, budget=250)
+        _, first = store.bound("s1", "read_file", "a" * 200)
+        _, second = store.bound("s2", "read_file", "b" * 200)
+        with self.assertRaises(KeyError):
+            store.page("s1", first)
+        self.assertEqual(store.stats()["evicted"], 1)
+        store.clear("s2")
+        with self.assertRaises(KeyError):
+            store.page("s2", second)
+
+    def test_other_sessions_cannot_read_an_observation(self):
+        _, handle = self.store.bound("s1", "read_file", _long_text(500))
+        with self.assertRaises(KeyError):
+            self.store.page("s2", handle)
+        with patch.object(tools, "observation_store", self.store):
+            self.assertIn("no existe", tools.fetch_observation(handle, session_id="s2"))
+            self.assertIn(
+                "página 1 de 6", tools.fetch_observation(handle, session_id="s1")
+            )
+        # El modelo no puede elegir la sesión: no es un parámetro de la herramienta.
+        result = agent_server.execute_tool(
+            "fetch_observation", {"handle": handle, "session_id": "s1"}, "s2"
+        )
+        self.assertIn("Parámetro desconocido 'session_id'", json.loads(result)["error"])
+
+    def test_fetch_observation_output_is_not_stored_again(self):
+        self.assertEqual(
+            self.store.bound("s1", "fetch_observation", "x" * 5000)[1], None
+        )
+
+
+class TestObservationsInTheAgentLoop(unittest.TestCase):
+
+    def setUp(self):
+        self.app = agent_server.app.test_client()
+        self.store = ObservationStore(preview_chars=300, page_chars=2000)
+        self._patchers = [
+            patch.object(agent_server, "load_long_term_memory", return_value="memoria"),
+            patch.object(agent_server, "observation_store", self.store),
+            patch.object(tools, "observation_store", self.store),
+        ]
+        for patcher in self._patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self._patchers:
+            patcher.stop()
+
+    def test_large_result_is_previewed_and_paged(self):
+        big = _long_text(5000)
+        prompts = []
+        scripts = iter([['{"read_file": {"path": "/grande"}}'], None, ["Listo."]])
+
+        def fake_call_ollama_stream(prompt, **kwargs):
+            prompts.append(prompt)
+            script = next(scripts)
+            if script is None:
+                handle = prompts[-1].split('handle "')[1].split('"')[0]
+                call = {"fetch_observation": {"handle": handle, "page": 2}}
+                script = [json.dumps(call)]
+            yield from script
+
+        with patch.object(
+            agent_server, "call_ollama_stream", fake_call_ollama_stream
+        ), patch.dict(
+            tools.AVAILABLE_TOOLS, {"read_file": lambda **kwargs: big}
+        ), patch.object(agent_server, "context_cache", agent_server.ContextCache()):
+            response = self.app.post(
+                "/chat",
+                json={"user_message": "Lee /grande"},
+                headers={"Accept": "text/event-stream"},
+            )
+            body = response.get_data(as_text=True)
+
+        self.assertIn('"handle": "obs-', body)
+        self.assertLess(len(prompts[1]) - len(prompts[0]), 1000)
+        self.assertNotIn("línea 02500", prompts[1])
+        self.assertIn("página 2 de", prompts[2])
+        self.assertIn("línea 00200", prompts[2])
+        self.assertEqual(self.store.stats()["pages_served"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
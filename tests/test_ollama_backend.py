@@ -0,0 +1,133 @@
+import unittest
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cancellation import CLIENT_DISCONNECT, Cancellation
+from ollama_backend import OllamaBackend, OllamaError
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """Servidor mínimo que imita las respuestas NDJSON de Ollama."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length))
+        self.server.requests.append((self.path, payload))
+        self.server.client_ports.add(self.client_address[1])
+
+        if payload.get("prompt") == "prefill lento":
+            # Ollama no envía las cabeceras hasta el primer token.
+            self.server.release.wait(5)
+            return
+        if payload.get("prompt") == "atasco":
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            frame = json.dumps({"response": "Hola", "done": False}).encode("utf-8")
+            frame += b"\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(frame), frame))
+            self.wfile.flush()
+            self.server.release.wait(5)
+            return
+        if payload.get("prompt") == "fallo":
+            frames = [{"error": "modelo no encontrado"}]
+        elif self.path == "/api/chat":
+            frames = [
+                {"message": {"role": "assistant", "content": "Hola"}, "done": False},
+                {"message": {"role": "assistant", "content": ""}, "done": True},
+            ]
+        else:
+            frames = [
+                {"response": "Hola", "done": False},
+                {"response": ", mundo", "done": False},
+                {"response": "", "done": True, "eval_count": 2},
+            ]
+
+        body = b"".join(json.dumps(f).encode("utf-8") + b"\n" for f in frames)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestOllamaBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllamaHandler)
+        self.server.requests = []
+        self.server.client_ports = set()
+        self.server.release = threading.Event()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        host = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.backend = OllamaBackend("modelo-prueba", host=host, keep_alive="5m")
+
+    def tearDown(self):
+        self.server.release.set()
+        self.backend.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_generate_stream_yields_tokens(self):
+        chunks = list(self.backend.generate_stream("Hola"))
+        self.assertEqual(chunks, ["Hola", ", mundo"])
+
+        path, payload = self.server.requests[0]
+        self.assertEqual(path, "/api/generate")
+        self.assertEqual(payload["model"], "modelo-prueba")
+        self.assertEqual(payload["keep_alive"], "5m")
+        self.assertTrue(payload["stream"])
+
+    def test_generate_frames_include_final_stats(self):
+        frames = list(self.backend.generate_frames("Hola"))
+        self.assertTrue(frames[-1]["done"])
+        self.assertEqual(frames[-1]["eval_count"], 2)
+
+    def test_connection_is_reused(self):
+        for _ in range(3):
+            self.assertEqual(self.backend.generate("Hola"), "Hola, mundo")
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_chat_frames(self):
+        frames = list(self.backend.chat_frames([{"role": "user", "content": "Hola"}]))
+        self.assertEqual(frames[0]["message"]["content"], "Hola")
+        self.assertEqual(self.server.requests[0][0], "/api/chat")
+
+    def test_error_frame_raises(self):
+        with self.assertRaises(OllamaError):
+            list(self.backend.generate_stream("fallo"))
+
+    def test_connection_error_raises(self):
+        backend = OllamaBackend("modelo-prueba", host="http://127.0.0.1:1")
+        with self.assertRaises(OllamaError):
+            backend.generate("Hola")
+
+    def test_cancellation_cuts_a_stalled_stream(self):
+        cancellation = Cancellation()
+        frames = self.backend.generate_frames("atasco", cancellation=cancellation)
+        self.assertEqual(next(frames)["response"], "Hola")
+        threading.Timer(0.2, cancellation.cancel, args=(CLIENT_DISCONNECT,)).start()
+        started = time.monotonic()
+        with self.assertRaises(OllamaError):
+            next(frames)
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_deadline_bounds_the_wait_for_prefill(self):
+        cancellation = Cancellation(deadline=time.monotonic() + 0.3)
+        started = time.monotonic()
+        with self.assertRaises(OllamaError):
+            list(self.backend.generate_frames(
+                "prefill lento", cancellation=cancellation
+            ))
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertTrue(cancellation.cancelled)
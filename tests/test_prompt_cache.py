@@ -0,0 +1,54 @@
+import unittest
+import os
+import tempfile
+
+from prompt_cache import ContextCache, FileDerivedCache, file_fingerprint
+
+
+class TestFileDerivedCache(unittest.TestCase):
+
+    def test_rebuilds_only_when_file_changes(self):
+        builds = []
+
+        def build(path):
+            builds.append(path)
+            with open(path, encoding="utf-8") as f:
+                return f.read().upper()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "memoria.md")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("hola")
+            cache = FileDerivedCache(build)
+            self.assertEqual(cache.get(path), "HOLA")
+            self.assertEqual(cache.get(path), "HOLA")
+            self.assertEqual(len(builds), 1)
+
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("adiós")
+            self.assertEqual(cache.get(path), "ADIÓS")
+            self.assertEqual(len(builds), 2)
+
+    def test_missing_file_fingerprint(self):
+        self.assertEqual(
+            file_fingerprint("/tmp/no/existe"), ("/tmp/no/existe", None, None)
+        )
+
+
+class TestContextCache(unittest.TestCase):
+
+    def test_fingerprint_mismatch_discards_entry(self):
+        cache = ContextCache()
+        cache.put("sesion", ("v1", 2), [1, 2, 3])
+        self.assertEqual(cache.get("sesion", ("v1", 2)), [1, 2, 3])
+        self.assertIsNone(cache.get("sesion", ("v2", 2)))
+        self.assertIsNone(cache.get("sesion", ("v1", 2)))
+
+    def test_lru_limit(self):
+        cache = ContextCache(max_entries=2)
+        cache.put("a", 1, [1])
+        cache.put("b", 1, [2])
+        cache.get("a", 1)
+        cache.put("c", 1, [3])
+        self.assertIsNone(cache.get("b", 1))
+        self.assertEqual(cache.get("a", 1), [1])
@@ -0,0 +1,148 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import agent_server
+from response_cache import ResponseCache, normalize_message
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self._tmp.name, "respuestas")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_entries_survive_a_restart_through_disk(self):
+        cache = ResponseCache(directory=self.directory)
+        cache.put("k", [["token", {"text": "Hola"}]], [["agent", "Hola"]], [], 1.5)
+        restarted = ResponseCache(directory=self.directory)
+        entry = restarted.get("k")
+        self.assertEqual(entry["events"], [["token", {"text": "Hola"}]])
+        self.assertEqual(restarted.stats()["saved_generation_seconds"], 1.5)
+        self.assertIsNone(restarted.get("otra"))
+        self.assertEqual(restarted.stats()["hit_ratio"], 0.5)
+
+    def test_ttl_and_lru_eviction(self):
+        cache = ResponseCache(max_entries=2, ttl=60, directory=self.directory)
+        for key in ("a", "b", "c"):
+            cache.put(key, [], [], [], 0.1)
+        self.assertIsNone(cache.get("a"))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "a.json")))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        with patch("response_cache.time.time", return_value=time.time() + 120):
+            self.assertIsNone(cache.get("b"))
+
+    def test_changed_paths_invalidate_entries(self):
+        path = os.path.join(self._tmp.name, "datos.txt")
+        with open(path, "w") as f:
+            f.write("uno")
+        cache = ResponseCache(directory=None)
+        fingerprint = agent_server.path_fingerprint(path)
+        cache.put("k", [], [], [(path, fingerprint)], 0.1)
+        self.assertIsNotNone(cache.get("k"))
+        with open(path, "w") as f:
+            f.write("dos, más largo")
+        self.assertIsNone(cache.get("k"))
+
+    def test_messages_are_normalized(self):
+        self.assertEqual(normalize_message("  ¿Qué  HORA\nes? "), "¿Qué HORA es?")
+
+
+class TestChatResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(directory=os.path.join(self._tmp.name, "respuestas"))
+        self.app = agent_server.app.test_client()
+        self.prompts = []
+        self.script = []
+        patchers = [
+            patch.object(agent_server, "RESPONSE_CACHE_ENABLED", True),
+            patch.object(agent_server, "response_cache", self.cache),
+            patch.object(agent_server, "load_long_term_memory", return_value="memoria"),
+            patch.object(
+                agent_server.ollama_backend,
+                "generate_frames",
+                self.fake_generate_frames,
+            ),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def fake_generate_frames(self, prompt, **options):
+        self.prompts.append(prompt)
+        yield {"response": self.script.pop(0), "done": False}
+        yield {"response": "", "done": True, "prompt_eval_count": 10}
+
+    def chat(self, message, session_id=None):
+        payload = {"user_message": message}
+        if session_id:
+            payload["session_id"] = session_id
+        response = self.app.post("/chat", json=payload)
+        return response.get_data(as_text=True), response.headers["X-Session-Id"]
+
+    def test_repeated_question_is_replayed_without_the_model(self):
+        self.script = ["La respuesta es 42."]
+        first, _ = self.chat("¿Cuál es la respuesta?")
+        second, session_id = self.chat("  ¿Cuál es la   respuesta? ")
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.prompts), 1)
+        turns = agent_server.session_store.get_turns(session_id)
+        self.assertEqual([turn["role"] for turn in turns][-2:], ["user", "agent"])
+        self.assertEqual(turns[-1]["text"], "La respuesta es 42.")
+        stats = self.app.get("/stats").get_json()["response_cache"]
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_tool_turns_are_replayed_until_the_file_changes(self):
+        path = os.path.join(self._tmp.name, "notas.txt")
+        with open(path, "w") as f:
+            f.write("contenido")
+        call = f'{{"read_file": {{"path": "{path}"}}}}'
+        self.script = [call, "Dice contenido.", call, "Dice otra cosa."]
+        self.assertEqual(self.chat("Lee las notas")[0], "Dice contenido.")
+        self.assertEqual(self.chat("Lee las notas")[0], "Dice contenido.")
+        self.assertEqual(len(self.prompts), 2)
+        with open(path, "w") as f:
+            f.write("otra cosa distinta")
+        self.assertEqual(self.chat("Lee las notas")[0], "Dice otra cosa.")
+        self.assertEqual(len(self.prompts), 4)
+
+    def test_paths_that_differ_only_in_case_are_not_shared(self):
+        upper = os.path.join(self._tmp.name, "Foo.txt")
+        lower = os.path.join(self._tmp.name, "foo.txt")
+        for path, content in ((upper, "mayúsculas"), (lower, "minúsculas")):
+            with open(path, "w") as f:
+                f.write(content)
+        self.script = [
+            f'{{"read_file": {{"path": "{upper}"}}}}', "Dice mayúsculas.",
+            f'{{"read_file": {{"path": "{lower}"}}}}', "Dice minúsculas.",
+        ]
+        self.assertEqual(self.chat(f"Lee {upper}")[0], "Dice mayúsculas.")
+        self.assertEqual(self.chat(f"Lee {lower}")[0], "Dice minúsculas.")
+        self.assertEqual(len(self.prompts), 4)
+
+    def test_sessions_with_mutating_tools_bypass_the_cache(self):
+        path = os.path.join(self._tmp.name, "salida.txt")
+        self.script = [
+            f'{{"write_file": {{"path": "{path}", "content": "x"}}}}',
+            "Escrito.", "Hola.", "Hola.",
+        ]
+        _, session_id = self.chat("Escribe el archivo")
+        self.chat("Saluda", session_id)
+        self.chat("Saluda", session_id)
+        self.assertEqual(len(self.prompts), 4)
+        self.assertEqual(self.cache.stats()["stored"], 0)
+        self.assertEqual(self.cache.stats()["bypassed"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import search_index
+from search_index import TrigramIndex, trigrams
+
+
+class TestTrigramIndex(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self._tmp.name, "repo")
+        self.index_dir = os.path.join(self._tmp.name, "indices")
+        os.makedirs(self.root)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, name: str, content: str) -> str:
+        path = os.path.join(self.root, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+    def build(self) -> TrigramIndex:
+        index = TrigramIndex(self.root, self.index_dir)
+        index.refresh()
+        index.ready = not index.too_large
+        return index
+
+    def test_trigrams(self):
+        self.assertEqual(trigrams(b"abcd"), {(97, 98, 99), (98, 99, 100)})
+
+    def test_candidates_are_narrowed_by_literals(self):
+        a = self.write("a.py", "def handle_request(req):\n")
+        self.write("b.py", "def otra_cosa():\n")
+        c = self.write("c.py", "handle_request = None\n")
+        index = self.build()
+        self.assertEqual(index.candidates(r"handle_request"), [a, c])
+        self.assertEqual(index.candidates(r"def handle_request\("), [a])
+        self.assertEqual(index.candidates(r"handle_request", include="c.*"), [c])
+        self.assertEqual(index.candidates(r"(?i:DEF) handle_request\("), [a])
+        # Sin literales de tres bytes no hay filtro posible.
+        self.assertIsNone(index.candidates(r"\w+\d"))
+        self.assertIsNone(index.candidates(r"(?i)handle"))
+
+    def test_refresh_picks_up_changes_lazily(self):
+        a = self.write("a.py", "antiguo\n")
+        index = self.build()
+        self.assertEqual(index.candidates("nuevo"), [])
+        time.sleep(0.01)
+        self.write("a.py", "nuevo contenido\n")
+        b = self.write("b.py", "nuevo\n")
+        # Dentro del intervalo de refresco no se vuelve a recorrer el árbol.
+        self.assertEqual(index.candidates("nuevo"), [])
+        index.mark_stale()
+        self.assertEqual(index.candidates("nuevo"), [a, b])
+        os.remove(b)
+        with patch.object(search_index, "INDEX_REFRESH_SECONDS", 0):
+            self.assertEqual(index.candidates("nuevo"), [a])
+        self.assertEqual(index.candidates("antiguo"), [])
+
+    def test_update_file_reindexes_a_single_file(self):
+        index = self.build()
+        path = self.write("a.py", "recien escrito\n")
+        index.update_file(path)
+        with patch.object(index, "refresh"):
+            self.assertEqual(index.candidates("recien"), [path])
+
+    def test_index_is_persisted(self):
+        path = self.write("a.py", "persistente\n")
+        self.build()
+        reloaded = TrigramIndex(self.root, self.index_dir)
+        self.assertTrue(reloaded.ready)
+        with patch.object(reloaded, "refresh"):
+            self.assertEqual(reloaded.candidates("persistente"), [path])
+
+    def test_file_changed_notifies_matching_indexes(self):
+        index = self.build()
+        path = self.write("a.py", "notificado\n")
+        with patch.dict(search_index._indexes, {self.root: index}, clear=True):
+            search_index.file_changed(path)
+        with patch.object(index, "refresh"):
+            self.assertEqual(index.candidates("notificado"), [path])
+
+    def test_large_trees_are_not_indexed(self):
+        a = self.write("a.py", "buscado\n")
+        b = self.write("b.py", "buscado tambien\n")
+        with patch.object(search_index, "INDEX_MAX_FILES", 1):
+            index = self.build()
+        self.assertTrue(index.too_large)
+        self.assertIsNone(index.path)  # Tampoco se guarda en disco.
+        self.assertIsNone(index.candidates("buscado"))
+        with patch.object(search_index, "INDEX_MAX_BYTES", 10):
+            index = self.build()
+        self.assertTrue(index.too_large)
+        index = self.build()
+        self.assertEqual(index.candidates("buscado"), [a, b])
+        # Si el árbol crece por encima del límite, el índice se abandona.
+        with patch.object(search_index, "INDEX_MAX_FILES", 1), patch.object(
+            search_index, "INDEX_REFRESH_SECONDS", 0
+        ):
+            self.assertIsNone(index.candidates("buscado"))
+        self.assertFalse(index.ready)
+
+    @patch.object(search_index, "SEARCH_INDEX_ENABLED", True)
+    def test_subdirectories_reuse_the_enclosing_index(self):
+        os.makedirs(os.path.join(self.root, "src", "generado"))
+        self.write(".gitignore", "generado/\n")
+        self.write("fuera.py", "buscado\n")
+        dentro = self.write(os.path.join("src", "dentro.py"), "buscado\n")
+        self.write(os.path.join("src", "otro.py"), "nada\n")
+        # El índice del raíz no lo ve; un recorrido desde src sí (como sin índice).
+        generado = self.write(os.path.join("src", "generado", "x.py"), "buscado\n")
+        index = self.build()
+        with patch.dict(search_index._indexes, {self.root: index}, clear=True):
+            self.assertIs(
+                search_index.index_for(os.path.join(self.root, "src"), self.index_dir),
+                index,
+            )
+            self.assertEqual(len(search_index._indexes), 1)
+        with patch.object(index, "refresh"):
+            self.assertEqual(
+                index.candidates("buscado", root=os.path.join(self.root, "src")),
+                [dentro, generado],
+            )
+
+    @patch.object(search_index, "SEARCH_INDEX_ENABLED", True)
+    def test_roots_are_capped_and_parents_replace_children(self):
+        for name in ("a", "b", "c"):
+            os.makedirs(os.path.join(self.root, name))
+        with patch.dict(search_index._indexes, clear=True), patch.object(
+            search_index, "SEARCH_INDEX_MAX_ROOTS", 2
+        ), patch.object(TrigramIndex, "build_in_background"):
+            for name in ("a", "b", "c"):
+                index = search_index.index_for(
+                    os.path.join(self.root, name), self.index_dir
+                )
+                index._dirty = True
+                index._save()
+            self.assertEqual(
+                [os.path.basename(r) for r in search_index._indexes], ["b", "c"]
+            )
+            self.assertEqual(len(os.listdir(self.index_dir)), 2)
+            search_index.index_for(self.root, self.index_dir)
+            self.assertEqual(list(search_index._indexes), [self.root])
+            self.assertEqual(os.listdir(self.index_dir), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import os
+import tempfile
+
+from session_store import SessionStore, format_history
+
+
+class TestSessionStore(unittest.TestCase):
+
+    def test_append_and_format_history(self):
+        store = SessionStore()
+        session_id = store.create()
+        store.append(session_id, "user", "Hola")
+        store.append(session_id, "tool", '{"stdout": "ok"}')
+        store.append(session_id, "agent", "**Hecho**")
+        self.assertEqual(
+            format_history(store.get_turns(session_id)),
+            [
+                "Usuario: Hola",
+                'Observación de Herramienta: {"stdout": "ok"}',
+                "Agente: **Hecho**",
+            ],
+        )
+
+    def test_append_to_unknown_session_raises(self):
+        with self.assertRaises(KeyError):
+            SessionStore().append("desconocida", "user", "Hola")
+
+    def test_page(self):
+        store = SessionStore()
+        session_id = store.create()
+        for i in range(5):
+            store.append(session_id, "user", f"mensaje {i}")
+        total, turns = store.page(session_id, offset=3, limit=10)
+        self.assertEqual(total, 5)
+        self.assertEqual([t["text"] for t in turns], ["mensaje 3", "mensaje 4"])
+        self.assertIsNone(store.page("desconocida"))
+
+    def test_lru_eviction_by_byte_budget(self):
+        store = SessionStore(memory_budget=100)
+        first = store.create()
+        store.append(first, "user", "a" * 60)
+        second = store.create()
+        store.append(second, "user", "b" * 60)
+        self.assertFalse(store.exists(first))
+        self.assertTrue(store.exists(second))
+        self.assertLessEqual(store.stats()["bytes_in_memory"], 100)
+
+    def test_sqlite_persistence_survives_eviction_and_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "sessions.db")
+            store = SessionStore(memory_budget=100, db_path=db_path)
+            first = store.create()
+            store.append(first, "user", "a" * 60)
+            compaction = {"summary": "resumen", "compacted_upto": 1}
+            store.set_meta(first, "compaction", compaction)
+            second = store.create()
+            store.append(second, "user", "b" * 60)
+            self.assertEqual(
+                store.get_meta(first, "compaction"), compaction
+            )
+            # Desalojada de memoria, pero se recarga desde SQLite.
+            self.assertEqual(store.get_turns(first)[0]["text"], "a" * 60)
+            store.close()
+
+            reopened = SessionStore(db_path=db_path)
+            self.assertEqual(len(reopened.get_turns(second)), 1)
+            self.assertTrue(reopened.delete(second))
+            self.assertFalse(reopened.exists(second))
+            reopened.close()
@@ -0,0 +1,108 @@
+import os
+import time
+import unittest
+
+from shell_runner import (
+    OutputBuffer, ShellJobError, ShellJobs, ShellProcess, run_command
+)
+
+
+class TestOutputBuffer(unittest.TestCase):
+
+    def test_keeps_head_and_tail_within_budget(self):
+        buffer = OutputBuffer(max_bytes=10)
+        for i in range(1000):
+            buffer.write(f"{i:04d}\n".encode())
+        self.assertEqual(buffer.total, 5000)
+        self.assertEqual(len(buffer.head) + len(buffer.tail), 10)
+        text = buffer.text()
+        self.assertTrue(text.startswith("0000\n"))
+        self.assertTrue(text.endswith("0999\n"))
+        self.assertIn("[... 4990 bytes omitidos ...]", text)
+
+    def test_small_output_is_returned_verbatim(self):
+        buffer = OutputBuffer(max_bytes=100)
+        buffer.write("héllo\n".encode())
+        self.assertEqual(buffer.text(), "héllo\n")
+
+    def test_tail_does_not_start_mid_character(self):
+        buffer = OutputBuffer(max_bytes=4)
+        buffer.write(b"ab" + "ññññ".encode())
+        self.assertNotIn("�", buffer.text())
+
+
+def live_group_members(pgid: int) -> list:
+    """PIDs vivos (no zombis) del grupo de procesos `pgid`, leídos de /proc."""
+    members = []
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[2]) == pgid and fields[0] != "Z":
+            members.append(int(name))
+    return members
+
+
+class TestShellProcess(unittest.TestCase):
+
+    def test_streams_output_while_running(self):
+        chunks = []
+        result = run_command(
+            "echo uno; sleep 0.2; echo dos >&2",
+            timeout=10,
+            on_output=lambda stream, text: chunks.append((stream, text)),
+        )
+        self.assertEqual(result["exit_code"], 0)
+        self.assertEqual(chunks, [("stdout", "uno\n"), ("stderr", "dos\n")])
+
+    @unittest.skipUnless(os.path.isdir("/proc"), "requiere /proc")
+    def test_timeout_kills_the_whole_process_group(self):
+        started = time.monotonic()
+        process = ShellProcess("sleep 30 & sleep 30; wait", timeout=0.5)
+        process.wait()
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertTrue(process.timed_out)
+        self.assertEqual(live_group_members(process.process.pid), [])
+
+    def test_large_output_uses_bounded_memory(self):
+        result = run_command("yes | head -c 20000000", timeout=30)
+        self.assertEqual(result["exit_code"], 0)
+        self.assertLess(len(result["stdout"]), 64 * 1024)
+        self.assertIn("bytes omitidos", result["stdout"])
+
+    def test_commands_do_not_wait_for_stdin(self):
+        result = run_command("cat", timeout=5)
+        self.assertEqual(result, {"stdout": "", "stderr": "", "exit_code": 0})
+
+
+class TestShellJobs(unittest.TestCase):
+
+    def test_poll_and_kill_a_background_job(self):
+        jobs = ShellJobs(max_jobs=1)
+        exited = []
+        job_id = jobs.start("echo listo; sleep 30", on_exit=exited.append)
+        status = jobs.status(job_id, wait=0.3)
+        self.assertEqual(status["status"], "running")
+        self.assertEqual(status["stdout"], "listo\n")
+        self.assertIsNone(status["exit_code"])
+        # Con el único hueco ocupado no se admiten más trabajos.
+        with self.assertRaises(ShellJobError):
+            jobs.start("true")
+        status = jobs.status(job_id, kill=True)
+        self.assertEqual(status["status"], "killed")
+        deadline = time.monotonic() + 5
+        while not exited and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(len(exited), 1)
+
+    def test_unknown_job(self):
+        with self.assertRaises(ShellJobError):
+            ShellJobs().get("nope")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import json
+import threading
+import time
+from unittest.mock import patch
+
+import agent_server
+from streaming import EventPump, format_sse, sse_stream
+
+
+def parse_frames(body: str) -> list:
+    frames = []
+    for block in body.split("\n\n"):
+        lines = block.split("\n")
+        event = next(
+            (line[len("event: "):] for line in lines if line.startswith("event: ")),
+            None,
+        )
+        data = next(
+            (line[len("data: "):] for line in lines if line.startswith("data: ")), None
+        )
+        if event:
+            frames.append((event, json.loads(data)))
+    return frames
+
+
+class TestStreaming(unittest.TestCase):
+
+    def test_format_sse(self):
+        self.assertEqual(
+            format_sse("token", {"text": "¡Hola!"}),
+            'event: token\ndata: {"text": "¡Hola!"}\n\n',
+        )
+
+    def test_pending_tokens_are_coalesced(self):
+        ready = threading.Event()
+
+        def events():
+            for text in ["a", "b", "c"]:
+                yield "token", {"text": text}
+            ready.set()
+            yield "done", {}
+
+        stream = sse_stream(events())
+        ready.wait(1)
+        time.sleep(0.05)
+        frames = parse_frames("".join(stream))
+        self.assertEqual(frames, [("token", {"text": "abc"}), ("done", {})])
+
+    def test_keepalive_while_idle(self):
+        def events():
+            time.sleep(0.2)
+            yield "done", {}
+
+        chunks = list(sse_stream(events(), keepalive=0.05))
+        self.assertIn(": keepalive\n\n", chunks)
+        self.assertEqual(parse_frames("".join(chunks)), [("done", {})])
+
+    def test_slow_reader_stops_producer(self):
+        produced = []
+        closed = threading.Event()
+
+        def events():
+            try:
+                for i in range(100):
+                    produced.append(i)
+                    yield "token", {"text": str(i)}
+            finally:
+                closed.set()
+
+        pump = EventPump(events(), queue_size=2, slow_reader_timeout=0.05)
+        self.assertTrue(closed.wait(1))
+        self.assertTrue(pump.stopped.is_set())
+        self.assertLess(len(produced), 10)
+
+    def test_client_disconnect_stops_producer(self):
+        closed = threading.Event()
+
+        def events():
+            try:
+                while True:
+                    yield "token", {"text": "x"}
+                    time.sleep(0.01)
+            finally:
+                closed.set()
+
+        stream = sse_stream(events())
+        next(stream)
+        stream.close()
+        self.assertTrue(closed.wait(1))
+
+
+class TestChatSSE(unittest.TestCase):
+
+    def setUp(self):
+        self.app = agent_server.app.test_client()
+
+    def test_chat_emits_typed_frames(self):
+        scripts = iter([['{"get_current_date": {}}'], ["Hoy ", "es lunes."]])
+
+        def fake_call_ollama_stream(prompt, **kwargs):
+            yield from next(scripts)
+
+        with patch.object(
+            agent_server, "call_ollama_stream", fake_call_ollama_stream
+        ), patch.object(
+            agent_server, "execute_tool", return_value="2024-01-01"
+        ):
+            response = self.app.post(
+                "/chat",
+                json={"user_message": "¿Qué día es?"},
+                headers={"Accept": "text/event-stream"},
+            )
+            body = response.get_data(as_text=True)
+
+        self.assertEqual(response.mimetype, "text/event-stream")
+        self.assertEqual(response.headers["X-Accel-Buffering"], "no")
+        frames = parse_frames(body)
+        kinds = [kind for kind, _ in frames]
+        self.assertEqual(kinds[0], "tool_start")
+        self.assertEqual(kinds[1], "tool_result")
+        self.assertEqual(kinds[-1], "done")
+        text = "".join(data["text"] for kind, data in frames if kind == "token")
+        self.assertEqual(text, "Hoy es lunes.")
+        self.assertEqual(frames[-1][1]["session_id"], response.headers["X-Session-Id"])
@@ -0,0 +1,159 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import tools
+from agent_server import execute_tool
+from tool_cache import ToolResultCache
+from tools import TOOL_MANIFEST
+
+
+class TestToolResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = self._tmp.name
+        self.path = os.path.join(self.dir, "a.txt")
+        with open(self.path, "w") as f:
+            f.write("uno")
+        self.cache = ToolResultCache(TOOL_MANIFEST, budget=10_000)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _call(self, tool_name, parameters, result, scope="s1"):
+        cached, token = self.cache.lookup(scope, tool_name, parameters)
+        if cached is not None:
+            return cached
+        self.cache.store(token, result)
+        return result
+
+    def test_repeated_pure_call_is_a_hit(self):
+        self._call("read_file", {"path": self.path}, "uno")
+        # Los valores por defecto y la normalización de la ruta no cambian la clave.
+        cached, _ = self.cache.lookup(
+            "s1", "read_file", {"path": self.path + "/.", "limit": 2000}
+        )
+        self.assertEqual(cached, "uno")
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_entries_are_scoped_by_session(self):
+        self._call("read_file", {"path": self.path}, "uno", scope="s1")
+        self.assertIsNone(self.cache.lookup("s2", "read_file", {"path": self.path})[0])
+        self.cache.clear("s1")
+        self.assertIsNone(self.cache.lookup("s1", "read_file", {"path": self.path})[0])
+
+    def test_impure_tools_are_never_cached(self):
+        self.assertEqual(self.cache.lookup("s1", "get_current_date", {}), (None, None))
+        self.assertEqual(
+            self.cache.lookup("s1", "web_fetch", {"prompt": "x"}), (None, None)
+        )
+
+    def test_external_change_invalidates_by_fingerprint(self):
+        self._call("read_file", {"path": self.path}, "uno")
+        with open(self.path, "w") as f:
+            f.write("dos!")
+        self.assertIsNone(self.cache.lookup("s1", "read_file", {"path": self.path})[0])
+
+    def test_write_invalidates_ancestors_and_descendants(self):
+        self._call("list_directory", {"path": self.dir}, "[]")
+        self._call("glob", {"pattern": "*", "path": self.dir}, "[]")
+        self._call("read_file", {"path": self.path}, "uno")
+        self.cache.invalidate_path(os.path.join(self.dir, "nuevo.txt"))
+        self.assertIsNone(
+            self.cache.lookup("s1", "glob", {"pattern": "*", "path": self.dir})[0]
+        )
+        # El archivo no relacionado sigue en caché.
+        self.assertEqual(
+            self.cache.lookup("s1", "read_file", {"path": self.path})[0], "uno"
+        )
+
+    def test_result_computed_during_a_write_is_not_stored(self):
+        _, token = self.cache.lookup("s1", "glob", {"pattern": "*", "path": self.dir})
+        self.cache.invalidate_path(self.path)
+        self.cache.store(token, "obsoleto")
+        self.assertIsNone(
+            self.cache.lookup("s1", "glob", {"pattern": "*", "path": self.dir})[0]
+        )
+
+    def test_recursive_results_expire(self):
+        cache = ToolResultCache(TOOL_MANIFEST, tree_ttl=0)
+        _, token = cache.lookup("s1", "glob", {"pattern": "*", "path": self.dir})
+        cache.store(token, "[]")
+        self.assertIsNone(
+            cache.lookup("s1", "glob", {"pattern": "*", "path": self.dir})[0]
+        )
+
+    def test_lru_eviction_respects_the_byte_budget(self):
+        cache = ToolResultCache(TOOL_MANIFEST, budget=300)
+        for i in range(5):
+            _, token = cache.lookup(
+                "s1", "search_file_content", {"pattern": f"p{i}", "path": self.dir}
+            )
+            cache.store(token, "x" * 100)
+        stats = cache.stats()
+        self.assertLessEqual(stats["bytes"], 300)
+        self.assertLess(stats["entries"], 5)
+        self.assertEqual(
+            cache.lookup(
+                "s1", "search_file_content", {"pattern": "p4", "path": self.dir}
+            )[0],
+            "x" * 100,
+        )
+
+
+class TestExecuteToolCaching(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "a.txt")
+        with open(self.path, "w") as f:
+            f.write("uno")
+        self.cache = ToolResultCache(TOOL_MANIFEST)
+        self._patchers = [
+            patch.object(tools, "tool_result_cache", self.cache),
+            patch("agent_server.tool_result_cache", self.cache),
+        ]
+        for patcher in self._patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self._patchers:
+            patcher.stop()
+        self._tmp.cleanup()
+
+    def test_write_file_invalidates_cached_reads(self):
+        def read(session_id):
+            return execute_tool("read_file", {"path": self.path}, session_id)
+
+        with patch.object(
+            tools, "read_file", wraps=tools.read_file
+        ) as read_file, patch.dict(tools.AVAILABLE_TOOLS, {"read_file": read_file}):
+            self.assertEqual(read("s1"), "uno")
+            self.assertEqual(read("s1"), "uno")
+            self.assertEqual(read_file.call_count, 1)
+            execute_tool("write_file", {"path": self.path, "content": "dos"}, "s1")
+            self.assertEqual(read("s1"), "dos")
+            self.assertEqual(read_file.call_count, 2)
+
+    def test_shell_command_clears_the_cache(self):
+        execute_tool("list_directory", {"path": self._tmp.name}, "s1")
+        execute_tool("run_shell_command", {"command": "true"}, "s1")
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_errors_are_not_cached(self):
+        missing = os.path.join(self._tmp.name, "no_existe.txt")
+        self.assertIn("Error", execute_tool("read_file", {"path": missing}, "s1"))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_metadata_is_not_sent_to_the_model(self):
+        prompt_manifest = json.dumps(tools.model_manifest())
+        self.assertNotIn('"pure"', prompt_manifest)
+        self.assertTrue(TOOL_MANIFEST["read_file"]["pure"])
+        self.assertFalse(TOOL_MANIFEST["write_file"]["pure"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+
+from tool_call_parser import (
+    ToolCallParser, UNDECIDED, TOOL_CALL, NOT_JSON, tool_call_list
+)
+
+
+def run_parser(chunks, **kwargs):
+    """Alimenta el parser fragmento a fragmento y devuelve (parser, texto emitido)."""
+    parser = ToolCallParser(**kwargs)
+    emitted = []
+    for chunk in chunks:
+        if parser.feed(chunk) == TOOL_CALL:
+            break
+        emitted.append(parser.pop_text())
+    if parser.status != TOOL_CALL:
+        emitted.append(parser.finish())
+    return parser, "".join(emitted)
+
+
+class TestToolCallParser(unittest.TestCase):
+
+    def test_plain_text_is_released_immediately(self):
+        parser = ToolCallParser()
+        self.assertEqual(parser.feed("Hola"), NOT_JSON)
+        self.assertEqual(parser.pop_text(), "Hola")
+
+    def test_whitespace_only_is_undecided_until_content(self):
+        parser = ToolCallParser()
+        self.assertEqual(parser.feed("  "), NOT_JSON)
+        self.assertEqual(parser.feed("{"), UNDECIDED)
+        self.assertEqual(parser.pop_text(), "  ")
+
+    def test_tool_call_split_across_chunks(self):
+        parser, emitted = run_parser(
+            ["{", '"read_', 'file": {"path": "/tmp/a', '\\"b"}', "}", " sobrante"]
+        )
+        self.assertEqual(parser.status, TOOL_CALL)
+        self.assertEqual(parser.tool_call, {"read_file": {"path": '/tmp/a"b'}})
+        self.assertEqual(emitted, "")
+
+    def test_list_of_tool_calls(self):
+        parser, emitted = run_parser(
+            ['[{"read_file": {"path": "/a"}},', ' {"read_file": {"path": "/b]"}}', "]"]
+        )
+        self.assertEqual(parser.status, TOOL_CALL)
+        self.assertEqual(
+            tool_call_list(parser.tool_call),
+            [("read_file", {"path": "/a"}), ("read_file", {"path": "/b]"})],
+        )
+        self.assertEqual(emitted, "")
+
+    def test_markdown_brackets_are_released(self):
+        parser, emitted = run_parser(["[enlace](http://x)\n", "[1, 2]\n", "[]"])
+        self.assertEqual(parser.status, NOT_JSON)
+        self.assertEqual(emitted, "[enlace](http://x)\n[1, 2]\n[]")
+
+    def test_braces_inside_strings_are_ignored(self):
+        parser, _ = run_parser(['{"write_file": {"content": "}}{{", "path": "/a"}}'])
+        self.assertEqual(parser.tool_call["write_file"]["content"], "}}{{")
+
+    def test_fenced_json_after_prose(self):
+        parser, emitted = run_parser(
+            [
+                "Primero leo el archivo:\n",
+                "```json\n",
+                '{"read_file": {"path": "/a"}}',
+                "\n```",
+            ]
+        )
+        self.assertEqual(parser.status, TOOL_CALL)
+        self.assertEqual(emitted, "Primero leo el archivo:\n")
+
+    def test_other_code_blocks_are_text(self):
+        text = 'Ejemplo:\n```python\n{"a": {}}\n```\nFin.'
+        parser, emitted = run_parser([text])
+        self.assertEqual(parser.status, NOT_JSON)
+        self.assertEqual(emitted, text)
+
+    def test_brace_in_prose_is_released(self):
+        parser, emitted = run_parser(["{hola", " mundo}", " y más"])
+        self.assertEqual(parser.status, NOT_JSON)
+        self.assertEqual(emitted, "{hola mundo} y más")
+
+    def test_json_that_is_not_a_tool_call_is_text(self):
+        text = '{"a": 1, "b": 2}\nresto'
+        parser, emitted = run_parser([text])
+        self.assertEqual(parser.status, NOT_JSON)
+        self.assertEqual(emitted, text)
+
+    def test_error_payload_is_not_a_tool_call(self):
+        parser, emitted = run_parser(['{"error": "Ollama no responde"}'])
+        self.assertEqual(parser.status, NOT_JSON)
+        self.assertEqual(emitted, '{"error": "Ollama no responde"}')
+
+    def test_incomplete_object_is_flushed_on_finish(self):
+        parser, emitted = run_parser(['{"read_file": {"path": '])
+        self.assertEqual(parser.status, NOT_JSON)
+        self.assertEqual(emitted, '{"read_file": {"path": ')
+
+    def test_strict_mode_stops_at_prose(self):
+        parser = ToolCallParser(allow_prose=False)
+        self.assertEqual(parser.feed("Texto\n"), NOT_JSON)
+        self.assertEqual(parser.feed('{"read_file": {"path": "/a"}}'), NOT_JSON)
+        self.assertIsNone(parser.tool_call)
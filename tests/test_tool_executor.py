@@ -0,0 +1,145 @@
+import unittest
+import threading
+import time
+
+from cancellation import Cancellation
+from tool_executor import ToolExecutor, plan_batches, report_progress
+
+READ_ONLY = {"read_file", "list_directory"}
+
+
+class TestPlanBatches(unittest.TestCase):
+
+    def test_mutating_calls_split_the_batches(self):
+        calls = [
+            ("read_file", {}),
+            ("list_directory", {}),
+            ("write_file", {}),
+            ("read_file", {}),
+            ("write_file", {}),
+            ("write_file", {}),
+        ]
+        self.assertEqual(plan_batches(calls, READ_ONLY), [[0, 1], [2], [3], [4], [5]])
+
+
+class TestToolExecutor(unittest.TestCase):
+
+    def test_read_only_calls_run_concurrently(self):
+        barrier = threading.Barrier(3, timeout=2)
+
+        def execute(tool_name, parameters):
+            # Solo se supera la barrera si las tres lecturas corren a la vez.
+            barrier.wait()
+            return parameters["path"]
+
+        executor = ToolExecutor(execute, READ_ONLY, max_workers=3)
+        calls = [("read_file", {"path": p}) for p in ("/a", "/b", "/c")]
+        results = dict(executor.run(calls))
+        executor.shutdown()
+        self.assertEqual(results, {0: "/a", 1: "/b", 2: "/c"})
+
+    def test_mutations_are_serialized_in_order(self):
+        log = []
+
+        def execute(tool_name, parameters):
+            log.append(("inicio", tool_name, parameters["path"]))
+            time.sleep(0.01)
+            log.append(("fin", tool_name, parameters["path"]))
+            return "ok"
+
+        executor = ToolExecutor(execute, READ_ONLY, max_workers=4)
+        calls = [
+            ("write_file", {"path": "/a"}),
+            ("read_file", {"path": "/a"}),
+        ]
+        self.assertEqual([i for i, _ in executor.run(calls)], [0, 1])
+        executor.shutdown()
+        self.assertEqual(
+            log[:2], [("inicio", "write_file", "/a"), ("fin", "write_file", "/a")]
+        )
+
+    def test_progress_is_streamed_before_the_result(self):
+        def execute(tool_name, parameters):
+            report_progress({"text": "uno"})
+            report_progress({"text": "dos"})
+            return "hecho"
+
+        executor = ToolExecutor(execute, READ_ONLY, max_workers=2)
+        events = list(executor.stream([("run_shell_command", {})]))
+        executor.shutdown()
+        self.assertEqual(events, [
+            ("progress", 0, {"text": "uno"}),
+            ("progress", 0, {"text": "dos"}),
+            ("result", 0, "hecho"),
+        ])
+
+    def test_errors_propagate_to_the_consumer(self):
+        def execute(tool_name, parameters):
+            raise RuntimeError("fallo")
+
+        executor = ToolExecutor(execute, READ_ONLY)
+        with self.assertRaises(RuntimeError):
+            list(executor.run([("write_file", {})]))
+        executor.shutdown()
+
+    def test_mutation_lock_is_per_scope(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def execute(tool_name, parameters):
+            if parameters["path"] == "/larga":
+                started.set()
+                release.wait(2)
+            return parameters["path"]
+
+        executor = ToolExecutor(execute, READ_ONLY)
+        slow = threading.Thread(target=lambda: list(executor.run(
+            [("run_shell_command", {"path": "/larga"})], scope="sesion-a"
+        )))
+        slow.start()
+        self.assertTrue(started.wait(2))
+        # Otra sesión escribe sin esperar al comando largo de la primera.
+        other = dict(executor.run([("write_file", {"path": "/b"})], scope="sesion-b"))
+        self.assertFalse(release.is_set())
+        release.set()
+        slow.join(2)
+        executor.shutdown()
+        self.assertEqual(other, {0: "/b"})
+
+    def test_cancelled_waiter_does_not_run(self):
+        release = threading.Event()
+        started = threading.Event()
+        ran = []
+
+        def execute(tool_name, parameters):
+            ran.append(parameters["path"])
+            if parameters["path"] == "/larga":
+                started.set()
+                release.wait(2)
+            return "ok"
+
+        executor = ToolExecutor(execute, READ_ONLY)
+        slow = threading.Thread(target=lambda: list(executor.stream(
+            [("run_shell_command", {"path": "/larga"})], scope="sesion"
+        )))
+        slow.start()
+        self.assertTrue(started.wait(2))
+        cancellation = Cancellation()
+        results = []
+        waiting = threading.Thread(target=lambda: results.extend(executor.stream(
+            [("write_file", {"path": "/b"})], cancellation=cancellation,
+            scope="sesion",
+        )))
+        waiting.start()
+        cancellation.cancel("client_disconnect")
+        waiting.join(2)
+        release.set()
+        slow.join(2)
+        time.sleep(0.1)  # La escritura pendiente obtiene el cerrojo al liberarse.
+        executor.shutdown()
+        self.assertEqual(ran, ["/larga"])
+        self.assertIn("cancelada", results[0][2])
+
+
+if __name__ == "__main__":
+    unittest.main()
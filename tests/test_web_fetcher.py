@@ -0,0 +1,192 @@
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import tools
+from web_fetcher import FetchCache, FetchError, HtmlToText, WebFetcher, extract_urls
+
+PAGE = """<!doctype html>
+<html><head><title>Página de prueba</title>
+<style>body { color: red; }</style><script>alert("no");</script></head>
+<body>
+<nav><a href="/">Inicio</a></nav>
+<h1>Hola</h1>
+<p>Un  párrafo
+con <a href="/otra">un enlace</a>.</p>
+<ul><li>uno</li><li>dos</li></ul>
+<pre>x = 1
+y = 2</pre>
+<footer>pie</footer>
+</body></html>"""
+
+
+class Handler(BaseHTTPRequestHandler):
+    hits = Counter()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        Handler.hits[path] += 1
+        if path == "/page":
+            if self.headers.get("If-None-Match") == '"v1"':
+                return self._send(
+                    304, headers={"ETag": '"v1"', "Cache-Control": "no-cache"}
+                )
+            return self._send(200, PAGE.encode(), {
+                "Content-Type": "text/html; charset=utf-8",
+                "ETag": '"v1"',
+                "Cache-Control": "no-cache",
+            })
+        if path == "/fresh":
+            return self._send(200, b"texto fresco", {
+                "Content-Type": "text/plain", "Cache-Control": "max-age=60"
+            })
+        if path == "/private":
+            return self._send(200, b"secreto", {
+                "Content-Type": "text/plain", "Cache-Control": "no-store"
+            })
+        if path == "/latin1":
+            return self._send(
+                200,
+                "<p>canción</p>".encode("latin-1"),
+                {"Content-Type": "text/html; charset=iso-8859-1"},
+            )
+        if path == "/big":
+            return self._send(200, b"a" * 500_000, {"Content-Type": "text/plain"})
+        if path == "/binary":
+            return self._send(200, b"\x89PNG\r\n", {"Content-Type": "image/png"})
+        if path == "/slow":
+            time.sleep(0.5)
+            return self._send(200, b"lento", {"Content-Type": "text/plain"})
+        if path == "/hang":
+            time.sleep(3)
+            return self._send(200, b"tarde", {"Content-Type": "text/plain"})
+        return self._send(404, b"no existe", {"Content-Type": "text/plain"})
+
+
+class TestWebFetcher(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        Handler.hits.clear()
+        self._tmp = tempfile.TemporaryDirectory()
+        self.fetcher = WebFetcher(
+            cache=FetchCache(self._tmp.name),
+            timeout=(2, 1),
+            max_bytes=100_000,
+            max_chars=5000,
+        )
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_html_is_reduced_to_readable_text(self):
+        page = self.fetcher.fetch(f"{self.base}/page")
+        text = page["text"]
+        self.assertEqual(page["title"], "Página de prueba")
+        self.assertIn("# Hola", text)
+        self.assertIn(f"Un párrafo con [un enlace]({self.base}/otra).", text)
+        self.assertIn("- uno\n\n- dos", text)
+        self.assertIn("```\nx = 1\ny = 2\n```", text)
+        for boilerplate in ("alert", "color: red", "Inicio", "pie"):
+            self.assertNotIn(boilerplate, text)
+
+    def test_etag_revalidation_reuses_the_cached_text(self):
+        first = self.fetcher.fetch(f"{self.base}/page")
+        second = self.fetcher.fetch(f"{self.base}/page")
+        self.assertEqual(first["source"], "network")
+        self.assertEqual(second["source"], "revalidated")
+        self.assertEqual(first["text"], second["text"])
+        self.assertEqual(Handler.hits["/page"], 2)
+
+    def test_fresh_responses_skip_the_network(self):
+        self.fetcher.fetch(f"{self.base}/fresh")
+        page = self.fetcher.fetch(f"{self.base}/fresh")
+        self.assertEqual(page["source"], "cache")
+        self.assertEqual(Handler.hits["/fresh"], 1)
+
+    def test_no_store_is_not_cached(self):
+        self.fetcher.fetch(f"{self.base}/private")
+        self.fetcher.fetch(f"{self.base}/private")
+        self.assertEqual(Handler.hits["/private"], 2)
+
+    def test_declared_charset_is_honoured(self):
+        self.assertEqual(self.fetcher.fetch(f"{self.base}/latin1")["text"], "canción")
+
+    def test_large_bodies_are_capped(self):
+        page = self.fetcher.fetch(f"{self.base}/big")
+        self.assertTrue(page["truncated"])
+        self.assertEqual(len(page["text"]), 5000)
+
+    def test_binary_content_is_not_returned(self):
+        self.assertIn("image/png", self.fetcher.fetch(f"{self.base}/binary")["text"])
+
+    def test_errors_and_timeouts(self):
+        with self.assertRaises(FetchError):
+            self.fetcher.fetch(f"{self.base}/missing")
+        started = time.monotonic()
+        with self.assertRaises(FetchError):
+            self.fetcher.fetch(f"{self.base}/hang")
+        self.assertLess(time.monotonic() - started, 2.5)
+
+    def test_urls_are_fetched_concurrently_in_order(self):
+        urls = [f"{self.base}/slow?{i}" for i in range(6)]
+        started = time.monotonic()
+        results = self.fetcher.fetch_many(urls)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual([url for url, _ in results], urls)
+        self.assertTrue(all(page["text"] == "lento" for _, page in results))
+
+    def test_web_fetch_tool(self):
+        with patch.object(tools, "web_fetcher", self.fetcher):
+            result = tools.web_fetch(f"Resume {self.base}/fresh y {self.base}/missing.")
+        self.assertIn(f"--- Contenido de {self.base}/fresh ---\ntexto fresco", result)
+        self.assertIn(f"Error al obtener {self.base}/missing: 404", result)
+
+
+class TestHelpers(unittest.TestCase):
+
+    def test_extract_urls_strips_trailing_punctuation(self):
+        text = (
+            "Mira https://a.example/x, (https://b.example/y) y "
+            "https://es.wikipedia.org/wiki/Python_(lenguaje). https://a.example/x"
+        )
+        self.assertEqual(extract_urls(text), [
+            "https://a.example/x",
+            "https://b.example/y",
+            "https://es.wikipedia.org/wiki/Python_(lenguaje)",
+        ])
+
+    def test_extractor_stops_at_the_limit(self):
+        extractor = HtmlToText(max_chars=10)
+        extractor.feed("<p>" + "palabra " * 100 + "</p>")
+        self.assertTrue(extractor.full)
+        self.assertLessEqual(len(extractor.text()), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --- CONFIGURACIÓN ---
+TOOL_CACHE_BUDGET = int(os.environ.get("AGENT_TOOL_CACHE_BYTES", str(32 * 1024 * 1024)))
+# Las herramientas recursivas (glob, búsqueda) dependen de todo un subárbol,
+# cuya huella sería tan cara como repetir la llamada: sus resultados caducan
+# a los TTL segundos además de invalidarse con las escrituras del agente.
+TOOL_CACHE_TREE_TTL = float(os.environ.get("AGENT_TOOL_CACHE_TREE_TTL", "30"))
+# Parámetros que nombran la ruta que lee una herramienta.
+PATH_PARAMETERS = ("path", "file_path")
+
+
+def path_fingerprint(path: str) -> tuple:
+    """(mtime_ns, ctime_ns, tamaño, inodo) de `path`; None si no existe."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_ctime_ns, st.st_size, st.st_ino)
+
+
+class ToolResultCache:
+    """Resultados de herramientas puras por sesión, con presupuesto de bytes (LRU).
+
+    La clave es (sesión, herramienta, argumentos normalizados con los valores
+    por defecto del manifiesto). Cada entrada guarda la huella de la ruta que
+    leyó la herramienta, tomada antes de ejecutarla: si el archivo o
+    directorio cambia, la huella deja de coincidir y la entrada se descarta.
+    Además, las herramientas que escriben invalidan explícitamente las
+    entradas de la ruta afectada y de sus directorios antecesores.
+    """
+
+    def __init__(
+        self,
+        manifest: dict,
+        budget: int = TOOL_CACHE_BUDGET,
+        tree_ttl: float = TOOL_CACHE_TREE_TTL,
+    ):
+        self.manifest = manifest
+        self.budget = budget
+        self.tree_ttl = tree_ttl
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        # Cambia con cada invalidación: un resultado calculado mientras otra
+        # herramienta escribía no se guarda.
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def is_cacheable(self, tool_name: str) -> bool:
+        return bool(self.manifest.get(tool_name, {}).get("pure"))
+
+    def key(self, scope, tool_name: str, parameters: dict):
+        """(clave, ruta leída o None) de una llamada."""
+        spec = self.manifest[tool_name]["parameters"]
+        arguments = {name: p["default"] for name, p in spec.items() if "default" in p}
+        arguments.update(parameters)
+        path = None
+        for name in PATH_PARAMETERS:
+            if isinstance(arguments.get(name), str):
+                arguments[name] = path = os.path.normpath(arguments[name])
+        encoded = json.dumps(arguments, sort_keys=True, ensure_ascii=False)
+        return (scope, tool_name, encoded), path
+
+    def lookup(self, scope, tool_name: str, parameters: dict):
+        """(resultado o None, testigo para `store`); (None, None) si no es cacheable."""
+        if not self.is_cacheable(tool_name):
+            return None, None
+        key, path = self.key(scope, tool_name, parameters)
+        fingerprint = path_fingerprint(path) if path else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                fresh = time.monotonic() < entry["expires"]
+                if entry["fingerprint"] == fingerprint and fresh:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry["result"], None
+                self._drop(key)
+            self.misses += 1
+            return None, (key, path, fingerprint, self._generation)
+
+    def store(self, token, result: str):
+        """Guarda `result` con la huella tomada en `lookup` (antes de ejecutar)."""
+        if token is None:
+            return
+        key, path, fingerprint, generation = token
+        size = len(result.encode("utf-8")) + len(key[2])
+        if size > self.budget:
+            return
+        recursive = self.manifest[key[1]].get("recursive", False)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._drop(key)
+            self._entries[key] = {
+                "result": result,
+                "path": path,
+                "fingerprint": fingerprint,
+                "expires": (
+                    time.monotonic() + self.tree_ttl if recursive else float("inf")
+                ),
+                "size": size,
+            }
+            self._total_bytes += size
+            while self._total_bytes > self.budget:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_path(self, path: str):
+        """Descarta las entradas de `path`, de sus antecesores y descendientes."""
+        path = os.path.normpath(path)
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if entry["path"] is None or _related(entry["path"], path)
+            ]
+            for key in stale:
+                self._drop(key)
+            self.invalidations += len(stale)
+            self._generation += 1
+
+    def clear(self, scope=None):
+        """Vacía la caché (o solo la de una sesión)."""
+        with self._lock:
+            stale = [key for key in self._entries if scope is None or key[0] == scope]
+            for key in stale:
+                self._drop(key)
+            self.invalidations += len(stale)
+            self._generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "budget": self.budget,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+    # --- Utilidades (requieren self._lock) ---
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry["size"]
+
+
+def _related(a: str, b: str) -> bool:
+    """True si `a` y `b` son la misma ruta o una contiene a la otra."""
+    if a == b:
+        return True
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    return longer.startswith(shorter.rstrip(os.sep) + os.sep)
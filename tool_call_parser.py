@@ -0,0 +1,307 @@
+import json
+import re
+
+# Estados que devuelve ToolCallParser.feed()
+UNDECIDED = "undecided"
+TOOL_CALL = "tool_call"
+NOT_JSON = "not_json"
+
+# Modos internos de la máquina de estados
+_SCAN = "scan"
+_FENCE = "fence"
+_AFTER_FENCE = "after_fence"
+_OBJECT = "object"
+
+_SCAN_TOKEN = re.compile(r"[\n{\[`]")
+_OBJECT_TOKEN = re.compile(r'["{}\[\]]')
+_STRING_TOKEN = re.compile(r'["\\\n]')
+_NON_BLANK = re.compile(r"[^ \t\r]")
+
+
+def is_tool_call(parsed) -> bool:
+    """Indica si un JSON decodificado tiene la forma {"herramienta": {...}}
+    o es una lista no vacía de objetos con esa forma."""
+    if isinstance(parsed, list):
+        return bool(parsed) and all(is_tool_call(item) for item in parsed)
+    return (
+        isinstance(parsed, dict)
+        and len(parsed) == 1
+        and isinstance(next(iter(parsed.values())), dict)
+    )
+
+
+def tool_call_list(parsed) -> list:
+    """Normaliza una llamada (objeto o lista) a [(herramienta, parámetros), ...]."""
+    items = parsed if isinstance(parsed, list) else [parsed]
+    return [next(iter(item.items())) for item in items]
+
+
+class ToolCallParser:
+    """Detecta llamadas a herramientas en un stream de texto de forma incremental.
+
+    Cada fragmento se recorre una sola vez: fuera de un candidato a JSON el texto
+    se libera de inmediato para enviarlo al cliente, y dentro de uno solo se
+    lleva la profundidad de llaves y el estado de las cadenas. `json.loads` se
+    ejecuta una única vez por objeto, cuando sus llaves quedan balanceadas.
+
+    Un candidato empieza con una `{` (una llamada) o un `[` (varias llamadas
+    independientes) al inicio de línea o tras un bloque ```json, así que se
+    toleran las explicaciones en prosa antes del JSON.
+    """
+
+    def __init__(self, allow_prose: bool = True):
+        self.allow_prose = allow_prose
+        self.status = UNDECIDED
+        self.tool_call = None
+        self.raw_tool_call = ""
+        self._ready = []
+        self._held = []
+        self._object = []
+        self._mode = _SCAN
+        self._at_line_start = True
+        self._seen_content = False
+        self._in_code_block = False
+        self._fenced = False
+        self._fence_line = ""
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect = None
+        self._is_list = False
+
+    # --- API pública ---
+
+    def feed(self, chunk: str) -> str:
+        """Procesa un fragmento y devuelve UNDECIDED, TOOL_CALL o NOT_JSON.
+
+        NOT_JSON significa que no hay ningún candidato pendiente: todo el texto
+        recibido puede enviarse ya con `pop_text()`.
+        """
+        if self.status == TOOL_CALL or not chunk:
+            return self.status
+        if self.status == NOT_JSON and not self.allow_prose:
+            self._ready.append(chunk)
+            return self.status
+
+        i = 0
+        while i < len(chunk) and self.status != TOOL_CALL:
+            if self._mode == _SCAN:
+                i = self._scan(chunk, i)
+            elif self._mode == _FENCE:
+                i = self._read_fence(chunk, i)
+            elif self._mode == _AFTER_FENCE:
+                i = self._after_fence(chunk, i)
+            else:
+                i = self._read_object(chunk, i)
+
+        if self.status != TOOL_CALL:
+            self.status = NOT_JSON if self._mode == _SCAN else UNDECIDED
+        return self.status
+
+    def pop_text(self) -> str:
+        """Devuelve (y descarta) el texto que ya puede enviarse al cliente."""
+        text = "".join(self._ready)
+        self._ready = []
+        return text
+
+    def finish(self) -> str:
+        """Cierra el stream: el candidato incompleto se trata como texto."""
+        if self.status != TOOL_CALL:
+            self._release()
+            self.status = NOT_JSON
+        return self.pop_text()
+
+    # --- Modos de la máquina de estados ---
+
+    def _scan(self, chunk: str, i: int) -> int:
+        while True:
+            match = _SCAN_TOKEN.search(chunk, i)
+            end = match.start() if match else len(chunk)
+            if _NON_BLANK.search(chunk, i, end):
+                self._at_line_start = False
+                if not self._seen_content:
+                    self._seen_content = True
+                    if not self.allow_prose:
+                        self._ready.append(chunk)
+                        self.status = NOT_JSON
+                        return len(chunk)
+            if match is None:
+                self._ready.append(chunk[i:])
+                return len(chunk)
+
+            char = match.group()
+            if char == "\n":
+                self._at_line_start = True
+                self._ready.append(chunk[i:end + 1])
+                i = end + 1
+                continue
+            if not self._at_line_start or (char in "{[" and self._in_code_block):
+                self._at_line_start = False
+                self._seen_content = True
+                self._ready.append(chunk[i:end + 1])
+                i = end + 1
+                continue
+
+            # Posible inicio de llamada a herramienta: se retiene desde aquí.
+            self._seen_content = True
+            self._ready.append(chunk[i:end])
+            if char in "{[":
+                self._start_object()
+            else:
+                self._mode = _FENCE
+                self._fence_line = ""
+            return end
+
+    def _read_fence(self, chunk: str, i: int) -> int:
+        newline = chunk.find("\n", i)
+        end = len(chunk) if newline == -1 else newline + 1
+        self._held.append(chunk[i:end])
+        self._fence_line += chunk[i:end]
+
+        if newline == -1:
+            if not "```".startswith(self._fence_line[:3]):
+                self._release(at_line_start=False)
+            return end
+
+        line = self._fence_line.strip()
+        info = line[3:].strip().lower()
+        if not line.startswith("```"):
+            self._release()
+        elif self._in_code_block:
+            self._in_code_block = info != ""
+            self._release()
+        elif info in ("", "json"):
+            self._mode = _AFTER_FENCE
+            self._fenced = True
+        else:
+            self._in_code_block = True
+            self._release()
+        return end
+
+    def _after_fence(self, chunk: str, i: int) -> int:
+        match = _NON_BLANK.search(chunk, i)
+        while match and match.group() == "\n":
+            match = _NON_BLANK.search(chunk, match.end())
+        if match is None:
+            self._held.append(chunk[i:])
+            return len(chunk)
+        if match.group() not in "{[":
+            self._in_code_block = True
+            self._release()
+            return i
+        self._held.append(chunk[i:match.start()])
+        self._start_object()
+        return match.start()
+
+    def _read_object(self, chunk: str, i: int) -> int:
+        start = i
+        while i < len(chunk):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    i += 1
+                    continue
+                match = _STRING_TOKEN.search(chunk, i)
+                if match is None:
+                    i = len(chunk)
+                    break
+                char = match.group()
+                i = match.end()
+                if char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                else:
+                    # JSON no admite saltos de línea literales dentro de cadenas.
+                    return self._abandon_object(chunk, start, i)
+                continue
+
+            if self._expect:
+                match = _NON_BLANK.search(chunk, i)
+                while match and match.group() == "\n":
+                    match = _NON_BLANK.search(chunk, match.end())
+                if match is None:
+                    i = len(chunk)
+                    break
+                if match.group() not in self._expect:
+                    return self._abandon_object(chunk, start, match.end())
+                self._expect = None
+                i = match.start()
+
+            match = _OBJECT_TOKEN.search(chunk, i)
+            if match is None:
+                i = len(chunk)
+                break
+            char = match.group()
+            i = match.end()
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._is_list = char == "["
+                # Tras la llave de una llamada solo puede venir una clave; tras
+                # el corchete de una lista, el objeto de la primera llamada.
+                if char == "[" and self._depth == 1:
+                    self._expect = ("{", "]")
+                elif char == "{" and self._depth == (2 if self._is_list else 1):
+                    self._expect = ('"', "}")
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    return self._complete_object(chunk, start, i)
+
+        self._object.append(chunk[start:i])
+        return i
+
+    # --- Utilidades ---
+
+    def _start_object(self):
+        self._mode = _OBJECT
+        self._object = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect = None
+        self._is_list = False
+
+    def _complete_object(self, chunk: str, start: int, end: int) -> int:
+        self._object.append(chunk[start:end])
+        text = "".join(self._object)
+        try:
+            parsed = json.loads(text)
+        except json.JSONDecodeError:
+            parsed = None
+        if is_tool_call(parsed):
+            self.status = TOOL_CALL
+            self.tool_call = parsed
+            self.raw_tool_call = text
+            self._held = []
+            self._object = []
+            return len(chunk)
+        self._held.append(text)
+        self._object = []
+        if self._fenced:
+            self._in_code_block = True
+        self._release(at_line_start=False)
+        return end
+
+    def _abandon_object(self, chunk: str, start: int, end: int) -> int:
+        self._object.append(chunk[start:end])
+        self._held.append("".join(self._object))
+        self._object = []
+        if self._fenced:
+            self._in_code_block = True
+        self._release(at_line_start=chunk[end - 1] == "\n")
+        return end
+
+    def _release(self, at_line_start: bool = True):
+        if self._object:
+            self._held.append("".join(self._object))
+            self._object = []
+        self._ready.extend(self._held)
+        self._held = []
+        self._mode = _SCAN
+        self._fenced = False
+        self._fence_line = ""
+        self._at_line_start = at_line_start
@@ -0,0 +1,175 @@
+import json
+import os
+import queue
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+# --- CONFIGURACIÓN ---
+TOOL_WORKERS = int(os.environ.get("AGENT_TOOL_WORKERS", "4"))
+# Avisos de progreso pendientes por paso; si el consumidor no da abasto se
+# descartan (el resultado final siempre se entrega).
+TOOL_PROGRESS_QUEUE_SIZE = 256
+# Cada cuánto se comprueba la cancelación de la petición mientras se espera a las
+# herramientas.
+TOOL_CANCEL_POLL_SECONDS = 0.2
+
+_progress = threading.local()
+
+
+def report_progress(data: dict):
+    """Notifica progreso de la herramienta que se ejecuta en este hilo.
+
+    Fuera de `ToolExecutor.stream` (p. ej. en las pruebas) no hace nada.
+    """
+    sink = getattr(_progress, "sink", None)
+    if sink is not None:
+        sink(data)
+
+
+def plan_batches(calls: list, read_only) -> list:
+    """Agrupa las llamadas en lotes que respetan el orden de la petición.
+
+    Las llamadas de solo lectura consecutivas forman un lote que puede
+    ejecutarse en paralelo; cada llamada con efectos secundarios forma un lote
+    propio, de modo que las lecturas posteriores ven sus cambios.
+    Devuelve listas de índices sobre `calls`.
+    """
+    batches = []
+    parallel = False
+    for index, (tool_name, _) in enumerate(calls):
+        if tool_name in read_only and parallel:
+            batches[-1].append(index)
+        else:
+            batches.append([index])
+            parallel = tool_name in read_only
+    return batches
+
+
+def _cancelled_result(cancellation) -> str:
+    return json.dumps(
+        {"error": f"Herramienta cancelada: {cancellation.reason}."},
+        ensure_ascii=False,
+    )
+
+
+class ToolExecutor:
+    """Ejecuta las llamadas a herramientas de un paso del agente.
+
+    Las herramientas de solo lectura de un mismo lote se reparten en un pool
+    de hilos acotado (compartido por todas las peticiones del proceso); las
+    que modifican el sistema se serializan con un cerrojo por ámbito (la
+    sesión), así dos peticiones de la misma sesión nunca escriben a la vez
+    sin que un comando largo de una sesión bloquee las escrituras de otra.
+    """
+
+    def __init__(self, execute, read_only, max_workers: int = TOOL_WORKERS):
+        self._execute = execute
+        self._read_only = read_only
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="tool"
+        )
+        # Cerrojos de escritura por ámbito; desaparecen cuando nadie los usa.
+        self._mutation_locks = weakref.WeakValueDictionary()
+        self._mutation_locks_guard = threading.Lock()
+
+    def _mutation_lock(self, scope) -> threading.Lock:
+        if scope is None:
+            # Sin ámbito, cada paso serializa solo sus propias escrituras.
+            return threading.Lock()
+        with self._mutation_locks_guard:
+            lock = self._mutation_locks.get(scope)
+            if lock is None:
+                lock = self._mutation_locks[scope] = threading.Lock()
+            return lock
+
+    def run(self, calls: list, execute=None, scope=None):
+        """Produce (índice, resultado) a medida que terminan las llamadas de `calls`."""
+        for kind, index, value in self.stream(calls, execute, scope=scope):
+            if kind == "result":
+                yield index, value
+
+    def stream(self, calls: list, execute=None, cancellation=None, scope=None):
+        """Como `run`, pero también produce el progreso de cada llamada.
+
+        Produce ("progress", índice, datos) por cada `report_progress` de la
+        herramienta y ("result", índice, resultado) al terminar. Las llamadas
+        se ejecutan fuera del hilo del consumidor, que puede reenviar el
+        progreso mientras esperan. `execute` sustituye a la función del
+        constructor solo para esta llamada (p. ej. para fijar la sesión).
+        Las llamadas con efectos secundarios del mismo `scope` se serializan.
+
+        Si `cancellation` se cancela mientras se espera, las llamadas
+        pendientes se dan por terminadas con un error y no se lanzan más
+        lotes; las que ya corren siguen en su hilo hasta que terminen (o
+        atiendan la cancelación, como `run_shell_command`). Una escritura que
+        aún esperaba al cerrojo ya no se ejecuta.
+        """
+        execute = execute or self._execute
+        lock = self._mutation_lock(scope)
+        for batch in plan_batches(calls, self._read_only):
+            events = queue.Queue()
+            if len(batch) == 1:
+                # Una llamada suelta no ocupa el pool: así las que esperan al
+                # cerrojo de escritura no bloquean las lecturas de otros pasos.
+                threading.Thread(
+                    target=self._task,
+                    args=(
+                        execute, batch[0], calls[batch[0]], events, lock,
+                        cancellation,
+                    ),
+                    daemon=True,
+                ).start()
+            else:
+                for index in batch:
+                    self._pool.submit(
+                        self._task, execute, index, calls[index], events, lock,
+                        cancellation,
+                    )
+            pending = set(batch)
+            while pending:
+                try:
+                    timeout = None if cancellation is None else TOOL_CANCEL_POLL_SECONDS
+                    kind, index, value = events.get(timeout=timeout)
+                except queue.Empty:
+                    if cancellation.cancelled:
+                        break
+                    continue
+                if kind == "error":
+                    raise value
+                if kind == "result":
+                    pending.discard(index)
+                yield kind, index, value
+            if cancellation is not None and cancellation.cancelled:
+                # Los lotes respetan el orden de `calls`: los siguientes no se lanzan.
+                for index in sorted(pending) + list(range(max(batch) + 1, len(calls))):
+                    yield "result", index, _cancelled_result(cancellation)
+                return
+
+    def _task(
+        self, execute, index: int, call, events: queue.Queue, lock, cancellation
+    ):
+        def sink(data):
+            if events.qsize() < TOOL_PROGRESS_QUEUE_SIZE:
+                events.put(("progress", index, data))
+
+        _progress.sink = sink
+        try:
+            result = self._run_one(execute, *call, lock, cancellation)
+            events.put(("result", index, result))
+        except Exception as e:
+            events.put(("error", index, e))
+        finally:
+            _progress.sink = None
+
+    def _run_one(self, execute, tool_name: str, parameters, lock, cancellation):
+        if tool_name in self._read_only:
+            return execute(tool_name, parameters)
+        with lock:
+            # Mientras se esperaba al cerrojo la petición pudo cancelarse.
+            if cancellation is not None and cancellation.cancelled:
+                return _cancelled_result(cancellation)
+            return execute(tool_name, parameters)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
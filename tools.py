@@ -1,50 +1,121 @@
 import logging
-import subprocess
 import os
 import json
-import glob
-import re
-import fnmatch
-import requests
 from datetime import datetime
 
+from cancellation import current_cancellation
+from file_editor import EditError, apply_edits
+from file_glob import GLOB_MAX_RESULTS, glob_paths
+from file_reader import READ_DEFAULT_LINES, READ_MAX_BYTES, read_bytes, read_lines
+from file_search import SEARCH_MAX_MATCHES_PER_FILE, SEARCH_MAX_RESULTS, iter_search
+from memory_store import MEMORY_DEFAULT_SECTION, memory_store_for
+from observation_store import observation_store
+from search_index import file_changed, index_for, invalidate_all
+from shell_runner import (
+    SHELL_MAX_TIMEOUT, SHELL_TIMEOUT, ShellJobError, run_command, shell_jobs
+)
+from tool_cache import ToolResultCache
+from tool_executor import report_progress
+from web_fetcher import FETCH_MAX_URLS, FetchError, extract_urls, web_fetcher
+
 AGENT_MEMORY_FILE = "/home/epardo/projects/python_agent_cli/config/agent_memory.md"
 
 # ------------------ TOOL IMPLEMENTATIONS ------------------
 
+def _path_changed(path: str):
+    """Notifica una escritura del agente a los índices y a la caché de resultados."""
+    file_changed(path)
+    tool_result_cache.invalidate_path(path)
+
+def _tree_changed(*_):
+    """Un comando de shell puede haber cambiado cualquier archivo."""
+    invalidate_all()
+    tool_result_cache.clear()
+
 def get_current_date() -> str:
     """Devuelve la fecha y hora actual del sistema."""
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-def run_shell_command(command: str) -> dict:
-    """Ejecuta un comando de shell y devuelve su salida."""
+# Espera máxima de una consulta a un trabajo en segundo plano.
+SHELL_JOB_MAX_WAIT = 30
+
+def run_shell_command(
+    command: str, timeout: float = SHELL_TIMEOUT, background: bool = False
+) -> dict:
+    """Ejecuta un comando de shell y devuelve su salida (acotada)."""
+    timeout = min(max(timeout, 1), SHELL_MAX_TIMEOUT)
     try:
-        result = subprocess.run(
+        if background:
+            # El comando puede modificar archivos indexados al terminar.
+            job_id = shell_jobs.start(command, on_exit=_tree_changed)
+            return {"job_id": job_id, "status": "running"}
+        result = run_command(
             command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            check=False,
+            timeout,
+            on_output=lambda stream, text: report_progress(
+                {"stream": stream, "text": text}
+            ),
+            cancellation=current_cancellation(),
         )
-        return {
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "exit_code": result.returncode,
-        }
+        _tree_changed()
+        return result
     except Exception as e:
         logging.error(f"Error al ejecutar run_shell_command: {e}")
         return {"error": str(e)}
 
-def read_file(path: str) -> str:
-    """Lee el contenido de un archivo en el sistema."""
+def shell_job_status(job_id: str, wait: float = 0, kill: bool = False) -> dict:
+    """Consulta (o termina) un comando de run_shell_command en segundo plano."""
+    try:
+        return shell_jobs.status(job_id, min(max(wait, 0), SHELL_JOB_MAX_WAIT), kill)
+    except ShellJobError as e:
+        return {"error": str(e)}
+
+def read_file(
+    path: str,
+    offset: int = None,
+    limit: int = None,
+    byte_offset: int = None,
+    byte_limit: int = None,
+) -> str:
+    """Lee un archivo del sistema, por páginas de líneas o rangos de bytes."""
     if not os.path.isabs(path):
         return "Error: La ruta debe ser absoluta."
+    minimums = {"offset": 1, "limit": 1, "byte_offset": 0, "byte_limit": 1}
+    values = {
+        "offset": offset, "limit": limit,
+        "byte_offset": byte_offset, "byte_limit": byte_limit,
+    }
+    for name, minimum in minimums.items():
+        if values[name] is not None and values[name] < minimum:
+            return f"Error: {name} debe ser un entero mayor o igual que {minimum}."
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return f.read()
+        by_bytes = byte_offset is not None or byte_limit is not None
+        if by_bytes and offset is None and limit is None:
+            page = read_bytes(path, byte_offset or 0, byte_limit or READ_MAX_BYTES)
+            footer = f"[Bytes {page['start']}-{page['end']} de {page['size']}."
+            if page["next_byte_offset"] is not None:
+                footer += f" Continúa con byte_offset={page['next_byte_offset']}."
+            return f"{page['content']}\n{footer}]"
+        page = read_lines(path, offset or 1, limit or READ_DEFAULT_LINES)
     except Exception as e:
         logging.error(f"Error al leer el archivo: {e}")
         return f"Error al leer el archivo: {e}"
+    whole = page["next_offset"] is None and not page["partial_line"]
+    if offset is None and limit is None and whole:
+        # El archivo completo cabe en una página: se devuelve tal cual.
+        return page["content"]
+    footer = (
+        f"[Líneas {page['start_line']}-{page['end_line']} de {page['total_lines']}."
+    )
+    if page["partial_line"]:
+        footer += (
+            f" La línea {page['end_line']} continúa: "
+            f"usa byte_offset={page['end_byte']}."
+        )
+    elif page["next_offset"] is not None:
+        footer += f" Continúa con offset={page['next_offset']}."
+    separator = "" if page["content"].endswith("\n") or not page["content"] else "\n"
+    return f"{page['content']}{separator}{footer}]"
 
 def write_file(path: str, content: str) -> str:
     """Escribe contenido en un archivo."""
@@ -54,6 +125,7 @@ def write_file(path: str, content: str) -> str:
         os.makedirs(os.path.dirname(path), exist_ok=True)
         with open(path, "w", encoding="utf-8") as f:
             f.write(content)
+        _path_changed(path)
         return f"Archivo {path} escrito exitosamente."
     except Exception as e:
         logging.error(f"Error al escribir el archivo: {e}")
@@ -74,73 +146,168 @@ def list_directory(path: str) -> str:
         logging.error(f"Error al listar el directorio: {e}")
         return f"Error al listar el directorio: {e}"
 
-def update_long_term_memory(content: str) -> str:
-    """Actualiza el contenido del archivo de memoria a largo plazo del agente."""
+def update_long_term_memory(
+    content: str = "", section: str = MEMORY_DEFAULT_SECTION, forget: str = ""
+) -> str:
+    """Añade una entrada a la memoria a largo plazo (o olvida una por su id)."""
+    store = memory_store_for(AGENT_MEMORY_FILE)
     try:
-        with open(AGENT_MEMORY_FILE, "w", encoding="utf-8") as f:
-            f.write(content)
-        return f"Memoria a largo plazo actualizada exitosamente en {AGENT_MEMORY_FILE}."
+        messages = []
+        if forget:
+            entry_id = forget.strip().lstrip("#")
+            if not store.forget(entry_id):
+                return (
+                    f"Error: no existe ninguna entrada de memoria con id '{entry_id}'."
+                )
+            messages.append(f"Entrada #{entry_id} olvidada.")
+        if content or not forget:
+            entry = store.append(content, section)
+            messages.append(
+                f"Entrada #{entry['id']} guardada en '{entry['section']}'."
+            )
+        _path_changed(store.path)
+        return (
+            f"Memoria a largo plazo actualizada en {store.path}: " + " ".join(messages)
+        )
     except Exception as e:
         logging.error(f"Error al actualizar la memoria a largo plazo: {e}")
         return f"Error al actualizar la memoria a largo plazo: {e}"
 
-def replace(file_path: str, old_string: str, new_string: str, instruction: str) -> str:
-    """Placeholder for replace tool."""
-    return "Error: La herramienta 'replace' no está completamente implementada."
+def replace(
+    file_path: str = "",
+    old_string: str = "",
+    new_string: str = "",
+    instruction: str = "",
+    edits: list = None,
+) -> str:
+    """Reemplaza fragmentos únicos en uno o varios archivos en una sola transacción."""
+    hunks = []
+    if old_string or not edits:
+        hunks.append((file_path, old_string, new_string))
+    for number, edit in enumerate(edits or [], 1):
+        if (
+            not isinstance(edit, dict)
+            or "old_string" not in edit
+            or "new_string" not in edit
+        ):
+            return (
+                f"Error: el cambio {number} de 'edits' debe tener 'old_string' y "
+                "'new_string'."
+            )
+        hunks.append(
+            (edit.get("file_path") or file_path, edit["old_string"], edit["new_string"])
+        )
+    try:
+        summary = apply_edits(hunks)
+    except EditError as e:
+        return f"Error: {e} No se ha modificado ningún archivo."
+    for path in {os.path.normpath(path) for path, _, _ in hunks}:
+        _path_changed(path)
+    return summary
 
-def search_file_content(pattern: str, path: str = ".", include: str = "*") -> str:
+def search_file_content(
+    pattern: str,
+    path: str = ".",
+    include: str = "*",
+    max_results: int = SEARCH_MAX_RESULTS,
+    max_matches_per_file: int = SEARCH_MAX_MATCHES_PER_FILE,
+) -> str:
     """Busca un patrón de expresión regular dentro del contenido de los archivos."""
     if not os.path.isabs(path):
         return "Error: La ruta de búsqueda debe ser absoluta."
     results = []
     try:
-        compiled_pattern = re.compile(pattern)
-        for root, _, files in os.walk(path):
-            for file_name in files:
-                if fnmatch.fnmatch(file_name, include):
-                    file_path = os.path.join(root, file_name)
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            for line_num, line in enumerate(f, 1):
-                                if compiled_pattern.search(line):
-                                    results.append(f"{file_path}:{line_num}: {line.strip()}")
-                    except Exception as e:
-                        logging.warning(f"No se pudo leer el archivo {file_path}: {e}")
+        # Con el índice de trigramas solo se verifican los archivos candidatos;
+        # sin él (aún en construcción o patrón sin literales) se recorre todo.
+        index = index_for(path)
+        candidates = None
+        if index is not None:
+            candidates = index.candidates(pattern, include, path)
+        for file_path, line_num, line in iter_search(
+            pattern,
+            path,
+            include,
+            max_results,
+            max_matches_per_file,
+            candidates=candidates,
+        ):
+            results.append(f"{file_path}:{line_num}: {line}")
     except Exception as e:
         return f"Error durante la búsqueda: {e}"
     if not results:
         return "No se encontraron coincidencias."
+    if len(results) >= max_results:
+        results.append(
+            f"[Resultados truncados: se alcanzó el límite de {max_results} "
+            "coincidencias. Acota el patrón, la ruta o el filtro 'include'.]"
+        )
     return "\n".join(results)
 
-def glob_files(pattern: str, path: str = ".") -> str:
+def glob_files(
+    pattern: str,
+    path: str = ".",
+    limit: int = GLOB_MAX_RESULTS,
+    sort_by_mtime: bool = False,
+) -> str:
     """Encuentra archivos que coinciden con patrones glob."""
     if not os.path.isabs(path):
         return "Error: La ruta de búsqueda debe ser absoluta."
-    full_pattern = os.path.join(path, pattern)
-    found_files = [os.path.abspath(f) for f in glob.glob(full_pattern, recursive=True)]
+    found_files, truncated = glob_paths(pattern, path, limit, sort_by_mtime)
     if not found_files:
         return "No se encontraron archivos que coincidan con el patrón."
-    return json.dumps(found_files)
+    result = json.dumps(found_files)
+    if truncated:
+        result += (
+            f"\n[Resultados truncados: se alcanzó el límite de {limit} rutas. "
+            "Acota el patrón o la ruta.]"
+        )
+    return result
 
 def web_fetch(prompt: str) -> str:
     """Procesa contenido de URL(s) incluidas en un prompt."""
-    urls = re.findall(r'https?://[^\s]+', prompt)
+    urls = extract_urls(prompt)
     if not urls:
         return "No se encontraron URLs en el prompt."
     results = []
-    for url in urls:
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            results.append(f"--- Contenido de {url} ---\n{response.text}")
-        except requests.exceptions.RequestException as e:
-            results.append(f"Error al obtener {url}: {e}")
+    for url, page in web_fetcher.fetch_many(urls[:FETCH_MAX_URLS]):
+        if isinstance(page, FetchError):
+            results.append(f"Error al obtener {url}: {page}")
+            continue
+        content = page["text"]
+        if page["truncated"]:
+            content += (
+                "\n[Contenido truncado: la página supera el límite de descarga o "
+                "de texto.]"
+            )
+        results.append(f"--- Contenido de {url} ---\n{content}")
+    if len(urls) > FETCH_MAX_URLS:
+        results.append(
+            f"[Se omitieron {len(urls) - FETCH_MAX_URLS} URLs: el límite es "
+            f"{FETCH_MAX_URLS} por llamada.]"
+        )
     return "\n\n".join(results)
 
+def fetch_observation(handle: str, page: int = 1, session_id: str = None) -> str:
+    """Devuelve una página de un resultado de herramienta guardado fuera del prompt.
+
+    Solo se leen las observaciones de la sesión `session_id` (la de la
+    petición, ver SESSION_TOOLS).
+    """
+    try:
+        return observation_store.page(session_id, handle.strip(), page)
+    except KeyError:
+        return (
+            f"Error: la observación '{handle}' no existe o ya se ha descartado; "
+            "vuelve a ejecutar la herramienta."
+        )
+    except ValueError as e:
+        return f"Error: {e}"
+
 # ------------------ TOOL REGISTRATION ------------------
 
 AVAILABLE_TOOLS = {
     "run_shell_command": run_shell_command,
+    "shell_job_status": shell_job_status,
     "read_file": read_file,
     "write_file": write_file,
     "list_directory": list_directory,
@@ -149,30 +316,128 @@ AVAILABLE_TOOLS = {
     "search_file_content": search_file_content,
     "glob": glob_files,
     "web_fetch": web_fetch,
+    "fetch_observation": fetch_observation,
     "get_current_date": get_current_date,
 }
 
+# Herramientas sin efectos secundarios: pueden ejecutarse en paralelo entre sí.
+# El resto (escritura, shell, memoria) se ejecuta de una en una y en orden.
+READ_ONLY_TOOLS = frozenset({
+    "read_file",
+    "list_directory",
+    "glob",
+    "search_file_content",
+    "web_fetch",
+    "fetch_observation",
+    "get_current_date",
+})
+
+# Herramientas que reciben además la sesión de la petición (`session_id`); el
+# modelo no puede indicarla porque no es un parámetro del manifiesto.
+SESSION_TOOLS = frozenset({"fetch_observation"})
+
+# `pure`: el resultado depende solo de los argumentos y del contenido de la
+# ruta leída, así que puede reutilizarse (ver tool_cache). `recursive`: lee un
+# subárbol entero. Estos metadatos no se envían al modelo (ver model_manifest).
 TOOL_MANIFEST = {
     "run_shell_command": {
-        "description": "Ejecuta un comando de shell en el sistema operativo. Úsalo para operaciones de sistema, gestión de archivos, etc. Devuelve la salida estándar, el error estándar y el código de salida.",
+        "pure": False,
+        "description": (
+            "Ejecuta un comando de shell en el sistema operativo. Úsalo para "
+            "operaciones de sistema, gestión de archivos, etc. Devuelve la salida "
+            "estándar, el error estándar y el código de salida; las salidas muy largas "
+            "se recortan conservando el principio y el final. El comando se termina si "
+            "supera 'timeout'. Con 'background' devuelve un 'job_id' para consultarlo "
+            "después con shell_job_status."
+        ),
         "parameters": {
             "command": {
                 "type": "string",
                 "description": "El comando exacto a ejecutar.",
-            }
+            },
+            "timeout": {
+                "type": "number",
+                "description": "Segundos máximos de ejecución (como mucho 600).",
+                "default": 120,
+            },
+            "background": {
+                "type": "boolean",
+                "description": (
+                    "Si es true, lanza el comando en segundo plano y devuelve su "
+                    "'job_id' sin esperar."
+                ),
+                "default": False,
+            },
+        },
+    },
+    "shell_job_status": {
+        "pure": False,
+        "description": (
+            "Consulta el estado y la salida de un comando lanzado en segundo plano con "
+            "run_shell_command, o lo termina."
+        ),
+        "parameters": {
+            "job_id": {
+                "type": "string",
+                "description": "El identificador devuelto por run_shell_command.",
+            },
+            "wait": {
+                "type": "number",
+                "description": (
+                    "Segundos a esperar a que termine antes de responder (como mucho "
+                    "30)."
+                ),
+                "default": 0,
+            },
+            "kill": {
+                "type": "boolean",
+                "description": "Si es true, termina el comando y sus procesos hijos.",
+                "default": False,
+            },
         },
     },
     "read_file": {
-        "description": "Lee y devuelve el contenido completo de un archivo de texto. La ruta al archivo debe ser absoluta.",
+        "pure": True,
+        "description": (
+            "Lee el contenido de un archivo de texto. La ruta al archivo debe ser "
+            "absoluta. Los archivos grandes se devuelven por páginas: el pie indica el "
+            "total de líneas y el 'offset' con el que continuar."
+        ),
         "parameters": {
             "path": {
                 "type": "string",
                 "description": "La ruta absoluta al archivo a leer.",
-            }
+            },
+            "offset": {
+                "type": "integer",
+                "description": "Número de línea (empezando en 1) desde el que leer.",
+                "default": 1,
+            },
+            "limit": {
+                "type": "integer",
+                "description": "Número máximo de líneas a leer (por defecto 2000).",
+                "default": 2000,
+            },
+            "byte_offset": {
+                "type": "integer",
+                "description": (
+                    "Lee por bytes desde esta posición en lugar de por líneas."
+                ),
+                "default": 0,
+            },
+            "byte_limit": {
+                "type": "integer",
+                "description": "Número máximo de bytes a leer en modo por bytes.",
+                "default": 262144,
+            },
         },
     },
     "write_file": {
-        "description": "Escribe (o sobrescribe) contenido en un archivo. La ruta al archivo debe ser absoluta. Creara los directorios si no existen.",
+        "pure": False,
+        "description": (
+            "Escribe (o sobrescribe) contenido en un archivo. La ruta al archivo debe "
+            "ser absoluta. Creara los directorios si no existen."
+        ),
         "parameters": {
             "path": {
                 "type": "string",
@@ -185,7 +450,10 @@ TOOL_MANIFEST = {
         },
     },
     "list_directory": {
-        "description": "Lista el contenido de un directorio. La ruta debe ser absoluta.",
+        "pure": True,
+        "description": (
+            "Lista el contenido de un directorio. La ruta debe ser absoluta."
+        ),
         "parameters": {
             "path": {
                 "type": "string",
@@ -194,37 +462,103 @@ TOOL_MANIFEST = {
         },
     },
     "update_long_term_memory": {
-        "description": "Actualiza el contenido del archivo de memoria a largo plazo del agente. Esto permitirá al agente aprender y adaptar sus directivas.",
+        "pure": False,
+        "description": (
+            "Guarda un dato en la memoria a largo plazo del agente (preferencias del "
+            "usuario, lecciones aprendidas, notas). Cada llamada añade una entrada "
+            "breve; no reescribas la memoria entera. En cada petición solo se incluyen "
+            "las entradas relevantes, además de las directivas generales. Para "
+            "corregir una entrada, olvídala con 'forget' (su id aparece como #id) y "
+            "guarda la nueva."
+        ),
         "parameters": {
             "content": {
                 "type": "string",
-                "description": "El nuevo contenido para la memoria a largo plazo.",
-            }
+                "description": "El dato a recordar, en una o dos frases.",
+                "default": "",
+            },
+            "section": {
+                "type": "string",
+                "description": (
+                    "Sección de la entrada: 'Directivas Generales' (siempre "
+                    "incluidas), 'Preferencias del Usuario', 'Lecciones Aprendidas', "
+                    "'Historial de Herramientas Utilizadas' o 'Notas Adicionales'."
+                ),
+                "default": MEMORY_DEFAULT_SECTION,
+            },
+            "forget": {
+                "type": "string",
+                "description": "Id de una entrada que se debe olvidar (opcional).",
+                "default": "",
+            },
         },
     },
     "replace": {
-        "description": "Reemplaza una única ocurrencia de texto en un archivo. Requiere la ruta absoluta del archivo, la cadena exacta a reemplazar (con contexto de al menos 3 líneas antes y después), la nueva cadena y una instrucción clara.",
+        "pure": False,
+        "description": (
+            "Reemplaza texto en archivos sin reescribirlos enteros. Cada 'old_string' "
+            "debe aparecer exactamente una vez en su archivo (incluye 2-3 líneas de "
+            "contexto para que sea único). Con 'edits' aplica varios cambios, en uno o "
+            "varios archivos, en una sola llamada: o se aplican todos o ninguno. "
+            "Devuelve un resumen con el diff de cada cambio."
+        ),
         "parameters": {
             "file_path": {
                 "type": "string",
-                "description": "La ruta absoluta al archivo a modificar.",
+                "description": (
+                    "La ruta absoluta al archivo a modificar (también la ruta por "
+                    "defecto de 'edits')."
+                ),
+                "default": "",
             },
             "old_string": {
                 "type": "string",
-                "description": "El texto exacto a reemplazar, incluyendo al menos 3 líneas de contexto antes y después.",
+                "description": (
+                    "El texto exacto a reemplazar, con el contexto necesario para que "
+                    "sea único."
+                ),
+                "default": "",
             },
             "new_string": {
                 "type": "string",
-                "description": "El texto exacto con el que se reemplazará 'old_string'.",
+                "description": (
+                    "El texto exacto con el que se reemplazará 'old_string'."
+                ),
+                "default": "",
+            },
+            "edits": {
+                "type": "array",
+                "description": (
+                    "Lista de cambios {'file_path', 'old_string', 'new_string'} "
+                    "aplicados juntos; 'file_path' es opcional si se indica arriba."
+                ),
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "file_path": {"type": "string"},
+                        "old_string": {"type": "string"},
+                        "new_string": {"type": "string"},
+                    },
+                    "required": ["old_string", "new_string"],
+                },
+                "default": [],
             },
             "instruction": {
                 "type": "string",
                 "description": "Una instrucción clara y semántica sobre el cambio.",
+                "default": "",
             },
         },
     },
     "search_file_content": {
-        "description": "Busca un patrón de expresión regular dentro del contenido de los archivos en un directorio especificado. Puede filtrar archivos por un patrón glob. Devuelve las líneas que contienen coincidencias, junto con sus rutas de archivo y números de línea.",
+        "pure": True,
+        "recursive": True,
+        "description": (
+            "Busca un patrón de expresión regular dentro del contenido de los archivos "
+            "en un directorio especificado. Puede filtrar archivos por un patrón glob. "
+            "Devuelve las líneas que contienen coincidencias, junto con sus rutas de "
+            "archivo y números de línea."
+        ),
         "parameters": {
             "pattern": {
                 "type": "string",
@@ -232,41 +566,197 @@ TOOL_MANIFEST = {
             },
             "path": {
                 "type": "string",
-                "description": "La ruta absoluta al directorio donde buscar. Por defecto es el directorio actual.",
+                "description": (
+                    "La ruta absoluta al directorio donde buscar. Por defecto es el "
+                    "directorio actual."
+                ),
                 "default": ".",
             },
             "include": {
                 "type": "string",
-                "description": "Un patrón glob para filtrar qué archivos se buscan (ej. '*.js', '*.{ts,tsx}'). Por defecto busca en todos los archivos.",
+                "description": (
+                    "Un patrón glob para filtrar qué archivos se buscan (ej. '*.js', "
+                    "'*.{ts,tsx}'). Por defecto busca en todos los archivos."
+                ),
                 "default": "*",
             },
+            "max_results": {
+                "type": "integer",
+                "description": (
+                    "Número máximo de coincidencias devueltas; la búsqueda se detiene "
+                    "al alcanzarlo."
+                ),
+                "default": 200,
+            },
+            "max_matches_per_file": {
+                "type": "integer",
+                "description": "Número máximo de coincidencias por archivo.",
+                "default": 20,
+            },
         },
     },
     "glob": {
-        "description": "Encuentra eficientemente archivos que coinciden con patrones glob específicos, devolviendo rutas absolutas. Útil para localizar archivos por su nombre o estructura de ruta.",
+        "pure": True,
+        "recursive": True,
+        "description": (
+            "Encuentra eficientemente archivos que coinciden con patrones glob "
+            "específicos, devolviendo rutas absolutas. Útil para localizar archivos "
+            "por su nombre o estructura de ruta."
+        ),
         "parameters": {
             "pattern": {
                 "type": "string",
-                "description": "El patrón glob a buscar (ej. '**/*.py', 'docs/*.md').",
+                "description": (
+                    "El patrón glob a buscar (ej. '**/*.py', 'docs/*.md', "
+                    "'src/**/*.{ts,tsx}')."
+                ),
             },
             "path": {
                 "type": "string",
-                "description": "La ruta absoluta al directorio donde buscar. Por defecto es el directorio actual.",
+                "description": (
+                    "La ruta absoluta al directorio donde buscar. Por defecto es el "
+                    "directorio actual."
+                ),
                 "default": ".",
             },
+            "limit": {
+                "type": "integer",
+                "description": "Número máximo de rutas devueltas.",
+                "default": 500,
+            },
+            "sort_by_mtime": {
+                "type": "boolean",
+                "description": (
+                    "Si es true, devuelve primero los archivos modificados más "
+                    "recientemente."
+                ),
+                "default": False,
+            },
         },
     },
     "web_fetch": {
-        "description": "Procesa contenido de URL(s) incluidas en un prompt. Extrae URLs y devuelve su contenido. Útil para obtener información de páginas web.",
+        "pure": False,
+        "description": (
+            "Procesa contenido de URL(s) incluidas en un prompt. Extrae URLs y "
+            "devuelve su contenido. Útil para obtener información de páginas web."
+        ),
         "parameters": {
             "prompt": {
                 "type": "string",
-                "description": "Un prompt que contiene la(s) URL(s) (hasta 20) a obtener y las instrucciones específicas sobre cómo procesar su contenido.",
+                "description": (
+                    "Un prompt que contiene la(s) URL(s) (hasta 20) a obtener y las "
+                    "instrucciones específicas sobre cómo procesar su contenido."
+                ),
             }
         },
     },
+    "fetch_observation": {
+        "pure": False,
+        "description": (
+            "Lee por páginas un resultado de herramienta recortado ('usa "
+            "fetch_observation con handle ...'). Pide solo las páginas que necesites."
+        ),
+        "parameters": {
+            "handle": {
+                "type": "string",
+                "description": "El identificador de la observación (obs-...).",
+            },
+            "page": {
+                "type": "integer",
+                "description": "Número de página, desde 1.",
+                "default": 1,
+            },
+        },
+    },
     "get_current_date": {
-        "description": "Devuelve la fecha y hora actual del sistema. Úsalo cuando el usuario pregunte por el día o la fecha.",
+        "pure": False,
+        "description": (
+            "Devuelve la fecha y hora actual del sistema. Úsalo cuando el usuario "
+            "pregunte por el día o la fecha."
+        ),
         "parameters": {}
     },
 }
+
+
+# Resultados de las herramientas puras, reutilizados mientras no cambie lo que leyeron.
+tool_result_cache = ToolResultCache(TOOL_MANIFEST)
+
+
+# ------------------ MANIFEST SCHEMAS AND VALIDATION ------------------
+
+def model_manifest(manifest: dict = None) -> dict:
+    """Manifiesto tal como lo ve el modelo: solo descripción y parámetros."""
+    manifest = TOOL_MANIFEST if manifest is None else manifest
+    return {
+        name: {"description": spec["description"], "parameters": spec["parameters"]}
+        for name, spec in manifest.items()
+    }
+
+
+_JSON_TYPES = {
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "array": list,
+    "object": dict,
+}
+
+
+def tool_parameters_schema(tool_name: str, manifest: dict = None) -> dict:
+    """Convierte los parámetros de una herramienta del manifiesto en un JSON Schema."""
+    manifest = TOOL_MANIFEST if manifest is None else manifest
+    parameters = manifest[tool_name]["parameters"]
+    return {
+        "type": "object",
+        "properties": {name: dict(spec) for name, spec in parameters.items()},
+        "required": [
+            name for name, spec in parameters.items() if "default" not in spec
+        ],
+        "additionalProperties": False,
+    }
+
+
+def manifest_to_ollama_tools(manifest: dict = None) -> list:
+    """Convierte el manifiesto a las herramientas nativas de Ollama (/api/chat)."""
+    manifest = TOOL_MANIFEST if manifest is None else manifest
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": spec["description"],
+                "parameters": tool_parameters_schema(name, manifest),
+            },
+        }
+        for name, spec in manifest.items()
+    ]
+
+
+def validate_tool_arguments(tool_name: str, parameters, manifest: dict = None) -> list:
+    """Valida los argumentos de una llamada contra el manifiesto.
+
+    Devuelve una lista de errores legibles; vacía si la llamada es válida.
+    """
+    manifest = TOOL_MANIFEST if manifest is None else manifest
+    if tool_name not in manifest:
+        return [f"La herramienta '{tool_name}' no existe."]
+    if not isinstance(parameters, dict):
+        return ["Los parámetros deben ser un objeto JSON."]
+
+    errors = []
+    schema = tool_parameters_schema(tool_name, manifest)
+    for name in schema["required"]:
+        if name not in parameters:
+            errors.append(f"Falta el parámetro obligatorio '{name}'.")
+    for name, value in parameters.items():
+        spec = schema["properties"].get(name)
+        if spec is None:
+            errors.append(f"Parámetro desconocido '{name}'.")
+            continue
+        expected = _JSON_TYPES.get(spec.get("type"))
+        is_bool = isinstance(value, bool) and spec.get("type") != "boolean"
+        if expected and (not isinstance(value, expected) or is_bool):
+            errors.append(f"El parámetro '{name}' debe ser de tipo {spec['type']}.")
+    return errors
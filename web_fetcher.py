@@ -0,0 +1,405 @@
+import codecs
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- CONFIGURACIÓN ---
+FETCH_WORKERS = int(os.environ.get("AGENT_FETCH_WORKERS", "8"))
+FETCH_MAX_URLS = 20
+FETCH_CONNECT_TIMEOUT = float(os.environ.get("AGENT_FETCH_CONNECT_TIMEOUT", "5"))
+FETCH_READ_TIMEOUT = float(os.environ.get("AGENT_FETCH_READ_TIMEOUT", "15"))
+# Plazo total por URL: el de lectura solo acota el silencio entre paquetes.
+FETCH_TOTAL_TIMEOUT = float(os.environ.get("AGENT_FETCH_TOTAL_TIMEOUT", "30"))
+FETCH_MAX_BYTES = int(os.environ.get("AGENT_FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+FETCH_MAX_CHARS = int(os.environ.get("AGENT_FETCH_MAX_CHARS", "20000"))
+FETCH_CACHE_DIR = os.environ.get(
+    "AGENT_FETCH_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "pyagent", "web_cache"),
+)
+FETCH_CACHE_MAX_ENTRIES = 1000
+FETCH_CHUNK_BYTES = 64 * 1024
+FETCH_USER_AGENT = "PyAgent/1.0 (+web_fetch)"
+
+# Etiquetas cuyo contenido nunca es texto legible.
+SKIPPED_TAGS = frozenset({
+    "script", "style", "noscript", "template", "svg", "iframe", "head", "nav",
+    "footer", "form",
+})
+BLOCK_TAGS = frozenset({
+    "p", "div", "section", "article", "main", "header", "aside", "ul", "ol", "dl",
+    "dt", "dd",
+    "table", "tr", "blockquote", "figure", "figcaption", "hr", "br", "li",
+    "h1", "h2", "h3", "h4", "h5", "h6", "pre",
+})
+TEXT_CONTENT_TYPES = (
+    "text/", "application/json", "application/xml", "application/xhtml", "+json", "+xml"
+)
+
+
+class FetchError(Exception):
+    """No se pudo obtener una URL."""
+
+
+class HtmlToText(HTMLParser):
+    """Extrae el texto legible de un HTML a medida que llega, en Markdown ligero.
+
+    Omite scripts, estilos y navegación; convierte títulos, listas, enlaces y
+    bloques `pre`. Deja de acumular al llegar a `max_chars` (`full` pasa a
+    True), de modo que quien lo alimenta puede cortar la descarga.
+    """
+
+    def __init__(self, base_url: str = "", max_chars: int = FETCH_MAX_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.max_chars = max_chars
+        self.title = ""
+        self.full = False
+        self._parts = []
+        self._chars = 0
+        self._skip_depth = 0
+        self._in_title = False
+        self._pre_depth = 0
+        self._links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "body":
+            # Un <head> o <nav> sin cerrar no debe ocultar el resto de la página.
+            self._skip_depth = 0
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+            return
+        if tag == "title":
+            self._in_title = True
+        if self._skip_depth:
+            return
+        if tag in BLOCK_TAGS:
+            self._emit("\n")
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self._emit("#" * int(tag[1]) + " ")
+        elif tag == "li":
+            self._emit("- ")
+        elif tag == "pre":
+            self._pre_depth += 1
+            self._emit("```\n")
+        elif tag == "a":
+            href = dict(attrs).get("href") or ""
+            self._links.append((len(self._parts), href))
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+            return
+        if tag == "title":
+            self._in_title = False
+        if self._skip_depth:
+            return
+        if tag == "a" and self._links:
+            start, href = self._links.pop()
+            text = "".join(self._parts[start:]).strip()
+            if text and href and not href.startswith(("#", "javascript:", "mailto:")):
+                self._parts.insert(start, "[")
+                self._emit(f"]({urljoin(self.base_url, href)})")
+        elif tag == "pre":
+            self._pre_depth = max(self._pre_depth - 1, 0)
+            self._emit("\n```")
+        if tag in BLOCK_TAGS:
+            self._emit("\n")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+            return
+        if self._skip_depth:
+            return
+        if not self._pre_depth:
+            data = re.sub(r"\s+", " ", data)
+        self._emit(data)
+
+    def _emit(self, text: str):
+        if self.full or not text:
+            return
+        room = self.max_chars - self._chars
+        if len(text) >= room:
+            text = text[:room]
+            self.full = True
+        self._parts.append(text)
+        self._chars += len(text)
+
+    def text(self) -> str:
+        text = "".join(self._parts)
+        lines = [line.rstrip() for line in text.split("\n")]
+        text = re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+        title = re.sub(r"\s+", " ", self.title).strip()
+        if title and not text.startswith(f"# {title}"):
+            text = f"# {title}\n\n{text}"
+        return text
+
+
+def _charset(content_type: str) -> str:
+    match = re.search(r"charset=[\"']?([\w.:-]+)", content_type, re.IGNORECASE)
+    if match:
+        try:
+            return codecs.lookup(match.group(1)).name
+        except LookupError:
+            pass
+    return "utf-8"
+
+
+def _freshness(headers, now: float) -> float:
+    """Instante hasta el que se reutiliza la respuesta sin revalidar (0: revalidar)."""
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-cache" in cache_control or "no-store" in cache_control:
+        return 0
+    age = 0
+    try:
+        age = max(int(headers.get("Age", "0")), 0)
+    except ValueError:
+        pass
+    match = re.search(r"max-age=(\d+)", cache_control)
+    if match:
+        return now + int(match.group(1)) - age
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            return email.utils.parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError):
+            return 0
+    return 0
+
+
+class FetchCache:
+    """Caché HTTP en disco: un JSON por URL con el texto extraído y sus validadores.
+
+    Mientras la respuesta está fresca (Cache-Control max-age o Expires) se
+    sirve sin red; después se revalida con If-None-Match/If-Modified-Since y
+    un 304 reutiliza el texto guardado. `no-store` no se guarda nunca.
+    """
+
+    def __init__(
+        self,
+        directory: str = FETCH_CACHE_DIR,
+        max_entries: int = FETCH_CACHE_MAX_ENTRIES,
+    ):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, url: str) -> str:
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + ".json")
+
+    def get(self, url: str):
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("url") == url else None
+
+    def put(self, url: str, entry: dict):
+        path = self._path(url)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"No se pudo guardar en la caché web {url}: {e}")
+            return
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % 100 == 0
+        if prune:
+            self._prune()
+
+    def _prune(self):
+        try:
+            with os.scandir(self.directory) as it:
+                entries = [
+                    (e.stat().st_mtime, e.path) for e in it if e.name.endswith(".json")
+                ]
+        except OSError:
+            return
+        entries.sort()
+        for _, path in entries[:max(len(entries) - self.max_entries, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class WebFetcher:
+    """Descarga URLs en paralelo con una sesión HTTP compartida y caché en disco.
+
+    Cada descarga tiene plazos de conexión, de lectura y total, y se corta al
+    superar `max_bytes`; el HTML se reduce a texto mientras llega.
+    """
+
+    def __init__(
+        self,
+        cache: FetchCache = None,
+        workers: int = FETCH_WORKERS,
+        timeout: tuple = (FETCH_CONNECT_TIMEOUT, FETCH_READ_TIMEOUT),
+        total_timeout: float = FETCH_TOTAL_TIMEOUT,
+        max_bytes: int = FETCH_MAX_BYTES,
+        max_chars: int = FETCH_MAX_CHARS,
+    ):
+        self.cache = cache
+        self.workers = workers
+        self.timeout = timeout
+        self.total_timeout = total_timeout
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = FETCH_USER_AGENT
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.stats = {"requests": 0, "cache_hits": 0, "revalidated": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def fetch_many(self, urls: list) -> list:
+        """Devuelve [(url, entrada o FetchError)] en el orden de `urls`."""
+        if not urls:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(urls))) as pool:
+            futures = [pool.submit(self._fetch_or_error, url) for url in urls]
+            return [(url, future.result()) for url, future in zip(urls, futures)]
+
+    def _fetch_or_error(self, url: str):
+        try:
+            return self.fetch(url)
+        except FetchError as e:
+            return e
+
+    def fetch(self, url: str) -> dict:
+        """Entrada {"url", "title", "text", "truncated", "content_type", "source"}.
+
+        `source` es "network", "cache" (fresca) o "revalidated" (304).
+        """
+        now = time.time()
+        cached = self.cache.get(url) if self.cache is not None else None
+        if cached is not None and now < cached.get("fresh_until", 0):
+            self._count("cache_hits")
+            return {**cached, "source": "cache"}
+        headers = {}
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        self._count("requests")
+        try:
+            response = self.session.get(
+                url, headers=headers, stream=True, timeout=self.timeout
+            )
+        except requests.exceptions.RequestException as e:
+            raise FetchError(str(e)) from e
+        with response:
+            if response.status_code == 304 and cached is not None:
+                self._count("revalidated")
+                cached["fresh_until"] = _freshness(response.headers, now)
+                self.cache.put(url, cached)
+                return {**cached, "source": "revalidated"}
+            if response.status_code >= 400:
+                raise FetchError(f"{response.status_code} {response.reason}")
+            entry = self._read(url, response, now)
+
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        if self.cache is not None and "no-store" not in cache_control:
+            self.cache.put(url, {
+                **entry,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fresh_until": _freshness(response.headers, now),
+            })
+        return {**entry, "source": "network"}
+
+    def _read(self, url: str, response, started: float) -> dict:
+        content_type = response.headers.get("Content-Type", "")
+        mime = content_type.split(";")[0].strip().lower()
+        is_html = mime in ("text/html", "application/xhtml+xml") or not mime
+        if mime and not is_html and not any(t in mime for t in TEXT_CONTENT_TYPES):
+            size = response.headers.get("Content-Length", "desconocido")
+            return {
+                "url": url, "title": "", "content_type": mime, "truncated": False,
+                "text": f"[Contenido binario ({mime}, {size} bytes): no se muestra.]",
+            }
+
+        decoder = codecs.getincrementaldecoder(_charset(content_type))(errors="replace")
+        extractor = HtmlToText(url, self.max_chars) if is_html else None
+        parts, chars, received = [], 0, 0
+        truncated = False
+        deadline = started + self.total_timeout
+        try:
+            for chunk in response.iter_content(FETCH_CHUNK_BYTES):
+                received += len(chunk)
+                text = decoder.decode(chunk)
+                if extractor is not None:
+                    extractor.feed(text)
+                    full = extractor.full
+                else:
+                    parts.append(text[:self.max_chars - chars])
+                    chars += len(parts[-1])
+                    full = chars >= self.max_chars
+                if full or received >= self.max_bytes:
+                    truncated = True
+                    break
+                if time.time() > deadline:
+                    raise FetchError(
+                        f"se superó el plazo total de {self.total_timeout:g} s"
+                    )
+        except requests.exceptions.RequestException as e:
+            raise FetchError(str(e)) from e
+        if extractor is not None:
+            extractor.close()
+            return {
+                "url": url,
+                "title": re.sub(r"\s+", " ", extractor.title).strip(),
+                "content_type": mime or "text/html",
+                "truncated": truncated,
+                "text": extractor.text(),
+            }
+        return {
+            "url": url,
+            "title": "",
+            "content_type": mime,
+            "truncated": truncated,
+            "text": "".join(parts),
+        }
+
+
+def extract_urls(text: str) -> list:
+    """URLs http(s) de `text`, sin duplicados ni la puntuación que las sigue."""
+    urls = []
+    for url in re.findall(r"https?://[^\s<>\"'`]+", text):
+        url = url.rstrip(".,;:!?")
+        # Un paréntesis final solo es parte de la URL si abre dentro de ella.
+        while url.endswith((")", "]")) and url.count(url[-1]) > url.count(
+            "(" if url[-1] == ")" else "["
+        ):
+            url = url[:-1].rstrip(".,;:!?")
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+
+web_fetcher = WebFetcher(cache=FetchCache())